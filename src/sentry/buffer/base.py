@@ -1,9 +1,149 @@
+from collections import defaultdict
+from time import monotonic
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connections, models, router
 from django.db.models import F
+from django.db.models.signals import post_save
 
 from sentry.signals import buffer_incr_complete
 from sentry.tasks.process_buffer import process_incr
+from sentry.utils import metrics
 from sentry.utils.services import Service
 
+# Filter column types that can be safely compared against the values returned
+# by the bulk UPDATE in order to figure out which rows were matched.
+_BULK_KEY_TYPES = frozenset(["smallint", "integer", "bigint"])
+
+
+def _cast_type(field, connection):
+    if isinstance(field, models.AutoField):
+        get_related_db_type = getattr(field, "get_related_db_type", None)
+        if get_related_db_type is not None:
+            return get_related_db_type(connection)
+        return field.rel_db_type(connection)
+    return field.db_type(connection)
+
+
+def _get_concrete_field(model, name):
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+    if not field.concrete or field.many_to_many:
+        return None
+    return field
+
+
+def _get_bulk_key(model, columns, filters, extra):
+    """
+    Returns the key under which an increment can be batched with others, or
+    `None` if it has to go through the regular `process` path.
+    """
+    if not filters or not (columns or extra):
+        return None
+
+    connection = connections[router.db_for_write(model)]
+    for name, value in filters.items():
+        field = _get_concrete_field(model, name)
+        if field is None or value is None:
+            return None
+        if _cast_type(field, connection) not in _BULK_KEY_TYPES:
+            return None
+
+    for name in (*columns, *(extra or ())):
+        if _get_concrete_field(model, name) is None:
+            return None
+
+    return (
+        model,
+        tuple(sorted(filters)),
+        tuple(sorted(columns)),
+        tuple(sorted(extra or ())),
+    )
+
+
+def _bulk_update(model, filter_names, column_names, extra_names, rows):
+    """
+    Applies many increments to `model` with a single statement::
+
+        UPDATE table AS t SET col = t.col + v.col, ...
+        FROM (VALUES (...), ...) AS v(...)
+        WHERE t.key = v.key ...
+        RETURNING t.key, ...
+
+    ``rows`` is a list of ``(filters, columns, extra)`` tuples. Returns the set
+    of filter value tuples that matched an existing row.
+    """
+    from sentry.models import Group
+
+    using = router.db_for_write(model)
+    connection = connections[using]
+    qn = connection.ops.quote_name
+
+    filter_fields = [_get_concrete_field(model, name) for name in filter_names]
+    column_fields = [_get_concrete_field(model, name) for name in column_names]
+    extra_fields = [_get_concrete_field(model, name) for name in extra_names]
+
+    value_fields = [*filter_fields, *column_fields, *extra_fields]
+    value_names = [f"v{i}" for i in range(len(value_fields))]
+    placeholders = "({})".format(
+        ", ".join(f"%s::{_cast_type(field, connection)}" for field in value_fields)
+    )
+
+    params = []
+    for filters, columns, extra in rows:
+        for name, field in zip(filter_names, filter_fields):
+            value = filters[name]
+            if isinstance(value, models.Model):
+                value = value.pk
+            params.append(field.get_db_prep_value(value, connection))
+        for name, field in zip(column_names, column_fields):
+            params.append(field.get_db_prep_value(columns[name], connection))
+        for name, field in zip(extra_names, extra_fields):
+            params.append(field.get_db_prep_value(extra[name], connection))
+
+    offset = len(filter_fields)
+    assignments = []
+    for i, field in enumerate(column_fields, offset):
+        assignments.append(f"{qn(field.column)} = t.{qn(field.column)} + v.{value_names[i]}")
+    offset += len(column_fields)
+    for i, field in enumerate(extra_fields, offset):
+        assignments.append(f"{qn(field.column)} = v.{value_names[i]}")
+
+    # Mirrors the `ScoreClause` applied by `process` for groups.
+    if model is Group and "times_seen" in column_names and "last_seen" in extra_names:
+        times_seen = value_names[len(filter_fields) + column_names.index("times_seen")]
+        last_seen = value_names[
+            len(filter_fields) + len(column_fields) + extra_names.index("last_seen")
+        ]
+        assignments.append(
+            f"{qn('score')} = log(t.{qn('times_seen')} + v.{times_seen}) * 600"
+            f" + trunc(extract(epoch from v.{last_seen}))"
+        )
+
+    where = " AND ".join(
+        f"t.{qn(field.column)} = v.{value_names[i]}" for i, field in enumerate(filter_fields)
+    )
+    returning = ", ".join(f"t.{qn(field.column)}" for field in filter_fields)
+
+    sql = (
+        "UPDATE {table} AS t SET {assignments} "
+        "FROM (VALUES {values}) AS v({names}) "
+        "WHERE {where} RETURNING {returning}"
+    ).format(
+        table=qn(model._meta.db_table),
+        assignments=", ".join(assignments),
+        values=", ".join([placeholders] * len(rows)),
+        names=", ".join(value_names),
+        where=where,
+        returning=returning,
+    )
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return {tuple(row) for row in cursor.fetchall()}
+
 
 class Buffer(Service):
     """
@@ -19,7 +159,7 @@ class Buffer(Service):
     keep up with the updates.
     """
 
-    __all__ = ("get", "incr", "process", "process_pending", "validate")
+    __all__ = ("get", "incr", "process", "process_batch", "process_pending", "validate")
 
     def get(self, model, columns, filters):
         """
@@ -48,6 +188,78 @@ class Buffer(Service):
     def process_pending(self, partition=None):
         return []
 
+    def process_batch(self, items):
+        """
+        Processes many buffered increments at once. ``items`` is a list of
+        ``(model, columns, filters, extra, signal_only)`` tuples, as would be
+        passed to `process`.
+
+        Increments for the same model and set of columns are applied with one
+        multi-row UPDATE. Anything that can't be expressed that way, and rows
+        that don't exist yet and have to be created, go through `process`.
+        """
+        from sentry.models import Group
+
+        batches = defaultdict(dict)
+        for item in items:
+            model, columns, filters, extra, signal_only = item
+            bulk_key = None if signal_only else _get_bulk_key(model, columns, filters, extra)
+            if bulk_key is None:
+                self.process(*item)
+                continue
+
+            filter_values = tuple(
+                filters[name].pk if isinstance(filters[name], models.Model) else filters[name]
+                for name in bulk_key[1]
+            )
+            # The same row can be buffered under different keys (e.g. `pk` and
+            # `id`), only one of those can be part of a single statement.
+            if filter_values in batches[bulk_key]:
+                self.process(*item)
+                continue
+            batches[bulk_key][filter_values] = item
+
+        for (model, filter_names, column_names, extra_names), batch in batches.items():
+            tags = {"module": model.__module__, "model": model.__name__}
+            start = monotonic()
+            updated = _bulk_update(
+                model,
+                filter_names,
+                column_names,
+                extra_names,
+                [(filters, columns, extra) for _, columns, filters, extra, _ in batch.values()],
+            )
+            duration = monotonic() - start
+
+            metrics.timing("buffer.bulk-flush.duration", duration, tags=tags)
+            metrics.timing("buffer.bulk-flush.rows", len(batch), tags=tags)
+            if duration > 0:
+                metrics.timing(
+                    "buffer.bulk-flush.rows-per-second", len(batch) / duration, tags=tags
+                )
+
+            if model is Group and filter_names == ("id",) and updated:
+                # `process` goes through `Group.update` so that the cached
+                # group picks up the new counters, do the same here.
+                for group in Group.objects.filter(id__in=[values[0] for values in updated]):
+                    post_save.send(sender=Group, instance=group, created=False)
+
+            for filter_values, item in batch.items():
+                if filter_values not in updated:
+                    # Either the row needs to be created, or (for groups) it
+                    # is gone and `process` will just fire the signal.
+                    self.process(*item)
+                    continue
+                model, columns, filters, extra, _ = item
+                buffer_incr_complete.send_robust(
+                    model=model,
+                    columns=columns,
+                    filters=filters,
+                    extra=extra,
+                    created=False,
+                    sender=model,
+                )
+
     def process(self, model, columns, filters, extra=None, signal_only=None):
         from sentry.event_manager import ScoreClause
         from sentry.models import Group
@@ -69,16 +69,58 @@ class PendingBuffer:
         return rv
 
 
+class _ClusterPipeline:
+    """
+    Adapts a Redis Cluster pipeline to the `with cluster.map() as client`
+    interface used for rb. Queued commands return placeholders whose `value`
+    is filled in once the pipeline executes, mirroring rb's promises.
+    """
+
+    def __init__(self, cluster):
+        self.pipe = cluster.pipeline(transaction=False)
+        self.results = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type is None:
+            for promise, value in zip(self.results, self.pipe.execute()):
+                promise.value = value
+
+    def __getattr__(self, name):
+        command = getattr(self.pipe, name)
+
+        def queue(*args, **kwargs):
+            command(*args, **kwargs)
+            promise = _PipelineResult()
+            self.results.append(promise)
+            return promise
+
+        return queue
+
+
+class _PipelineResult:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = None
+
+
 class RedisBuffer(Buffer):
     key_expire = 60 * 60  # 1 hour
     pending_key = "b:p"
 
-    def __init__(self, pending_partitions=1, incr_batch_size=2, **options):
+    def __init__(self, pending_partitions=1, incr_batch_size=2, bulk_flush=False, **options):
         self.is_redis_cluster, self.cluster, options = get_dynamic_cluster_from_options(
             "SENTRY_BUFFER_OPTIONS", options
         )
         self.pending_partitions = pending_partitions
         self.incr_batch_size = incr_batch_size
+        # When enabled, each `process_incr` batch is read from Redis with a
+        # handful of pipelined round trips and written back with one multi-row
+        # UPDATE per (model, columns) group instead of one UPDATE per key.
+        self.bulk_flush = bulk_flush
         assert self.pending_partitions > 0
         assert self.incr_batch_size > 0
 
@@ -318,12 +360,100 @@ class RedisBuffer(Buffer):
         if key is not None:
             batch_keys = [key]
 
+        if self.bulk_flush and len(batch_keys) > 1:
+            self._process_batch_incr(batch_keys)
+            return
+
         for key in batch_keys:
             self._process_single_incr(key)
 
     def _process(self, model, columns, filters, extra=None, signal_only=None):
         return super().process(model, columns, filters, extra, signal_only)
 
+    def _load_buffered_values(self, values):
+        """
+        Decodes the hash stored by `incr` into the arguments expected by
+        `Buffer.process`.
+        """
+        model = import_string(force_str(values.pop("m")))
+
+        if values["f"].startswith(b"{" if not self.is_redis_cluster else "{"):
+            filters = self._load_values(json.loads(force_str(values.pop("f"))))
+        else:
+            # TODO(dcramer): legacy pickle support - remove in Sentry 9.1
+            filters = pickle.loads(force_bytes(values.pop("f")))
+
+        incr_values = {}
+        extra_values = {}
+        signal_only = None
+        for k, v in values.items():
+            if k.startswith("i+"):
+                incr_values[k[2:]] = int(v)
+            elif k.startswith("e+"):
+                if v.startswith(b"[" if not self.is_redis_cluster else "["):
+                    extra_values[k[2:]] = self._load_value(json.loads(force_str(v)))
+                else:
+                    # TODO(dcramer): legacy pickle support - remove in Sentry 9.1
+                    extra_values[k[2:]] = pickle.loads(force_bytes(v))
+            elif k == "s":
+                signal_only = bool(int(v))  # Should be 1 if set
+
+        return model, incr_values, filters, extra_values, signal_only
+
+    def _pipeline(self):
+        """
+        Returns a context manager yielding a client that buffers commands
+        routed to the host owning each key. Every command returns an object
+        whose `value` is available once the context exits.
+        """
+        if self.is_redis_cluster:
+            return _ClusterPipeline(self.cluster)
+        return self.cluster.map()
+
+    def _process_batch_incr(self, batch_keys):
+        """
+        Bulk variant of `_process_single_incr`: locks, reads and clears every
+        key of the batch with pipelined commands and hands the decoded
+        increments to `Buffer.process_batch` so they can be written with as few
+        statements as possible.
+        """
+        lock_keys = [self._make_lock_key(key) for key in batch_keys]
+
+        with self._pipeline() as client:
+            lock_results = [client.set(lock_key, "1", nx=True, ex=10) for lock_key in lock_keys]
+
+        locked = []
+        for key, result in zip(batch_keys, lock_results):
+            if result.value:
+                locked.append(key)
+            else:
+                metrics.incr("buffer.revoked", tags={"reason": "locked"}, skip_internal=False)
+                logger.debug("buffer.revoked.locked", extra={"redis_key": key})
+
+        try:
+            with self._pipeline() as client:
+                hashes = []
+                for key in locked:
+                    hashes.append(client.hgetall(key))
+                    client.zrem(self._make_pending_key_from_key(key), key)
+                    client.delete(key)
+
+            items = []
+            for key, result in zip(locked, hashes):
+                values = {force_str(k): v for k, v in result.value.items()}
+                if not values:
+                    metrics.incr("buffer.revoked", tags={"reason": "empty"}, skip_internal=False)
+                    logger.debug("buffer.revoked.empty", extra={"redis_key": key})
+                    continue
+                items.append(self._load_buffered_values(values))
+
+            if items:
+                self.process_batch(items)
+        finally:
+            with self._pipeline() as client:
+                for key in locked:
+                    client.delete(self._make_lock_key(key))
+
     def _process_single_incr(self, key):
         if self.is_redis_cluster:
             client = self.cluster
@@ -362,29 +492,9 @@ class RedisBuffer(Buffer):
                 logger.debug("buffer.revoked.empty", extra={"redis_key": key})
                 return
 
-            model = import_string(force_str(values.pop("m")))
-
-            if values["f"].startswith(b"{" if not self.is_redis_cluster else "{"):
-                filters = self._load_values(json.loads(force_str(values.pop("f"))))
-            else:
-                # TODO(dcramer): legacy pickle support - remove in Sentry 9.1
-                filters = pickle.loads(force_bytes(values.pop("f")))
-
-            incr_values = {}
-            extra_values = {}
-            signal_only = None
-            for k, v in values.items():
-                if k.startswith("i+"):
-                    incr_values[k[2:]] = int(v)
-                elif k.startswith("e+"):
-                    if v.startswith(b"[" if not self.is_redis_cluster else "["):
-                        extra_values[k[2:]] = self._load_value(json.loads(force_str(v)))
-                    else:
-                        # TODO(dcramer): legacy pickle support - remove in Sentry 9.1
-                        extra_values[k[2:]] = pickle.loads(force_bytes(v))
-                elif k == "s":
-                    signal_only = bool(int(v))  # Should be 1 if set
-
+            model, incr_values, filters, extra_values, signal_only = self._load_buffered_values(
+                values
+            )
             self._process(model, incr_values, filters, extra_values, signal_only)
         finally:
             client.delete(lock_key)
@@ -48,6 +48,36 @@ def multiprocessing_options(
     ]
 
 
+def ingest_occurrences_options() -> List[click.Option]:
+    """Return a list of ingest-occurrences options."""
+    options = multiprocessing_options(default_max_batch_size=20)
+    options.append(
+        click.Option(
+            ["--mode"],
+            type=click.Choice(["parallel", "batched"]),
+            default="parallel",
+            help="Process messages one at a time in subprocesses, or a batch at a time.",
+        )
+    )
+    return options
+
+
+def subscription_results_options(
+    default_max_batch_size: Optional[int] = None,
+) -> List[click.Option]:
+    """Return a list of subscription results options."""
+    options = multiprocessing_options(default_max_batch_size=default_max_batch_size)
+    options.append(
+        click.Option(
+            ["--mode"],
+            type=click.Choice(["parallel", "batched"]),
+            default="parallel",
+            help="Process updates one at a time, or the updates of a batch together.",
+        )
+    )
+    return options
+
+
 def ingest_replay_recordings_options() -> List[click.Option]:
     """Return a list of ingest-replay-recordings options."""
     options = multiprocessing_options(default_max_batch_size=10)
@@ -128,12 +158,12 @@ KAFKA_CONSUMERS: Mapping[str, ConsumerDefinition] = {
     "ingest-occurrences": {
         "topic": settings.KAFKA_INGEST_OCCURRENCES,
         "strategy_factory": "sentry.issues.run.OccurrenceStrategyFactory",
-        "click_options": multiprocessing_options(default_max_batch_size=20),
+        "click_options": ingest_occurrences_options(),
     },
     "events-subscription-results": {
         "topic": settings.KAFKA_EVENTS_SUBSCRIPTIONS_RESULTS,
         "strategy_factory": "sentry.snuba.query_subscriptions.run.QuerySubscriptionStrategyFactory",
-        "click_options": multiprocessing_options(default_max_batch_size=100),
+        "click_options": subscription_results_options(default_max_batch_size=100),
         "static_args": {
             "topic": settings.KAFKA_EVENTS_SUBSCRIPTIONS_RESULTS,
         },
@@ -141,7 +171,7 @@ KAFKA_CONSUMERS: Mapping[str, ConsumerDefinition] = {
     "transactions-subscription-results": {
         "topic": settings.KAFKA_TRANSACTIONS_SUBSCRIPTIONS_RESULTS,
         "strategy_factory": "sentry.snuba.query_subscriptions.run.QuerySubscriptionStrategyFactory",
-        "click_options": multiprocessing_options(default_max_batch_size=100),
+        "click_options": subscription_results_options(default_max_batch_size=100),
         "static_args": {
             "topic": settings.KAFKA_TRANSACTIONS_SUBSCRIPTIONS_RESULTS,
         },
@@ -150,7 +180,7 @@ KAFKA_CONSUMERS: Mapping[str, ConsumerDefinition] = {
         "topic": settings.KAFKA_GENERIC_METRICS_SUBSCRIPTIONS_RESULTS,
         "default_topic": "generic-metrics-subscription-results",
         "strategy_factory": "sentry.snuba.query_subscriptions.run.QuerySubscriptionStrategyFactory",
-        "click_options": multiprocessing_options(default_max_batch_size=100),
+        "click_options": subscription_results_options(default_max_batch_size=100),
         "static_args": {
             "topic": settings.KAFKA_GENERIC_METRICS_SUBSCRIPTIONS_RESULTS,
         },
@@ -158,7 +188,7 @@ KAFKA_CONSUMERS: Mapping[str, ConsumerDefinition] = {
     "sessions-subscription-results": {
         "topic": settings.KAFKA_SESSIONS_SUBSCRIPTIONS_RESULTS,
         "strategy_factory": "sentry.snuba.query_subscriptions.run.QuerySubscriptionStrategyFactory",
-        "click_options": multiprocessing_options(),
+        "click_options": subscription_results_options(),
         "static_args": {
             "topic": settings.KAFKA_SESSIONS_SUBSCRIPTIONS_RESULTS,
         },
@@ -166,7 +196,7 @@ KAFKA_CONSUMERS: Mapping[str, ConsumerDefinition] = {
     "metrics-subscription-results": {
         "topic": settings.KAFKA_METRICS_SUBSCRIPTIONS_RESULTS,
         "strategy_factory": "sentry.snuba.query_subscriptions.run.QuerySubscriptionStrategyFactory",
-        "click_options": multiprocessing_options(default_max_batch_size=100),
+        "click_options": subscription_results_options(default_max_batch_size=100),
         "static_args": {
             "topic": settings.KAFKA_METRICS_SUBSCRIPTIONS_RESULTS,
         },
@@ -1,6 +1,6 @@
 import logging
 from datetime import datetime, timedelta, timezone
-from typing import List, OrderedDict, Set
+from typing import List, Optional, OrderedDict, Set
 
 import sentry_sdk
 
@@ -56,8 +56,11 @@ def is_sliding_window_org_enabled(organization: Organization) -> bool:
     ) and not features.has("organizations:ds-sliding-window", organization, actor=None)
 
 
-def get_guarded_blended_sample_rate(organization: Organization, project: Project) -> float:
-    sample_rate = quotas.get_blended_sample_rate(organization_id=organization.id)  # type:ignore
+def get_guarded_blended_sample_rate(
+    organization: Organization, project: Project, sample_rate: Optional[float] = None
+) -> float:
+    if sample_rate is None:
+        sample_rate = quotas.get_blended_sample_rate(organization_id=organization.id)  # type:ignore
 
     # If the sample rate is None, it means that dynamic sampling rules shouldn't be generated.
     if sample_rate is None:
@@ -118,15 +121,26 @@ def _get_rules_of_enabled_biases(
     return rules
 
 
-def generate_rules(project: Project) -> List[PolymorphicRule]:
+def generate_rules(
+    project: Project,
+    blended_sample_rate: Optional[float] = None,
+    combined_biases: Optional[OrderedDict[RuleType, Bias]] = None,
+) -> List[PolymorphicRule]:
+    """
+    Generates the dynamic sampling rules of the project. The blended sample rate and the
+    combined biases only depend on the organization, callers generating the rules of many of
+    its projects can pass them in.
+    """
     organization = project.organization
 
     try:
         rules = _get_rules_of_enabled_biases(
             project,
-            get_guarded_blended_sample_rate(organization, project),
+            get_guarded_blended_sample_rate(organization, project, blended_sample_rate),
             get_enabled_user_biases(project.get_option("sentry:dynamic_sampling_biases", None)),
-            get_relay_biases_combinator(organization).get_combined_biases(),
+            combined_biases
+            if combined_biases is not None
+            else get_relay_biases_combinator(organization).get_combined_biases(),
         )
     except Exception as e:
         sentry_sdk.capture_exception(e)
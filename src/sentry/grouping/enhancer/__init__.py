@@ -16,6 +16,7 @@ from sentry.grouping.component import GroupingComponent
 from sentry.utils.strings import unescape_string
 
 from .actions import Action, FlagAction, VarAction
+from .compiler import CompiledRule, FrameMatcherTable
 from .exceptions import InvalidEnhancerConfig
 from .matchers import (
     CalleeMatch,
@@ -126,6 +127,16 @@ class Enhancements:
             if updater_rule := rule._as_updater_rule():
                 self._updater_rules.append(updater_rule)
 
+        self._matcher_table = FrameMatcherTable.for_rules(
+            self._modifier_rules + self._updater_rules
+        )
+        self._compiled_modifier_rules = [
+            CompiledRule(rule, self._matcher_table) for rule in self._modifier_rules
+        ]
+        self._compiled_updater_rules = [
+            CompiledRule(rule, self._matcher_table) for rule in self._updater_rules
+        ]
+
     def apply_modifications_to_frame(
         self,
         frames: Sequence[dict[str, Any]],
@@ -144,12 +155,15 @@ class Enhancements:
             op="stacktrace_processing",
             description="apply_rules_to_frames",
         ):
-            for rule in self._modifier_rules:
-                for idx, action in rule.get_matching_frame_actions(
-                    match_frames, platform, exception_data, in_memory_cache
+            masks = self._matcher_table.get_masks(match_frames, in_memory_cache)
+            for compiled_rule in self._compiled_modifier_rules:
+                for idx, action in compiled_rule.get_matching_frame_actions(
+                    match_frames, masks, platform, exception_data, in_memory_cache
                 ):
                     # Both frames and match_frames are updated
-                    action.apply_modifications_to_frame(frames, match_frames, idx, rule=rule)
+                    action.apply_modifications_to_frame(
+                        frames, match_frames, idx, rule=compiled_rule.rule
+                    )
 
     def update_frame_components_contributions(self, components, frames, platform, exception_data):
         in_memory_cache: dict[str, str] = {}
@@ -157,11 +171,12 @@ class Enhancements:
         match_frames = [create_match_frame(frame, platform) for frame in frames]
 
         stacktrace_state = StacktraceState()
+        masks = self._matcher_table.get_masks(match_frames, in_memory_cache)
         # Apply direct frame actions and update the stack state alongside
-        for rule in self._updater_rules:
-
-            for idx, action in rule.get_matching_frame_actions(
-                match_frames, platform, exception_data, in_memory_cache
+        for compiled_rule in self._compiled_updater_rules:
+            rule = compiled_rule.rule
+            for idx, action in compiled_rule.get_matching_frame_actions(
+                match_frames, masks, platform, exception_data, in_memory_cache
             ):
                 action.update_frame_components_contributions(components, frames, idx, rule=rule)
                 action.modify_stacktrace_state(stacktrace_state, rule)
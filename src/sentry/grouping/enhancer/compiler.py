@@ -0,0 +1,234 @@
+"""
+Compiled evaluation of enhancement rules.
+
+`Rule.get_matching_frame_actions` checks every matcher of a rule against
+every frame. Most matchers only look at fields of a single frame that never
+change while rules are applied (family, function, module, package and path),
+so their results are computed once per distinct frame for all rules of an
+`Enhancements` instance at once, and kept in a process-wide LRU that is
+shared between events. Matchers on fields that actions modify (``app`` and
+``category``) and exception matchers are still evaluated per call.
+"""
+
+from __future__ import annotations
+
+import itertools
+import re
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sentry.utils import metrics
+from sentry.utils.lru import LRUCache
+
+from .actions import Action
+from .matchers import (
+    CalleeMatch,
+    CallerMatch,
+    ExceptionFieldMatch,
+    FamilyMatch,
+    FrameFieldMatch,
+    FrameMatch,
+    FunctionMatch,
+    ModuleMatch,
+    PathLikeMatch,
+)
+
+# Frame fields the results of static matchers depend on, in the order of the
+# frame key.
+STATIC_FIELDS = ("family", "function", "module", "package", "path")
+
+# Number of (matcher table, frame) results kept across events.
+FRAME_CACHE_SIZE = 20000
+
+# Number of matcher tables kept for distinct rule sets. Tables are shared by
+# all `Enhancements` with the same static matchers, one that was evicted keeps
+# working for the instances that still hold it.
+MATCHER_TABLE_REGISTRY_SIZE = 1000
+
+# Patterns made only of these characters are matched by `glob_match` exactly
+# as they are, the prefix of a pattern up to the first other character must
+# be a prefix of every matching value.
+_literal_re = re.compile(rb"[A-Za-z0-9_.:<>$@ -]*")
+
+_frame_cache: LRUCache[Tuple[int, Tuple[Any, ...]], int] = LRUCache(max_weight=FRAME_CACHE_SIZE)
+
+MatcherKey = Tuple[type, bytes]
+
+
+def is_static_matcher(matcher: FrameMatch) -> bool:
+    return isinstance(matcher, (FamilyMatch, PathLikeMatch, FunctionMatch, ModuleMatch))
+
+
+def _matcher_key(matcher: FrameMatch) -> MatcherKey:
+    # Negated matchers share the positive result of their pattern.
+    return (type(matcher), matcher._encoded_pattern)
+
+
+class FrameMatcherTable:
+    """
+    The static matchers of a set of rules. `get_masks` returns one bit mask
+    per frame, with the bit of every matcher that (positively) matches it.
+
+    Matchers on ``function`` and ``module`` are dispatched on the frame
+    value: literal patterns are looked up in a dict, and globs are only
+    evaluated when the value starts with the literal prefix of the pattern.
+    """
+
+    # Global registry of tables, the same way matchers are registered. Ids are
+    # never reused, so cached masks of an evicted table can't be served to a
+    # different one.
+    instances: LRUCache[Tuple[MatcherKey, ...], FrameMatcherTable] = LRUCache(
+        max_weight=MATCHER_TABLE_REGISTRY_SIZE
+    )
+    _ids = itertools.count()
+    _lock = threading.Lock()
+
+    def __init__(self, id: int, matchers: Sequence[FrameMatch]) -> None:
+        self.id = id
+        self.bits: Dict[MatcherKey, int] = {}
+        self._family: List[Tuple[int, FrameMatch]] = []
+        self._literals: Dict[str, Dict[bytes, int]] = {}
+        self._globs: Dict[str, List[Tuple[bytes, int, FrameMatch]]] = {}
+
+        for bit, matcher in enumerate(matchers):
+            self.bits[_matcher_key(matcher)] = bit
+            if isinstance(matcher, FamilyMatch):
+                self._family.append((bit, matcher))
+                continue
+
+            pattern = matcher._encoded_pattern
+            prefix = _literal_re.match(pattern).group()  # type: ignore[union-attr]
+            if isinstance(matcher, FrameFieldMatch):
+                if prefix == pattern:
+                    literals = self._literals.setdefault(matcher.field, {})
+                    literals[pattern] = literals.get(pattern, 0) | (1 << bit)
+                    continue
+            else:
+                # Path normalization makes prefixes of path patterns unusable.
+                prefix = b""
+            self._globs.setdefault(matcher.field, []).append((prefix, bit, matcher))
+
+    @classmethod
+    def for_rules(cls, rules: Sequence[Any]) -> FrameMatcherTable:
+        matchers: Dict[MatcherKey, FrameMatch] = {}
+        for rule in rules:
+            for matcher in rule._other_matchers:
+                if isinstance(matcher, (CallerMatch, CalleeMatch)):
+                    matcher = matcher.caller
+                if is_static_matcher(matcher):
+                    matchers.setdefault(_matcher_key(matcher), matcher)
+
+        key = tuple(matchers)
+        with cls._lock:
+            table = cls.instances.get(key)
+            if table is None:
+                table = cls(next(cls._ids), list(matchers.values()))
+                cls.instances.set(key, table)
+                metrics.gauge("grouping.enhancer.matcher_tables.registry_size", len(cls.instances))
+        return table
+
+    def get_masks(self, match_frames: Sequence[Dict[str, Any]], cache: Dict[Any, Any]) -> List[int]:
+        masks = []
+        for match_frame in match_frames:
+            frame_key = (self.id, tuple(match_frame[field] for field in STATIC_FIELDS))
+            mask = _frame_cache.get(frame_key)
+            if mask is None:
+                mask = self._evaluate(match_frame, cache)
+                _frame_cache.set(frame_key, mask)
+            masks.append(mask)
+        return masks
+
+    def _evaluate(self, match_frame: Dict[str, Any], cache: Dict[Any, Any]) -> int:
+        mask = 0
+        for bit, matcher in self._family:
+            if matcher._positive_frame_match(match_frame, None, None, cache):
+                mask |= 1 << bit
+
+        for field, literals in self._literals.items():
+            value = match_frame[field]
+            if value is not None:
+                mask |= literals.get(value, 0)
+
+        for field, globs in self._globs.items():
+            value = match_frame[field]
+            if value is None:
+                continue
+            for prefix, bit, matcher in globs:
+                if value.startswith(prefix) and matcher._positive_frame_match(
+                    match_frame, None, None, cache
+                ):
+                    mask |= 1 << bit
+        return mask
+
+
+# (frame offset, bit, negated, matcher): static conditions have a bit, the
+# others are evaluated with their matcher.
+Condition = Tuple[int, Optional[int], bool, Optional[Any]]
+
+
+class CompiledRule:
+    """A rule whose frame matchers refer to the bits of a `FrameMatcherTable`."""
+
+    def __init__(self, rule: Any, table: FrameMatcherTable) -> None:
+        self.rule = rule
+        self.actions: List[Action] = rule.actions
+        self._exception_matchers: List[ExceptionFieldMatch] = rule._exception_matchers
+        # Bits that must be set in the mask of a frame for the rule to match it.
+        self._required = 0
+        self._conditions: List[Condition] = []
+
+        for matcher in rule._other_matchers:
+            offset = 0
+            inner = matcher
+            if isinstance(matcher, CallerMatch):
+                offset, inner = -1, matcher.caller
+            elif isinstance(matcher, CalleeMatch):
+                offset, inner = 1, matcher.caller
+
+            if not is_static_matcher(inner):
+                self._conditions.append((offset, None, False, matcher))
+            elif offset == 0 and not inner.negated:
+                self._required |= 1 << table.bits[_matcher_key(inner)]
+            else:
+                bit = table.bits[_matcher_key(inner)]
+                self._conditions.append((offset, bit, inner.negated, None))
+
+    def get_matching_frame_actions(
+        self,
+        match_frames: Sequence[Dict[str, Any]],
+        masks: Sequence[int],
+        platform: str,
+        exception_data: Dict[str, Any],
+        in_memory_cache: Dict[Any, Any],
+    ) -> List[Tuple[int, Action]]:
+        """Same as `Rule.get_matching_frame_actions`, given the masks of the frames."""
+        if not self.rule.matchers:
+            return []
+
+        for m in self._exception_matchers:
+            if not m.matches_frame(match_frames, None, platform, exception_data, in_memory_cache):
+                return []
+
+        rv = []
+        required = self._required
+        num_frames = len(match_frames)
+        for idx, mask in enumerate(masks):
+            if mask & required != required:
+                continue
+            for offset, bit, negated, matcher in self._conditions:
+                if matcher is not None:
+                    if not matcher.matches_frame(
+                        match_frames, idx, platform, exception_data, in_memory_cache
+                    ):
+                        break
+                    continue
+                other = idx + offset
+                if not 0 <= other < num_frames:
+                    break
+                if bool(masks[other] >> bit & 1) == negated:
+                    break
+            else:
+                for action in self.actions:
+                    rv.append((idx, action))
+
+        return rv
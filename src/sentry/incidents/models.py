@@ -91,6 +91,47 @@ class IncidentManager(BaseManager):
 
         return incident
 
+    def get_active_incidents(self, alert_rule_projects):
+        """
+        Bulk version of `get_active_incident`. Takes (alert rule id, project id) pairs and returns
+        a dict mapping each pair to its active incident, or to None. Shares the cache of
+        `get_active_incident`, and fetches all misses with a single query.
+        """
+        cache_keys = {
+            pair: self._build_active_incident_cache_key(*pair) for pair in alert_rule_projects
+        }
+        cached = cache.get_many(list(cache_keys.values()))
+        incidents = {}
+        missing = set()
+        for pair, cache_key in cache_keys.items():
+            incident = cached.get(cache_key)
+            if incident is None:
+                missing.add(pair)
+            else:
+                # A falsey value is a negative cache entry
+                incidents[pair] = incident or None
+
+        if missing:
+            fetched = {pair: False for pair in missing}
+            incident_projects = (
+                IncidentProject.objects.filter(
+                    incident__type=IncidentType.ALERT_TRIGGERED.value,
+                    incident__alert_rule_id__in={alert_rule_id for alert_rule_id, _ in missing},
+                    project_id__in={project_id for _, project_id in missing},
+                )
+                .exclude(incident__status=IncidentStatus.CLOSED.value)
+                .select_related("incident")
+                .order_by("-incident__date_added")
+            )
+            for incident_project in incident_projects:
+                pair = (incident_project.incident.alert_rule_id, incident_project.project_id)
+                if fetched.get(pair) is False:
+                    fetched[pair] = incident_project.incident
+            cache.set_many({cache_keys[pair]: incident for pair, incident in fetched.items()})
+            incidents.update((pair, incident or None) for pair, incident in fetched.items())
+
+        return incidents
+
     @classmethod
     def clear_active_incident_cache(cls, instance, **kwargs):
         for project in instance.projects.all():
@@ -328,6 +369,45 @@ class AlertRuleManager(BaseManager):
 
         return alert_rule
 
+    def get_for_subscriptions(self, subscriptions):
+        """
+        Bulk version of `get_for_subscription`. Returns a dict mapping the id of each
+        Subscription to its AlertRule. Subscriptions without an AlertRule are left out.
+        """
+        cache_keys = {
+            subscription.id: self.__build_subscription_cache_key(subscription.id)
+            for subscription in subscriptions
+        }
+        cached = cache.get_many(list(cache_keys.values()))
+        alert_rules = {
+            subscription_id: cached[cache_key]
+            for subscription_id, cache_key in cache_keys.items()
+            if cached.get(cache_key) is not None
+        }
+
+        missing = [
+            subscription for subscription in subscriptions if subscription.id not in alert_rules
+        ]
+        if missing:
+            by_snuba_query = {
+                alert_rule.snuba_query_id: alert_rule
+                for alert_rule in AlertRule.objects.filter(
+                    snuba_query_id__in={subscription.snuba_query_id for subscription in missing}
+                )
+            }
+            fetched = {
+                subscription.id: by_snuba_query[subscription.snuba_query_id]
+                for subscription in missing
+                if subscription.snuba_query_id in by_snuba_query
+            }
+            cache.set_many(
+                {cache_keys[subscription_id]: rule for subscription_id, rule in fetched.items()},
+                3600,
+            )
+            alert_rules.update(fetched)
+
+        return alert_rules
+
     @classmethod
     def clear_subscription_cache(cls, instance, **kwargs):
         cache.delete(cls.__build_subscription_cache_key(instance.id))
@@ -483,6 +563,40 @@ class AlertRuleTriggerManager(BaseManager):
             cache.set(cache_key, triggers, 3600)
         return triggers
 
+    def get_for_alert_rules(self, alert_rules):
+        """
+        Bulk version of `get_for_alert_rule`. Returns a dict mapping the id of each AlertRule
+        to the list of its AlertRuleTriggers.
+        """
+        cache_keys = {
+            alert_rule.id: self._build_trigger_cache_key(alert_rule.id)
+            for alert_rule in alert_rules
+        }
+        cached = cache.get_many(list(cache_keys.values()))
+        triggers = {
+            alert_rule_id: cached[cache_key]
+            for alert_rule_id, cache_key in cache_keys.items()
+            if cached.get(cache_key) is not None
+        }
+
+        missing = {alert_rule_id for alert_rule_id in cache_keys if alert_rule_id not in triggers}
+        if missing:
+            fetched = {alert_rule_id: [] for alert_rule_id in missing}
+            for trigger in AlertRuleTrigger.objects.filter(alert_rule_id__in=missing).order_by(
+                "id"
+            ):
+                fetched[trigger.alert_rule_id].append(trigger)
+            cache.set_many(
+                {
+                    cache_keys[alert_rule_id]: rule_triggers
+                    for alert_rule_id, rule_triggers in fetched.items()
+                },
+                3600,
+            )
+            triggers.update(fetched)
+
+        return triggers
+
     @classmethod
     def clear_trigger_cache(cls, instance, **kwargs):
         cache.delete(cls._build_trigger_cache_key(instance.alert_rule_id))
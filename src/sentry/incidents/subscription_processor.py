@@ -2,9 +2,22 @@ from __future__ import annotations
 
 import logging
 import operator
+from contextlib import nullcontext
 from copy import deepcopy
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Sequence, Tuple, TypeVar, cast
+from typing import (
+    Any,
+    Callable,
+    ContextManager,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    TypeVar,
+    cast,
+)
 
 from django.conf import settings
 from django.db import router, transaction
@@ -78,21 +91,40 @@ class SubscriptionProcessor:
         AlertRuleThresholdType.BELOW: (operator.lt, operator.gt),
     }
 
-    def __init__(self, subscription: QuerySubscription) -> None:
+    def __init__(
+        self, subscription: QuerySubscription, batch: Optional[SubscriptionProcessorBatch] = None
+    ) -> None:
         self.subscription = subscription
-        try:
-            self.alert_rule = AlertRule.objects.get_for_subscription(subscription)
-        except AlertRule.DoesNotExist:
-            return
-
-        self.triggers = AlertRuleTrigger.objects.get_for_alert_rule(self.alert_rule)
-        self.triggers.sort(key=lambda trigger: trigger.alert_threshold)
-
-        (
-            self.last_update,
-            self.trigger_alert_counts,
-            self.trigger_resolve_counts,
-        ) = get_alert_rule_stats(self.alert_rule, self.subscription, self.triggers)
+        self.batch = batch
+        if batch is not None:
+            # Everything this processor needs has been fetched along with the rest of the batch
+            if subscription.id not in batch.alert_rules:
+                return
+            self.alert_rule = batch.alert_rules[subscription.id]
+            self.triggers = list(batch.triggers[self.alert_rule.id])
+            self.triggers.sort(key=lambda trigger: trigger.alert_threshold)
+            (
+                self.last_update,
+                self.trigger_alert_counts,
+                self.trigger_resolve_counts,
+            ) = batch.stats[subscription.id]
+            pair = (self.alert_rule.id, subscription.project_id)
+            self._active_incident = batch.active_incidents[pair]
+            self._incident_triggers = batch.incident_triggers[pair]
+        else:
+            try:
+                self.alert_rule = AlertRule.objects.get_for_subscription(subscription)
+            except AlertRule.DoesNotExist:
+                return
+
+            self.triggers = AlertRuleTrigger.objects.get_for_alert_rule(self.alert_rule)
+            self.triggers.sort(key=lambda trigger: trigger.alert_threshold)
+
+            (
+                self.last_update,
+                self.trigger_alert_counts,
+                self.trigger_resolve_counts,
+            ) = get_alert_rule_stats(self.alert_rule, self.subscription, self.triggers)
         self.orig_trigger_alert_counts = deepcopy(self.trigger_alert_counts)
         self.orig_trigger_resolve_counts = deepcopy(self.trigger_resolve_counts)
 
@@ -484,7 +516,13 @@ class SubscriptionProcessor:
             AlertRuleThresholdType(self.alert_rule.threshold_type)
         ]
         fired_incident_triggers = []
-        with transaction.atomic(router.db_for_write(AlertRule)):
+        atomic: ContextManager[Any]
+        if self.changes_trigger_status(aggregation_value, alert_operator, resolve_operator):
+            atomic = transaction.atomic(router.db_for_write(AlertRule))
+        else:
+            # Only the trigger counts change, which doesn't need a transaction
+            atomic = nullcontext()
+        with atomic:
             for trigger in self.triggers:
                 if alert_operator(
                     aggregation_value, trigger.alert_threshold
@@ -519,6 +557,33 @@ class SubscriptionProcessor:
         # before the next one then we might alert twice.
         self.update_alert_rule_stats()
 
+    def changes_trigger_status(
+        self,
+        aggregation_value: float,
+        alert_operator: Callable[[float, float], bool],
+        resolve_operator: Callable[[float, float], bool],
+    ) -> bool:
+        """
+        Determines whether `aggregation_value` makes any of the triggers fire or resolve, in
+        which case `process_update` will write the incident and its triggers.
+        """
+        threshold_period = self.alert_rule.threshold_period
+        for trigger in self.triggers:
+            if (
+                alert_operator(aggregation_value, trigger.alert_threshold)
+                and not self.check_trigger_status(trigger, TriggerStatus.ACTIVE)
+                and self.trigger_alert_counts[trigger.id] + 1 >= threshold_period
+            ):
+                return True
+            if (
+                resolve_operator(aggregation_value, self.calculate_resolve_threshold(trigger))
+                and self.active_incident
+                and self.check_trigger_status(trigger, TriggerStatus.ACTIVE)
+                and self.trigger_resolve_counts[trigger.id] + 1 >= threshold_period
+            ):
+                return True
+        return False
+
     def calculate_event_date_from_update_date(self, update_date: datetime) -> datetime:
         """
         Calculates the date that an event actually happened based on the date that we
@@ -728,9 +793,19 @@ class SubscriptionProcessor:
 
     def update_alert_rule_stats(self) -> None:
         """
-        Updates stats about the alert rule, if they're changed.
+        Updates stats about the alert rule, if they're changed. When processing a batch, the
+        stats are written by `SubscriptionProcessorBatch.flush` once the update is processed.
         :return:
         """
+        if self.batch is not None:
+            self.batch.updated.add(self.subscription.id)
+            return
+
+        update_alert_rule_stats(*self.get_updated_alert_rule_stats())
+
+    def get_updated_alert_rule_stats(
+        self,
+    ) -> Tuple[AlertRule, QuerySubscription, datetime, Dict[str, int], Dict[str, int]]:
         updated_trigger_alert_counts = {
             trigger_id: alert_count
             for trigger_id, alert_count in self.trigger_alert_counts.items()
@@ -742,7 +817,7 @@ class SubscriptionProcessor:
             if alert_count != self.orig_trigger_resolve_counts[trigger_id]
         }
 
-        update_alert_rule_stats(
+        return (
             self.alert_rule,
             self.subscription,
             self.last_update,
@@ -751,6 +826,132 @@ class SubscriptionProcessor:
         )
 
 
+class SubscriptionProcessorBatch:
+    """
+    Fetches what the `SubscriptionProcessor`s of a batch of subscription updates need, in bulk:
+    the alert rules of the subscriptions, their triggers, their active incidents along with the
+    incident triggers, and the alert rule stats, with a single redis pipeline. The stats that
+    the processors change are written back by `flush`.
+    """
+
+    def __init__(self, subscriptions: Sequence[QuerySubscription]) -> None:
+        self.processors: Dict[int, SubscriptionProcessor] = {}
+        self.updated: Set[int] = set()
+
+        self.alert_rules: Dict[int, AlertRule] = AlertRule.objects.get_for_subscriptions(
+            subscriptions
+        )
+        subscriptions = [
+            subscription for subscription in subscriptions if subscription.id in self.alert_rules
+        ]
+        self.triggers: Dict[
+            int, List[AlertRuleTrigger]
+        ] = AlertRuleTrigger.objects.get_for_alert_rules(set(self.alert_rules.values()))
+
+        self.stats: Dict[int, Tuple[datetime, Dict[str, int], Dict[str, int]]] = dict(
+            zip(
+                [subscription.id for subscription in subscriptions],
+                get_alert_rule_stats_multi(
+                    [
+                        (
+                            self.alert_rules[subscription.id],
+                            subscription,
+                            self.triggers[self.alert_rules[subscription.id].id],
+                        )
+                        for subscription in subscriptions
+                    ]
+                ),
+            )
+        )
+
+        self.active_incidents: Dict[
+            Tuple[int, int], Optional[Incident]
+        ] = Incident.objects.get_active_incidents(
+            {
+                (self.alert_rules[subscription.id].id, subscription.project_id)
+                for subscription in subscriptions
+            }
+        )
+        self.incident_triggers: Dict[Tuple[int, int], Dict[int, IncidentTrigger]] = {
+            pair: {} for pair in self.active_incidents
+        }
+        pairs_by_incident = {
+            incident.id: pair
+            for pair, incident in self.active_incidents.items()
+            if incident is not None
+        }
+        if pairs_by_incident:
+            for incident_trigger in IncidentTrigger.objects.filter(
+                incident_id__in=list(pairs_by_incident)
+            ).select_related("alert_rule_trigger"):
+                self.incident_triggers[pairs_by_incident[incident_trigger.incident_id]][
+                    incident_trigger.alert_rule_trigger_id
+                ] = incident_trigger
+
+    def get_processor(self, subscription: QuerySubscription) -> SubscriptionProcessor:
+        """
+        Returns the processor of a subscription. Updates of the same subscription are processed
+        by the same processor, so that each of them sees the state left by the previous one.
+        """
+        if subscription.id not in self.processors:
+            self.processors[subscription.id] = SubscriptionProcessor(subscription, self)
+        return self.processors[subscription.id]
+
+    def flush(self) -> None:
+        """
+        Writes the alert rule stats changed by the processors of the batch since the last flush.
+        """
+        if not self.updated:
+            return
+        update_alert_rule_stats_multi(
+            [
+                self.processors[subscription_id].get_updated_alert_rule_stats()
+                for subscription_id in sorted(self.updated)
+            ]
+        )
+        self.updated.clear()
+
+
+def process_update_batch(updates: Sequence[Tuple[SubscriptionUpdate, QuerySubscription]]) -> None:
+    """
+    Processes a batch of subscription updates, like `SubscriptionProcessor.process_update` does
+    one at a time, but with the state of the processors fetched for the whole batch. An update
+    that fails is logged and doesn't affect the rest of the batch. If fetching the state fails,
+    the updates are processed one at a time.
+
+    The alert rule stats are written after every update rather than once for the batch. Another
+    batch with updates of the same subscription (for instance on another consumer after a
+    rebalance) could otherwise read the trigger counts from before a whole batch of updates and
+    fire the same alert again.
+    """
+    subscriptions = list({subscription.id: subscription for _, subscription in updates}.values())
+    try:
+        with metrics.timer("incidents.subscription_processor.process_update_batch.prefetch"):
+            batch: Optional[SubscriptionProcessorBatch] = SubscriptionProcessorBatch(subscriptions)
+    except Exception:
+        logger.exception(
+            "Failed to fetch subscription processor batch, processing updates one at a time",
+            extra={"count": len(updates)},
+        )
+        metrics.incr("incidents.subscription_processor.process_update_batch.prefetch_failed")
+        batch = None
+
+    for subscription_update, subscription in updates:
+        try:
+            if batch is None:
+                SubscriptionProcessor(subscription).process_update(subscription_update)
+                continue
+            try:
+                batch.get_processor(subscription).process_update(subscription_update)
+            finally:
+                batch.flush()
+        except Exception:
+            logger.exception(
+                "Failed to process subscription update",
+                extra={"subscription_id": subscription.id},
+            )
+
+
 def build_alert_rule_stat_keys(alert_rule: AlertRule, subscription: QuerySubscription) -> List[str]:
     """
     Builds keys for fetching stats about alert rules
@@ -811,6 +1012,38 @@ def get_alert_rule_stats(
     alert_rule_keys = build_alert_rule_stat_keys(alert_rule, subscription)
     trigger_keys = build_trigger_stat_keys(alert_rule, subscription, triggers)
     results = get_redis_client().mget(alert_rule_keys + trigger_keys)
+    return parse_alert_rule_stats(triggers, results)
+
+
+def get_alert_rule_stats_multi(
+    alert_rule_subscriptions: Sequence[
+        Tuple[AlertRule, QuerySubscription, Sequence[AlertRuleTrigger]]
+    ],
+) -> List[Tuple[datetime, Dict[str, int], Dict[str, int]]]:
+    """
+    Bulk version of `get_alert_rule_stats`, which fetches the stats of many alert rule and
+    subscription pairs with a single pipeline.
+    :return: A list with the stats of each pair, as returned by `get_alert_rule_stats`.
+    """
+    if not alert_rule_subscriptions:
+        return []
+
+    pipeline = get_redis_client().pipeline()
+    for alert_rule, subscription, triggers in alert_rule_subscriptions:
+        # The keys of a pair share a hash tag, so each of these can be a single MGET
+        pipeline.mget(
+            build_alert_rule_stat_keys(alert_rule, subscription)
+            + build_trigger_stat_keys(alert_rule, subscription, triggers)
+        )
+    return [
+        parse_alert_rule_stats(triggers, results)
+        for (_, _, triggers), results in zip(alert_rule_subscriptions, pipeline.execute())
+    ]
+
+
+def parse_alert_rule_stats(
+    triggers: Sequence[AlertRuleTrigger], results: Sequence[Optional[str]]
+) -> Tuple[datetime, Dict[str, int], Dict[str, int]]:
     results = tuple(0 if result is None else int(result) for result in results)
     last_update = to_datetime(results[0])
     trigger_results = results[1:]
@@ -837,7 +1070,35 @@ def update_alert_rule_stats(
     Updates stats about the alert rule, subscription and triggers if they've changed.
     """
     pipeline = get_redis_client().pipeline()
+    add_alert_rule_stats_to_pipeline(
+        pipeline, alert_rule, subscription, last_update, alert_counts, resolve_counts
+    )
+    pipeline.execute()
+
+
+def update_alert_rule_stats_multi(
+    stats: Sequence[Tuple[AlertRule, QuerySubscription, datetime, Dict[str, int], Dict[str, int]]],
+) -> None:
+    """
+    Bulk version of `update_alert_rule_stats`, which writes the stats of many alert rule and
+    subscription pairs with a single pipeline.
+    """
+    pipeline = get_redis_client().pipeline()
+    for alert_rule, subscription, last_update, alert_counts, resolve_counts in stats:
+        add_alert_rule_stats_to_pipeline(
+            pipeline, alert_rule, subscription, last_update, alert_counts, resolve_counts
+        )
+    pipeline.execute()
+
 
+def add_alert_rule_stats_to_pipeline(
+    pipeline: Any,
+    alert_rule: AlertRule,
+    subscription: QuerySubscription,
+    last_update: datetime,
+    alert_counts: Dict[str, int],
+    resolve_counts: Dict[str, int],
+) -> None:
     counts_with_stat_keys = zip(ALERT_RULE_TRIGGER_STAT_KEYS, (alert_counts, resolve_counts))
     for stat_key, trigger_counts in counts_with_stat_keys:
         for trigger_id, alert_count in trigger_counts.items():
@@ -851,7 +1112,6 @@ def update_alert_rule_stats(
 
     last_update_key = build_alert_rule_stat_keys(alert_rule, subscription)[0]
     pipeline.set(last_update_key, int(to_timestamp(last_update)), ex=REDIS_TTL)
-    pipeline.execute()
 
 
 def get_redis_client() -> RetryingRedisCluster:
@@ -3,7 +3,19 @@ from __future__ import annotations
 import logging
 from datetime import datetime
 from hashlib import md5
-from typing import Any, Mapping, Optional, Tuple, TypedDict, cast
+from typing import (
+    Any,
+    Collection,
+    Dict,
+    List,
+    Mapping,
+    MutableMapping,
+    Optional,
+    Sequence,
+    Tuple,
+    TypedDict,
+    cast,
+)
 
 import sentry_sdk
 from django.conf import settings
@@ -23,7 +35,7 @@ from sentry.event_manager import (
 from sentry.eventstore.models import Event, GroupEvent, augment_message_with_occurrence
 from sentry.issues.grouptype import should_create_group
 from sentry.issues.issue_occurrence import IssueOccurrence, IssueOccurrenceData
-from sentry.models import GroupHash, Release
+from sentry.models import Group, GroupHash, Release
 from sentry.ratelimits.sliding_windows import Quota, RedisSlidingWindowRateLimiter, RequestedQuota
 from sentry.utils import json, metrics, redis
 
@@ -35,9 +47,14 @@ ISSUE_QUOTA = Quota(3600, 60, 5)
 
 logger = logging.getLogger(__name__)
 
+# Groups by (project id, hash of the fingerprint), see `get_groups_by_hash`.
+GroupsByHash = MutableMapping[Tuple[int, str], Optional[Group]]
+
 
 def save_issue_occurrence(
-    occurrence_data: IssueOccurrenceData, event: Event
+    occurrence_data: IssueOccurrenceData,
+    event: Event,
+    groups: Optional[GroupsByHash] = None,
 ) -> Tuple[IssueOccurrence, Optional[GroupInfo]]:
     process_occurrence_data(occurrence_data)
     # Convert occurrence data to `IssueOccurrence`
@@ -54,7 +71,7 @@ def save_issue_occurrence(
         # The release should always exist here since event has been ingested at this point, but just
         # in case it has been deleted
         release = None
-    group_info = save_issue_from_occurrence(occurrence, event, release)
+    group_info = save_issue_from_occurrence(occurrence, event, release, groups)
     if group_info:
         send_issue_occurrence_to_eventstream(event, occurrence, group_info)
         environment = event.get_environment()
@@ -69,9 +86,28 @@ def save_issue_occurrence(
 
 def process_occurrence_data(occurrence_data: IssueOccurrenceData) -> None:
     # Hash fingerprints to make sure they're a consistent length
-    occurrence_data["fingerprint"] = [
-        md5(part.encode("utf-8")).hexdigest() for part in occurrence_data["fingerprint"]
-    ]
+    occurrence_data["fingerprint"] = hash_fingerprint(occurrence_data["fingerprint"])
+
+
+def hash_fingerprint(fingerprint: Sequence[str]) -> List[str]:
+    return [md5(part.encode("utf-8")).hexdigest() for part in fingerprint]
+
+
+def get_groups_by_hash(hashes_by_project: Mapping[int, Collection[str]]) -> GroupsByHash:
+    """
+    Looks up the groups of many (hashed) fingerprints with one query per project, to be passed to
+    `save_issue_occurrence`. Fingerprints without a group map to `None`, and are filled in when
+    an occurrence creates their group.
+    """
+    groups: GroupsByHash = {}
+    for project_id, hashes in hashes_by_project.items():
+        found: Dict[str, Optional[Group]] = {hash: None for hash in hashes}
+        for grouphash in GroupHash.objects.filter(
+            project_id=project_id, hash__in=list(found)
+        ).select_related("group"):
+            found[grouphash.hash] = grouphash.group
+        groups.update(((project_id, hash), group) for hash, group in found.items())
+    return groups
 
 
 class IssueArgs(TypedDict):
@@ -140,7 +176,10 @@ def materialize_metadata(occurrence: IssueOccurrence, event: Event) -> Occurrenc
 
 @metrics.wraps("issues.ingest.save_issue_from_occurrence")
 def save_issue_from_occurrence(
-    occurrence: IssueOccurrence, event: Event, release: Optional[Release]
+    occurrence: IssueOccurrence,
+    event: Event,
+    release: Optional[Release],
+    groups: Optional[GroupsByHash] = None,
 ) -> Optional[GroupInfo]:
     project = event.project
     issue_kwargs = _create_issue_kwargs(occurrence, event, release)
@@ -152,13 +191,17 @@ def save_issue_from_occurrence(
     # Note that additional fingerprints won't be used to generated additional issues, they'll be
     # used to map the occurrence to a specific issue.
     new_grouphash = occurrence.fingerprint[0]
-    existing_grouphash = (
-        GroupHash.objects.filter(project=project, hash=new_grouphash)
-        .select_related("group")
-        .first()
-    )
+    if groups is not None and (project.id, new_grouphash) in groups:
+        existing_group = groups[project.id, new_grouphash]
+    else:
+        existing_grouphash = (
+            GroupHash.objects.filter(project=project, hash=new_grouphash)
+            .select_related("group")
+            .first()
+        )
+        existing_group = existing_grouphash.group if existing_grouphash else None
 
-    if not existing_grouphash:
+    if existing_group is None:
         cluster_key = settings.SENTRY_ISSUE_PLATFORM_RATE_LIMITER_OPTIONS.get("cluster", "default")
         client = redis.redis_clusters.get(cluster_key)
         if not should_create_group(occurrence.type, client, new_grouphash, project):
@@ -195,8 +238,11 @@ def save_issue_from_occurrence(
                 tags={"platform": event.platform or "unknown", "type": occurrence.type.type_id},
             )
             group_info = GroupInfo(group=group, is_new=is_new, is_regression=is_regression)
+
+        if groups is not None:
+            groups[project.id, new_grouphash] = group
     else:
-        group = existing_grouphash.group
+        group = existing_group
         if group.issue_category.value != occurrence.type.category:
             logger.error(
                 "save_issue_from_occurrence.category_mismatch",
@@ -1,5 +1,6 @@
 import logging
-from typing import Any, Dict, Mapping, Optional, Tuple
+from collections import defaultdict
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Set, Tuple, Type
 from uuid import UUID
 
 import jsonschema
@@ -9,8 +10,13 @@ from django.utils import timezone
 from sentry import nodestore
 from sentry.event_manager import GroupInfo
 from sentry.eventstore.models import Event
-from sentry.issues.grouptype import get_group_type_by_type_id
-from sentry.issues.ingest import save_issue_occurrence
+from sentry.issues.grouptype import GroupType, get_group_type_by_type_id
+from sentry.issues.ingest import (
+    GroupsByHash,
+    get_groups_by_hash,
+    hash_fingerprint,
+    save_issue_occurrence,
+)
 from sentry.issues.issue_occurrence import DEFAULT_LEVEL, IssueOccurrence, IssueOccurrenceData
 from sentry.issues.json_schemas import EVENT_PAYLOAD_SCHEMA
 from sentry.models import Organization, Project
@@ -45,8 +51,12 @@ def save_event_from_occurrence(
         return event
 
 
-def lookup_event(project_id: int, event_id: str) -> Event:
-    data = nodestore.get(Event.generate_node_id(project_id, event_id))
+def lookup_event(
+    project_id: int, event_id: str, nodes: Optional[Mapping[str, Any]] = None
+) -> Event:
+    node_id = Event.generate_node_id(project_id, event_id)
+    # Events of a batch are fetched together, see `OccurrenceBatch`.
+    data = nodes[node_id] if nodes is not None and node_id in nodes else nodestore.get(node_id)
     if data is None:
         raise EventLookupError(f"Failed to lookup event({event_id}) for project_id({project_id})")
     event = Event(event_id=event_id, project_id=project_id)
@@ -55,7 +65,9 @@ def lookup_event(project_id: int, event_id: str) -> Event:
 
 
 def process_event_and_issue_occurrence(
-    occurrence_data: IssueOccurrenceData, event_data: Dict[str, Any]
+    occurrence_data: IssueOccurrenceData,
+    event_data: Dict[str, Any],
+    groups: Optional[GroupsByHash] = None,
 ) -> Tuple[IssueOccurrence, Optional[GroupInfo]]:
     if occurrence_data["event_id"] != event_data["event_id"]:
         raise ValueError(
@@ -67,16 +79,17 @@ def process_event_and_issue_occurrence(
         "occurrence_consumer._process_message.save_issue_occurrence",
         tags={"method": "process_event_and_issue_occurrence"},
     ):
-        return save_issue_occurrence(occurrence_data, event)
+        return save_issue_occurrence(occurrence_data, event, groups)
 
 
 def lookup_event_and_process_issue_occurrence(
     occurrence_data: IssueOccurrenceData,
+    batch: Optional["OccurrenceBatch"] = None,
 ) -> Tuple[IssueOccurrence, Optional[GroupInfo]]:
     project_id = occurrence_data["project_id"]
     event_id = occurrence_data["event_id"]
     try:
-        event = lookup_event(project_id, event_id)
+        event = lookup_event(project_id, event_id, batch.nodes if batch else None)
     except Exception:
         raise EventLookupError(f"Failed to lookup event({event_id}) for project_id({project_id})")
 
@@ -84,7 +97,7 @@ def lookup_event_and_process_issue_occurrence(
         "occurrence_consumer._process_message.save_issue_occurrence",
         tags={"method": "lookup_event_and_process_issue_occurrence"},
     ):
-        return save_issue_occurrence(occurrence_data, event)
+        return save_issue_occurrence(occurrence_data, event, batch.groups if batch else None)
 
 
 def _get_kwargs(payload: Mapping[str, Any]) -> Mapping[str, Any]:
@@ -203,46 +216,199 @@ def _process_message(
         try:
             with metrics.timer("occurrence_consumer._process_message._get_kwargs"):
                 kwargs = _get_kwargs(message)
-            occurrence_data = kwargs["occurrence_data"]
-            metrics.incr(
-                "occurrence_ingest.messages",
-                sample_rate=1.0,
-                tags={"occurrence_type": occurrence_data["type"]},
-            )
-            txn.set_tag("occurrence_type", occurrence_data["type"])
-
-            project = Project.objects.get_from_cache(id=occurrence_data["project_id"])
-            organization = Organization.objects.get_from_cache(id=project.organization_id)
-
-            txn.set_tag("organization_id", organization.id)
-            txn.set_tag("organization_slug", organization.slug)
-            txn.set_tag("project_id", project.id)
-            txn.set_tag("project_slug", project.slug)
-
-            group_type = get_group_type_by_type_id(occurrence_data["type"])
-            if not group_type.allow_ingest(organization):
-                metrics.incr(
-                    "occurrence_ingest.dropped_feature_disabled",
-                    sample_rate=1.0,
-                    tags={"occurrence_type": occurrence_data["type"]},
-                )
-                txn.set_tag("result", "dropped_feature_disabled")
-                return None
-
-            if "event_data" in kwargs:
-                txn.set_tag("result", "success")
-                with metrics.timer(
-                    "occurrence_consumer._process_message.process_event_and_issue_occurrence"
-                ):
-                    return process_event_and_issue_occurrence(
-                        kwargs["occurrence_data"], kwargs["event_data"]
-                    )
-            else:
-                txn.set_tag("result", "success")
-                with metrics.timer(
-                    "occurrence_consumer._process_message.lookup_event_and_process_issue_occurrence"
-                ):
-                    return lookup_event_and_process_issue_occurrence(kwargs["occurrence_data"])
+            return _process_occurrence(txn, kwargs)
         except (ValueError, KeyError) as e:
             txn.set_tag("result", "error")
             raise InvalidEventPayloadError(e)
+
+
+def _process_occurrence(
+    txn: sentry_sdk.tracing.Transaction,
+    kwargs: Mapping[str, Any],
+    batch: Optional["OccurrenceBatch"] = None,
+) -> Optional[Tuple[IssueOccurrence, Optional[GroupInfo]]]:
+    occurrence_data = kwargs["occurrence_data"]
+    metrics.incr(
+        "occurrence_ingest.messages",
+        sample_rate=1.0,
+        tags={"occurrence_type": occurrence_data["type"]},
+    )
+    txn.set_tag("occurrence_type", occurrence_data["type"])
+
+    if batch is not None:
+        project = batch.get_project(occurrence_data["project_id"])
+        organization = batch.get_organization(project.organization_id)
+    else:
+        project = Project.objects.get_from_cache(id=occurrence_data["project_id"])
+        organization = Organization.objects.get_from_cache(id=project.organization_id)
+
+    txn.set_tag("organization_id", organization.id)
+    txn.set_tag("organization_slug", organization.slug)
+    txn.set_tag("project_id", project.id)
+    txn.set_tag("project_slug", project.slug)
+
+    group_type = get_group_type_by_type_id(occurrence_data["type"])
+    if batch is not None:
+        allow_ingest = batch.allow_ingest(group_type, organization)
+    else:
+        allow_ingest = group_type.allow_ingest(organization)
+    if not allow_ingest:
+        metrics.incr(
+            "occurrence_ingest.dropped_feature_disabled",
+            sample_rate=1.0,
+            tags={"occurrence_type": occurrence_data["type"]},
+        )
+        txn.set_tag("result", "dropped_feature_disabled")
+        return None
+
+    if "event_data" in kwargs:
+        txn.set_tag("result", "success")
+        with metrics.timer(
+            "occurrence_consumer._process_message.process_event_and_issue_occurrence"
+        ):
+            return process_event_and_issue_occurrence(
+                kwargs["occurrence_data"],
+                kwargs["event_data"],
+                batch.groups if batch else None,
+            )
+    else:
+        txn.set_tag("result", "success")
+        with metrics.timer(
+            "occurrence_consumer._process_message.lookup_event_and_process_issue_occurrence"
+        ):
+            return lookup_event_and_process_issue_occurrence(kwargs["occurrence_data"], batch)
+
+
+class OccurrenceBatch:
+    """
+    What the occurrences of a batch have in common, looked up once for the whole batch: their
+    projects and organizations, whether their group types can be ingested, the events they refer
+    to (fetched with a single nodestore call), and the groups of their fingerprints. If one of
+    the lookups fails, every occurrence does its own instead.
+    """
+
+    def __init__(self, batch: Sequence[Mapping[str, Any]]) -> None:
+        occurrences = [kwargs["occurrence_data"] for kwargs in batch]
+
+        self.projects: Optional[Dict[int, Project]] = None
+        self.organizations: Optional[Dict[int, Organization]] = None
+        try:
+            self.projects = {
+                project.id: project
+                for project in Project.objects.get_many_from_cache(
+                    {occurrence["project_id"] for occurrence in occurrences}
+                )
+            }
+            self.organizations = {
+                organization.id: organization
+                for organization in Organization.objects.get_many_from_cache(
+                    {project.organization_id for project in self.projects.values()}
+                )
+            }
+        except Exception:
+            logger.exception("occurrence_consumer.process_batch.get_projects_failed")
+            self.projects = self.organizations = None
+        self._allow_ingest: Dict[Tuple[int, int], bool] = {}
+
+        node_ids = {
+            Event.generate_node_id(
+                kwargs["occurrence_data"]["project_id"], kwargs["occurrence_data"]["event_id"]
+            )
+            for kwargs in batch
+            if "event_data" not in kwargs
+        }
+        self.nodes: Mapping[str, Any] = {}
+        if node_ids:
+            try:
+                self.nodes = nodestore.get_multi(list(node_ids))
+            except Exception:
+                # Every occurrence looks up its own event instead.
+                logger.exception("occurrence_consumer.process_batch.get_events_failed")
+
+        hashes_by_project: Dict[int, Set[str]] = defaultdict(set)
+        for occurrence in occurrences:
+            if not occurrence["fingerprint"]:
+                continue
+            if self.projects is None or occurrence["project_id"] in self.projects:
+                hashes_by_project[occurrence["project_id"]].update(
+                    hash_fingerprint(occurrence["fingerprint"][:1])
+                )
+        # Fingerprints missing from `groups` are looked up by `save_issue_occurrence`.
+        self.groups: GroupsByHash = {}
+        try:
+            self.groups = get_groups_by_hash(hashes_by_project)
+        except Exception:
+            logger.exception("occurrence_consumer.process_batch.get_groups_failed")
+
+    def get_project(self, project_id: int) -> Project:
+        if self.projects is None:
+            return Project.objects.get_from_cache(id=project_id)
+        try:
+            return self.projects[project_id]
+        except KeyError:
+            raise Project.DoesNotExist(f"Project matching id {project_id} does not exist")
+
+    def get_organization(self, organization_id: int) -> Organization:
+        if self.organizations is None:
+            return Organization.objects.get_from_cache(id=organization_id)
+        try:
+            return self.organizations[organization_id]
+        except KeyError:
+            raise Organization.DoesNotExist(
+                f"Organization matching id {organization_id} does not exist"
+            )
+
+    def allow_ingest(self, group_type: Type[GroupType], organization: Organization) -> bool:
+        key = (group_type.type_id, organization.id)
+        if key not in self._allow_ingest:
+            self._allow_ingest[key] = group_type.allow_ingest(organization)
+        return self._allow_ingest[key]
+
+
+def process_occurrence_batch(messages: Sequence[Mapping[str, Any]]) -> None:
+    """
+    Processes a batch of occurrence messages, like `_process_message` does one at a time.
+
+    Occurrences are grouped by project and fingerprint, and each group is processed in the order
+    of the batch, so that all but the first occurrence of a new issue find the group it created.
+    A message that fails is logged and doesn't affect the rest of the batch.
+
+    Groups and grouphashes aren't bulk created or updated. A batch creates at most one group per
+    fingerprint, and only after the noise reduction and issue rate limits of that fingerprint
+    allowed it, which `bulk_create` can't check (nor send the `post_save` signals of). Updates of
+    existing groups already go through `buffer_incr`, which coalesces them across messages.
+    """
+    batch: List[Mapping[str, Any]] = []
+    for message in messages:
+        try:
+            with metrics.timer("occurrence_consumer._process_message._get_kwargs"):
+                batch.append(_get_kwargs(message))
+        except Exception:
+            logger.exception("failed to process message payload")
+
+    if not batch:
+        return
+
+    with metrics.timer("occurrence_consumer.process_batch.prefetch"):
+        occurrence_batch = OccurrenceBatch(batch)
+
+    by_fingerprint: Dict[Tuple[Any, ...], List[Mapping[str, Any]]] = {}
+    for kwargs in batch:
+        occurrence_data = kwargs["occurrence_data"]
+        key = (occurrence_data["project_id"], *occurrence_data["fingerprint"])
+        by_fingerprint.setdefault(key, []).append(kwargs)
+
+    metrics.timing("occurrence_consumer.process_batch.fingerprints", len(by_fingerprint))
+
+    for group in by_fingerprint.values():
+        for kwargs in group:
+            with sentry_sdk.start_transaction(
+                op="_process_message",
+                name="issues.occurrence_consumer",
+                sampled=True,
+            ) as txn:
+                try:
+                    _process_occurrence(txn, kwargs, occurrence_batch)
+                except Exception:
+                    txn.set_tag("result", "error")
+                    logger.exception("failed to process message payload")
@@ -1,4 +1,5 @@
 import logging
+import time
 from typing import Mapping
 
 import rapidjson
@@ -10,7 +11,9 @@ from arroyo.processing.strategies import (
     CommitOffsets,
     ProcessingStrategy,
     ProcessingStrategyFactory,
+    RunTask,
 )
+from arroyo.processing.strategies.batching import BatchStep, ValuesBatch
 from arroyo.types import Commit, Message, Partition
 
 from sentry.utils.arroyo import RunTaskWithMultiprocessing
@@ -91,6 +94,7 @@ class OccurrenceStrategyFactory(ProcessingStrategyFactory[KafkaPayload]):
         num_processes: int,
         input_block_size: int,
         output_block_size: int,
+        mode: str = "parallel",
     ):
         super().__init__()
         self.max_batch_size = max_batch_size
@@ -98,12 +102,22 @@ class OccurrenceStrategyFactory(ProcessingStrategyFactory[KafkaPayload]):
         self.num_processes = num_processes
         self.input_block_size = input_block_size
         self.output_block_size = output_block_size
+        self.batched = mode == "batched"
 
     def create_with_partitions(
         self,
         commit: Commit,
         partitions: Mapping[Partition, int],
     ) -> ProcessingStrategy[KafkaPayload]:
+        if self.batched:
+            # Messages are processed a batch at a time in this process, which allows the work they
+            # have in common to be shared.
+            return BatchStep(
+                max_batch_size=self.max_batch_size,
+                max_batch_time=self.max_batch_time,
+                next_step=RunTask(function=process_batch, next_step=CommitOffsets(commit)),
+            )
+
         return RunTaskWithMultiprocessing(
             function=process_message,
             next_step=CommitOffsets(commit),
@@ -134,3 +148,27 @@ def process_message(message: Message[KafkaPayload]) -> None:
         Exception,
     ):
         logger.exception("failed to process message payload")
+
+
+def process_batch(message: Message[ValuesBatch[KafkaPayload]]) -> None:
+    from sentry.issues.occurrence_consumer import process_occurrence_batch
+    from sentry.utils import json, metrics
+
+    start = time.monotonic()
+    payloads = []
+    for value in message.payload:
+        try:
+            payloads.append(json.loads(value.payload.value, use_rapid_json=True))
+        except Exception:
+            logger.exception("failed to process message payload")
+
+    with metrics.timer("occurrence_consumer.process_batch"):
+        process_occurrence_batch(payloads)
+
+    duration = time.monotonic() - start
+    metrics.timing("occurrence_consumer.process_batch.size", len(message.payload))
+    if duration > 0:
+        metrics.gauge(
+            "occurrence_consumer.process_batch.messages_per_second",
+            len(message.payload) / duration,
+        )
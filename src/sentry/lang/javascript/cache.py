@@ -1,8 +1,16 @@
+import hashlib
+from time import monotonic
+from typing import Any, Callable, Hashable, Optional, Tuple
+
 from symbolic.sourcemap import SourceView
+from symbolic.sourcemapcache import SourceMapCache as SmCache
 
+from sentry import options
+from sentry.utils import metrics
+from sentry.utils.lru import LRUCache
 from sentry.utils.strings import codec_lookup
 
-__all__ = ["SourceCache", "SourceMapCache"]
+__all__ = ["SourceCache", "SourceMapCache", "ParsedArtifactCache", "get_parsed_artifact_cache"]
 
 
 def is_utf8(codec):
@@ -90,3 +98,134 @@ class SourceMapCache:
             sourcemap = self.get(sourcemap_url)
             return (sourcemap_url, sourcemap)
         return (None, None)
+
+
+def _record_lookup(type: str, lookup: str, entry: Optional[Tuple[Any, float]]) -> None:
+    result = "hit" if entry is not None else "miss"
+    metrics.incr("sourcemaps.parsed_cache", tags={"type": type, "lookup": lookup, "result": result})
+    if entry is not None:
+        # The time it took to parse the entry in the first place.
+        metrics.timing("sourcemaps.parsed_cache.parse_time_saved", entry[1], tags={"type": type})
+
+
+# The weight of an entry that points from the identity of an artifact to its
+# parsed contents.
+IDENT_ENTRY_WEIGHT = 256
+
+
+class ParsedArtifactCache:
+    """
+    A process-wide cache of parsed source views and sourcemap caches, shared
+    by all events processed by a worker and bounded by the size of the parsed
+    files in bytes.
+
+    Parsed files are stored under the hash of their contents, so a file that
+    was replaced (under the same url, release file or debug id) is never
+    served from a previous parse. On top of that, the contents can be looked
+    up by the identity of the artifact before it is fetched. Identities must
+    change whenever the contents may change, e.g. by including the checksum
+    of the artifact bundle the file is read from, which makes the entries of
+    a replaced bundle unreachable until they are evicted.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self._cache: LRUCache[Hashable, Any] = LRUCache(max_weight=max_bytes)
+
+    @property
+    def max_bytes(self) -> int:
+        return self._cache.max_weight
+
+    def get_sourceview(
+        self, body: bytes, ident: Optional[Hashable] = None, url: Optional[str] = None
+    ) -> SourceView:
+        """
+        Returns the parsed `body`, and remembers it (and the `url` it was
+        fetched from) as the contents of the artifact `ident`.
+        """
+        key = ("sourceview", hashlib.sha1(body).hexdigest())
+        return self._get_or_parse(
+            "sourceview", key, len(body), lambda: SourceView.from_bytes(body), ident, url
+        )
+
+    def get_sourcemap_cache(
+        self,
+        source: bytes,
+        sourcemap: bytes,
+        ident: Optional[Hashable] = None,
+        url: Optional[str] = None,
+    ) -> SmCache:
+        """
+        Returns the sourcemap cache of `sourcemap` applied to `source`, and
+        remembers it (and the `url` of the sourcemap) as the contents of the
+        artifact `ident`.
+        """
+        key = (
+            "sourcemapcache",
+            hashlib.sha1(source).hexdigest(),
+            hashlib.sha1(sourcemap).hexdigest(),
+        )
+        return self._get_or_parse(
+            "sourcemapcache",
+            key,
+            len(source) + len(sourcemap),
+            lambda: SmCache.from_bytes(source, sourcemap),
+            ident,
+            url,
+        )
+
+    def get_by_ident(self, type: str, ident: Hashable) -> Optional[Tuple[Any, Optional[str]]]:
+        """
+        Returns the parsed contents of the artifact `ident` and the url they
+        were fetched from, if they are still cached.
+        """
+        ident_entry = self._cache.get(("ident", type, ident))
+        entry = self._cache.get(ident_entry[0]) if ident_entry is not None else None
+        _record_lookup(type, "ident", entry)
+        if entry is None:
+            return None
+        return entry[0], ident_entry[1]  # type: ignore[index]
+
+    def _get_or_parse(
+        self,
+        type: str,
+        key: Tuple[str, ...],
+        size: int,
+        parse: Callable[[], Any],
+        ident: Optional[Hashable],
+        url: Optional[str],
+    ) -> Any:
+        entry = self._cache.get(key)
+        _record_lookup(type, "content", entry)
+        if entry is not None:
+            parsed = entry[0]
+        else:
+            start = monotonic()
+            parsed = parse()
+            parse_time = monotonic() - start
+
+            evicted = self._cache.set(key, (parsed, parse_time), weight=size)
+            if evicted:
+                metrics.incr("sourcemaps.parsed_cache.evictions", amount=evicted)
+            metrics.gauge("sourcemaps.parsed_cache.bytes", self._cache.weight)
+
+        if ident is not None:
+            self._cache.set(("ident", type, ident), (key, url), weight=IDENT_ENTRY_WEIGHT)
+        return parsed
+
+
+_parsed_artifact_cache: Optional[ParsedArtifactCache] = None
+
+
+def get_parsed_artifact_cache() -> Optional[ParsedArtifactCache]:
+    """
+    Returns the process-wide cache of parsed artifacts, or `None` if it is
+    disabled via the `sourcemaps.parsed-cache.max-bytes` option.
+    """
+    global _parsed_artifact_cache
+
+    max_bytes = options.get("sourcemaps.parsed-cache.max-bytes")
+    if not max_bytes:
+        _parsed_artifact_cache = None
+    elif _parsed_artifact_cache is None or _parsed_artifact_cache.max_bytes != max_bytes:
+        _parsed_artifact_cache = ParsedArtifactCache(max_bytes)
+    return _parsed_artifact_cache
@@ -7,7 +7,9 @@ import logging
 import re
 import sys
 import time
+import uuid
 import zlib
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime, timezone
 from enum import Enum
 from io import BytesIO
@@ -25,11 +27,14 @@ from symbolic.sourcemapcache import SourceMapCache as SmCache
 
 from sentry import features, http, options
 from sentry.event_manager import set_tag
+from sentry.lang.javascript.cache import get_parsed_artifact_cache
 from sentry.models import (
     NULL_STRING,
     ArtifactBundle,
     ArtifactBundleArchive,
+    DebugIdArtifactBundle,
     EventError,
+    File,
     Organization,
     ReleaseFile,
     SourceFileType,
@@ -90,6 +95,10 @@ CACHE_MAX_VALUE_SIZE = settings.SENTRY_CACHE_MAX_VALUE_SIZE
 
 logger = logging.getLogger(__name__)
 
+# Shared by all processors, the number of bundles read in parallel for a single event is bounded by the
+# `sourcemaps.prefetch.concurrency` option.
+_prefetch_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="sourcemaps-prefetch")
+
 
 class UnparseableSourcemap(http.BadSource):
     error_type = EventError.JS_INVALID_SOURCEMAP
@@ -693,6 +702,8 @@ class Fetcher:
         # Set that contains all the tuples (release, dist) of a bundle for which the query returned an empty result.
         # Here we also don't put the project for the same reasoning as above.
         self.empty_result_for_releases = set()
+        # Mappings between (debug_id, source_file_type) -> ArtifactBundle to avoid running the same query twice.
+        self.artifact_bundles_by_debug_id = {}
 
     def bind_release(self, release=None, dist=None):
         """
@@ -740,6 +751,10 @@ class Fetcher:
         """
         project_id = self.project.id if self.project else None
 
+        artifact_bundle = self.artifact_bundles_by_debug_id.get((debug_id, source_file_type))
+        if artifact_bundle is not None:
+            return artifact_bundle
+
         if (debug_id, source_file_type) in self.empty_result_for_debug_ids:
             raise Exception(
                 f"There are no artifact bundles bound to project {project_id}"
@@ -768,8 +783,149 @@ class Fetcher:
                 f"that contain debug_id {debug_id} for source_file_type {source_file_type}"
             )
 
+        self.artifact_bundles_by_debug_id[debug_id, source_file_type] = entry[0]
         return entry[0]
 
+    def get_debug_id_ident(self, debug_id, source_file_type):
+        """
+        Returns the identity of the file with debug_id and source_file_type, that is the artifact bundle it will be
+        read from together with the file backing that bundle (which changes when the bundle is re-uploaded), or None
+        if there is no such bundle.
+        """
+        try:
+            artifact_bundle = self._get_artifact_bundle_entry_by_debug_id(
+                debug_id, source_file_type
+            )
+        except Exception:
+            return None
+
+        return (
+            debug_id,
+            source_file_type,
+            artifact_bundle.id,
+            artifact_bundle.file_id,
+            artifact_bundle.file.checksum,
+        )
+
+    def resolve_debug_ids(self, debug_id_pairs):
+        """
+        Resolves the ArtifactBundle of many (debug_id, source_file_type) pairs with a single query, picking the newest
+        bundle for each pair like _get_artifact_bundle_entry_by_debug_id does, and remembers the results (including the
+        pairs without any bundle) for the lookups of the single pairs.
+        """
+        project_id = self.project.id if self.project else None
+
+        pending = {}
+        for debug_id, source_file_type in debug_id_pairs:
+            pair = (debug_id, source_file_type)
+            if (
+                source_file_type is None
+                or pair in self.artifact_bundles_by_debug_id
+                or pair in self.empty_result_for_debug_ids
+            ):
+                continue
+            try:
+                pending[uuid.UUID(debug_id), source_file_type.value] = pair
+            except (TypeError, ValueError):
+                # Malformed debug ids are left to the lookup of the single pair, which reports them.
+                continue
+
+        if not pending:
+            return
+
+        entries = (
+            DebugIdArtifactBundle.objects.filter(
+                debug_id__in={debug_id for debug_id, _ in pending},
+                source_file_type__in={source_file_type for _, source_file_type in pending},
+                artifact_bundle__organization_id=self.organization.id,
+                artifact_bundle__projectartifactbundle__project_id=project_id,
+            )
+            .order_by("-artifact_bundle__date_uploaded")
+            .select_related("artifact_bundle__file")
+        )
+
+        for entry in entries:
+            pair = pending.pop((entry.debug_id, entry.source_file_type), None)
+            if pair is not None:
+                self.artifact_bundles_by_debug_id[pair] = entry.artifact_bundle
+
+        self.empty_result_for_debug_ids.update(pending.values())
+
+    def prefetch_artifact_bundles(self, debug_id_pairs=(), urls=()):
+        """
+        Opens ahead of the individual lookups the artifact bundles that contain the supplied
+        (debug_id, source_file_type) pairs and, in case some of the "urls" are not yet cached, all the bundles connected
+        to the release/dist pair.
+
+        The bundles are resolved with batched queries and their files are fetched concurrently, while the archives are
+        opened by the calling thread, which is the only one touching the state of the Fetcher. Failures are not
+        reported here, they are left to the lookups that follow.
+        """
+        self.resolve_debug_ids(debug_id_pairs)
+
+        artifact_bundles = {}
+        for pair in debug_id_pairs:
+            artifact_bundle = self.artifact_bundles_by_debug_id.get(pair)
+            if artifact_bundle is not None:
+                artifact_bundles[artifact_bundle.id] = artifact_bundle
+
+        if urls and self.release is not None:
+            cache_keys = [get_cache_keys_new(url, self.release, self.dist)[0] for url in urls]
+            if len(cache.get_many(cache_keys)) < len(cache_keys):
+                try:
+                    for artifact_bundle in self._get_artifact_bundle_entries_by_release_dist_pair():
+                        artifact_bundles.setdefault(artifact_bundle.id, artifact_bundle)
+                except Exception as exc:
+                    logger.debug(
+                        "Failed to prefetch the artifact bundles for release %s and dist %s",
+                        self.release,
+                        self.dist,
+                        exc_info=exc,
+                    )
+
+        artifact_bundles = [
+            artifact_bundle
+            for artifact_bundle_id, artifact_bundle in artifact_bundles.items()
+            if artifact_bundle_id not in self.open_archives
+        ]
+        if not artifact_bundles:
+            return
+
+        with sentry_sdk.start_span(
+            op="Fetcher.prefetch_artifact_bundles._fetch_artifact_bundle_files"
+        ):
+            artifact_bundle_files = self._fetch_artifact_bundle_files(artifact_bundles)
+
+        # The archives are opened in the order of the bundles, since lookups in the open archives return the first
+        # archive containing a file.
+        for artifact_bundle in artifact_bundles:
+            artifact_bundle_id = artifact_bundle.id
+            artifact_bundle_file = artifact_bundle_files[artifact_bundle_id]
+            if isinstance(artifact_bundle_file, Exception):
+                logger.debug(
+                    "Failed to fetch artifact bundle %s",
+                    artifact_bundle_id,
+                    exc_info=artifact_bundle_file,
+                )
+                self.open_archives[artifact_bundle_id] = INVALID_ARCHIVE
+                continue
+
+            try:
+                with sentry_sdk.start_span(
+                    op="Fetcher.prefetch_artifact_bundles.ArtifactBundleArchive"
+                ):
+                    self.open_archives[artifact_bundle_id] = ArtifactBundleArchive(
+                        artifact_bundle_file
+                    )
+            except Exception as exc:
+                artifact_bundle_file.seek(0)
+                logger.debug(
+                    "Failed to initialize archive for the artifact bundle file",
+                    exc_info=exc,
+                    extra={"contents": base64.b64encode(artifact_bundle_file.read(256))},
+                )
+                self.open_archives[artifact_bundle_id] = INVALID_ARCHIVE
+
     @staticmethod
     def _fetch_artifact_bundle_file(artifact_bundle):
         """
@@ -788,7 +944,19 @@ class Fetcher:
             return BytesIO(result)
 
         # We didn't find the bundle in the cache, thus we want to fetch it.
-        artifact_bundle_file = fetch_retry_policy(artifact_bundle.file.getfile)
+        return Fetcher._read_artifact_bundle_file(artifact_bundle)
+
+    @staticmethod
+    def _read_artifact_bundle_file(artifact_bundle, blob_indexes=None):
+        """
+        Reads the File object bound to an ArtifactBundle from the blob storage and puts it in the cache.
+
+        When the blob indexes of the file are supplied, the file is read without touching the database, which allows
+        it to be called outside the processing thread.
+        """
+        artifact_bundle_file = fetch_retry_policy(
+            lambda: artifact_bundle.file.getfile(blob_indexes=blob_indexes)
+        )
 
         # `cache.set` will only keep values up to a certain size,
         # so we should not read the entire file if it's too large for caching
@@ -800,11 +968,75 @@ class Fetcher:
             contents = artifact_bundle_file.read()
         with sentry_sdk.start_span(op="_fetch_artifact_bundle_file.write_to_cache") as span:
             span.set_data("file_size", len(contents))
-            cache.set(cache_key, contents, 3600)
+            cache.set(get_artifact_bundle_cache_key(artifact_bundle.id), contents, 3600)
 
         artifact_bundle_file.seek(0)
         return artifact_bundle_file
 
+    @staticmethod
+    def _fetch_artifact_bundle_files(artifact_bundles):
+        """
+        Fetches the File objects bound to many ArtifactBundles, like _fetch_artifact_bundle_file does for one.
+
+        The cache is queried once for all bundles, and the blob indexes of the bundles that are not cached are loaded
+        with a single query. The bundles are then read from the blob storage in parallel, with at most
+        `sourcemaps.prefetch.concurrency` reads in flight.
+
+        Returns a mapping between bundle id -> File object, or the exception raised while fetching it.
+        """
+        rv = {}
+        missing = {get_artifact_bundle_cache_key(bundle.id): bundle for bundle in artifact_bundles}
+        for cache_key, result in cache.get_many(list(missing)).items():
+            if result:
+                rv[missing.pop(cache_key).id] = BytesIO(result)
+
+        if not missing:
+            return rv
+
+        with sentry_sdk.start_span(op="Fetcher._fetch_artifact_bundle_files.get_blob_indexes"):
+            blob_indexes = File.get_blob_indexes([bundle.file for bundle in missing.values()])
+
+        hub = sentry_sdk.Hub(sentry_sdk.Hub.current)
+
+        def read(artifact_bundle):
+            with sentry_sdk.Hub(hub):
+                return Fetcher._read_artifact_bundle_file(
+                    artifact_bundle, blob_indexes[artifact_bundle.file_id]
+                )
+
+        concurrency = options.get("sourcemaps.prefetch.concurrency")
+        remaining = iter(missing.values())
+        pending = {}
+
+        if concurrency <= 1 or len(missing) == 1:
+            for artifact_bundle in remaining:
+                try:
+                    rv[artifact_bundle.id] = read(artifact_bundle)
+                except Exception as exc:
+                    rv[artifact_bundle.id] = exc
+            return rv
+
+        def submit():
+            for artifact_bundle in remaining:
+                pending[_prefetch_pool.submit(read, artifact_bundle)] = artifact_bundle.id
+                if len(pending) >= concurrency:
+                    break
+
+        with sentry_sdk.start_span(op="Fetcher._fetch_artifact_bundle_files.read") as span:
+            span.set_data("fan_out", min(concurrency, len(missing)))
+            submit()
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    artifact_bundle_id = pending.pop(future)
+                    try:
+                        rv[artifact_bundle_id] = future.result()
+                    except Exception as exc:
+                        rv[artifact_bundle_id] = exc
+                submit()
+
+        return rv
+
     def _open_artifact_bundle_archive(self, debug_id, source_file_type):
         """
         Opens an ArtifactBundle as a .zip file and returns an ArtifactBundleArchive object that allows the caller
@@ -1389,6 +1621,8 @@ class JavaScriptStacktraceProcessor(StacktraceProcessor):
 
         self.fetch_count = 0
         self.sourcemaps_touched = set()
+        # Set when the event turns out to have frames to process, to report the processing time once done.
+        self.processing_started_at = None
 
         # All the following dictionaries have been defined top level for simplicity reasons. Because this code will
         # be ported to Symbolicator we wanted to keep it as simple and explicit as possible. This comment also
@@ -1455,6 +1689,8 @@ class JavaScriptStacktraceProcessor(StacktraceProcessor):
             )
             return False
 
+        self.processing_started_at = time.monotonic()
+
         with sentry_sdk.start_span(op="JavaScriptStacktraceProcessor.preprocess_step.get_release"):
             release = self.get_release(create=True)
             dist = None
@@ -1865,9 +2101,14 @@ class JavaScriptStacktraceProcessor(StacktraceProcessor):
                 op="JavaScriptStacktraceProcessor.fetch_and_cache_sourceview.fetch_by_debug_id"
             ) as span:
                 span.set_data("debug_id", debug_id)
-                result = self.fetcher.fetch_by_debug_id(debug_id, source_file_type)
-                if result is not None:
-                    sourceview = SourceView.from_bytes(result.body)
+                sourceview = self._get_parsed_by_debug_id("sourceview", debug_id, source_file_type)
+                if sourceview is None:
+                    result = self.fetcher.fetch_by_debug_id(debug_id, source_file_type)
+                    if result is not None:
+                        sourceview = self._parse_sourceview(
+                            result.body, self._get_debug_id_ident(debug_id, source_file_type)
+                        )
+                if sourceview is not None:
                     self.fetch_by_debug_id_sourceviews[debug_id, source_file_type] = sourceview
                     return sourceview, FetcherSource.DEBUG_ID
 
@@ -1878,7 +2119,7 @@ class JavaScriptStacktraceProcessor(StacktraceProcessor):
             span.set_data("url", url)
             result = self.fetcher.fetch_by_url_new(url)
             if result is not None:
-                sourceview = SourceView.from_bytes(result.body)
+                sourceview = self._parse_sourceview(result.body)
                 self.fetch_by_url_new_sourceviews[url] = sourceview
 
                 sourcemap_url = discover_sourcemap(result)
@@ -1906,7 +2147,7 @@ class JavaScriptStacktraceProcessor(StacktraceProcessor):
             if result is None:
                 return None, FetcherSource.NONE
 
-            sourceview = SourceView.from_bytes(result.body)
+            sourceview = self._parse_sourceview(result.body)
             self.fetch_by_url_sourceviews[url] = sourceview
 
             sourcemap_url = discover_sourcemap(result)
@@ -1982,6 +2223,18 @@ class JavaScriptStacktraceProcessor(StacktraceProcessor):
             return sourcemap_cache
 
     def _fetch_sourcemap_cache_by_debug_id(self, debug_id, minified_sourceview):
+        # The sourcemap cache depends on both the minified file and the sourcemap.
+        sourcemap_ident = self._get_debug_id_ident(debug_id, SourceFileType.SOURCE_MAP)
+        minified_ident = self._get_debug_id_ident(debug_id, SourceFileType.MINIFIED_SOURCE)
+        ident = (sourcemap_ident, minified_ident) if sourcemap_ident and minified_ident else None
+
+        parsed_artifact_cache = get_parsed_artifact_cache()
+        if parsed_artifact_cache is not None and ident is not None:
+            cached = parsed_artifact_cache.get_by_ident("sourcemapcache", ident)
+            if cached is not None:
+                sourcemap_cache, self.sourcemap_debug_id_to_sourcemap_url[debug_id] = cached
+                return sourcemap_cache
+
         result = self.fetcher.fetch_by_debug_id(debug_id, SourceFileType.SOURCE_MAP)
         if result is not None:
             try:
@@ -1991,8 +2244,11 @@ class JavaScriptStacktraceProcessor(StacktraceProcessor):
                     # We want to keep track of the sourcemap url of the sourcemap resolved with this specific debug id.
                     self.sourcemap_debug_id_to_sourcemap_url[debug_id] = result.url
                     # This is an expensive operation that should be executed as few times as possible.
-                    return SmCache.from_bytes(
-                        minified_sourceview.get_source().encode("utf-8"), result.body
+                    return self._parse_sourcemap_cache(
+                        minified_sourceview.get_source().encode("utf-8"),
+                        result.body,
+                        ident=ident,
+                        url=result.url,
                     )
             except Exception as exc:
                 # This is in debug because the product shows an error already.
@@ -2094,12 +2350,42 @@ class JavaScriptStacktraceProcessor(StacktraceProcessor):
                 op="JavaScriptStacktraceProcessor.fetch_sourcemap_view_by_url.SmCache.from_bytes"
             ):
                 # This is an expensive operation that should be executed as few times as possible.
-                return SmCache.from_bytes(source, body)
+                return self._parse_sourcemap_cache(source, body)
         except Exception as exc:
             # This is in debug because the product shows an error already.
             logger.debug(str(exc), exc_info=True)
             raise UnparseableSourcemap({"url": http.expose_url(url)})
 
+    def _get_debug_id_ident(self, debug_id, source_file_type):
+        # Resolving the identity costs a query, which is only worth it if the parsed file can be cached.
+        if get_parsed_artifact_cache() is None:
+            return None
+        return self.fetcher.get_debug_id_ident(debug_id, source_file_type)
+
+    def _get_parsed_by_debug_id(self, type, debug_id, source_file_type):
+        """
+        Looks up a file that was parsed for a previous event in the process-wide cache, without fetching it.
+        """
+        parsed_artifact_cache = get_parsed_artifact_cache()
+        ident = self._get_debug_id_ident(debug_id, source_file_type)
+        if parsed_artifact_cache is None or ident is None:
+            return None
+
+        cached = parsed_artifact_cache.get_by_ident(type, ident)
+        return cached[0] if cached is not None else None
+
+    def _parse_sourceview(self, body, ident=None):
+        parsed_artifact_cache = get_parsed_artifact_cache()
+        if parsed_artifact_cache is None:
+            return SourceView.from_bytes(body)
+        return parsed_artifact_cache.get_sourceview(body, ident)
+
+    def _parse_sourcemap_cache(self, source, body, ident=None, url=None):
+        parsed_artifact_cache = get_parsed_artifact_cache()
+        if parsed_artifact_cache is None:
+            return SmCache.from_bytes(source, body)
+        return parsed_artifact_cache.get_sourcemap_cache(source, body, ident, url)
+
     def populate_source_cache(self, frames):
         """
         Fetch all sources that we know are required (being referenced directly
@@ -2121,6 +2407,12 @@ class JavaScriptStacktraceProcessor(StacktraceProcessor):
                 continue
             pending_file_list.add(f["abs_path"])
 
+        with sentry_sdk.start_span(
+            op="JavaScriptStacktraceProcessor.populate_source_cache.prefetch"
+        ) as span:
+            span.set_data("urls", len(pending_file_list))
+            self.prefetch_artifacts(pending_file_list)
+
         for idx, url in enumerate(pending_file_list):
             with sentry_sdk.start_span(
                 op="JavaScriptStacktraceProcessor.populate_source_cache.cache_source"
@@ -2132,6 +2424,53 @@ class JavaScriptStacktraceProcessor(StacktraceProcessor):
                     url=url, debug_id=debug_id, source_file_type=SourceFileType.MINIFIED_SOURCE
                 )
 
+    def prefetch_artifacts(self, urls):
+        """
+        Opens up front all the artifact bundles that the files at 'urls' (and their sourcemaps, when resolved by
+        debug id) will be read from, so that they are fetched together instead of one after another.
+
+        Files that were parsed for a previous event don't need their bundle, and the release bundles are only needed for
+        urls without a debug id, since those are the only ones that are looked up by url.
+        """
+        debug_id_pairs = []
+        urls_without_debug_id = []
+        for url in urls:
+            debug_id = self.abs_path_debug_id.get(url)
+            if debug_id is None:
+                urls_without_debug_id.append(url)
+            else:
+                debug_id_pairs.append((debug_id, SourceFileType.MINIFIED_SOURCE))
+                debug_id_pairs.append((debug_id, SourceFileType.SOURCE_MAP))
+
+        if debug_id_pairs:
+            self.fetcher.resolve_debug_ids(debug_id_pairs)
+
+            if get_parsed_artifact_cache() is not None:
+                debug_id_pairs = [
+                    pair for pair in debug_id_pairs if not self._is_parsed_by_debug_id(*pair)
+                ]
+
+        self.fetcher.prefetch_artifact_bundles(debug_id_pairs, urls_without_debug_id)
+
+    def _is_parsed_by_debug_id(self, debug_id, source_file_type):
+        parsed_artifact_cache = get_parsed_artifact_cache()
+        minified_ident = self._get_debug_id_ident(debug_id, SourceFileType.MINIFIED_SOURCE)
+        if parsed_artifact_cache is None or minified_ident is None:
+            return False
+
+        if source_file_type == SourceFileType.MINIFIED_SOURCE:
+            return parsed_artifact_cache.get_by_ident("sourceview", minified_ident) is not None
+
+        # The sourcemap cache is keyed by the identity of both files, see _fetch_sourcemap_cache_by_debug_id.
+        sourcemap_ident = self._get_debug_id_ident(debug_id, SourceFileType.SOURCE_MAP)
+        return (
+            sourcemap_ident is not None
+            and parsed_artifact_cache.get_by_ident(
+                "sourcemapcache", (sourcemap_ident, minified_ident)
+            )
+            is not None
+        )
+
     def close(self):
         StacktraceProcessor.close(self)
         # We want to close all the open archives inside the local Fetcher cache.
@@ -2140,6 +2479,10 @@ class JavaScriptStacktraceProcessor(StacktraceProcessor):
             metrics.incr(
                 "sourcemaps.processed", amount=len(self.sourcemaps_touched), skip_internal=True
             )
+        if self.processing_started_at is not None:
+            metrics.timing(
+                "sourcemaps.processing_time", time.monotonic() - self.processing_started_at
+            )
 
     def suspected_console_errors(self, frames):
         def is_suspicious_frame(frame) -> bool:
@@ -213,24 +213,50 @@ class AbstractFile(Model):
     DELETE_UNREFERENCED_BLOB_TASK: ClassVar[SentryTask]
     blobs: models.ManyToManyField
 
-    def _get_chunked_blob(self, mode=None, prefetch=False, prefetch_to=None, delete=True):
+    def _get_chunked_blob(
+        self, mode=None, prefetch=False, prefetch_to=None, delete=True, blob_indexes=None
+    ):
+        if blob_indexes is None:
+            blob_indexes = (
+                self.FILE_BLOB_INDEX_MODEL.objects.filter(file=self)
+                .select_related("blob")
+                .order_by("offset")
+            )
         return ChunkedFileBlobIndexWrapper(
-            self.FILE_BLOB_INDEX_MODEL.objects.filter(file=self)
-            .select_related("blob")
-            .order_by("offset"),
+            blob_indexes,
             mode=mode,
             prefetch=prefetch,
             prefetch_to=prefetch_to,
             delete=delete,
         )
 
+    @classmethod
+    def get_blob_indexes(cls, files):
+        """Loads the blob indexes of several files with a single query.
+
+        Returns a mapping of file id to the indexes of that file, which can
+        be passed to `getfile` to read the file without querying them again.
+        """
+        rv = {file.id: [] for file in files}
+        if rv:
+            for blob_index in (
+                cls.FILE_BLOB_INDEX_MODEL.objects.filter(file_id__in=list(rv))
+                .select_related("blob")
+                .order_by("offset")
+            ):
+                rv[blob_index.file_id].append(blob_index)
+        return rv
+
     @sentry_sdk.tracing.trace
-    def getfile(self, mode=None, prefetch=False):
+    def getfile(self, mode=None, prefetch=False, blob_indexes=None):
         """Returns a file object.  By default the file is fetched on
         demand but if prefetch is enabled the file is fully prefetched
         into a tempfile before reading can happen.
+
+        The blob indexes of the file are queried unless they were already
+        loaded with `get_blob_indexes`.
         """
-        impl = self._get_chunked_blob(mode, prefetch)
+        impl = self._get_chunked_blob(mode, prefetch, blob_indexes=blob_indexes)
         return FileObj(impl, self.name)
 
     def save_to(self, path):
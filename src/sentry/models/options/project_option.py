@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, Any, Mapping, Sequence
+from typing import TYPE_CHECKING, Any, Dict, Mapping, Sequence
 
 from django.db import models
 
@@ -117,6 +117,34 @@ class ProjectOptionManager(OptionManager["ProjectOption"]):
 
         return self._option_cache.get(cache_key, {})
 
+    def get_all_values_bulk(self, projects: Sequence[Project]) -> Mapping[int, Mapping[str, Value]]:
+        """
+        Like `get_all_values` for many projects, with a single cache lookup and a single query
+        for the projects whose options aren't cached.
+        """
+        cache_keys = {self._make_key(project.id): project.id for project in projects}
+        missing = [cache_key for cache_key in cache_keys if cache_key not in self._option_cache]
+        if missing:
+            cached = cache.get_many(missing)
+            self._option_cache.update(cached)
+
+            uncached: Dict[int, Dict[str, Value]] = {
+                cache_keys[cache_key]: {} for cache_key in missing if cache_key not in cached
+            }
+            if uncached:
+                for option in self.filter(project__in=uncached.keys()):
+                    uncached[option.project_id][option.key] = option.value
+                results = {
+                    self._make_key(project_id): values for project_id, values in uncached.items()
+                }
+                cache.set_many(results)
+                self._option_cache.update(results)
+
+        return {
+            project_id: self._option_cache.get(cache_key, {})
+            for cache_key, project_id in cache_keys.items()
+        }
+
     def reload_cache(self, project_id: int, update_reason: str) -> Mapping[str, Value]:
         from sentry.tasks.relay import schedule_invalidate_project_config
 
@@ -1,10 +1,18 @@
+import logging
+import struct
+import zlib
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from threading import local
+from time import monotonic
 
 import sentry_sdk
 from django.core.cache import InvalidCacheBackendError, caches
+from sentry_sdk import Hub
 
-from sentry.utils import json
+from sentry import options
+from sentry.utils import json, metrics
 from sentry.utils.cache import memoize
+from sentry.utils.lru import LRUCache
 from sentry.utils.services import Service
 
 # Cache an instance of the encoder we want to use
@@ -22,6 +30,84 @@ json_dumps = json.JSONEncoder(
 
 json_loads = json.loads
 
+logger = logging.getLogger(__name__)
+
+# Shared by all nodestore instances so that concurrent `get_multi` calls can't
+# spawn an unbounded number of threads. The per-call fan-out is capped by the
+# `nodestore.get-multi.concurrency` option.
+_fetch_pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix="nodestore-fetch")
+
+# Nodes written with the indexed encoding start with a NUL byte, which can
+# never be the first byte of a legacy (newline-separated JSON) payload.
+INDEXED_MAGIC = b"\x00ns"
+INDEXED_VERSION = 1
+
+# magic, version, number of sections
+_indexed_header = struct.Struct("!3sBH")
+# key length, absolute offset and length of the compressed section
+_indexed_entry = struct.Struct("!HII")
+
+
+def is_indexed(value):
+    return value[: len(INDEXED_MAGIC)] == INDEXED_MAGIC
+
+
+# In-process tier in front of the shared `nodedata` cache. Nodestores are
+# thread-locals, so this lives on the module to be shared by all threads.
+_local_cache = None
+
+
+def get_local_cache():
+    """
+    Returns the in-process node cache, or `None` if it is disabled via the
+    `nodestore.local-cache.max-bytes` option.
+    """
+    global _local_cache
+
+    max_bytes = options.get("nodestore.local-cache.max-bytes")
+    if not max_bytes:
+        _local_cache = None
+    elif _local_cache is None or _local_cache.max_weight != max_bytes:
+        _local_cache = LRUCache(max_weight=max_bytes)
+    return _local_cache
+
+
+def _copy_node(value):
+    """
+    Returns a copy of a decoded node payload that shares no dicts or lists
+    with it, and roughly the size of the payload as JSON. Much cheaper than
+    serializing and parsing the payload again.
+    """
+    if isinstance(value, dict):
+        copy = {}
+        size = 2
+        for key, item in value.items():
+            copy[key], item_size = _copy_node(item)
+            size += (len(key) if isinstance(key, str) else 8) + item_size + 4
+        return copy, size
+    if isinstance(value, list):
+        copy = []
+        size = 2
+        for item in value:
+            item, item_size = _copy_node(item)
+            copy.append(item)
+            size += item_size + 1
+        return copy, size
+    if isinstance(value, str):
+        return value, len(value) + 2
+    return value, 8
+
+
+def _hit_or_miss(value):
+    return "hit" if value is not None else "miss"
+
+
+def _incr_cache_results(tier, hits, total):
+    if hits:
+        metrics.incr("nodestore.cache", amount=hits, tags={"tier": tier, "result": "hit"})
+    if total - hits:
+        metrics.incr("nodestore.cache", amount=total - hits, tags={"tier": tier, "result": "miss"})
+
 
 class NodeStorage(local, Service):
     """
@@ -56,6 +142,19 @@ class NodeStorage(local, Service):
 
     This is used in reprocessing to store a snapshot of the event from multiple
     stages of the pipeline.
+
+    When the `nodestore.indexed-encoding` option is enabled, nodes are written
+    in a versioned container instead: a header lists the offset and length of
+    every subkey, and each subkey is compressed on its own. Reading a single
+    subkey then only decompresses and parses that section. Nodes written in
+    the old format keep reading through the same `_decode`.
+
+    Main payloads are cached in two tiers: an optional in-process LRU (see
+    `nodestore.local-cache.max-bytes`) holding decoded payloads, and the
+    shared `nodedata` Django cache. The in-process tier keeps its own copy of
+    every payload and hands out copies of it, so callers may mutate what they
+    get. Other processes only see writes and deletes once their entries
+    expire, which is bounded by `nodestore.local-cache.ttl`.
     """
 
     __all__ = (
@@ -92,6 +191,9 @@ class NodeStorage(local, Service):
         if value is None:
             return None
 
+        if is_indexed(value):
+            return self._decode_indexed(value, subkey)
+
         lines_iter = iter(value.splitlines())
         try:
             if subkey is not None:
@@ -112,6 +214,31 @@ class NodeStorage(local, Service):
         except StopIteration:
             return None
 
+    def _decode_indexed(self, value, subkey):
+        """
+        Decode a single section of a value written by `_encode_indexed`,
+        without touching any of the other sections.
+        """
+        magic, version, count = _indexed_header.unpack_from(value)
+        if version != INDEXED_VERSION:
+            raise ValueError(f"Unsupported nodestore encoding version: {version}")
+
+        # See `_decode` for why subkeys are ASCII. The main payload is always
+        # the first section, its key is empty.
+        subkey = b"" if subkey is None else subkey.encode("ascii")
+        view = memoryview(value)
+        pos = _indexed_header.size
+        for index in range(count):
+            key_length, offset, length = _indexed_entry.unpack_from(value, pos)
+            pos += _indexed_entry.size
+            key = value[pos : pos + key_length]
+            pos += key_length
+
+            if key == subkey:
+                return json_loads(zlib.decompress(view[offset : offset + length]))
+
+        return None
+
     def _get_bytes(self, id):
         """
         >>> nodestore._get_bytes('key1')
@@ -138,7 +265,7 @@ class NodeStorage(local, Service):
             rv = self._decode(bytes_data, subkey=subkey)
             if subkey is None:
                 # set cache item only after we know decoding did not fail
-                self._set_cache_item(id, rv)
+                self._set_cache_item(id, rv, bytes_data=bytes_data)
 
             span.set_tag("result", "from_service")
             if bytes_data:
@@ -155,7 +282,106 @@ class NodeStorage(local, Service):
             "key2": b'{"message": "hello world"}'
         }
         """
-        return {id: self._get_bytes(id) for id in id_list}
+        concurrency = options.get("nodestore.get-multi.concurrency")
+        if concurrency <= 1 or len(id_list) <= 1:
+            return {id: self._get_bytes(id) for id in id_list}
+
+        return self._get_bytes_multi_concurrent(
+            id_list, concurrency, options.get("nodestore.get-multi.timeout")
+        )
+
+    def _get_bytes_multi_concurrent(self, id_list, concurrency, timeout):
+        """
+        Fallback for backends without a native bulk read: fetches nodes with
+        `_get_bytes` on the shared thread pool, with at most `concurrency`
+        fetches in flight for this call.
+
+        Nodes that fail to load or are not fetched within `timeout` seconds
+        are returned as `None` and reported, unless every fetch failed in
+        which case the first error is raised.
+        """
+        hub = Hub(Hub.current)
+
+        def fetch(id):
+            with Hub(hub):
+                start = monotonic()
+                try:
+                    return self._get_bytes(id)
+                finally:
+                    metrics.timing(
+                        "nodestore.get_multi.fetch_duration",
+                        monotonic() - start,
+                        tags={"backend": type(self).__name__},
+                    )
+
+        with sentry_sdk.start_span(op="nodestore.get_bytes_multi") as span:
+            span.set_data("fan_out", min(concurrency, len(id_list)))
+            start = monotonic()
+            deadline = start + timeout
+
+            rv = {}
+            errors = {}
+            pending = {}
+            remaining = iter(id_list)
+
+            def submit():
+                for id in remaining:
+                    pending[_fetch_pool.submit(fetch, id)] = id
+                    if len(pending) >= concurrency:
+                        break
+
+            submit()
+            while pending:
+                done, _ = wait(
+                    pending, timeout=max(deadline - monotonic(), 0), return_when=FIRST_COMPLETED
+                )
+                if not done:
+                    break
+                for future in done:
+                    id = pending.pop(future)
+                    try:
+                        rv[id] = future.result()
+                    except Exception as e:
+                        errors[id] = e
+                submit()
+
+            timed_out = list(pending.values())
+            timed_out.extend(remaining)
+            for future in pending:
+                future.cancel()
+
+            tags = {"backend": type(self).__name__}
+            metrics.timing("nodestore.get_multi.fan_out", min(concurrency, len(id_list)), tags=tags)
+            metrics.timing("nodestore.get_multi.batch_duration", monotonic() - start, tags=tags)
+
+            if errors or timed_out:
+                span.set_data("errors", len(errors))
+                span.set_data("timed_out", len(timed_out))
+                metrics.incr(
+                    "nodestore.get_multi.failed",
+                    amount=len(errors),
+                    tags={**tags, "reason": "error"},
+                )
+                metrics.incr(
+                    "nodestore.get_multi.failed",
+                    amount=len(timed_out),
+                    tags={**tags, "reason": "timeout"},
+                )
+                logger.warning(
+                    "nodestore.get_multi.partial_failure",
+                    extra={
+                        "num_ids": len(id_list),
+                        "num_errors": len(errors),
+                        "num_timed_out": len(timed_out),
+                    },
+                    exc_info=next(iter(errors.values()), None),
+                )
+                if not rv and errors:
+                    raise next(iter(errors.values()))
+
+            for id in id_list:
+                rv.setdefault(id, None)
+            return rv
 
     def get_multi(self, id_list, subkey=None):
         """
@@ -179,12 +405,10 @@ class NodeStorage(local, Service):
             else:
                 uncached_ids = id_list
 
-            items = {
-                id: self._decode(value, subkey=subkey)
-                for id, value in self._get_bytes_multi(uncached_ids).items()
-            }
+            bytes_items = self._get_bytes_multi(uncached_ids)
+            items = {id: self._decode(value, subkey=subkey) for id, value in bytes_items.items()}
             if subkey is None:
-                self._set_cache_items(items)
+                self._set_cache_items(items, bytes_items=bytes_items)
                 items.update(cache_items)
 
             span.set_tag("result", "from_service")
@@ -201,6 +425,9 @@ class NodeStorage(local, Service):
         >>> _encode({"unprocessed": {}, None: {"stacktrace": {}}})
         b'{"stacktrace": {}}\nunprocessed\n{}'
         """
+        if options.get("nodestore.indexed-encoding"):
+            return self._encode_indexed(data)
+
         lines = [json_dumps(data.pop(None)).encode("utf8")]
         for key, value in data.items():
             lines.append(key.encode("ascii"))
@@ -208,6 +435,30 @@ class NodeStorage(local, Service):
 
         return b"\n".join(lines)
 
+    def _encode_indexed(self, data):
+        """
+        Encode data dict into the indexed container format::
+
+            magic (3 bytes) | version (1 byte) | section count (2 bytes)
+            per section: key length (2) | offset (4) | length (4) | key
+            zlib-compressed JSON of every section
+
+        The first section is always the `None` key (the regular event
+        payload) and is stored with an empty key.
+        """
+        sections = [(b"", zlib.compress(json_dumps(data.pop(None)).encode("utf8")))]
+        for key, value in data.items():
+            sections.append((key.encode("ascii"), zlib.compress(json_dumps(value).encode("utf8"))))
+
+        offset = _indexed_header.size + sum(_indexed_entry.size + len(key) for key, _ in sections)
+        header = [_indexed_header.pack(INDEXED_MAGIC, INDEXED_VERSION, len(sections))]
+        for key, section in sections:
+            header.append(_indexed_entry.pack(len(key), offset, len(section)))
+            header.append(key)
+            offset += len(section)
+
+        return b"".join(header + [section for _, section in sections])
+
     def _set_bytes(self, id, data, ttl=None):
         """
         >>> nodestore.set('key1', b"{'foo': 'bar'}")
@@ -254,29 +505,89 @@ class NodeStorage(local, Service):
         raise NotImplementedError
 
     def _get_cache_item(self, id):
+        local_cache = get_local_cache()
+        if local_cache is not None:
+            rv = local_cache.get(id)
+            metrics.incr("nodestore.cache", tags={"tier": "local", "result": _hit_or_miss(rv)})
+            if rv is not None:
+                return _copy_node(rv)[0]
+
         if self.cache:
-            return self.cache.get(id)
+            rv = self.cache.get(id)
+            metrics.incr("nodestore.cache", tags={"tier": "shared", "result": _hit_or_miss(rv)})
+            if rv is not None and local_cache is not None:
+                self._set_local_cache_item(local_cache, id, rv)
+            return rv
 
     def _get_cache_items(self, id_list):
-        if self.cache:
-            return self.cache.get_many(id_list)
-        return {}
+        rv = {}
+        local_cache = get_local_cache()
+        if local_cache is not None:
+            for id in id_list:
+                value = local_cache.get(id)
+                if value is not None:
+                    rv[id] = _copy_node(value)[0]
+            _incr_cache_results("local", len(rv), len(id_list))
+            if len(rv) == len(id_list):
+                return rv
+            id_list = [id for id in id_list if id not in rv]
 
-    def _set_cache_item(self, id, data):
+        if self.cache:
+            shared_items = self.cache.get_many(id_list)
+            _incr_cache_results("shared", len(shared_items), len(id_list))
+            if local_cache is not None:
+                for id, value in shared_items.items():
+                    self._set_local_cache_item(local_cache, id, value)
+            rv.update(shared_items)
+        return rv
+
+    def _set_cache_item(self, id, data, bytes_data=None):
         if self.cache and data:
             self.cache.set(id, data)
+        self._update_local_cache_item(id, data, bytes_data)
 
-    def _set_cache_items(self, items):
+    def _set_cache_items(self, items, bytes_items=None):
         if self.cache:
             self.cache.set_many(items)
+        for id, data in items.items():
+            self._update_local_cache_item(id, data, (bytes_items or {}).get(id))
+
+    def _update_local_cache_item(self, id, data, bytes_data):
+        local_cache = get_local_cache()
+        if local_cache is None:
+            return
+        # Only keep payloads that were read, copying on every write would slow
+        # down saving events for nodes that are rarely read again.
+        if data and bytes_data is not None:
+            self._set_local_cache_item(local_cache, id, data)
+        else:
+            local_cache.delete(id)
+
+    def _set_local_cache_item(self, local_cache, id, data):
+        # Callers mutate the nodes they get (`NodeData.bind_data` pops the
+        # node ref, the event manager adds grouping information), so the cache
+        # keeps a copy nobody else holds and every hit gets its own copy.
+        value, size = _copy_node(data)
+        evicted = local_cache.set(
+            id, value, ttl=options.get("nodestore.local-cache.ttl"), weight=size
+        )
+        if evicted:
+            metrics.incr("nodestore.cache.evictions", amount=evicted, tags={"tier": "local"})
 
     def _delete_cache_item(self, id):
         if self.cache:
             self.cache.delete(id)
+        local_cache = get_local_cache()
+        if local_cache is not None:
+            local_cache.delete(id)
 
     def _delete_cache_items(self, id_list):
         if self.cache:
             self.cache.delete_many([id for id in id_list])
+        local_cache = get_local_cache()
+        if local_cache is not None:
+            for id in id_list:
+                local_cache.delete(id)
 
     @memoize
     def cache(self):
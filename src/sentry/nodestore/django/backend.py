@@ -1,18 +1,29 @@
+import base64
 import logging
 import math
 import pickle
+import zlib
 
 from django.utils import timezone
 
 from sentry.db.models import create_or_update
-from sentry.nodestore.base import NodeStorage
-from sentry.utils.strings import compress, decompress
+from sentry.nodestore.base import NodeStorage, get_local_cache, is_indexed
+from sentry.utils.strings import compress
 
 from .models import Node
 
 logger = logging.getLogger("sentry")
 
 
+def _decompress(data):
+    value = base64.b64decode(data)
+    # Sections of the indexed encoding are compressed individually, so they
+    # are stored without the outer zlib layer.
+    if is_indexed(value):
+        return value
+    return zlib.decompress(value)
+
+
 class DjangoNodeStorage(NodeStorage):
     def delete(self, id):
         Node.objects.filter(id=id).delete()
@@ -23,7 +34,7 @@ class DjangoNodeStorage(NodeStorage):
             return None
 
         try:
-            if value.startswith(b"{"):
+            if value.startswith(b"{") or is_indexed(value):
                 return NodeStorage._decode(self, value, subkey=subkey)
 
             if subkey is None:
@@ -37,19 +48,23 @@ class DjangoNodeStorage(NodeStorage):
     def _get_bytes(self, id):
         try:
             data = Node.objects.get(id=id).data
-            return decompress(data)
+            return _decompress(data)
         except Node.DoesNotExist:
             return None
 
     def _get_bytes_multi(self, id_list):
-        return {n.id: decompress(n.data) for n in Node.objects.filter(id__in=id_list)}
+        return {n.id: _decompress(n.data) for n in Node.objects.filter(id__in=id_list)}
 
     def delete_multi(self, id_list):
         Node.objects.filter(id__in=id_list).delete()
         self._delete_cache_items(id_list)
 
     def _set_bytes(self, id, data, ttl=None):
-        create_or_update(Node, id=id, values={"data": compress(data), "timestamp": timezone.now()})
+        if is_indexed(data):
+            data = base64.b64encode(data).decode("utf-8")
+        else:
+            data = compress(data)
+        create_or_update(Node, id=id, values={"data": data, "timestamp": timezone.now()})
 
     def cleanup(self, cutoff_timestamp):
         from sentry.db.deletion import BulkDeleteQuery
@@ -60,6 +75,9 @@ class DjangoNodeStorage(NodeStorage):
         BulkDeleteQuery(model=Node, dtfield="timestamp", days=days).execute()
         if self.cache:
             self.cache.clear()
+        local_cache = get_local_cache()
+        if local_cache is not None:
+            local_cache.clear()
 
     def bootstrap(self):
         # Nothing for Django backend to do during bootstrap
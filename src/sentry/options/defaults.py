@@ -126,6 +126,22 @@ register(
     default=1024 * 1024 * 1024,
     flags=FLAG_PRIORITIZE_DISK | FLAG_AUTOMATOR_MODIFIABLE,
 )
+# Size in bytes (of the parsed files) of the per-process cache of parsed
+# source views and sourcemap caches of the JavaScript processor. 0 disables it.
+register(
+    "sourcemaps.parsed-cache.max-bytes",
+    type=Int,
+    default=0,
+    flags=FLAG_PRIORITIZE_DISK | FLAG_AUTOMATOR_MODIFIABLE,
+)
+# Maximum number of artifact bundles read in parallel while the JavaScript
+# processor prefetches the files of an event. 1 reads them one after another.
+register(
+    "sourcemaps.prefetch.concurrency",
+    type=Int,
+    default=4,
+    flags=FLAG_PRIORITIZE_DISK | FLAG_AUTOMATOR_MODIFIABLE,
+)
 
 
 # Mail
@@ -496,6 +512,40 @@ register(
     flags=FLAG_PRIORITIZE_DISK | FLAG_AUTOMATOR_MODIFIABLE,
 )
 
+# Seconds cached snuba query results are still served after they expire, while a
+# single request refreshes them.
+register("snuba.query-cache.stale-ttl", default=0, flags=FLAG_AUTOMATOR_MODIFIABLE)
+# Cache policies by referrer, overriding the cache TTL and stale TTL, e.g.
+# {"api.dashboards.widget.line-chart": {"ttl": 300, "stale_ttl": 600}}
+register(
+    "snuba.query-cache.referrer-policies",
+    type=Dict,
+    default={},
+    flags=FLAG_AUTOMATOR_MODIFIABLE,
+)
+# Only let one request run a query that misses the cache, the others wait for
+# its result for up to `snuba.query-cache.single-flight.wait` seconds. The query
+# lock is held for up to 30 seconds, which is also how long snuba queries may run.
+register(
+    "snuba.query-cache.single-flight.enabled",
+    default=False,
+    flags=FLAG_AUTOMATOR_MODIFIABLE,
+)
+register("snuba.query-cache.single-flight.wait", default=30.0, flags=FLAG_AUTOMATOR_MODIFIABLE)
+
+# Cache the results of timeseries queries in chunks of buckets, see
+# `sentry.utils.snuba.bulk_timeseries_snql_query`. Chunks are cached once they
+# end `settle-seconds` in the past, so that late events are mostly included.
+register("snuba.timeseries-cache.enabled", default=False, flags=FLAG_AUTOMATOR_MODIFIABLE)
+register("snuba.timeseries-cache.buckets-per-chunk", default=12, flags=FLAG_AUTOMATOR_MODIFIABLE)
+register("snuba.timeseries-cache.settle-seconds", default=600, flags=FLAG_AUTOMATOR_MODIFIABLE)
+register("snuba.timeseries-cache.ttl", default=3600, flags=FLAG_AUTOMATOR_MODIFIABLE)
+
+# Adapt how many queries of a bulk snuba query run at once to how fast snuba
+# answers the queries of each referrer, see `sentry.utils.snuba.QueryConcurrencyLimiter`.
+register("snuba.bulk-query.adaptive-concurrency", default=False, flags=FLAG_AUTOMATOR_MODIFIABLE)
+register("snuba.bulk-query.target-latency", default=3.0, flags=FLAG_AUTOMATOR_MODIFIABLE)
+
 # Kafka Publisher
 register("kafka-publisher.raw-event-sample-rate", default=0.0, flags=FLAG_AUTOMATOR_MODIFIABLE)
 register("kafka-publisher.max-event-size", default=100000, flags=FLAG_AUTOMATOR_MODIFIABLE)
@@ -622,6 +672,42 @@ register(
 register(
     "nodedata.cache-on-save", default=False, flags=FLAG_PRIORITIZE_DISK | FLAG_AUTOMATOR_MODIFIABLE
 )
+# Write nodes in the indexed container format, which allows decoding single
+# subkeys. Only enable once every reader is able to decode it.
+register(
+    "nodestore.indexed-encoding",
+    default=False,
+    flags=FLAG_PRIORITIZE_DISK | FLAG_AUTOMATOR_MODIFIABLE,
+)
+# Maximum number of nodes fetched in parallel by a single `get_multi` call on
+# backends without a native bulk read. 1 disables concurrent fetches.
+register(
+    "nodestore.get-multi.concurrency",
+    default=8,
+    flags=FLAG_PRIORITIZE_DISK | FLAG_AUTOMATOR_MODIFIABLE,
+)
+# Deadline in seconds for concurrent `get_multi` fetches. Nodes not fetched in
+# time are returned as missing.
+register(
+    "nodestore.get-multi.timeout",
+    default=5.0,
+    flags=FLAG_PRIORITIZE_DISK | FLAG_AUTOMATOR_MODIFIABLE,
+)
+# Size in bytes of the per-process cache of node payloads that sits in front of
+# the shared nodedata cache, estimated from their size as JSON. The cache keeps
+# decoded payloads and hands out copies of them. 0 disables it.
+register(
+    "nodestore.local-cache.max-bytes",
+    default=0,
+    flags=FLAG_PRIORITIZE_DISK | FLAG_AUTOMATOR_MODIFIABLE,
+)
+# Seconds a payload is served from the per-process cache, which bounds how
+# long other processes may serve a node after it was changed or deleted.
+register(
+    "nodestore.local-cache.ttl",
+    default=60,
+    flags=FLAG_PRIORITIZE_DISK | FLAG_AUTOMATOR_MODIFIABLE,
+)
 
 # Use nodestore for eventstore.get_events
 register(
@@ -940,6 +1026,91 @@ register(
     "sentry-metrics.indexer.cache-key-double-write", default=False, flags=FLAG_AUTOMATOR_MODIFIABLE
 )
 
+# Size in bytes of the per-process cache of string indexer ids that sits in
+# front of the shared indexer cache, for each use case. 0 disables it.
+register(
+    "sentry-metrics.indexer.local-cache.max-bytes",
+    default=0,
+    flags=FLAG_PRIORITIZE_DISK | FLAG_AUTOMATOR_MODIFIABLE,
+)
+# Overrides of sentry-metrics.indexer.local-cache.max-bytes for some use cases,
+# keyed by use case id.
+register(
+    "sentry-metrics.indexer.local-cache.max-bytes-per-use-case",
+    type=Dict,
+    default={},
+    flags=FLAG_PRIORITIZE_DISK | FLAG_AUTOMATOR_MODIFIABLE,
+)
+# Seconds an id is served from the per-process cache, before it is looked up
+# in the shared cache again. Jittered like the shared cache TTL.
+register(
+    "sentry-metrics.indexer.local-cache.ttl",
+    default=600,
+    flags=FLAG_PRIORITIZE_DISK | FLAG_AUTOMATOR_MODIFIABLE,
+)
+# Seconds the per-process cache remembers that `resolve` found no id for a
+# string. Strings indexed by another process in the meantime resolve to None
+# until then. 0 disables negative caching.
+register(
+    "sentry-metrics.indexer.local-cache.negative-ttl",
+    default=0,
+    flags=FLAG_PRIORITIZE_DISK | FLAG_AUTOMATOR_MODIFIABLE,
+)
+
+# Size in bytes of the table of string indexer ids in shared memory, that the
+# indexer processes of a host look up before the shared cache. 0 disables it.
+# Changing the size replaces the table.
+register(
+    "sentry-metrics.indexer.shared-cache.max-bytes",
+    default=0,
+    flags=FLAG_PRIORITIZE_DISK | FLAG_AUTOMATOR_MODIFIABLE,
+)
+# Name of the shared memory segment of the table.
+register(
+    "sentry-metrics.indexer.shared-cache.name",
+    default="sentry-indexer-ids",
+    flags=FLAG_PRIORITIZE_DISK | FLAG_AUTOMATOR_MODIFIABLE,
+)
+# Seconds an id is served from the shared memory table after it was written.
+register(
+    "sentry-metrics.indexer.shared-cache.ttl",
+    default=3600,
+    flags=FLAG_PRIORITIZE_DISK | FLAG_AUTOMATOR_MODIFIABLE,
+)
+
+# Write new strings of the Postgres string indexer by loading them into a
+# temporary table with COPY, instead of with bulk_create.
+register(
+    "sentry-metrics.indexer.pg-copy-insert",
+    default=False,
+    flags=FLAG_PRIORITIZE_DISK | FLAG_AUTOMATOR_MODIFIABLE,
+)
+# Initial and maximum number of new strings written per statement by the COPY
+# path. The batch size adapts to keep statements around the target latency.
+register(
+    "sentry-metrics.indexer.pg-copy-insert.batch-size",
+    default=1000,
+    flags=FLAG_PRIORITIZE_DISK | FLAG_AUTOMATOR_MODIFIABLE,
+)
+register(
+    "sentry-metrics.indexer.pg-copy-insert.max-batch-size",
+    default=20000,
+    flags=FLAG_PRIORITIZE_DISK | FLAG_AUTOMATOR_MODIFIABLE,
+)
+register(
+    "sentry-metrics.indexer.pg-copy-insert.target-latency-ms",
+    default=500,
+    flags=FLAG_PRIORITIZE_DISK | FLAG_AUTOMATOR_MODIFIABLE,
+)
+
+# Copy the values of set and distribution metrics from the ingest message to
+# the output message as raw bytes, instead of decoding and encoding them.
+register(
+    "sentry-metrics.indexer.raw-value-passthrough",
+    default=False,
+    flags=FLAG_PRIORITIZE_DISK | FLAG_AUTOMATOR_MODIFIABLE,
+)
+
 # Global and per-organization limits on the writes to the string indexer's DB.
 #
 # Format is a list of dictionaries of format {
@@ -1020,6 +1191,23 @@ register(
     default=True,
     flags=FLAG_AUTOMATOR_MODIFIABLE,
 )
+# Check and consume the writes limits of a batch in one step, with one round
+# trip per shard. The counters of this mode are kept apart from the ones of the
+# default mode, so switching it resets the usage of every limit.
+register(
+    "sentry-metrics.writes-limiter.bulk",
+    default=False,
+    flags=FLAG_AUTOMATOR_MODIFIABLE,
+)
+# With `sentry-metrics.writes-limiter.bulk`, take this much quota in advance
+# whenever a limit needs more, so that most batches don't go to Redis at all.
+# Every process may over-count the usage of a limit by up to this amount per
+# 10 seconds. 0 disables leasing.
+register(
+    "sentry-metrics.writes-limiter.lease-size",
+    default=0,
+    flags=FLAG_AUTOMATOR_MODIFIABLE,
+)
 # per-organization limits on the number of timeseries that can be observed in
 # each window.
 #
@@ -1,4 +1,8 @@
-from typing import Any, Optional, Sequence, Tuple
+import threading
+import zlib
+from itertools import chain
+from time import time
+from typing import Any, Dict, List, MutableMapping, Optional, Sequence, Tuple
 
 from sentry_redis_tools.clients import RedisCluster, StrictRedis
 from sentry_redis_tools.sliding_windows_rate_limiter import GrantedQuota, Quota
@@ -8,10 +12,45 @@ from sentry_redis_tools.sliding_windows_rate_limiter import (
 from sentry_redis_tools.sliding_windows_rate_limiter import RequestedQuota, Timestamp
 
 from sentry.exceptions import InvalidConfiguration
-from sentry.utils import redis
+from sentry.utils import metrics, redis
 from sentry.utils.services import Service
 
-__all__ = ["Quota", "GrantedQuota", "RequestedQuota", "Timestamp"]
+__all__ = ["Quota", "GrantedQuota", "QuotaLease", "RequestedQuota", "Timestamp"]
+
+check_and_use_quotas_script = redis.load_script("ratelimits/sliding_windows.lua")
+
+# The number of hash slots the counters of `bulk_check_and_use_quotas` are
+# spread over on Redis Cluster.
+DEFAULT_SHARDS = 32
+
+
+class _ScriptCall:
+    """The windows and requests of one invocation of `check_and_use_quotas_script`."""
+
+    def __init__(self) -> None:
+        self.keys: List[str] = []
+        # (granule count, limit, ttl) of every window
+        self.windows: List[Tuple[int, int, int]] = []
+        # request index -> indexes of the windows of the request
+        self.requests: Dict[int, List[int]] = {}
+        self._counter_keys: List[str] = []
+
+    def add_window(self, keys: Sequence[str], quota: Quota) -> int:
+        # The first key is the most recent granule, the one requests are
+        # counted in.
+        self._counter_keys.append(keys[0])
+        self.keys.extend(keys)
+        self.windows.append((len(keys), quota.limit, quota.window_seconds))
+        return len(self.windows) - 1
+
+    def get_counter_key(self, window: int) -> str:
+        return self._counter_keys[window]
+
+    def get_args(self, requested: Sequence[int]) -> List[int]:
+        args = [len(self.windows), *chain.from_iterable(self.windows), len(self.requests)]
+        for index, windows in self.requests.items():
+            args.extend([requested[index], len(windows), *(window + 1 for window in windows)])
+        return args
 
 
 class SlidingWindowRateLimiter(Service):
@@ -115,6 +154,20 @@ class SlidingWindowRateLimiter(Service):
         self.use_quotas(requests, grants, timestamp)
         return grants
 
+    def bulk_check_and_use_quotas(
+        self, requests: Sequence[RequestedQuota], timestamp: Optional[Timestamp] = None
+    ) -> Sequence[GrantedQuota]:
+        """
+        Like `check_and_use_quotas`, but meant for large batches of requests
+        that are checked and consumed in one step, such as the requests of a
+        consumer batch.
+
+        Backends may keep the counters of this method apart from the ones of
+        `check_within_quotas` and `use_quotas`, a quota should only ever be
+        consumed through one of the two.
+        """
+        return self.check_and_use_quotas(requests, timestamp)
+
 
 class RedisSlidingWindowRateLimiter(SlidingWindowRateLimiter):
     def __init__(self, **options: Any) -> None:
@@ -123,6 +176,7 @@ class RedisSlidingWindowRateLimiter(SlidingWindowRateLimiter):
         assert isinstance(client, (StrictRedis, RedisCluster)), client
         self.client = client
         self.impl = RedisSlidingWindowRateLimiterImpl(self.client)
+        self.shards = options.get("shards", DEFAULT_SHARDS)
         super().__init__(**options)
 
     def validate(self) -> None:
@@ -144,3 +198,214 @@ class RedisSlidingWindowRateLimiter(SlidingWindowRateLimiter):
         timestamp: Timestamp,
     ) -> None:
         return self.impl.use_quotas(requests, grants, timestamp)
+
+    def _build_bulk_redis_key(self, prefix: str, quota: Quota, granule: int) -> str:
+        if "{" in prefix or "}" in prefix:
+            raise ValueError("Explicit sharding not allowed in RequestedQuota.prefix")
+
+        # All granules of a prefix share a hash slot, so that a window can be
+        # summed up by a script.
+        shard = zlib.crc32(prefix.encode("utf-8")) % self.shards
+        return (
+            f"sliding-window-rate-limit-bulk:{{{shard}}}:{prefix}:"
+            f"{quota.window_seconds}:{quota.granularity_seconds}:{granule}"
+        )
+
+    def bulk_check_and_use_quotas(
+        self, requests: Sequence[RequestedQuota], timestamp: Optional[Timestamp] = None
+    ) -> Sequence[GrantedQuota]:
+        """
+        Check and consume the quotas of all requests with a Lua script that
+        sums up the windows and increments the counters on the Redis server,
+        with one round trip per shard.
+
+        The windows of a prefix are stored in the shard of the prefix. On
+        Redis Cluster every shard is a separate script call, and a request
+        whose quotas are stored in several shards (e.g. a per-org quota and a
+        global quota) may be granted less by a later shard than by an earlier
+        one. The difference is then given back to the earlier shards, so
+        requests are never granted more than their quotas allow, but later
+        requests of the same batch may be granted less than they could have.
+        """
+        if timestamp is None:
+            timestamp = int(time())
+        else:
+            timestamp = int(timestamp)
+
+        # All windows can be passed to a single script call on a single Redis
+        # server, on Redis Cluster they are grouped by hash slot.
+        is_cluster = isinstance(self.client, RedisCluster)
+
+        # (prefix, quota) -> (call, window index in the call)
+        windows: Dict[Tuple[str, Quota], Tuple[int, int]] = {}
+        calls: Dict[int, _ScriptCall] = {}
+        # The window of every quota of every request, in the order of the quotas.
+        request_windows: List[List[Tuple[int, int]]] = []
+
+        for index, request in enumerate(requests):
+            assert request.quotas
+
+            quota_windows = []
+            for quota in request.quotas:
+                prefix = quota.prefix_override or request.prefix
+                window = windows.get((prefix, quota))
+                if window is None:
+                    keys = [
+                        self._build_bulk_redis_key(prefix, quota, granule)
+                        for granule in quota.iter_window(timestamp)
+                    ]
+                    call_id = zlib.crc32(prefix.encode("utf-8")) % self.shards if is_cluster else 0
+                    call = calls.setdefault(call_id, _ScriptCall())
+                    window = windows[(prefix, quota)] = (call_id, call.add_window(keys, quota))
+                quota_windows.append(window)
+
+            request_windows.append(quota_windows)
+            for call_id, window in quota_windows:
+                call_windows = calls[call_id].requests.setdefault(index, [])
+                if window not in call_windows:
+                    call_windows.append(window)
+
+        granted = [request.requested for request in requests]
+        # (call, window index in the call, request index) -> remaining quota
+        remaining: Dict[Tuple[int, int, int], int] = {}
+        # (call, request index) -> quota consumed by the request in the call
+        consumed: Dict[Tuple[int, int], int] = {}
+
+        # Calls shared by most requests (those of global quotas) go first and
+        # every call is capped by what earlier calls granted, so that few
+        # requests need to give back quota.
+        for call_id, call in sorted(calls.items(), key=lambda item: -len(item[1].requests)):
+            rv = iter(check_and_use_quotas_script(self.client, call.keys, call.get_args(granted)))
+            for index, call_windows in call.requests.items():
+                granted[index] = consumed[(call_id, index)] = int(next(rv))
+                for window in call_windows:
+                    remaining[(call_id, window, index)] = int(next(rv))
+
+        refunds: MutableMapping[str, int] = {}
+        for (call_id, index), amount in consumed.items():
+            if amount > granted[index]:
+                for window in calls[call_id].requests[index]:
+                    key = calls[call_id].get_counter_key(window)
+                    refunds[key] = refunds.get(key, 0) + amount - granted[index]
+
+        if refunds:
+            with self.client.pipeline(transaction=False) as pipeline:
+                for key, amount in refunds.items():
+                    pipeline.decrby(key, amount)
+                pipeline.execute()
+
+        results = []
+        for index, request in enumerate(requests):
+            # Same as `check_within_quotas` of the Redis implementation.
+            granted_quota = request.requested
+            reached_quotas = []
+            for quota, (call_id, window) in zip(request.quotas, request_windows[index]):
+                remaining_quota = remaining[(call_id, window, index)]
+                if remaining_quota < granted_quota:
+                    granted_quota = remaining_quota
+                    reached_quotas.append(quota)
+
+            results.append(
+                GrantedQuota(
+                    prefix=request.prefix,
+                    granted=granted_quota,
+                    reached_quotas=reached_quotas,
+                )
+            )
+
+        return results
+
+
+class QuotaLease:
+    """
+    Spends quota that was granted to this process in advance, so that most
+    requests do not need to go to the rate limiter at all.
+
+    When the local budget of a request runs out, `size` more than the request
+    needs is taken from the rate limiter (with `bulk_check_and_use_quotas`)
+    and kept for `ttl_seconds`. Quota that is not spent within that time is
+    dropped, but stays consumed in the rate limiter: every process can
+    over-count the usage of a prefix by up to `size` per `ttl_seconds`, but
+    never grants more than the quotas allow.
+
+    Unlike `check_within_quotas`, quota is consumed right away.
+    """
+
+    def __init__(self, rate_limiter: SlidingWindowRateLimiter, size: int, ttl_seconds: int) -> None:
+        self.rate_limiter = rate_limiter
+        self.size = size
+        self.ttl_seconds = ttl_seconds
+        # (prefix, quotas) -> (remaining budget, expiry timestamp)
+        self._budgets: Dict[Tuple[str, Tuple[Quota, ...]], Tuple[int, Timestamp]] = {}
+        self._lock = threading.Lock()
+
+    def check_and_use_quotas(
+        self, requests: Sequence[RequestedQuota], timestamp: Optional[Timestamp] = None
+    ) -> Sequence[GrantedQuota]:
+        if timestamp is None:
+            timestamp = int(time())
+        else:
+            timestamp = int(timestamp)
+
+        results: List[Optional[GrantedQuota]] = [None] * len(requests)
+        # (prefix, quotas) -> indexes of the requests that need more budget
+        refills: Dict[Tuple[str, Tuple[Quota, ...]], List[int]] = {}
+
+        with self._lock:
+            for index, request in enumerate(requests):
+                budget_key = (request.prefix, tuple(request.quotas))
+                budget = self._get_budget(budget_key, timestamp)
+                if budget_key not in refills and 0 < request.requested <= budget:
+                    self._budgets[budget_key] = (
+                        budget - request.requested,
+                        self._budgets[budget_key][1],
+                    )
+                    results[index] = GrantedQuota(
+                        prefix=request.prefix, granted=request.requested, reached_quotas=[]
+                    )
+                else:
+                    refills.setdefault(budget_key, []).append(index)
+
+            if refills:
+                refill_requests = []
+                for (prefix, quotas), indexes in refills.items():
+                    needed = sum(requests[index].requested for index in indexes)
+                    budget = self._get_budget((prefix, quotas), timestamp)
+                    refill_requests.append(
+                        RequestedQuota(
+                            prefix=prefix,
+                            requested=needed - budget + self.size,
+                            quotas=quotas,
+                        )
+                    )
+
+                grants = self.rate_limiter.bulk_check_and_use_quotas(refill_requests, timestamp)
+                metrics.incr("ratelimits.sliding_window.lease.refill", amount=len(refill_requests))
+
+                self._budgets = {
+                    budget_key: budget
+                    for budget_key, budget in self._budgets.items()
+                    if budget[1] > timestamp
+                }
+                for (budget_key, indexes), grant in zip(refills.items(), grants):
+                    budget = self._get_budget(budget_key, timestamp) + grant.granted
+                    for index in indexes:
+                        request = requests[index]
+                        granted = min(budget, request.requested)
+                        budget -= granted
+                        results[index] = GrantedQuota(
+                            prefix=request.prefix,
+                            granted=granted,
+                            reached_quotas=grant.reached_quotas
+                            if granted < request.requested
+                            else [],
+                        )
+                    self._budgets[budget_key] = (budget, timestamp + self.ttl_seconds)
+
+        return results  # type: ignore[return-value]
+
+    def _get_budget(self, budget_key: Tuple[str, Tuple[Quota, ...]], timestamp: Timestamp) -> int:
+        budget = self._budgets.get(budget_key)
+        if budget is None or budget[1] <= timestamp:
+            return 0
+        return budget[0]
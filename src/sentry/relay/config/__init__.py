@@ -10,6 +10,7 @@ from typing import (
     Mapping,
     MutableMapping,
     Optional,
+    OrderedDict,
     Sequence,
     TypedDict,
     Union,
@@ -23,6 +24,9 @@ from sentry import features, killswitches, quotas, utils
 from sentry.constants import HEALTH_CHECK_GLOBS, ObjectStatus
 from sentry.datascrubbing import get_datascrubbing_settings, get_pii_config
 from sentry.dynamic_sampling import generate_rules
+from sentry.dynamic_sampling.rules.biases.base import Bias
+from sentry.dynamic_sampling.rules.combine import get_relay_biases_combinator
+from sentry.dynamic_sampling.rules.utils import RuleType
 from sentry.grouping.api import get_grouping_config_dict_for_project
 from sentry.ingest.inbound_filters import (
     FilterStatKeys,
@@ -38,7 +42,7 @@ from sentry.ingest.transaction_clusterer.rules import (
     get_sorted_rules,
 )
 from sentry.interfaces.security import DEFAULT_DISALLOWED_SOURCES
-from sentry.models import Project, ProjectKey
+from sentry.models import Organization, Project, ProjectKey, ProjectKeyStatus
 from sentry.relay.config.metric_extraction import (
     get_metric_conditional_tagging_rules,
     get_metric_extraction_config,
@@ -71,11 +75,64 @@ MIN_CLUSTERER_RUNS = 10
 logger = logging.getLogger(__name__)
 
 
-def get_exposed_features(project: Project) -> Sequence[str]:
+class OrganizationConfigValues:
+    """
+    The parts of project configs that only depend on the organization. Computing them once
+    lets `get_project_key_configs` share them across all projects of an organization.
+    """
+
+    def __init__(self, organization: Organization) -> None:
+        self.organization = organization
+        self.features: Dict[str, bool] = {}
+        self.trusted_relays = [
+            r["public_key"] for r in organization.get_option("sentry:trusted-relays", []) if r
+        ]
+        self.event_retention = quotas.backend.get_event_retention(organization)
+
+        # A blended sample rate of None means that the organization has no dynamic sampling
+        # rules, whereas `dynamic_sampling_failed` means that the values couldn't be computed.
+        self.blended_sample_rate: Optional[float] = None
+        self.combined_biases: Optional[OrderedDict[RuleType, Bias]] = None
+        self.dynamic_sampling_failed = False
+        if self.has_feature("organizations:dynamic-sampling"):
+            try:
+                self.blended_sample_rate = quotas.get_blended_sample_rate(  # type:ignore
+                    organization_id=organization.id
+                )
+                if self.blended_sample_rate is not None:
+                    self.combined_biases = get_relay_biases_combinator(
+                        organization
+                    ).get_combined_biases()
+            except Exception:
+                # `generate_rules` computes them again for every project instead
+                logger.error(
+                    "Exception while computing the dynamic sampling values of an organization",
+                    exc_info=True,
+                )
+                self.blended_sample_rate = None
+                self.dynamic_sampling_failed = True
+
+    def has_feature(self, feature: str) -> bool:
+        if feature not in self.features:
+            self.features[feature] = features.has(feature, self.organization)
+        return self.features[feature]
+
+
+def _has_organization_feature(
+    feature: str, project: Project, organization_values: Optional[OrganizationConfigValues]
+) -> bool:
+    if organization_values is not None:
+        return organization_values.has_feature(feature)
+    return features.has(feature, project.organization)
+
+
+def get_exposed_features(
+    project: Project, organization_values: Optional[OrganizationConfigValues] = None
+) -> Sequence[str]:
     active_features = []
     for feature in EXPOSABLE_FEATURES:
         if feature.startswith("organizations:"):
-            has_feature = features.has(feature, project.organization)
+            has_feature = _has_organization_feature(feature, project, organization_values)
         elif feature.startswith("projects:"):
             has_feature = features.has(feature, project)
         else:
@@ -196,11 +253,24 @@ def get_project_config(
             return _get_project_config(project, full_config=full_config, project_keys=project_keys)
 
 
-def get_dynamic_sampling_config(project: Project) -> Optional[Mapping[str, Any]]:
-    if features.has("organizations:dynamic-sampling", project.organization):
+def get_dynamic_sampling_config(
+    project: Project, organization_values: Optional[OrganizationConfigValues] = None
+) -> Optional[Mapping[str, Any]]:
+    if _has_organization_feature("organizations:dynamic-sampling", project, organization_values):
+        if organization_values is None or organization_values.dynamic_sampling_failed:
+            rules = generate_rules(project)
+        elif organization_values.blended_sample_rate is None:
+            # Dynamic sampling rules aren't generated without a blended sample rate
+            rules = []
+        else:
+            rules = generate_rules(
+                project,
+                organization_values.blended_sample_rate,
+                organization_values.combined_biases,
+            )
         # For compatibility reasons we want to return an empty list of old rules. This has been done in order to make
         # old Relays use empty configs which will result in them forwarding sampling decisions to upstream Relays.
-        return {"rules": [], "rulesV2": generate_rules(project)}
+        return {"rules": [], "rulesV2": rules}
 
     return None
 
@@ -220,8 +290,12 @@ class TransactionNameRule(TypedDict):
     redaction: TransactionNameRuleRedaction
 
 
-def get_transaction_names_config(project: Project) -> Optional[Sequence[TransactionNameRule]]:
-    if not features.has("organizations:transaction-name-normalize", project.organization):
+def get_transaction_names_config(
+    project: Project, organization_values: Optional[OrganizationConfigValues] = None
+) -> Optional[Sequence[TransactionNameRule]]:
+    if not _has_organization_feature(
+        "organizations:transaction-name-normalize", project, organization_values
+    ):
         return None
 
     cluster_rules = get_sorted_rules(ClustererNamespace.TRANSACTIONS, project)
@@ -311,8 +385,52 @@ def _should_extract_abnormal_mechanism(project: Project) -> bool:
     )
 
 
+def get_project_key_configs(
+    project: Project,
+    project_keys: Sequence[ProjectKey],
+    organization_values: Optional[OrganizationConfigValues] = None,
+) -> Dict[str, Mapping[str, Any]]:
+    """Constructs the full configs of several keys of a project, by public key.
+
+    Only the public keys and quotas of the configs depend on the key, the rest is computed
+    once for all keys. Pass the `OrganizationConfigValues` of the project's organization to
+    share its organization-level parts with other projects.
+    """
+    with sentry_sdk.push_scope() as scope:
+        scope.set_tag("project", project.id)
+        with metrics.timer("relay.config.get_project_key_configs.duration"):
+            project_config = _get_project_config(
+                project,
+                full_config=True,
+                organization_values=organization_values,
+                with_quotas=False,
+            ).to_dict()
+
+            configs: Dict[str, Mapping[str, Any]] = {}
+            for key in project_keys:
+                if key.status != ProjectKeyStatus.ACTIVE or project_config["disabled"]:
+                    configs[key.public_key] = {"disabled": True}
+                    continue
+
+                config = {**project_config["config"]}
+                with Hub.current.start_span(op="get_all_quotas"):
+                    if quotas_config := get_quotas(project, keys=[key]):
+                        config["quotas"] = quotas_config
+                configs[key.public_key] = {
+                    **project_config,
+                    "publicKeys": get_public_key_configs(project, True, project_keys=[key]),
+                    "config": config,
+                }
+
+            return configs
+
+
 def _get_project_config(
-    project: Project, full_config: bool = True, project_keys: Optional[Sequence[ProjectKey]] = None
+    project: Project,
+    full_config: bool = True,
+    project_keys: Optional[Sequence[ProjectKey]] = None,
+    organization_values: Optional[OrganizationConfigValues] = None,
+    with_quotas: bool = True,
 ) -> "ProjectConfig":
     if project.status != ObjectStatus.ACTIVE:
         return ProjectConfig(project, disabled=True)
@@ -330,7 +448,9 @@ def _get_project_config(
             "publicKeys": public_keys,
             "config": {
                 "allowedDomains": list(get_origins(project)),
-                "trustedRelays": [
+                "trustedRelays": organization_values.trusted_relays
+                if organization_values is not None
+                else [
                     r["public_key"]
                     for r in project.organization.get_option("sentry:trusted-relays", [])
                     if r
@@ -344,19 +464,23 @@ def _get_project_config(
 
     config = cfg["config"]
 
-    if exposed_features := get_exposed_features(project):
+    if exposed_features := get_exposed_features(project, organization_values):
         config["features"] = exposed_features
 
     # NOTE: Omitting dynamicSampling because of a failure increases the number
     # of events forwarded by Relay, because dynamic sampling will stop filtering
     # anything.
-    add_experimental_config(config, "dynamicSampling", get_dynamic_sampling_config, project)
+    add_experimental_config(
+        config, "dynamicSampling", get_dynamic_sampling_config, project, organization_values
+    )
 
     # Limit the number of custom measurements
     add_experimental_config(config, "measurements", get_measurements_config)
 
     # Rules to replace high cardinality transaction names
-    add_experimental_config(config, "txNameRules", get_transaction_names_config, project)
+    add_experimental_config(
+        config, "txNameRules", get_transaction_names_config, project, organization_values
+    )
 
     # Rules to replace high cardinality span descriptions
     add_experimental_config(config, "spanDescriptionRules", get_span_descriptions_config, project)
@@ -372,7 +496,7 @@ def _get_project_config(
 
     config["breakdownsV2"] = project.get_option("sentry:breakdowns")
 
-    if _should_extract_transaction_metrics(project):
+    if _should_extract_transaction_metrics(project, organization_values):
         add_experimental_config(
             config,
             "transactionMetrics",
@@ -390,13 +514,13 @@ def _get_project_config(
 
         add_experimental_config(config, "metricExtraction", get_metric_extraction_config, project)
 
-    if features.has("organizations:metrics-extraction", project.organization):
+    if _has_organization_feature("organizations:metrics-extraction", project, organization_values):
         config["sessionMetrics"] = {
             "version": EXTRACT_ABNORMAL_MECHANISM_VERSION
             if _should_extract_abnormal_mechanism(project)
             else EXTRACT_METRICS_VERSION,
-            "drop": features.has(
-                "organizations:release-health-drop-sessions", project.organization
+            "drop": _has_organization_feature(
+                "organizations:release-health-drop-sessions", project, organization_values
             ),
         }
 
@@ -409,12 +533,17 @@ def _get_project_config(
         if grouping_config is not None:
             config["groupingConfig"] = grouping_config
     with Hub.current.start_span(op="get_event_retention"):
-        event_retention = quotas.backend.get_event_retention(project.organization)
+        event_retention = (
+            organization_values.event_retention
+            if organization_values is not None
+            else quotas.backend.get_event_retention(project.organization)
+        )
         if event_retention is not None:
             config["eventRetention"] = event_retention
-    with Hub.current.start_span(op="get_all_quotas"):
-        if quotas_config := get_quotas(project, keys=project_keys):
-            config["quotas"] = quotas_config
+    if with_quotas:
+        with Hub.current.start_span(op="get_all_quotas"):
+            if quotas_config := get_quotas(project, keys=project_keys):
+                config["quotas"] = quotas_config
 
     return ProjectConfig(project, **cfg)
 
@@ -600,9 +729,11 @@ class TransactionMetricsSettings(TypedDict):
     acceptTransactionNames: TransactionNameStrategy
 
 
-def _should_extract_transaction_metrics(project: Project) -> bool:
-    return features.has(
-        "organizations:transaction-metrics-extraction", project.organization
+def _should_extract_transaction_metrics(
+    project: Project, organization_values: Optional[OrganizationConfigValues] = None
+) -> bool:
+    return _has_organization_feature(
+        "organizations:transaction-metrics-extraction", project, organization_values
     ) and not killswitches.killswitch_matches_context(
         "relay.drop-transaction-metrics", {"project_id": project.id}
     )
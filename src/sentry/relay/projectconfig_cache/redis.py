@@ -14,11 +14,12 @@ logger = logging.getLogger(__name__)
 
 class RedisProjectConfigCache(ProjectConfigCache):
     def __init__(self, **options):
+        # Configs are stored compressed, responses must not be decoded
         cluster_key = options.get("cluster", "default")
-        self.cluster = redis.redis_clusters.get(cluster_key)
+        self.cluster = redis.redis_clusters.get(cluster_key, decode_responses=False)
 
         read_cluster_key = options.get("read_cluster", cluster_key)
-        self.cluster_read = redis.redis_clusters.get(read_cluster_key)
+        self.cluster_read = redis.redis_clusters.get(read_cluster_key, decode_responses=False)
 
         super().__init__(**options)
 
@@ -54,6 +55,16 @@ class RedisProjectConfigCache(ProjectConfigCache):
             "relay.projectconfig_cache.write", amount=sum(return_values), tags={"action": "delete"}
         )
 
+    def exists_many(self, public_keys):
+        public_keys = list(public_keys)
+        # Note: Those are multiple pipelines, one per cluster node
+        with self.cluster_read.pipeline() as p:
+            for public_key in public_keys:
+                p.exists(self.__get_redis_key(public_key))
+            return_values = p.execute()
+
+        return {public_key for public_key, exists in zip(public_keys, return_values) if exists}
+
     def get(self, public_key):
         rv = self.cluster_read.get(self.__get_redis_key(public_key))
         if rv is not None:
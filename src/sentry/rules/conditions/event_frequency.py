@@ -5,7 +5,7 @@ import contextlib
 import logging
 import re
 from datetime import datetime, timedelta
-from typing import Any, Dict, Mapping, Tuple
+from typing import Any, Dict, List, Mapping, Sequence, Set, Tuple
 
 from django import forms
 from django.core.cache import cache
@@ -17,12 +17,14 @@ from sentry.issues.constants import get_issue_tsdb_group_model, get_issue_tsdb_u
 from sentry.receivers.rules import DEFAULT_RULE_LABEL
 from sentry.rules import EventState
 from sentry.rules.conditions.base import EventCondition
+from sentry.tsdb.base import TSDBModel, cluster_windows
 from sentry.types.condition_activity import (
     FREQUENCY_CONDITION_BUCKET_SIZE,
     ConditionActivity,
     round_to_five_minute,
 )
 from sentry.utils import metrics
+from sentry.utils.safe import safe_execute
 from sentry.utils.snuba import options_override
 
 standard_intervals = {
@@ -42,6 +44,13 @@ comparison_intervals = {
     "1w": ("one week", timedelta(days=7)),
     "30d": ("30 days", timedelta(days=30)),
 }
+# The (start, end) range of a single frequency query.
+QueryWindow = Tuple[datetime, datetime]
+
+# Kinds of tsdb queries frequency conditions are answered with.
+QUERY_SUMS = "sums"
+QUERY_DISTINCT_COUNTS = "distinct_counts"
+
 COMPARISON_TYPE_COUNT = "count"
 COMPARISON_TYPE_PERCENT = "percent"
 comparison_types = {
@@ -164,6 +173,10 @@ class BaseEventFrequencyCondition(EventCondition, abc.ABC):
 
     def query(self, event: GroupEvent, start: datetime, end: datetime, environment_id: str) -> int:
         query_result = self.query_hook(event, start, end, environment_id)
+        self.record_query()
+        return query_result
+
+    def record_query(self) -> None:
         metrics.incr(
             "rules.conditions.queried_snuba",
             tags={
@@ -171,7 +184,6 @@ class BaseEventFrequencyCondition(EventCondition, abc.ABC):
                 "is_created_on_project_creation": self.is_guessed_to_be_created_on_project_creation,
             },
         )
-        return query_result
 
     def query_hook(
         self, event: GroupEvent, start: datetime, end: datetime, environment_id: str
@@ -179,30 +191,59 @@ class BaseEventFrequencyCondition(EventCondition, abc.ABC):
         """ """
         raise NotImplementedError  # subclass must implement
 
-    def get_rate(self, event: GroupEvent, interval: str, environment_id: str) -> int:
-        _, duration = self.intervals[interval]
-        end = timezone.now()
-        # For conditions with interval >= 1 hour we don't need to worry about read your writes
-        # consistency. Disable it so that we can scale to more nodes.
-        option_override_cm = contextlib.nullcontext()
-        if duration >= timedelta(hours=1):
-            option_override_cm = options_override({"consistent": False})
-        with option_override_cm:
-            result: int = self.query(event, end - duration, end, environment_id=environment_id)
-            comparison_type = self.get_option("comparisonType", COMPARISON_TYPE_COUNT)
-            if comparison_type == COMPARISON_TYPE_PERCENT:
-                comparison_interval = comparison_intervals[self.get_option("comparisonInterval")][1]
-                comparison_end = end - comparison_interval
-                # TODO: Figure out if there's a way we can do this less frequently. All queries are
-                # automatically cached for 10s. We could consider trying to cache this and the main
-                # query for 20s to reduce the load.
-                comparison_result = self.query(
-                    event, comparison_end - duration, comparison_end, environment_id=environment_id
-                )
-                result = percent_increase(result, comparison_result)
+    def get_tsdb_query(self, event: GroupEvent) -> Tuple[str, TSDBModel] | None:
+        """
+        Returns the kind (`QUERY_SUMS` or `QUERY_DISTINCT_COUNTS`) and model
+        of the tsdb query `query_hook` runs for the group of the event, so
+        that `FrequencyQueryPlanner` can share it with other conditions.
+        Conditions returning ``None`` are evaluated with `passes`.
+        """
+        return None
+
+    def convert_tsdb_result(
+        self, event: GroupEvent, result: int, end: datetime, environment_id: int | None
+    ) -> int:
+        """
+        Converts the result of the tsdb query of `get_tsdb_query` for a window
+        ending at `end` into the result `query_hook` returns.
+        """
+        return result
 
+    def get_query_windows(self, interval: str, end: datetime) -> List[QueryWindow]:
+        """
+        Returns the windows `get_rate` queries for `interval`: the interval
+        ending at `end`, followed by the comparison window when comparing by
+        percent.
+        """
+        _, duration = self.intervals[interval]
+        windows = [(end - duration, end)]
+        comparison_type = self.get_option("comparisonType", COMPARISON_TYPE_COUNT)
+        if comparison_type == COMPARISON_TYPE_PERCENT:
+            comparison_interval = comparison_intervals[self.get_option("comparisonInterval")][1]
+            comparison_end = end - comparison_interval
+            windows.append((comparison_end - duration, comparison_end))
+        return windows
+
+    def get_rate_from_results(self, query_results: Sequence[int]) -> int:
+        """Computes the rate from the results of the windows of `get_query_windows`."""
+        result = query_results[0]
+        if len(query_results) > 1:
+            result = percent_increase(result, query_results[1])
         return result
 
+    def get_rate(self, event: GroupEvent, interval: str, environment_id: str) -> int:
+        _, duration = self.intervals[interval]
+        windows = self.get_query_windows(interval, timezone.now())
+        # TODO: Figure out if there's a way we can do the comparison query less frequently. All
+        # queries are automatically cached for 10s. We could consider trying to cache this and the
+        # main query for 20s to reduce the load.
+        with consistency_override(duration):
+            query_results = [
+                self.query(event, start, end, environment_id=environment_id)
+                for start, end in windows
+            ]
+        return self.get_rate_from_results(query_results)
+
     @property
     def is_guessed_to_be_created_on_project_creation(self) -> bool:
         """
@@ -240,6 +281,9 @@ class EventFrequencyCondition(BaseEventFrequencyCondition):
         )
         return sums[event.group_id]
 
+    def get_tsdb_query(self, event: GroupEvent) -> Tuple[str, TSDBModel] | None:
+        return QUERY_SUMS, get_issue_tsdb_group_model(event.group.issue_category)
+
     def get_preview_aggregate(self) -> Tuple[str, str]:
         return "count", "roundedTime"
 
@@ -264,6 +308,9 @@ class EventUniqueUserFrequencyCondition(BaseEventFrequencyCondition):
         )
         return totals[event.group_id]
 
+    def get_tsdb_query(self, event: GroupEvent) -> Tuple[str, TSDBModel] | None:
+        return QUERY_DISTINCT_COUNTS, get_issue_tsdb_user_group_model(event.group.issue_category)
+
     def get_preview_aggregate(self) -> Tuple[str, str]:
         return "uniq", "user"
 
@@ -336,12 +383,10 @@ class EventFrequencyPercentCondition(BaseEventFrequencyCondition):
             ],
         }
 
-    def query_hook(
-        self, event: GroupEvent, start: datetime, end: datetime, environment_id: str
-    ) -> int:
-        project_id = event.project_id
+    def get_session_count(self, project_id: int, environment_id: int | None, end: datetime) -> int:
+        """Returns the (cached) number of sessions of the project in the hour before `end`."""
         cache_key = f"r.c.spc:{project_id}-{environment_id}"
-        session_count_last_hour = cache.get(cache_key)
+        session_count_last_hour: int | None = cache.get(cache_key)
         if session_count_last_hour is None:
             with options_override({"consistent": False}):
                 session_count_last_hour = release_health.get_project_sessions_count(  # type: ignore
@@ -353,13 +398,32 @@ class EventFrequencyPercentCondition(BaseEventFrequencyCondition):
                 )
 
             cache.set(cache_key, session_count_last_hour, 600)
+        return session_count_last_hour  # type: ignore
 
-        if session_count_last_hour >= MIN_SESSIONS_TO_FIRE:
-            interval_in_minutes = (
-                percent_intervals[self.get_option("interval")][1].total_seconds() // 60
+    def get_percent(self, project_id: int, issue_count: int, session_count_last_hour: int) -> int:
+        interval_in_minutes = (
+            percent_intervals[self.get_option("interval")][1].total_seconds() // 60
+        )
+        avg_sessions_in_interval = session_count_last_hour / (60 / interval_in_minutes)
+        if issue_count > avg_sessions_in_interval:
+            # We want to better understand when and why this is happening, so we're logging it for now
+            self.logger.info(
+                "EventFrequencyPercentCondition.query_hook",
+                extra={
+                    "issue_count": issue_count,
+                    "project_id": project_id,
+                    "avg_sessions_in_interval": avg_sessions_in_interval,
+                },
             )
-            avg_sessions_in_interval = session_count_last_hour / (60 / interval_in_minutes)
+        percent: int = 100 * round(issue_count / avg_sessions_in_interval, 4)
+        return percent
 
+    def query_hook(
+        self, event: GroupEvent, start: datetime, end: datetime, environment_id: str
+    ) -> int:
+        project_id = event.project_id
+        session_count_last_hour = self.get_session_count(project_id, environment_id, end)  # type: ignore
+        if session_count_last_hour >= MIN_SESSIONS_TO_FIRE:
             issue_count = self.tsdb.get_sums(
                 model=get_issue_tsdb_group_model(event.group.issue_category),
                 keys=[event.group_id],
@@ -371,19 +435,19 @@ class EventFrequencyPercentCondition(BaseEventFrequencyCondition):
                 tenant_ids={"organization_id": event.group.project.organization_id},
                 referrer_suffix="alert_event_frequency_percent",
             )[event.group_id]
-            if issue_count > avg_sessions_in_interval:
-                # We want to better understand when and why this is happening, so we're logging it for now
-                self.logger.info(
-                    "EventFrequencyPercentCondition.query_hook",
-                    extra={
-                        "issue_count": issue_count,
-                        "project_id": project_id,
-                        "avg_sessions_in_interval": avg_sessions_in_interval,
-                    },
-                )
-            percent: int = 100 * round(issue_count / avg_sessions_in_interval, 4)
-            return percent
+            return self.get_percent(project_id, issue_count, session_count_last_hour)
+
+        return 0
 
+    def get_tsdb_query(self, event: GroupEvent) -> Tuple[str, TSDBModel] | None:
+        return QUERY_SUMS, get_issue_tsdb_group_model(event.group.issue_category)
+
+    def convert_tsdb_result(
+        self, event: GroupEvent, result: int, end: datetime, environment_id: int | None
+    ) -> int:
+        session_count_last_hour = self.get_session_count(event.project_id, environment_id, end)
+        if session_count_last_hour >= MIN_SESSIONS_TO_FIRE:
+            return self.get_percent(event.project_id, result, session_count_last_hour)
         return 0
 
     def passes_activity_frequency(
@@ -392,6 +456,154 @@ class EventFrequencyPercentCondition(BaseEventFrequencyCondition):
         raise NotImplementedError
 
 
+def consistency_override(duration: timedelta) -> contextlib.AbstractContextManager[Any]:
+    # For conditions with interval >= 1 hour we don't need to worry about read your writes
+    # consistency. Disable it so that we can scale to more nodes.
+    if duration >= timedelta(hours=1):
+        return options_override({"consistent": False})
+    return contextlib.nullcontext()
+
+
+class FrequencyQueryPlanner:
+    """
+    Evaluates the frequency conditions of all rules for a single event.
+
+    Conditions are first added with `add`, which records the windows and
+    environments they need. `execute` then queries tsdb once per query kind,
+    model and group of overlapping windows for the group of the event,
+    covering every window needed by any condition, so conditions (and rules)
+    asking for the same window share its result. The number of tsdb calls per
+    event no longer depends on the number of rules and intervals.
+
+    Conditions that don't describe their tsdb query are not planned, callers
+    evaluate them on their own with `passes`. A failed query only fails the
+    conditions that need it.
+    """
+
+    def __init__(self, event: GroupEvent) -> None:
+        self.event = event
+        self.end = timezone.now()
+        # (query kind, model) -> (environment id, window) -> result
+        self._results: Dict[
+            Tuple[str, TSDBModel], Dict[Tuple[int | None, QueryWindow], int | None]
+        ] = {}
+        self._tsdb: Dict[Tuple[str, TSDBModel], Any] = {}
+        self._failed: Set[Tuple[str, TSDBModel]] = set()
+        self._pending: List[
+            Tuple[BaseEventFrequencyCondition, float, Tuple[str, TSDBModel], List[QueryWindow]]
+        ] = []
+        self._passes: Dict[int, bool] = {}
+
+    def add(self, condition: BaseEventFrequencyCondition) -> bool:
+        """
+        Plans the query of `condition`. Returns whether it was planned, conditions that
+        aren't have to be evaluated with `passes`.
+        """
+        interval, value = condition._get_options()
+        if not (interval and value is not None):
+            self._passes[id(condition)] = False
+            return True
+
+        query = condition.get_tsdb_query(self.event)
+        if query is None:
+            return False
+
+        # TODO(mgaeta): Bug: Rule is optional.
+        environment_id = condition.rule.environment_id  # type: ignore
+        windows = condition.get_query_windows(interval, self.end)
+        results = self._results.setdefault(query, {})
+        for window in windows:
+            results.setdefault((environment_id, window), None)
+        self._tsdb.setdefault(query, condition.tsdb)
+        self._pending.append((condition, value, query, windows))
+        return True
+
+    def execute(self) -> None:
+        for query, results in self._results.items():
+            if safe_execute(self._query, query, results, _with_transaction=False) is None:
+                self._failed.add(query)
+
+        for condition, value, query, windows in self._pending:
+            if query in self._failed:
+                self._passes[id(condition)] = False
+                continue
+            self._passes[id(condition)] = bool(
+                safe_execute(
+                    self._evaluate, condition, value, query, windows, _with_transaction=False
+                )
+            )
+        self._pending.clear()
+
+    def _query(
+        self,
+        query: Tuple[str, TSDBModel],
+        results: Dict[Tuple[int | None, QueryWindow], int | None],
+    ) -> bool:
+        needs = [need for need, result in results.items() if result is None]
+        if not needs:
+            return True
+
+        kind, model = query
+        tsdb_ = self._tsdb[query]
+        if kind == QUERY_SUMS:
+            get_multi_window = tsdb_.get_sums_multi_window
+            referrer_suffix = "alert_event_frequency"
+        else:
+            get_multi_window = tsdb_.get_distinct_counts_totals_multi_window
+            referrer_suffix = "alert_event_uniq_user_frequency"
+
+        group_id = self.event.group_id
+        windows = [window for _, window in needs]
+        # Disjoint windows (e.g. "compared to 30 days ago") are queried
+        # separately, so that neither the scanned range nor the consistency of
+        # short windows carries over to the others.
+        for cluster in cluster_windows(windows):
+            cluster_needs = [needs[index] for index in cluster]
+            cluster_windows_ = [window for _, window in cluster_needs]
+            with consistency_override(min(end - start for start, end in cluster_windows_)):
+                window_results = get_multi_window(
+                    model=model,
+                    keys=[group_id],
+                    windows=cluster_windows_,
+                    environment_ids=[environment_id for environment_id, _ in cluster_needs],
+                    use_cache=True,
+                    jitter_value=group_id,
+                    tenant_ids={"organization_id": self.event.group.project.organization_id},
+                    referrer_suffix=referrer_suffix,
+                )
+            for need, window_result in zip(cluster_needs, window_results):
+                results[need] = window_result[group_id]
+        metrics.timing(
+            "rules.conditions.frequency_planner.windows", len(needs), tags={"kind": kind}
+        )
+        return True
+
+    def _evaluate(
+        self,
+        condition: BaseEventFrequencyCondition,
+        value: float,
+        query: Tuple[str, TSDBModel],
+        windows: Sequence[QueryWindow],
+    ) -> bool:
+        # TODO(mgaeta): Bug: Rule is optional.
+        environment_id = condition.rule.environment_id  # type: ignore
+        query_results = [
+            condition.convert_tsdb_result(
+                self.event,
+                self._results[query][(environment_id, window)],  # type: ignore
+                window[1],
+                environment_id,
+            )
+            for window in windows
+        ]
+        condition.record_query()
+        current_value = condition.get_rate_from_results(query_results)
+        return current_value > value
+
+    def passes(self, condition: BaseEventFrequencyCondition) -> bool:
+        return self._passes.get(id(condition), False)
+
+
 def bucket_count(start: datetime, end: datetime, buckets: Dict[datetime, int]) -> int:
     rounded_end = round_to_five_minute(end)
     rounded_start = round_to_five_minute(start)
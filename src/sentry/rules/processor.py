@@ -1,24 +1,35 @@
 from __future__ import annotations
 
 import logging
-from datetime import timedelta
+from datetime import datetime, timedelta
 from random import randrange
-from typing import Any, Callable, Iterable, List, Mapping, MutableMapping, Sequence, Set, Tuple
+from typing import Callable, Iterable, List, Mapping, MutableMapping, Optional, Sequence, Set, Tuple
 
 from django.core.cache import cache
 from django.utils import timezone
 
 from sentry import analytics
 from sentry.eventstore.models import GroupEvent
-from sentry.models import Environment, GroupRuleStatus, Rule
+from sentry.models import Environment, GroupRuleStatus, Project, Rule
 from sentry.models.rulesnooze import RuleSnooze
-from sentry.rules import EventState, history, rules
+from sentry.rules import EventState, RuleBase, history, rules
+from sentry.rules.conditions.event_frequency import (
+    BaseEventFrequencyCondition,
+    FrequencyQueryPlanner,
+)
+from sentry.rules.registry import RuleRegistry
 from sentry.types.rules import RuleFuture
-from sentry.utils.hashlib import hash_values
+from sentry.utils import json, metrics
+from sentry.utils.hashlib import hash_values, md5_text
+from sentry.utils.lru import LRUCache
 from sentry.utils.safe import safe_execute
 
 SLOW_CONDITION_MATCHES = ["event_frequency"]
 
+# Number of projects whose compiled rules are kept in memory, and for how long.
+COMPILED_RULES_CACHE_SIZE = 1000
+COMPILED_RULES_CACHE_TTL = 600
+
 
 def get_match_function(match_name: str) -> Callable[..., bool] | None:
     if match_name == "all":
@@ -37,6 +48,71 @@ def is_condition_slow(condition: Mapping[str, str]) -> bool:
     return False
 
 
+class CompiledRule:
+    """
+    The filters and conditions of a rule, instantiated once so that they can
+    be evaluated against many events. Conditions are ordered so that cheap
+    ones run first, followed by the slow ones that need to be evaluated
+    (which are batched by `RuleProcessor`).
+
+    Unregistered filters and conditions are kept as ``None`` and never pass.
+    """
+
+    def __init__(self, rule: Rule, project: Project, registry: RuleRegistry) -> None:
+        self.rule = rule
+        self.filter_match = rule.data.get("filter_match") or Rule.DEFAULT_FILTER_MATCH
+        self.condition_match = rule.data.get("action_match") or Rule.DEFAULT_CONDITION_MATCH
+        self.frequency = rule.data.get("frequency") or Rule.DEFAULT_FREQUENCY
+
+        self.filters: List[Optional[RuleBase]] = []
+        self.conditions: List[Optional[RuleBase]] = []
+        self.slow_conditions: List[Optional[RuleBase]] = []
+        for rule_cond in rule.data.get("conditions", ()):
+            condition_cls = registry.get(rule_cond["id"])
+            if condition_cls is None:
+                RuleProcessor.logger.warning("Unregistered condition or filter %r", rule_cond["id"])
+                self.filters.append(None)
+            elif condition_cls.rule_type != "condition/event":
+                self.filters.append(condition_cls(project, data=rule_cond, rule=rule))
+            elif is_condition_slow(rule_cond):
+                self.slow_conditions.append(condition_cls(project, data=rule_cond, rule=rule))
+            else:
+                self.conditions.append(condition_cls(project, data=rule_cond, rule=rule))
+
+
+class CompiledRules:
+    def __init__(self, rules_: Sequence[Rule], project: Project, registry: RuleRegistry) -> None:
+        self.rules = {rule.id: CompiledRule(rule, project, registry) for rule in rules_}
+
+
+_compiled_rules: LRUCache[Tuple[int, str], CompiledRules] = LRUCache(
+    max_weight=COMPILED_RULES_CACHE_SIZE, ttl=COMPILED_RULES_CACHE_TTL
+)
+
+
+def get_rules_revision(rules_: Sequence[Rule]) -> str:
+    """Returns a digest of everything the compiled versions of the rules depend on."""
+    return md5_text(
+        json.dumps(
+            [[rule.id, rule.label, rule.environment_id, rule.data] for rule in rules_],
+        )
+    ).hexdigest()
+
+
+def get_compiled_rules(project: Project, rules_: Sequence[Rule]) -> CompiledRules:
+    """
+    Returns the compiled rules of a project, which are cached by the revision
+    of its rules.
+    """
+    key = (project.id, get_rules_revision(rules_))
+    compiled = _compiled_rules.get(key)
+    if compiled is None:
+        metrics.incr("rules.processor.compile")
+        compiled = CompiledRules(rules_, project, rules)
+        _compiled_rules.set(key, compiled)
+    return compiled
+
+
 class RuleProcessor:
     logger = logging.getLogger("sentry.rules")
 
@@ -127,29 +203,13 @@ class RuleProcessor:
 
         return rule_statuses
 
-    def condition_matches(
-        self, condition: Mapping[str, Any], state: EventState, rule: Rule
-    ) -> bool | None:
-        condition_cls = rules.get(condition["id"])
-        if condition_cls is None:
-            self.logger.warning("Unregistered condition %r", condition["id"])
+    def condition_matches(self, condition: Optional[RuleBase], state: EventState) -> bool | None:
+        if condition is None:
             return None
 
-        condition_inst = condition_cls(self.project, data=condition, rule=rule)
-        passes: bool = safe_execute(
-            condition_inst.passes, self.event, state, _with_transaction=False
-        )
+        passes: bool = safe_execute(condition.passes, self.event, state, _with_transaction=False)
         return passes
 
-    def get_rule_type(self, condition: Mapping[str, Any]) -> str | None:
-        rule_cls = rules.get(condition["id"])
-        if rule_cls is None:
-            self.logger.warning("Unregistered condition or filter %r", condition["id"])
-            return None
-
-        rule_type: str = rule_cls.rule_type
-        return rule_type
-
     def get_state(self) -> EventState:
         return EventState(
             is_new=self.is_new,
@@ -158,65 +218,98 @@ class RuleProcessor:
             has_reappeared=self.has_reappeared,
         )
 
-    def apply_rule(self, rule: Rule, status: GroupRuleStatus) -> None:
+    def match_predicates(
+        self,
+        compiled: CompiledRule,
+        predicates: Iterable[bool | None],
+        match: str,
+        name: str,
+    ) -> bool:
+        predicate_func = get_match_function(match)
+        if predicate_func is None:
+            self.logger.error(f"Unsupported {name}_match {match!r} for rule {compiled.rule.id}")
+            return False
+        return predicate_func(predicates)
+
+    def evaluate_rule(self, compiled: CompiledRule, state: EventState) -> bool | None:
         """
-        If all conditions and filters pass, execute every action.
-
-        :param rule: `Rule` object
-        :return: void
+        Evaluates the filters and cheap conditions of a rule. Returns whether
+        the rule passes, or ``None`` if that depends on its slow conditions.
         """
-        condition_match = rule.data.get("action_match") or Rule.DEFAULT_CONDITION_MATCH
-        filter_match = rule.data.get("filter_match") or Rule.DEFAULT_FILTER_MATCH
-        rule_condition_list = rule.data.get("conditions", ())
-        frequency = rule.data.get("frequency") or Rule.DEFAULT_FREQUENCY
-
-        try:
-            environment = self.event.get_environment()
-        except Environment.DoesNotExist:
-            return
-
-        if rule.environment_id is not None and environment.id != rule.environment_id:
-            return
-
-        now = timezone.now()
-        freq_offset = now - timedelta(minutes=frequency)
-        if status.last_active and status.last_active > freq_offset:
-            return
-
-        state = self.get_state()
-
-        condition_list = []
-        filter_list = []
-        for rule_cond in rule_condition_list:
-            if self.get_rule_type(rule_cond) == "condition/event":
-                condition_list.append(rule_cond)
-            else:
-                filter_list.append(rule_cond)
+        if compiled.filters and not self.match_predicates(
+            compiled,
+            (self.condition_matches(f, state) for f in compiled.filters),
+            compiled.filter_match,
+            "filter",
+        ):
+            return False
+
+        if not compiled.slow_conditions:
+            if not compiled.conditions:
+                return True
+            return self.match_predicates(
+                compiled,
+                (self.condition_matches(c, state) for c in compiled.conditions),
+                compiled.condition_match,
+                "condition",
+            )
 
-        # Sort `condition_list` so that most expensive conditions run last.
-        condition_list.sort(key=lambda condition: is_condition_slow(condition))
+        match = compiled.condition_match
+        if get_match_function(match) is None:
+            return self.match_predicates(compiled, (), match, "condition")
+
+        # `all` is decided by the first failing condition, `any` and `none` by the first passing
+        # one. Only rules that aren't decided by their cheap conditions need the slow ones.
+        decided_by = match != "all"
+        for condition in compiled.conditions:
+            if bool(self.condition_matches(condition, state)) == decided_by:
+                return match == "any"
+        return None
+
+    def evaluate_slow_conditions(
+        self, pending: Sequence[CompiledRule], state: EventState
+    ) -> List[bool]:
+        """
+        Evaluates the slow conditions of the rules that weren't decided by
+        their cheap conditions. All frequency conditions are planned together
+        with a `FrequencyQueryPlanner`, which answers them with one tsdb call
+        per model for the group.
+        """
+        planner = FrequencyQueryPlanner(self.event)
+        planned = set()
+        for compiled in pending:
+            for condition in compiled.slow_conditions:
+                if isinstance(condition, BaseEventFrequencyCondition) and planner.add(condition):
+                    planned.add(id(condition))
+        planner.execute()
+
+        def slow_matches(condition: Optional[RuleBase]) -> bool | None:
+            if id(condition) in planned:
+                return planner.passes(condition)  # type: ignore[arg-type]
+            return self.condition_matches(condition, state)
+
+        return [
+            self.match_predicates(
+                compiled,
+                (slow_matches(condition) for condition in compiled.slow_conditions),
+                compiled.condition_match,
+                "condition",
+            )
+            for compiled in pending
+        ]
 
-        for predicate_list, match, name in (
-            (filter_list, filter_match, "filter"),
-            (condition_list, condition_match, "condition"),
-        ):
-            if not predicate_list:
-                continue
-            predicate_iter = (self.condition_matches(f, state, rule) for f in predicate_list)
-            predicate_func = get_match_function(match)
-            if predicate_func:
-                if not predicate_func(predicate_iter):
-                    return
-            else:
-                self.logger.error(
-                    f"Unsupported {name}_match {match!r} for rule {rule.id}", filter_match, rule.id
-                )
-                return
+    def apply_rule(self, rule: Rule, status: GroupRuleStatus, freq_offset: datetime) -> None:
+        """
+        Fire a rule whose conditions and filters passed, and execute every
+        action.
 
+        :param rule: `Rule` object
+        :return: void
+        """
         updated = (
             GroupRuleStatus.objects.filter(id=status.id)
             .exclude(last_active__gt=freq_offset)
-            .update(last_active=now)
+            .update(last_active=timezone.now())
         )
 
         if not updated:
@@ -268,12 +361,52 @@ class RuleProcessor:
 
         self.grouped_futures.clear()
         rules = self.get_rules()
-        snoozed_rules = RuleSnooze.objects.filter(rule__in=rules, user_id=None).values_list(
-            "rule", flat=True
+        if not rules:
+            return self.grouped_futures.values()
+
+        try:
+            environment = self.event.get_environment()
+        except Environment.DoesNotExist:
+            return self.grouped_futures.values()
+
+        snoozed_rules = set(
+            RuleSnooze.objects.filter(rule__in=rules, user_id=None).values_list("rule", flat=True)
         )
         rule_statuses = self.bulk_get_rule_status(rules)
+        compiled_rules = get_compiled_rules(self.project, rules)
+        state = self.get_state()
+        now = timezone.now()
+
+        # Rules are evaluated in two passes: cheap filters and conditions decide most rules, then
+        # the slow conditions of the remaining ones are evaluated together. Rules still fire in
+        # their original order.
+        candidates: List[Tuple[Rule, CompiledRule, bool | None]] = []
+        pending: List[CompiledRule] = []
         for rule in rules:
-            if rule.id not in snoozed_rules:
-                self.apply_rule(rule, rule_statuses[rule.id])
+            if rule.id in snoozed_rules:
+                continue
+            if rule.environment_id is not None and environment.id != rule.environment_id:
+                continue
+
+            compiled = compiled_rules.rules[rule.id]
+            freq_offset = now - timedelta(minutes=compiled.frequency)
+            status = rule_statuses[rule.id]
+            if status.last_active and status.last_active > freq_offset:
+                continue
+
+            passes = self.evaluate_rule(compiled, state)
+            if passes is None:
+                pending.append(compiled)
+            candidates.append((rule, compiled, passes))
+
+        slow_results = dict(zip(map(id, pending), self.evaluate_slow_conditions(pending, state)))
+        metrics.timing("rules.processor.slow_rules", len(pending))
+
+        for rule, compiled, passes in candidates:
+            if passes is None:
+                passes = slow_results[id(compiled)]
+            if passes:
+                freq_offset = now - timedelta(minutes=compiled.frequency)
+                self.apply_rule(rule, rule_statuses[rule.id], freq_offset)
 
         return self.grouped_futures.values()
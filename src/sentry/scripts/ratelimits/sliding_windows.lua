@@ -0,0 +1,90 @@
+-- Checks and consumes sliding window quotas for a batch of requests.
+--
+-- Every window is the set of granule keys of one quota for one prefix,
+-- starting with the granule that requests are counted in. All windows passed
+-- to a single invocation must be stored in the same hash slot.
+--
+-- Requests are processed in order, so requests that share a window see the
+-- quota consumed by earlier requests of the same batch.
+--
+-- Input:
+-- keys:
+--  the granule keys of every window, back to back
+-- args:
+--  window_count,
+--  (granule_count, limit, ttl_seconds) for every window,
+--  request_count,
+--  (requested, request_window_count, window_index...) for every request
+--
+-- Output:
+-- (granted, remaining quota of every window of the request before it was
+-- granted...) for every request
+
+local arg_index = 1
+local function next_arg()
+  local value = tonumber(ARGV[arg_index])
+  arg_index = arg_index + 1
+  return value
+end
+
+local windows = {}
+local key_index = 1
+for w = 1, next_arg() do
+  local granule_count = next_arg()
+  windows[w] = {
+    first = key_index,
+    last = key_index + granule_count - 1,
+    limit = next_arg(),
+    ttl = next_arg(),
+    used = nil,
+    incr = 0,
+  }
+  key_index = key_index + granule_count
+end
+
+-- Windows are only summed up when a request needs them, and afterwards kept
+-- up to date with the quota granted by this script.
+local function get_used(window)
+  if window.used == nil then
+    local used = 0
+    for _, value in ipairs(redis.call("MGET", unpack(KEYS, window.first, window.last))) do
+      used = used + (tonumber(value) or 0)
+    end
+    window.used = used
+  end
+  return window.used
+end
+
+local rv = {}
+for _ = 1, next_arg() do
+  local granted = next_arg()
+  local request_windows = {}
+  for i = 1, next_arg() do
+    request_windows[i] = windows[next_arg()]
+  end
+
+  local remaining = {}
+  for i, window in ipairs(request_windows) do
+    remaining[i] = math.max(0, window.limit - get_used(window))
+    granted = math.min(granted, remaining[i])
+  end
+
+  for _, window in ipairs(request_windows) do
+    window.used = window.used + granted
+    window.incr = window.incr + granted
+  end
+
+  table.insert(rv, granted)
+  for i = 1, #remaining do
+    table.insert(rv, remaining[i])
+  end
+end
+
+for _, window in ipairs(windows) do
+  if window.incr > 0 then
+    redis.call("INCRBY", KEYS[window.first], window.incr)
+    redis.call("EXPIRE", KEYS[window.first], window.ttl)
+  end
+end
+
+return rv
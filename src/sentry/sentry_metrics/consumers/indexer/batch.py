@@ -45,6 +45,21 @@ MAX_TAG_VALUE_LENGTH = 200
 ACCEPTED_METRIC_TYPES = {"s", "c", "d"}  # set, counter, distribution
 MRI_RE_PATTERN = re.compile("^([c|s|d|g|e]):([a-zA-Z0-9_]+)/.*$")
 
+# Strings and brackets of a JSON document, enough to find the top-level members
+# of a message without decoding it.
+JSON_TOKEN_RE = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"|[{}\[\]]')
+JSON_UINT = rb"(?:0|[1-9][0-9]*)"
+JSON_NUMBER = rb"-?%s(?:\.[0-9]+)?(?:[eE][+-]?[0-9]+)?" % JSON_UINT
+JSON_ARRAY = rb"\[\s*(?:%s\s*(?:,\s*%s\s*)*)?\]"
+JSON_NUMBER_ARRAY_RE = re.compile(JSON_ARRAY % (JSON_NUMBER, JSON_NUMBER))
+# Values the ingest schema allows for the metric types passed through as raw bytes: sets are
+# non-negative integers, distributions any numbers.
+RAW_VALUE_RES = {
+    "s": re.compile(JSON_ARRAY % (JSON_UINT, JSON_UINT)),
+    "d": JSON_NUMBER_ARRAY_RE,
+}
+RAW_VALUE_PLACEHOLDER = b'"value":[]'
+
 OrgId = int
 Headers = MutableSequence[Tuple[str, bytes]]
 
@@ -91,6 +106,59 @@ def extract_use_case_id(mri: str) -> UseCaseID:
     raise ValidationError(f"Invalid mri: {mri}")
 
 
+def split_raw_value(payload: bytes) -> Optional[Tuple[bytes, memoryview]]:
+    """
+    Finds the value of a set or distribution metric in a raw ingest message.
+
+    Returns the message with the value replaced by an empty array, and a view
+    of the value in the original message. Returns None if the top-level
+    "value" of the message is not an array of numbers.
+    """
+    depth = 0
+    for token in JSON_TOKEN_RE.finditer(payload):
+        char = payload[token.start()]
+        if char in b"{[":
+            depth += 1
+        elif char in b"}]":
+            depth -= 1
+        elif depth == 1 and token.group() == b'"value"':
+            colon = payload.find(b":", token.end())
+            # Only the key of the member is followed by a colon
+            if colon < 0 or payload[token.end() : colon].strip():
+                continue
+            start = colon + 1
+            while payload[start : start + 1].isspace():
+                start += 1
+            matched = JSON_NUMBER_ARRAY_RE.match(payload, start)
+            if matched is None:
+                return None
+            end = matched.end()
+            return payload[:start] + b"[]" + payload[end:], memoryview(payload)[start:end]
+
+    return None
+
+
+def is_valid_raw_value(metric_type: Optional[str], raw_value: memoryview) -> bool:
+    """
+    Returns whether a value split off by `split_raw_value` is valid for the type of the metric.
+    Values that aren't have to be decoded, so that the schema validation sees them.
+    """
+    pattern = RAW_VALUE_RES.get(metric_type)  # type: ignore[arg-type]
+    return pattern is not None and pattern.fullmatch(raw_value) is not None
+
+
+def splice_raw_value(payload: bytes, raw_value: memoryview) -> bytes:
+    """
+    Puts a value split off by `split_raw_value` back into an encoded output
+    message, in place of the empty array it was decoded as.
+    """
+    # Tags and mapping meta only contain strings and integers, so the only
+    # empty array in the message is the value.
+    head, placeholder, tail = payload.partition(RAW_VALUE_PLACEHOLDER)
+    assert placeholder, "output message has no value placeholder"
+    return b"".join((head, b'"value":', raw_value, tail))
+
+
 class IndexerBatch:
     def __init__(
         self,
@@ -121,6 +189,10 @@ class IndexerBatch:
     def _extract_messages(self) -> None:
         self.skipped_offsets: Set[PartitionIdxOffset] = set()
         self.parsed_payloads_by_offset: MutableMapping[PartitionIdxOffset, ParsedMessage] = {}
+        # Values of set and distribution metrics that are copied to the output
+        # messages as-is. Their parsed payloads hold an empty array instead.
+        self.raw_values_by_offset: MutableMapping[PartitionIdxOffset, memoryview] = {}
+        raw_value_passthrough = options.get("sentry-metrics.indexer.raw-value-passthrough")
 
         for msg in self.outer_message.payload:
             assert isinstance(msg.value, BrokerValue)
@@ -132,9 +204,17 @@ class IndexerBatch:
                 self.skipped_offsets.add(partition_offset)
                 metrics.incr("process_messages.namespace_disabled", tags={"namespace": namespace})
                 continue
+
+            payload_value = msg.payload.value
+            raw_value = None
+            if raw_value_passthrough:
+                split = split_raw_value(payload_value)
+                if split is not None:
+                    payload_value, raw_value = split
+
             try:
                 parsed_payload: ParsedMessage = json.loads(
-                    msg.payload.value.decode("utf-8"), use_rapid_json=True
+                    payload_value.decode("utf-8"), use_rapid_json=True
                 )
             except rapidjson.JSONDecodeError:
                 self.skipped_offsets.add(partition_offset)
@@ -144,6 +224,11 @@ class IndexerBatch:
                     exc_info=True,
                 )
                 continue
+            if raw_value is not None and not is_valid_raw_value(
+                parsed_payload.get("type"), raw_value
+            ):
+                parsed_payload["value"] = json.loads(bytes(raw_value).decode("utf-8"))
+                raw_value = None
             try:
                 if self.__input_codec:
                     self.__input_codec.validate(parsed_payload)
@@ -185,6 +270,8 @@ class IndexerBatch:
             _: IngestMetric = parsed_payload
 
             self.parsed_payloads_by_offset[partition_offset] = parsed_payload
+            if raw_value is not None:
+                self.raw_values_by_offset[partition_offset] = raw_value
 
     @metrics.wraps("process_messages.filter_messages")
     def filter_messages(self, keys_to_remove: Sequence[PartitionIdxOffset]) -> None:
@@ -306,6 +393,7 @@ class IndexerBatch:
             if partition_offset in self.skipped_offsets:
                 continue
             old_payload_value = self.parsed_payloads_by_offset.pop(partition_offset)
+            raw_value = self.raw_values_by_offset.pop(partition_offset, None)
 
             metric_name = old_payload_value["name"]
             org_id = old_payload_value["org_id"]
@@ -461,9 +549,13 @@ class IndexerBatch:
                 }
                 new_payload_value = new_payload_v2
 
+            new_payload_bytes = rapidjson.dumps(new_payload_value).encode()
+            if raw_value is not None:
+                new_payload_bytes = splice_raw_value(new_payload_bytes, raw_value)
+
             kafka_payload = KafkaPayload(
                 key=message.payload.key,
-                value=rapidjson.dumps(new_payload_value).encode(),
+                value=new_payload_bytes,
                 headers=[
                     *message.payload.headers,
                     ("mapping_sources", mapping_header_content),
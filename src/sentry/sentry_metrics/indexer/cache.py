@@ -1,10 +1,11 @@
 import logging
 import random
-from typing import Collection, Mapping, MutableMapping, Optional, Sequence, Set
+from typing import Collection, Dict, Mapping, MutableMapping, Optional, Sequence, Set, Tuple
 
 from django.conf import settings
 from django.core.cache import caches
 
+from sentry import options
 from sentry.sentry_metrics.indexer.base import (
     FetchType,
     OrgId,
@@ -15,15 +16,32 @@ from sentry.sentry_metrics.indexer.base import (
     metric_path_key_compatible_resolve,
     metric_path_key_compatible_rev_resolve,
 )
+from sentry.sentry_metrics.indexer.shared_cache import StringIndexerSharedCache
 from sentry.sentry_metrics.use_case_id_registry import UseCaseID
 from sentry.utils import metrics
 from sentry.utils.hashlib import md5_text
+from sentry.utils.lru import LRUCache
 
 logger = logging.getLogger(__name__)
 
 _INDEXER_CACHE_METRIC = "sentry_metrics.indexer.memcache"
 # only used to compare to the older version of the PGIndexer
 _INDEXER_CACHE_FETCH_METRIC = "sentry_metrics.indexer.memcache.fetch"
+_INDEXER_LOCAL_CACHE_METRIC = "sentry_metrics.indexer.local_cache"
+_INDEXER_SHARED_CACHE_METRIC = "sentry_metrics.indexer.shared_cache"
+
+# Rough size in bytes of an entry of the local cache, on top of its key
+_LOCAL_CACHE_ENTRY_OVERHEAD = 200
+
+# Stored in the local cache for strings that `resolve` found no id for
+_NO_ID = -1
+
+
+def randomize_ttl(cache_ttl: float) -> int:
+    # introduce jitter in the cache_ttl so that when we have large
+    # amount of new keys written into the cache, they don't expire all at once
+    jitter = random.uniform(0, 0.25) * cache_ttl
+    return int(cache_ttl + jitter)
 
 
 class StringIndexerCache:
@@ -34,11 +52,7 @@ class StringIndexerCache:
 
     @property
     def randomized_ttl(self) -> int:
-        # introduce jitter in the cache_ttl so that when we have large
-        # amount of new keys written into the cache, they don't expire all at once
-        cache_ttl = settings.SENTRY_METRICS_INDEXER_CACHE_TTL
-        jitter = random.uniform(0, 0.25) * cache_ttl
-        return int(cache_ttl + jitter)
+        return randomize_ttl(settings.SENTRY_METRICS_INDEXER_CACHE_TTL)
 
     def make_cache_key(self, key: str) -> str:
         use_case_id, org_id, string = key.split(":", 2)
@@ -97,10 +111,147 @@ class StringIndexerCache:
         self.cache.delete_many(cache_keys, version=self.version)
 
 
+class StringIndexerLocalCache:
+    """
+    A per-process tier in front of `StringIndexerCache`, for the hot strings that the indexer
+    sees over and over. Takes the same "use_case_id:org_id:string" keys.
+
+    Every use case gets its own LRU, bounded in bytes by
+    `sentry-metrics.indexer.local-cache.max-bytes` unless overridden in
+    `sentry-metrics.indexer.local-cache.max-bytes-per-use-case`, so that a use case with many
+    strings can't evict the others. A use case with no budget is not cached.
+
+    It can also remember that `resolve` found no id for a string, for
+    `sentry-metrics.indexer.local-cache.negative-ttl` seconds.
+    """
+
+    def __init__(self) -> None:
+        self.caches: Dict[str, LRUCache[str, int]] = {}
+
+    def _get_cache(self, use_case_id: str, max_bytes: int) -> Optional[LRUCache[str, int]]:
+        if not max_bytes:
+            self.caches.pop(use_case_id, None)
+            return None
+
+        cache = self.caches.get(use_case_id)
+        if cache is None or cache.max_weight != max_bytes:
+            cache = self.caches[use_case_id] = LRUCache(max_weight=max_bytes)
+        return cache
+
+    def _get_caches(self, keys: Collection[str]) -> Dict[str, Optional[LRUCache[str, int]]]:
+        """
+        Returns the cache of the use case of every key, or None if the use case isn't cached.
+        """
+        max_bytes = options.get("sentry-metrics.indexer.local-cache.max-bytes")
+        max_bytes_per_use_case = options.get(
+            "sentry-metrics.indexer.local-cache.max-bytes-per-use-case"
+        )
+        return {
+            use_case_id: self._get_cache(
+                use_case_id, max_bytes_per_use_case.get(use_case_id, max_bytes)
+            )
+            for use_case_id in {key.split(":", 1)[0] for key in keys}
+        }
+
+    def _set(self, cache: LRUCache[str, int], key: str, value: int, ttl: float) -> None:
+        evicted = cache.set(key, value, ttl=ttl, weight=len(key) + _LOCAL_CACHE_ENTRY_OVERHEAD)
+        if evicted:
+            metrics.incr(
+                "sentry_metrics.indexer.local_cache.evictions",
+                amount=evicted,
+                tags={"use_case_id": key.split(":", 1)[0]},
+            )
+
+    def get(self, key: str) -> Tuple[bool, Optional[int]]:
+        """
+        Returns whether the key was cached, and its id. A cached key without an id is one that
+        `resolve` didn't find.
+        """
+        cache = self._get_caches([key])[key.split(":", 1)[0]]
+        value = cache.get(key) if cache is not None else None
+        if value is None:
+            return False, None
+        return True, None if value == _NO_ID else value
+
+    def get_many(self, keys: Collection[str]) -> Tuple[Dict[str, int], Sequence[str]]:
+        """
+        Returns the ids of the cached keys, and the keys that need to be looked up elsewhere.
+        Keys cached without an id need to be looked up, since they may be recorded.
+        """
+        caches = self._get_caches(keys)
+        results: Dict[str, int] = {}
+        missing = []
+        for key in keys:
+            cache = caches[key.split(":", 1)[0]]
+            value = cache.get(key) if cache is not None else None
+            if value is None or value == _NO_ID:
+                missing.append(key)
+            else:
+                results[key] = value
+        return results, missing
+
+    def set_many(self, key_values: Mapping[str, Optional[int]]) -> None:
+        caches = self._get_caches(key_values.keys())
+        ttl = randomize_ttl(options.get("sentry-metrics.indexer.local-cache.ttl"))
+        for key, value in key_values.items():
+            cache = caches[key.split(":", 1)[0]]
+            if cache is not None and value is not None:
+                self._set(cache, key, value, ttl)
+
+    def set(self, key: str, value: int) -> None:
+        self.set_many({key: value})
+
+    def set_no_id(self, key: str) -> None:
+        """
+        Remembers that `resolve` found no id for the key, if negative caching is enabled.
+        """
+        negative_ttl = options.get("sentry-metrics.indexer.local-cache.negative-ttl")
+        cache = self._get_caches([key])[key.split(":", 1)[0]]
+        if cache is not None and negative_ttl:
+            self._set(cache, key, _NO_ID, randomize_ttl(negative_ttl))
+
+    def is_enabled(self) -> bool:
+        return bool(
+            options.get("sentry-metrics.indexer.local-cache.max-bytes")
+            or any(
+                options.get("sentry-metrics.indexer.local-cache.max-bytes-per-use-case").values()
+            )
+        )
+
+
+def _incr_local_cache_results(
+    caller: str, hits: int, total: int, metric: str = _INDEXER_LOCAL_CACHE_METRIC
+) -> None:
+    metrics.incr(
+        metric,
+        tags={"cache_hit": "true", "caller": caller},
+        amount=hits,
+    )
+    metrics.incr(
+        metric,
+        tags={"cache_hit": "false", "caller": caller},
+        amount=total - hits,
+    )
+
+
 class CachingIndexer(StringIndexer):
-    def __init__(self, cache: StringIndexerCache, indexer: StringIndexer) -> None:
+    """
+    Looks up ids in an optional per-process cache (`StringIndexerLocalCache`), then in an
+    optional per-host cache (`StringIndexerSharedCache`), then in the shared cache, and finally
+    in the wrapped indexer.
+    """
+
+    def __init__(
+        self,
+        cache: StringIndexerCache,
+        indexer: StringIndexer,
+        local_cache: Optional[StringIndexerLocalCache] = None,
+        shared_cache: Optional[StringIndexerSharedCache] = None,
+    ) -> None:
         self.cache = cache
         self.indexer = indexer
+        self.local_cache = local_cache
+        self.shared_cache = shared_cache
 
     def bulk_record(
         self, strings: Mapping[UseCaseID, Mapping[OrgId, Set[str]]]
@@ -108,7 +259,28 @@ class CachingIndexer(StringIndexer):
         cache_keys = UseCaseKeyCollection(strings)
         metrics.gauge("sentry_metrics.indexer.lookups_per_batch", value=cache_keys.size)
         cache_key_strs = cache_keys.as_strings()
-        cache_results = self.cache.get_many(cache_key_strs)
+
+        local_results: Mapping[str, int] = {}
+        if self.local_cache is not None and self.local_cache.is_enabled():
+            local_results, cache_key_strs = self.local_cache.get_many(cache_key_strs)
+            _incr_local_cache_results("get_many_ids", len(local_results), cache_keys.size)
+
+        shared_results: Mapping[str, int] = {}
+        shared_cache = (
+            self.shared_cache
+            if self.shared_cache is not None and self.shared_cache.is_enabled()
+            else None
+        )
+        if shared_cache is not None and cache_key_strs:
+            total = len(cache_key_strs)
+            shared_results, cache_key_strs = shared_cache.get_many(cache_key_strs)
+            _incr_local_cache_results(
+                "get_many_ids", len(shared_results), total, _INDEXER_SHARED_CACHE_METRIC
+            )
+            if self.local_cache is not None and shared_results:
+                self.local_cache.set_many(shared_results)
+
+        cache_results = self.cache.get_many(cache_key_strs) if cache_key_strs else {}
 
         hits = [k for k, v in cache_results.items() if v is not None]
 
@@ -130,7 +302,22 @@ class CachingIndexer(StringIndexer):
             amount=cache_keys.size,
         )
 
+        if hits:
+            hit_ids = {k: cache_results[k] for k in hits}
+            if self.local_cache is not None:
+                self.local_cache.set_many(hit_ids)
+            if shared_cache is not None:
+                shared_cache.set_many(hit_ids)
+
         cache_key_results = UseCaseKeyResults()
+        cache_key_results.add_use_case_key_results(
+            [UseCaseKeyResult.from_string(k, v) for k, v in local_results.items()],
+            FetchType.CACHE_HIT,
+        )
+        cache_key_results.add_use_case_key_results(
+            [UseCaseKeyResult.from_string(k, v) for k, v in shared_results.items()],
+            FetchType.CACHE_HIT,
+        )
         cache_key_results.add_use_case_key_results(
             [UseCaseKeyResult.from_string(k, v) for k, v in cache_results.items() if v is not None],
             FetchType.CACHE_HIT,
@@ -148,7 +335,12 @@ class CachingIndexer(StringIndexer):
             }
         )
 
-        self.cache.set_many(db_record_key_results.get_mapped_strings_to_ints())
+        db_record_ids = db_record_key_results.get_mapped_strings_to_ints()
+        self.cache.set_many(db_record_ids)
+        if self.local_cache is not None:
+            self.local_cache.set_many(db_record_ids)
+        if shared_cache is not None:
+            shared_cache.set_many(db_record_ids)
 
         return cache_key_results.merge(db_record_key_results)
 
@@ -159,10 +351,40 @@ class CachingIndexer(StringIndexer):
     @metric_path_key_compatible_resolve
     def resolve(self, use_case_id: UseCaseID, org_id: int, string: str) -> Optional[int]:
         key = f"{use_case_id.value}:{org_id}:{string}"
+        local_cache = (
+            self.local_cache
+            if self.local_cache is not None and self.local_cache.is_enabled()
+            else None
+        )
+        if local_cache is not None:
+            cached, local_result = local_cache.get(key)
+            _incr_local_cache_results("resolve", int(cached), 1)
+            if cached:
+                return local_result
+
+        shared_cache = (
+            self.shared_cache
+            if self.shared_cache is not None and self.shared_cache.is_enabled()
+            else None
+        )
+        if shared_cache is not None:
+            result = shared_cache.get(key)
+            _incr_local_cache_results(
+                "resolve", int(result is not None), 1, _INDEXER_SHARED_CACHE_METRIC
+            )
+            if result is not None:
+                if local_cache is not None:
+                    local_cache.set(key, result)
+                return result
+
         result = self.cache.get(key)
 
         if result and isinstance(result, int):
             metrics.incr(_INDEXER_CACHE_METRIC, tags={"cache_hit": "true", "caller": "resolve"})
+            if local_cache is not None:
+                local_cache.set(key, result)
+            if shared_cache is not None:
+                shared_cache.set(key, result)
             return result
 
         metrics.incr(_INDEXER_CACHE_METRIC, tags={"cache_hit": "false", "caller": "resolve"})
@@ -170,6 +392,12 @@ class CachingIndexer(StringIndexer):
 
         if id is not None:
             self.cache.set(key, id)
+            if local_cache is not None:
+                local_cache.set(key, id)
+            if shared_cache is not None:
+                shared_cache.set(key, id)
+        elif local_cache is not None:
+            local_cache.set_no_id(key)
 
         return id
 
@@ -1,12 +1,14 @@
 from __future__ import annotations
 
 import dataclasses
+from time import time
 from typing import Any, Mapping, MutableMapping, Optional, Sequence, Tuple, Union
 
 from sentry import options
 from sentry.ratelimits.sliding_windows import (
     GrantedQuota,
     Quota,
+    QuotaLease,
     RedisSlidingWindowRateLimiter,
     RequestedQuota,
     Timestamp,
@@ -29,6 +31,9 @@ from sentry.utils import metrics
 
 OrgId = int
 
+# Leased quota that isn't spent within this many seconds is dropped, see `QuotaLease`.
+LEASE_TTL_SECONDS = 10
+
 
 def _build_quota_key(namespace: str, org_id: Optional[OrgId] = None) -> str:
     if org_id is not None:
@@ -102,6 +107,7 @@ class RateLimitState:
     _requests: Sequence[RequestedQuota]
     _grants: Sequence[GrantedQuota]
     _timestamp: Timestamp
+    _quotas_used: bool
 
     accepted_keys: UseCaseKeyCollection
     dropped_strings: Sequence[DroppedString]
@@ -114,17 +120,47 @@ class RateLimitState:
         """
         Consumes the rate limits returned by `check_write_limits`.
         """
-        if exc_type is None:
+        if exc_type is None and not self._quotas_used:
             self._writes_limiter.rate_limiter.use_quotas(
                 self._requests, self._grants, self._timestamp
             )
 
 
-class WritesLimiter:
+class _BaseWritesLimiter:
     def __init__(self, namespace: str, **options: Mapping[str, str]) -> None:
         self.namespace = namespace
         self.rate_limiter: RedisSlidingWindowRateLimiter = RedisSlidingWindowRateLimiter(**options)
+        self._lease: Optional[QuotaLease] = None
+
+    def _check_quotas(
+        self, requests: Sequence[RequestedQuota]
+    ) -> Tuple[Timestamp, Sequence[GrantedQuota], bool]:
+        """
+        Returns the timestamp and the grants of `requests`, and whether the
+        granted quota was already consumed.
+
+        With `sentry-metrics.writes-limiter.bulk` the quotas are checked and
+        consumed in one round trip per shard, and with a lease size through a
+        `QuotaLease` that only goes to Redis when its budget runs out.
+        Otherwise the quotas are only checked, and consumed when the rate limit
+        state exits.
+        """
+        if not options.get("sentry-metrics.writes-limiter.bulk"):
+            timestamp, grants = self.rate_limiter.check_within_quotas(requests)
+            return timestamp, grants, False
+
+        timestamp = int(time())
+        lease_size = options.get("sentry-metrics.writes-limiter.lease-size")
+        if lease_size > 0:
+            if self._lease is None or self._lease.size != lease_size:
+                self._lease = QuotaLease(self.rate_limiter, lease_size, LEASE_TTL_SECONDS)
+            return timestamp, self._lease.check_and_use_quotas(requests, timestamp), True
+
+        self._lease = None
+        return timestamp, self.rate_limiter.bulk_check_and_use_quotas(requests, timestamp), True
 
+
+class WritesLimiter(_BaseWritesLimiter):
     @metrics.wraps("sentry_metrics.indexer.check_write_limits")
     def check_write_limits(
         self,
@@ -140,7 +176,8 @@ class WritesLimiter:
 
         2. All unmapped keys that did not pass through the rate limiter.
 
-        Upon (successful) exit, rate limits are consumed.
+        Upon (successful) exit, rate limits are consumed, unless they were
+        consumed right away (see `_check_quotas`).
         """
         use_case_id = next(iter(use_case_keys.mapping.keys()))
         keys = next(iter(use_case_keys.mapping.values()))
@@ -149,7 +186,7 @@ class WritesLimiter:
             self.namespace,
             keys,
         )
-        timestamp, grants = self.rate_limiter.check_within_quotas(requests)
+        timestamp, grants, quotas_used = self._check_quotas(requests)
 
         granted_key_collection = dict(keys.mapping)
         dropped_strings = []
@@ -184,6 +221,7 @@ class WritesLimiter:
             _requests=requests,
             _grants=grants,
             _timestamp=timestamp,
+            _quotas_used=quotas_used,
             accepted_keys=UseCaseKeyCollection(
                 {use_case_id: KeyCollection(granted_key_collection)}
             ),
@@ -206,6 +244,7 @@ class UcaRateLimitState:
     _requests: Sequence[RequestedQuota]
     _grants: Sequence[GrantedQuota]
     _timestamp: Timestamp
+    _quotas_used: bool
 
     accepted_keys: UseCaseKeyCollection
     dropped_strings: Sequence[UcaDroppedString]
@@ -218,17 +257,13 @@ class UcaRateLimitState:
         """
         Consumes the rate limits returned by `check_write_limits`.
         """
-        if exc_type is not None:
+        if exc_type is not None or self._quotas_used:
             return
 
         self._writes_limiter.rate_limiter.use_quotas(self._requests, self._grants, self._timestamp)
 
 
-class UcaWritesLimiter:
-    def __init__(self, namespace: str, **options: Mapping[str, str]) -> None:
-        self.namespace = namespace
-        self.rate_limiter: RedisSlidingWindowRateLimiter = RedisSlidingWindowRateLimiter(**options)
-
+class UcaWritesLimiter(_BaseWritesLimiter):
     def _build_quota_key(self, use_case_id: UseCaseID, org_id: Optional[OrgId] = None) -> str:
         if org_id is not None:
             return f"metrics-indexer-{use_case_id.value}-org-{org_id}"
@@ -292,11 +327,12 @@ class UcaWritesLimiter:
 
         2. All unmapped keys that did not pass through the rate limiter.
 
-        Upon (successful) exit, rate limits are consumed.
+        Upon (successful) exit, rate limits are consumed, unless they were
+        consumed right away (see `_check_quotas`).
         """
 
         use_case_ids, org_ids, requests = self._construct_quota_requests(use_case_keys)
-        timestamp, grants = self.rate_limiter.check_within_quotas(requests)
+        timestamp, grants, quotas_used = self._check_quotas(requests)
 
         accepted_keys = {
             use_case_id: {org_id: strings for org_id, strings in key_collection.mapping.items()}
@@ -336,6 +372,7 @@ class UcaWritesLimiter:
             _requests=requests,
             _grants=grants,
             _timestamp=timestamp,
+            _quotas_used=quotas_used,
             accepted_keys=UseCaseKeyCollection(accepted_keys),
             dropped_strings=dropped_strings,
         )
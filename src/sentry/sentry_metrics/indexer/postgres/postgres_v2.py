@@ -1,10 +1,13 @@
+import csv
+import io
 from functools import reduce
 from operator import or_
-from time import sleep
-from typing import Any, Collection, Dict, Mapping, Optional, Sequence, Set
+from time import monotonic, sleep
+from typing import Any, Callable, Collection, Dict, Mapping, Optional, Sequence, Set, Tuple
 
 import sentry_sdk
 from django.conf import settings
+from django.db import connections, router, transaction
 from django.db.models import Q
 from psycopg2 import OperationalError
 from psycopg2.errorcodes import DEADLOCK_DETECTED
@@ -21,9 +24,14 @@ from sentry.sentry_metrics.indexer.base import (
     metric_path_key_compatible_resolve,
     metric_path_key_compatible_rev_resolve,
 )
-from sentry.sentry_metrics.indexer.cache import CachingIndexer, StringIndexerCache
+from sentry.sentry_metrics.indexer.cache import (
+    CachingIndexer,
+    StringIndexerCache,
+    StringIndexerLocalCache,
+)
 from sentry.sentry_metrics.indexer.limiters.writes import writes_limiter_factory
 from sentry.sentry_metrics.indexer.postgres.models import TABLE_MAPPING, BaseIndexer, IndexerTable
+from sentry.sentry_metrics.indexer.shared_cache import StringIndexerSharedCache
 from sentry.sentry_metrics.indexer.strings import StaticStringIndexer
 from sentry.sentry_metrics.use_case_id_registry import METRIC_PATH_MAPPING, UseCaseID
 from sentry.utils import metrics
@@ -40,13 +48,55 @@ indexer_cache = StringIndexerCache(
     **settings.SENTRY_STRING_INDEXER_CACHE_OPTIONS, partition_key=_PARTITION_KEY
 )
 
+# A new string, as (use case id, organization id, string). The use case id is None for tables
+# without a `use_case_id` column.
+NewString = Tuple[Optional[str], int, str]
+
+
+class AdaptiveBatchSize:
+    """
+    Sizes the batches of new strings written by `PGStringIndexerV2._copy_insert`, so that each
+    statement takes about `sentry-metrics.indexer.pg-copy-insert.target-latency-ms`: the batch
+    size doubles after a fast statement, and halves after a slow one.
+    """
+
+    MIN_SIZE = 100
+
+    def __init__(self) -> None:
+        self._size: Optional[int] = None
+
+    @property
+    def size(self) -> int:
+        if self._size is None:
+            self._size = options.get("sentry-metrics.indexer.pg-copy-insert.batch-size")
+        return self._size
+
+    def update(self, batch_size: int, duration: float) -> None:
+        target = options.get("sentry-metrics.indexer.pg-copy-insert.target-latency-ms") / 1000
+        max_size = options.get("sentry-metrics.indexer.pg-copy-insert.max-batch-size")
+        if duration > target:
+            self._size = max(self.MIN_SIZE, self.size // 2)
+        elif duration < target / 2 and batch_size >= self.size:
+            # Only grow when the batch was full, otherwise a small batch says nothing about
+            # how long a larger one would take.
+            self._size = min(max_size, self.size * 2)
+        metrics.gauge("sentry_metrics.indexer.pg_copy_insert.batch_size", self.size)
+
 
 class PGStringIndexerV2(StringIndexer):
     """
     Provides integer IDs for metric names, tag keys and tag values
     and the corresponding reverse lookup.
+
+    New strings are written with `bulk_create` and then read back to get their ids, unless
+    `sentry-metrics.indexer.pg-copy-insert` is enabled. Then they are loaded into a temporary
+    table with COPY, and inserted from there by a statement that returns the ids of both the
+    new rows and the rows that already existed (see `_copy_insert`).
     """
 
+    def __init__(self) -> None:
+        self.copy_batch_size = AdaptiveBatchSize()
+
     def _get_db_records(self, db_use_case_keys: UseCaseKeyCollection) -> Any:
         """
         The order of operations for our changes needs to be:
@@ -87,33 +137,148 @@ class PGStringIndexerV2(StringIndexer):
         specifically so that we don't interrupt processing or raise an error for a
         fairly normal event.
         """
-        retry_count = 0
-        sleep_ms = 5
-        last_seen_exception: Optional[BaseException] = None
-
         with metrics.timer("sentry_metrics.indexer.pg_bulk_create"):
             # We use `ignore_conflicts=True` here to avoid race conditions where metric indexer
             # records might have be created between when we queried in `bulk_record` and the
             # attempt to create the rows down below.
-            while retry_count + 1 < settings.SENTRY_POSTGRES_INDEXER_RETRY_COUNT:
-                try:
-                    table.objects.bulk_create(new_records, ignore_conflicts=True)
-                    return
-                except OperationalError as e:
-                    sentry_sdk.capture_message(
-                        f"retryable deadlock exception encountered; pgcode={e.pgcode}, pgerror={e.pgerror}"
+            self._retry_on_deadlock(
+                lambda: table.objects.bulk_create(new_records, ignore_conflicts=True),
+                "sentry_metrics.indexer.pg_bulk_create.deadlocked",
+            )
+
+    def _retry_on_deadlock(self, func: Callable[[], Any], deadlock_metric: str) -> Any:
+        retry_count = 0
+        sleep_ms = 5
+        last_seen_exception: Optional[BaseException] = None
+
+        while retry_count + 1 < settings.SENTRY_POSTGRES_INDEXER_RETRY_COUNT:
+            try:
+                return func()
+            except OperationalError as e:
+                sentry_sdk.capture_message(
+                    f"retryable deadlock exception encountered; pgcode={e.pgcode}, pgerror={e.pgerror}"
+                )
+                if e.pgcode == DEADLOCK_DETECTED:
+                    metrics.incr(deadlock_metric)
+                    retry_count += 1
+                    sleep(sleep_ms / 1000 * (2**retry_count))
+                    last_seen_exception = e
+                else:
+                    raise e
+        # If we haven't returned after successful bulk create, we should re-raise the last
+        # seen exception
+        assert isinstance(last_seen_exception, BaseException)
+        raise last_seen_exception
+
+    def _copy_insert_with_retry(
+        self, table: IndexerTable, new_strings: Sequence[NewString]
+    ) -> Dict[NewString, int]:
+        """
+        Writes new strings with `_copy_insert`, in batches sized by `AdaptiveBatchSize`, and
+        returns the ids of all of them. Like `_bulk_create_with_retry`, a batch is retried when
+        it deadlocks.
+        """
+        ids: Dict[NewString, int] = {}
+        with metrics.timer("sentry_metrics.indexer.pg_copy_insert"):
+            start = 0
+            while start < len(new_strings):
+                batch = new_strings[start : start + self.copy_batch_size.size]
+                start += len(batch)
+                batch_start = monotonic()
+                ids.update(
+                    self._retry_on_deadlock(
+                        lambda: self._copy_insert(table, batch),
+                        "sentry_metrics.indexer.pg_copy_insert.deadlocked",
                     )
-                    if e.pgcode == DEADLOCK_DETECTED:
-                        metrics.incr("sentry_metrics.indexer.pg_bulk_create.deadlocked")
-                        retry_count += 1
-                        sleep(sleep_ms / 1000 * (2**retry_count))
-                        last_seen_exception = e
-                    else:
-                        raise e
-            # If we haven't returned after successful bulk create, we should re-raise the last
-            # seen exception
-            assert isinstance(last_seen_exception, BaseException)
-            raise last_seen_exception
+                )
+                self.copy_batch_size.update(len(batch), monotonic() - batch_start)
+
+        missing = [new_string for new_string in new_strings if new_string not in ids]
+        if missing:
+            # Rows committed by another indexer while our statement ran are neither inserted nor
+            # visible to it, so they are read back like in the `bulk_create` path.
+            metrics.incr("sentry_metrics.indexer.pg_copy_insert.read_back", amount=len(missing))
+            ids.update(self._get_new_string_ids(table, missing))
+        return ids
+
+    def _copy_insert(
+        self, table: IndexerTable, new_strings: Sequence[NewString]
+    ) -> Dict[NewString, int]:
+        """
+        Loads the new strings into a temporary table with COPY, and inserts them into `table`
+        in a single statement, which skips existing strings and returns the ids of both the
+        inserted and the existing ones.
+        """
+        has_use_case = any(use_case_id is not None for use_case_id, _, _ in new_strings)
+        columns = ["organization_id", "string"] + (["use_case_id"] if has_use_case else [])
+        column_list = ", ".join(columns)
+        join_condition = " AND ".join(f"t.{column} = n.{column}" for column in columns)
+
+        buffer = io.StringIO()
+        # Strings are always quoted, which keeps empty strings from being loaded as NULL.
+        writer = csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC)
+        for use_case_id, organization_id, string in new_strings:
+            writer.writerow([organization_id, string] + ([use_case_id] if has_use_case else []))
+        buffer.seek(0)
+
+        using = router.db_for_write(table)
+        with transaction.atomic(using=using), connections[using].cursor() as cursor:
+            # The table lives as long as the connection, and is emptied by every commit. It is
+            # truncated as well, since this may run in a transaction that wrote to it before.
+            cursor.execute(
+                """
+                CREATE TEMPORARY TABLE IF NOT EXISTS sentry_indexer_new_strings (
+                    organization_id bigint NOT NULL,
+                    string varchar(200) NOT NULL,
+                    use_case_id varchar(120)
+                ) ON COMMIT DELETE ROWS
+                """
+            )
+            cursor.execute("TRUNCATE sentry_indexer_new_strings")
+            cursor.copy_expert(
+                f"COPY sentry_indexer_new_strings ({column_list}) FROM STDIN WITH (FORMAT csv)",
+                buffer,
+            )
+            cursor.execute(
+                f"""
+                WITH inserted AS (
+                    INSERT INTO {table._meta.db_table}
+                        ({column_list}, date_added, last_seen, retention_days)
+                    SELECT {column_list}, now(), now(), %s
+                    FROM sentry_indexer_new_strings
+                    ON CONFLICT DO NOTHING
+                    RETURNING id, {column_list}
+                )
+                SELECT id, {column_list} FROM inserted
+                UNION ALL
+                SELECT t.id, {", ".join(f"t.{column}" for column in columns)}
+                FROM {table._meta.db_table} t
+                JOIN sentry_indexer_new_strings n ON {join_condition}
+                """,
+                [table._meta.get_field("retention_days").get_default()],
+            )
+            rows = cursor.fetchall()
+
+        return {(row[3] if has_use_case else None, row[1], row[2]): row[0] for row in rows}
+
+    def _get_new_string_ids(
+        self, table: IndexerTable, new_strings: Sequence[NewString]
+    ) -> Dict[NewString, int]:
+        has_use_case = any(use_case_id is not None for use_case_id, _, _ in new_strings)
+        conditions = [
+            Q(organization_id=organization_id, string=string, use_case_id=use_case_id)
+            if has_use_case
+            else Q(organization_id=organization_id, string=string)
+            for use_case_id, organization_id, string in new_strings
+        ]
+        return {
+            (
+                db_obj.use_case_id if has_use_case else None,
+                db_obj.organization_id,
+                db_obj.string,
+            ): db_obj.id
+            for db_obj in table.objects.filter(reduce(or_, conditions))
+        }
 
     def _uca_bulk_record(
         self, strings: Mapping[UseCaseID, Mapping[OrgId, Set[str]]]
@@ -194,6 +359,41 @@ class PGStringIndexerV2(StringIndexer):
 
             table = self._get_table_from_metric_path_key(metric_path_key)
 
+            if options.get("sentry-metrics.indexer.pg-copy-insert"):
+                new_string_ids = self._copy_insert_with_retry(
+                    table,
+                    [
+                        (
+                            use_case_id.value
+                            if metric_path_key is UseCaseKey.PERFORMANCE
+                            else None,
+                            int(organization_id),
+                            string,
+                        )
+                        for use_case_id, organization_id, string in accepted_keys.as_tuples()
+                    ],
+                )
+                db_write_key_results = UseCaseKeyResults()
+                db_write_key_results.add_use_case_key_results(
+                    [
+                        UseCaseKeyResult(
+                            use_case_id=(
+                                UseCaseID.SESSIONS
+                                if metric_path_key is UseCaseKey.RELEASE_HEALTH
+                                else UseCaseID(use_case_id)
+                            ),
+                            org_id=organization_id,
+                            string=string,
+                            id=id,
+                        )
+                        for (use_case_id, organization_id, string), id in new_string_ids.items()
+                    ],
+                    fetch_type=FetchType.FIRST_SEEN,
+                )
+                return db_read_key_results.merge(db_write_key_results).merge(
+                    rate_limited_key_results
+                )
+
             if metric_path_key is UseCaseKey.PERFORMANCE:
                 new_records = [
                     table(
@@ -321,6 +521,32 @@ class PGStringIndexerV2(StringIndexer):
             if filtered_db_write_keys.size == 0:
                 return db_read_key_results.merge(rate_limited_key_results)
 
+            if options.get("sentry-metrics.indexer.pg-copy-insert"):
+                new_string_ids = self._copy_insert_with_retry(
+                    self._get_table_from_use_case_ids(strings.keys()),
+                    [
+                        (
+                            use_case_id.value
+                            if use_case_path_key is UseCaseKey.PERFORMANCE
+                            else None,
+                            int(organization_id),
+                            string,
+                        )
+                        for organization_id, string in filtered_db_write_keys.as_tuples()
+                    ],
+                )
+                db_write_key_results = UseCaseKeyResults()
+                db_write_key_results.add_use_case_key_results(
+                    [
+                        UseCaseKeyResult(use_case_id, org_id=organization_id, string=string, id=id)
+                        for (_, organization_id, string), id in new_string_ids.items()
+                    ],
+                    fetch_type=FetchType.FIRST_SEEN,
+                )
+                return db_read_key_results.merge(db_write_key_results).merge(
+                    rate_limited_key_results
+                )
+
             if use_case_path_key is UseCaseKey.PERFORMANCE:
                 new_records = [
                     self._get_table_from_use_case_ids(strings.keys())(
@@ -453,4 +679,11 @@ class PGStringIndexerV2(StringIndexer):
 
 class PostgresIndexer(StaticStringIndexer):
     def __init__(self) -> None:
-        super().__init__(CachingIndexer(indexer_cache, PGStringIndexerV2()))
+        super().__init__(
+            CachingIndexer(
+                indexer_cache,
+                PGStringIndexerV2(),
+                StringIndexerLocalCache(),
+                StringIndexerSharedCache(),
+            )
+        )
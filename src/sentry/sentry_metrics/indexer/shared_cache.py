@@ -0,0 +1,311 @@
+"""
+A host-local table of string indexer ids in shared memory, so that the
+indexer processes of a host don't each have to look up the same strings in
+the shared (Redis) cache.
+
+The table is a fixed-size hash table of buckets with a few slots each. A
+slot holds a digest of the "use_case_id:org_id:string" key, its id and the
+time it was written. Readers never lock: every slot has a sequence number that
+is odd while the slot is being written, like a seqlock. Only one process
+writes at a time, the others skip writing rather than waiting for it.
+
+Resizing the table replaces its segment under the same name. The old segment
+is marked as retired, so the processes still using it open the new one, and
+its memory is freed once the last of them closed it.
+"""
+
+import fcntl
+import hashlib
+import logging
+import os
+import struct
+import tempfile
+import time
+from multiprocessing import resource_tracker, shared_memory
+from typing import Collection, Dict, Mapping, Optional, Sequence, Tuple
+
+from sentry import options
+from sentry.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+_MAGIC = b"SIDXv001"
+_RETIRED_MAGIC = b"SIDXdead"
+# magic, number of buckets, number of entries
+_HEADER = struct.Struct("<8sQQ")
+_HEADER_SIZE = 64
+_ENTRIES_OFFSET = 16
+_ENTRIES = struct.Struct("<Q")
+# sequence number, written at, key digest, id
+_SLOT = struct.Struct("<II16sq")
+_SLOT_DATA = struct.Struct("<I16sq")
+_SEQ = struct.Struct("<I")
+_SLOTS_PER_BUCKET = 8
+_BUCKET_SIZE = _SLOT.size * _SLOTS_PER_BUCKET
+_EMPTY_DIGEST = bytes(16)
+
+# The lock files are kept next to the segments, which are files in /dev/shm on Linux
+_LOCK_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+
+def _digest(key: str) -> bytes:
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+
+
+class SharedIdTable:
+    """
+    The table in a shared memory segment. Use `SharedIdTable.open` to create it, or attach to
+    the one another process created.
+
+    Full buckets evict the entry that was written the longest time ago.
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, lock_path: str, lock_fd: int) -> None:
+        self.shm = shm
+        self.lock_path = lock_path
+        self.lock_fd = lock_fd
+        self.size = shm.size
+        self.writes = 0
+
+    @classmethod
+    def open(cls, name: str, size: int) -> "SharedIdTable":
+        """
+        Attaches to the table called `name`, or creates it with `size` bytes. The segment
+        outlives the processes using it, so that restarted workers find it warm. A table of
+        another size is replaced.
+        """
+        buckets = (size - _HEADER_SIZE) // _BUCKET_SIZE
+        if buckets <= 0:
+            raise ValueError(f"Shared id table of {size} bytes is too small")
+
+        lock_path = os.path.join(_LOCK_DIR, f"{name}.lock")
+        lock_fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            # Creating and replacing the segment waits for the writers, so the header of the
+            # segment is always complete when it is attached to
+            fcntl.flock(lock_fd, fcntl.LOCK_EX)
+            try:
+                shm = cls._create_or_attach(name, buckets)
+            finally:
+                fcntl.flock(lock_fd, fcntl.LOCK_UN)
+        except BaseException:
+            os.close(lock_fd)
+            raise
+
+        # Python unlinks segments when the process that opened them exits
+        resource_tracker.unregister(shm._name, "shared_memory")  # type: ignore[attr-defined]
+        return cls(shm, lock_path, lock_fd)
+
+    @staticmethod
+    def _create_or_attach(name: str, buckets: int) -> shared_memory.SharedMemory:
+        try:
+            shm = shared_memory.SharedMemory(name=name)
+        except FileNotFoundError:
+            pass
+        else:
+            if _HEADER.unpack_from(shm.buf, 0)[:2] == (_MAGIC, buckets):
+                return shm
+            # The table was resized
+            _HEADER.pack_into(shm.buf, 0, _RETIRED_MAGIC, 0, 0)
+            shm.unlink()
+            shm.close()
+
+        shm = shared_memory.SharedMemory(
+            name=name, create=True, size=_HEADER_SIZE + buckets * _BUCKET_SIZE
+        )
+        _HEADER.pack_into(shm.buf, 0, _MAGIC, buckets, 0)
+        return shm
+
+    @property
+    def buckets(self) -> int:
+        magic, buckets, _ = _HEADER.unpack_from(self.shm.buf, 0)
+        return int(buckets) if magic == _MAGIC else 0
+
+    @property
+    def retired(self) -> bool:
+        """
+        Whether the table was replaced by one of another size.
+        """
+        return bytes(self.shm.buf[: len(_RETIRED_MAGIC)]) == _RETIRED_MAGIC
+
+    @property
+    def entries(self) -> int:
+        return int(_ENTRIES.unpack_from(self.shm.buf, _ENTRIES_OFFSET)[0])
+
+    def _bucket_offset(self, digest: bytes, buckets: int) -> int:
+        return _HEADER_SIZE + int.from_bytes(digest[:8], "little") % buckets * _BUCKET_SIZE
+
+    def get_many(self, keys: Collection[str], max_age: float) -> Dict[str, int]:
+        """
+        Returns the ids of the keys that were written less than `max_age` seconds ago.
+        """
+        buckets = self.buckets
+        if not buckets:
+            return {}
+
+        buf = self.shm.buf
+        min_written_at = time.time() - max_age
+        results: Dict[str, int] = {}
+        for key in keys:
+            digest = _digest(key)
+            offset = self._bucket_offset(digest, buckets)
+            for slot_offset in range(offset, offset + _BUCKET_SIZE, _SLOT.size):
+                seq, written_at, slot_digest, id = _SLOT.unpack_from(buf, slot_offset)
+                if slot_digest != digest:
+                    continue
+                # Skip slots that are being written, were written while we read them, or
+                # are too old
+                if (
+                    not seq % 2
+                    and _SEQ.unpack_from(buf, slot_offset)[0] == seq
+                    and written_at >= min_written_at
+                ):
+                    results[key] = id
+                break
+        return results
+
+    def set_many(self, key_values: Mapping[str, int]) -> Optional[int]:
+        """
+        Writes the ids of the keys, unless another process is writing. Returns the number of
+        entries that were evicted, or None if nothing was written.
+        """
+        buckets = self.buckets
+        if not buckets:
+            return None
+        try:
+            fcntl.flock(self.lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return None
+
+        try:
+            buf = self.shm.buf
+            now = int(time.time())
+            added = evicted = 0
+            for key, id in key_values.items():
+                digest = _digest(key)
+                offset = self._bucket_offset(digest, buckets)
+                slot = self._find_slot(digest, offset, self.writes)
+                self.writes += 1
+                seq, written_at, slot_digest, _ = _SLOT.unpack_from(buf, slot)
+                if slot_digest == _EMPTY_DIGEST:
+                    added += 1
+                elif slot_digest != digest:
+                    evicted += 1
+
+                _SEQ.pack_into(buf, slot, (seq + 1) & 0xFFFFFFFF)
+                _SLOT_DATA.pack_into(buf, slot + _SEQ.size, now, digest, id)
+                _SEQ.pack_into(buf, slot, (seq + 2) & 0xFFFFFFFF)
+
+            if added:
+                _ENTRIES.pack_into(buf, _ENTRIES_OFFSET, self.entries + added)
+            return evicted
+        finally:
+            fcntl.flock(self.lock_fd, fcntl.LOCK_UN)
+
+    def _find_slot(self, digest: bytes, offset: int, start: int) -> int:
+        """
+        Returns the slot of the bucket that holds the digest, or else an empty one, or else the
+        one that was written the longest time ago. Slots are scanned from `start`, so that
+        entries written in the same second are evicted in turns.
+        """
+        buf = self.shm.buf
+        empty_slot = None
+        oldest_slot, oldest_written_at = offset, None
+        for i in range(start, start + _SLOTS_PER_BUCKET):
+            slot_offset = offset + i % _SLOTS_PER_BUCKET * _SLOT.size
+            _, written_at, slot_digest, _ = _SLOT.unpack_from(buf, slot_offset)
+            if slot_digest == digest:
+                return slot_offset
+            if slot_digest == _EMPTY_DIGEST:
+                if empty_slot is None:
+                    empty_slot = slot_offset
+            elif oldest_written_at is None or written_at < oldest_written_at:
+                oldest_slot, oldest_written_at = slot_offset, written_at
+        return empty_slot if empty_slot is not None else oldest_slot
+
+    def close(self) -> None:
+        os.close(self.lock_fd)
+        self.shm.close()
+
+    def unlink(self) -> None:
+        # Balances the unregister in `open`
+        resource_tracker.register(self.shm._name, "shared_memory")  # type: ignore[attr-defined]
+        self.shm.unlink()
+        os.unlink(self.lock_path)
+
+
+class StringIndexerSharedCache:
+    """
+    A host-wide tier between `StringIndexerLocalCache` and `StringIndexerCache`, backed by a
+    `SharedIdTable` of `sentry-metrics.indexer.shared-cache.max-bytes`. Takes the same
+    "use_case_id:org_id:string" keys.
+
+    The table is opened lazily in every process that uses it. Changing the size of the table
+    replaces it.
+    """
+
+    def __init__(self) -> None:
+        self.table: Optional[SharedIdTable] = None
+        self.pid: Optional[int] = None
+        self.max_bytes: Optional[int] = None
+
+    def _get_table(self) -> Optional[SharedIdTable]:
+        max_bytes = options.get("sentry-metrics.indexer.shared-cache.max-bytes")
+        name = options.get("sentry-metrics.indexer.shared-cache.name")
+        if not max_bytes:
+            return None
+
+        # The lock of a table opened before forking is shared with the parent process
+        if self.table is not None and (
+            self.pid != os.getpid()
+            or self.table.shm.name != name
+            or self.max_bytes != max_bytes
+            or self.table.retired
+        ):
+            self.table.close()
+            self.table = None
+
+        if self.table is None:
+            try:
+                self.table = SharedIdTable.open(name, max_bytes)
+            except (OSError, ValueError):
+                logger.exception("sentry_metrics.indexer.shared_cache.open_failed")
+                return None
+            self.pid = os.getpid()
+            self.max_bytes = max_bytes
+        return self.table
+
+    def get_many(self, keys: Sequence[str]) -> Tuple[Dict[str, int], Sequence[str]]:
+        """
+        Returns the ids of the cached keys, and the keys that need to be looked up elsewhere.
+        """
+        table = self._get_table()
+        if table is None:
+            return {}, keys
+
+        results = table.get_many(keys, options.get("sentry-metrics.indexer.shared-cache.ttl"))
+        return results, [key for key in keys if key not in results]
+
+    def get(self, key: str) -> Optional[int]:
+        results, _ = self.get_many([key])
+        return results.get(key)
+
+    def set_many(self, key_values: Mapping[str, Optional[int]]) -> None:
+        table = self._get_table()
+        if table is None:
+            return
+
+        evicted = table.set_many({k: v for k, v in key_values.items() if v is not None})
+        if evicted is None:
+            metrics.incr("sentry_metrics.indexer.shared_cache.write_skipped")
+            return
+        if evicted:
+            metrics.incr("sentry_metrics.indexer.shared_cache.evictions", amount=evicted)
+        metrics.gauge("sentry_metrics.indexer.shared_cache.bytes", table.size)
+        metrics.gauge("sentry_metrics.indexer.shared_cache.entries", table.entries)
+
+    def set(self, key: str, value: int) -> None:
+        self.set_many({key: value})
+
+    def is_enabled(self) -> bool:
+        return bool(options.get("sentry-metrics.indexer.shared-cache.max-bytes"))
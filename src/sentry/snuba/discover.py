@@ -12,6 +12,7 @@ from snuba_sdk.conditions import Condition, Op
 from snuba_sdk.function import Function
 from typing_extensions import TypedDict
 
+from sentry import options
 from sentry.discover.arithmetic import categorize_columns
 from sentry.exceptions import InvalidSearchQuery
 from sentry.models import Group
@@ -35,6 +36,7 @@ from sentry.utils.math import nice_int
 from sentry.utils.snuba import (
     SnubaTSResult,
     bulk_snql_query,
+    bulk_timeseries_snql_query,
     get_array_column_alias,
     get_array_column_field,
     get_measurement_name,
@@ -316,7 +318,11 @@ def timeseries_query(
             )
             query_list.append(comparison_builder)
 
-        query_results = bulk_snql_query([query.get_snql_query() for query in query_list], referrer)
+        snql_queries = [query.get_snql_query() for query in query_list]
+        if options.get("snuba.timeseries-cache.enabled"):
+            query_results = bulk_timeseries_snql_query(snql_queries, rollup, referrer)
+        else:
+            query_results = bulk_snql_query(snql_queries, referrer)
 
     with sentry_sdk.start_span(op="discover.discover", description="timeseries.transform_results"):
         results = []
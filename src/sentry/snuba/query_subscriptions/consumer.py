@@ -1,6 +1,7 @@
 import logging
+from collections import defaultdict
 from datetime import timezone
-from typing import Callable, Dict
+from typing import Callable, Collection, Dict, List, Mapping, Optional, Sequence, Tuple
 
 import sentry_sdk
 from dateutil.parser import parse as parse_date
@@ -11,8 +12,9 @@ from sentry_kafka_schemas.schema_types.events_subscription_results_v1 import (
 )
 
 from sentry.incidents.utils.types import SubscriptionUpdate
+from sentry.models import Organization, Project
 from sentry.snuba.dataset import EntityKey
-from sentry.snuba.models import QuerySubscription
+from sentry.snuba.models import QuerySubscription, SnubaQuery
 from sentry.snuba.query_subscriptions.constants import topic_to_dataset
 from sentry.snuba.tasks import _delete_from_snuba
 from sentry.utils import metrics
@@ -20,7 +22,14 @@ from sentry.utils import metrics
 logger = logging.getLogger(__name__)
 TQuerySubscriptionCallable = Callable[[SubscriptionUpdate, QuerySubscription], None]
 
+TQuerySubscriptionBatchCallable = Callable[
+    [Sequence[Tuple[SubscriptionUpdate, QuerySubscription]]], None
+]
+
 subscriber_registry: Dict[str, TQuerySubscriptionCallable] = {}
+# Subscribers that can also process the updates of a consumer batch together. See
+# `handle_message_batch`.
+batch_subscriber_registry: Dict[str, TQuerySubscriptionBatchCallable] = {}
 
 
 def register_subscriber(
@@ -35,6 +44,18 @@ def register_subscriber(
     return inner
 
 
+def register_batch_subscriber(
+    subscriber_key: str,
+) -> Callable[[TQuerySubscriptionBatchCallable], TQuerySubscriptionBatchCallable]:
+    def inner(func: TQuerySubscriptionBatchCallable) -> TQuerySubscriptionBatchCallable:
+        if subscriber_key in batch_subscriber_registry:
+            raise Exception("Batch handler already registered for %s" % subscriber_key)
+        batch_subscriber_registry[subscriber_key] = func
+        return func
+
+    return inner
+
+
 def parse_message_value(value: bytes, jsoncodec: Codec[SubscriptionResult]) -> SubscriptionUpdate:
     """
     Parses the value received via the Kafka consumer and verifies that it
@@ -78,78 +99,17 @@ def handle_message(
     :return:
     """
     with sentry_sdk.push_scope() as scope:
-        try:
-            with metrics.timer(
-                "snuba_query_subscriber.parse_message_value", tags={"dataset": dataset}
-            ):
-                contents = parse_message_value(message_value, jsoncodec)
-        except InvalidMessageError:
-            # If the message is in an invalid format, just log the error
-            # and continue
-            logger.exception(
-                "Subscription update could not be parsed",
-                extra={
-                    "offset": message_offset,
-                    "partition": message_partition,
-                    "value": message_value,
-                },
-            )
+        contents = get_message_contents(
+            message_value, message_offset, message_partition, dataset, jsoncodec
+        )
+        if contents is None:
             return
         scope.set_tag("query_subscription_id", contents["subscription_id"])
 
-        try:
-            with metrics.timer(
-                "snuba_query_subscriber.fetch_subscription", tags={"dataset": dataset}
-            ):
-                subscription: QuerySubscription = QuerySubscription.objects.get_from_cache(
-                    subscription_id=contents["subscription_id"]
-                )
-                if subscription.status != QuerySubscription.Status.ACTIVE.value:
-                    metrics.incr("snuba_query_subscriber.subscription_inactive")
-                    return
-        except QuerySubscription.DoesNotExist:
-            metrics.incr(
-                "snuba_query_subscriber.subscription_doesnt_exist", tags={"dataset": dataset}
-            )
-            logger.warning(
-                "Received subscription update, but subscription does not exist",
-                extra={
-                    "offset": message_offset,
-                    "partition": message_partition,
-                    "value": message_value,
-                },
-            )
-            try:
-                if topic in topic_to_dataset:
-                    _delete_from_snuba(
-                        topic_to_dataset[topic],
-                        contents["subscription_id"],
-                        EntityKey(contents["entity"]),
-                    )
-                else:
-                    logger.error(
-                        "Topic not registered with QuerySubscriptionConsumer, can't remove "
-                        "non-existent subscription from Snuba",
-                        extra={"topic": topic, "subscription_id": contents["subscription_id"]},
-                    )
-            except InvalidMessageError as e:
-                logger.exception(e)
-            except Exception:
-                logger.exception("Failed to delete unused subscription from snuba.")
-            return
-
-        if subscription.type not in subscriber_registry:
-            metrics.incr(
-                "snuba_query_subscriber.subscription_type_not_registered", tags={"dataset": dataset}
-            )
-            logger.error(
-                "Received subscription update, but no subscription handler registered",
-                extra={
-                    "offset": message_offset,
-                    "partition": message_partition,
-                    "value": message_value,
-                },
-            )
+        subscription = get_message_subscription(
+            contents, message_value, message_offset, message_partition, topic, dataset
+        )
+        if subscription is None:
             return
 
         sentry_sdk.set_tag("project_id", subscription.project_id)
@@ -174,6 +134,217 @@ def handle_message(
             callback(contents, subscription)
 
 
+def handle_message_batch(
+    messages: Sequence[Tuple[bytes, int, int]],
+    topic: str,
+    dataset: str,
+    jsoncodec: Codec[SubscriptionResult],
+) -> None:
+    """
+    Handles a batch of (value, offset, partition) messages like `handle_message` does one at a
+    time. The subscriptions of the batch, their queries and projects are fetched in bulk, and the
+    updates of each subscription type are passed together to its batch callback, if it has one.
+    Updates are passed on in the order of the batch.
+    """
+    parsed: List[Tuple[SubscriptionUpdate, bytes, int, int]] = []
+    for message_value, message_offset, message_partition in messages:
+        contents = get_message_contents(
+            message_value, message_offset, message_partition, dataset, jsoncodec
+        )
+        if contents is not None:
+            parsed.append((contents, message_value, message_offset, message_partition))
+
+    if not parsed:
+        return
+
+    with metrics.timer("snuba_query_subscriber.fetch_subscriptions", tags={"dataset": dataset}):
+        subscriptions = get_subscriptions(
+            {contents["subscription_id"] for contents, _, _, _ in parsed}
+        )
+
+    updates_by_type: Dict[str, List[Tuple[SubscriptionUpdate, QuerySubscription]]] = defaultdict(
+        list
+    )
+    for contents, message_value, message_offset, message_partition in parsed:
+        subscription = get_message_subscription(
+            contents,
+            message_value,
+            message_offset,
+            message_partition,
+            topic,
+            dataset,
+            subscriptions,
+        )
+        if subscription is not None:
+            updates_by_type[subscription.type].append((contents, subscription))
+
+    metrics.timing("snuba_query_subscriber.handle_message_batch.size", len(parsed))
+
+    for subscription_type, updates in updates_by_type.items():
+        with sentry_sdk.start_span(op="process_batch") as span, metrics.timer(
+            "snuba_query_subscriber.batch_callback.duration",
+            instance=subscription_type,
+            tags={"dataset": dataset},
+        ):
+            span.set_data("batch_size", len(updates))
+            if subscription_type in batch_subscriber_registry:
+                try:
+                    batch_subscriber_registry[subscription_type](updates)
+                except Exception:
+                    logger.exception(
+                        "Failed to handle subscription updates",
+                        extra={"subscription_type": subscription_type, "count": len(updates)},
+                    )
+                continue
+
+            callback = subscriber_registry[subscription_type]
+            for contents, subscription in updates:
+                try:
+                    callback(contents, subscription)
+                except Exception:
+                    logger.exception(
+                        "Failed to handle subscription update",
+                        extra={"subscription_id": contents["subscription_id"]},
+                    )
+
+
+def get_message_contents(
+    message_value: bytes,
+    message_offset: int,
+    message_partition: int,
+    dataset: str,
+    jsoncodec: Codec[SubscriptionResult],
+) -> Optional[SubscriptionUpdate]:
+    """
+    Parses the value from Kafka, or logs an error and returns None if it is invalid.
+    """
+    try:
+        with metrics.timer("snuba_query_subscriber.parse_message_value", tags={"dataset": dataset}):
+            return parse_message_value(message_value, jsoncodec)
+    except InvalidMessageError:
+        # If the message is in an invalid format, just log the error
+        # and continue
+        logger.exception(
+            "Subscription update could not be parsed",
+            extra={
+                "offset": message_offset,
+                "partition": message_partition,
+                "value": message_value,
+            },
+        )
+        return None
+
+
+def get_subscriptions(subscription_ids: Collection[str]) -> Dict[str, QuerySubscription]:
+    """
+    Fetches the `QuerySubscription`s of many Snuba subscription ids, along with their queries,
+    projects and organizations. Returns a dict keyed by Snuba subscription id.
+    """
+    subscriptions = {
+        subscription.subscription_id: subscription
+        for subscription in QuerySubscription.objects.get_many_from_cache(
+            subscription_ids, key="subscription_id"
+        )
+    }
+    snuba_queries = SnubaQuery.objects.in_bulk(
+        {subscription.snuba_query_id for subscription in subscriptions.values()}
+    )
+    projects = {
+        project.id: project
+        for project in Project.objects.get_many_from_cache(
+            {subscription.project_id for subscription in subscriptions.values()}
+        )
+    }
+    organizations = {
+        organization.id: organization
+        for organization in Organization.objects.get_many_from_cache(
+            {project.organization_id for project in projects.values()}
+        )
+    }
+    for project in projects.values():
+        if project.organization_id in organizations:
+            project.organization = organizations[project.organization_id]
+    for subscription in subscriptions.values():
+        if subscription.snuba_query_id in snuba_queries:
+            subscription.snuba_query = snuba_queries[subscription.snuba_query_id]
+        if subscription.project_id in projects:
+            subscription.project = projects[subscription.project_id]
+    return subscriptions
+
+
+def get_message_subscription(
+    contents: SubscriptionUpdate,
+    message_value: bytes,
+    message_offset: int,
+    message_partition: int,
+    topic: str,
+    dataset: str,
+    subscriptions: Optional[Mapping[str, QuerySubscription]] = None,
+) -> Optional[QuerySubscription]:
+    """
+    Fetches the active subscription of an update, unless it has been prefetched in
+    `subscriptions`. Returns None, after logging metrics/errors, if the subscription is inactive,
+    has been removed (in which case it's removed from Snuba as well), or has no callback.
+    """
+    try:
+        with metrics.timer("snuba_query_subscriber.fetch_subscription", tags={"dataset": dataset}):
+            if subscriptions is not None:
+                if contents["subscription_id"] not in subscriptions:
+                    raise QuerySubscription.DoesNotExist
+                subscription = subscriptions[contents["subscription_id"]]
+            else:
+                subscription = QuerySubscription.objects.get_from_cache(
+                    subscription_id=contents["subscription_id"]
+                )
+            if subscription.status != QuerySubscription.Status.ACTIVE.value:
+                metrics.incr("snuba_query_subscriber.subscription_inactive")
+                return None
+    except QuerySubscription.DoesNotExist:
+        metrics.incr("snuba_query_subscriber.subscription_doesnt_exist", tags={"dataset": dataset})
+        logger.warning(
+            "Received subscription update, but subscription does not exist",
+            extra={
+                "offset": message_offset,
+                "partition": message_partition,
+                "value": message_value,
+            },
+        )
+        try:
+            if topic in topic_to_dataset:
+                _delete_from_snuba(
+                    topic_to_dataset[topic],
+                    contents["subscription_id"],
+                    EntityKey(contents["entity"]),
+                )
+            else:
+                logger.error(
+                    "Topic not registered with QuerySubscriptionConsumer, can't remove "
+                    "non-existent subscription from Snuba",
+                    extra={"topic": topic, "subscription_id": contents["subscription_id"]},
+                )
+        except InvalidMessageError as e:
+            logger.exception(e)
+        except Exception:
+            logger.exception("Failed to delete unused subscription from snuba.")
+        return None
+
+    if subscription.type not in subscriber_registry:
+        metrics.incr(
+            "snuba_query_subscriber.subscription_type_not_registered", tags={"dataset": dataset}
+        )
+        logger.error(
+            "Received subscription update, but no subscription handler registered",
+            extra={
+                "offset": message_offset,
+                "partition": message_partition,
+                "value": message_value,
+            },
+        )
+        return None
+
+    return subscription
+
+
 class InvalidMessageError(Exception):
     pass
 
@@ -1,7 +1,8 @@
 import logging
+import time
 from functools import partial
 from random import random
-from typing import Mapping
+from typing import Dict, List, Mapping, Tuple
 
 import sentry_sdk
 from arroyo import Topic, configure_metrics
@@ -15,6 +16,7 @@ from arroyo.processing.strategies import (
     ProcessingStrategyFactory,
     RunTask,
 )
+from arroyo.processing.strategies.batching import BatchStep, ValuesBatch
 from arroyo.types import BrokerValue, Commit, Message, Partition
 from sentry_kafka_schemas import get_codec
 
@@ -35,6 +37,7 @@ class QuerySubscriptionStrategyFactory(ProcessingStrategyFactory[KafkaPayload]):
         input_block_size: int,
         output_block_size: int,
         multi_proc: bool = True,
+        mode: str = "parallel",
     ):
         self.topic = topic
         self.dataset = topic_to_dataset[self.topic]
@@ -45,12 +48,25 @@ class QuerySubscriptionStrategyFactory(ProcessingStrategyFactory[KafkaPayload]):
         self.input_block_size = input_block_size
         self.output_block_size = output_block_size
         self.multi_proc = multi_proc
+        self.batched = mode == "batched"
 
     def create_with_partitions(
         self,
         commit: Commit,
         partitions: Mapping[Partition, int],
     ) -> ProcessingStrategy[KafkaPayload]:
+        if self.batched:
+            # Messages are processed a batch at a time in this process, so that the updates of a
+            # batch can be handled together. See `handle_message_batch`.
+            return BatchStep(
+                max_batch_size=self.max_batch_size,
+                max_batch_time=self.max_batch_time,
+                next_step=RunTask(
+                    partial(process_batch, self.dataset, self.topic, self.logical_topic),
+                    CommitOffsets(commit),
+                ),
+            )
+
         callable = partial(process_message, self.dataset, self.topic, self.logical_topic)
         if self.multi_proc:
             return RunTaskWithMultiprocessing(
@@ -106,6 +122,52 @@ def process_message(
             )
 
 
+def process_batch(
+    dataset: Dataset, topic: str, logical_topic: str, message: Message[ValuesBatch[KafkaPayload]]
+) -> None:
+    from sentry import options
+    from sentry.snuba.query_subscriptions.consumer import handle_message_batch
+    from sentry.utils import metrics
+
+    start = time.monotonic()
+    # Updates are handled per partition, which keeps the updates of a subscription in order.
+    by_partition: Dict[int, List[Tuple[bytes, int, int]]] = {}
+    for value in message.payload:
+        by_partition.setdefault(value.partition.index, []).append(
+            (value.payload.value, value.offset, value.partition.index)
+        )
+
+    with sentry_sdk.start_transaction(
+        op="handle_message_batch",
+        name="query_subscription_consumer_process_batch",
+        sampled=random() <= options.get("subscriptions-query.sample-rate"),
+    ), metrics.timer(
+        "snuba_query_subscriber.handle_message_batch", tags={"dataset": dataset.value}
+    ):
+        for partition, messages in by_partition.items():
+            try:
+                handle_message_batch(messages, topic, dataset.value, get_codec(logical_topic))
+            except Exception:
+                # Like in `process_message`, a failure must not block the consumer.
+                logger.exception(
+                    "Unexpected error while handling batch in QuerySubscriptionStrategy. Skipping batch.",
+                    extra={
+                        "partition": partition,
+                        "first_offset": messages[0][1],
+                        "last_offset": messages[-1][1],
+                    },
+                )
+
+    duration = time.monotonic() - start
+    metrics.timing("snuba_query_subscriber.process_batch.size", len(message.payload))
+    if duration > 0:
+        metrics.gauge(
+            "snuba_query_subscriber.process_batch.messages_per_second",
+            len(message.payload) / duration,
+            tags={"dataset": dataset.value},
+        )
+
+
 def get_query_subscription_consumer(
     topic: str,
     group_id: str,
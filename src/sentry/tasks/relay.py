@@ -1,5 +1,6 @@
 import logging
 import time
+from collections import defaultdict
 
 import sentry_sdk
 from django.db import router, transaction
@@ -122,22 +123,7 @@ def compute_configs(organization_id=None, project_id=None, public_key=None):
         # it could be possible that refrequent invalidations cause the task to take excessive time
         # to complete.
         for organization in Organization.objects.filter(id=organization_id):
-            for project in Project.objects.filter(organization_id=organization_id):
-                project.set_cached_field_value("organization", organization)
-                for key in ProjectKey.objects.filter(project_id=project.id):
-                    key.set_cached_field_value("project", project)
-                    # If we find the config in the cache it means it was active.  As such we want to
-                    # recalculate it.  If the config was not there at all, we leave it and avoid the
-                    # cost of re-computation.
-                    if projectconfig_cache.backend.get(key.public_key) is not None:
-                        configs[key.public_key] = compute_projectkey_config(key)
-                        action = "recompute"
-                    else:
-                        action = "not-cached"
-                    metrics.incr(
-                        "relay.projectconfig_cache.invalidation.recompute",
-                        tags={"action": action, "scope": "organization"},
-                    )
+            configs.update(compute_organization_configs(organization))
     elif project_id:
         for project in Project.objects.filter(id=project_id):
             for key in ProjectKey.objects.filter(project_id=project_id):
@@ -176,6 +162,63 @@ def compute_configs(organization_id=None, project_id=None, public_key=None):
     return configs
 
 
+def compute_organization_configs(organization):
+    """Computes the configs of all cached public keys of the organization.
+
+    Fetches the projects, keys and project options of the organization in bulk, checks which
+    keys are cached with a single pipeline and shares the organization-level parts of the
+    configs between its projects.
+
+    :returns: A dict mapping the affected public keys to their config.
+    """
+    from sentry.models import Project, ProjectKey, ProjectOption
+    from sentry.relay.config import OrganizationConfigValues, get_project_key_configs
+
+    with metrics.timer("relay.projectconfig_cache.invalidation.organization.duration"):
+        projects = list(Project.objects.filter(organization_id=organization.id))
+        keys_by_project = defaultdict(list)
+        for key in ProjectKey.objects.filter(project_id__in=[project.id for project in projects]):
+            keys_by_project[key.project_id].append(key)
+
+        # If we find the config in the cache it means it was active.  As such we want to
+        # recalculate it.  If the config was not there at all, we leave it and avoid the
+        # cost of re-computation.
+        cached_public_keys = projectconfig_cache.exists_many(
+            key.public_key for keys in keys_by_project.values() for key in keys
+        )
+        cached_keys_by_project = {
+            project_id: cached_keys
+            for project_id, keys in keys_by_project.items()
+            if (cached_keys := [key for key in keys if key.public_key in cached_public_keys])
+        }
+        projects = [project for project in projects if project.id in cached_keys_by_project]
+        ProjectOption.objects.get_all_values_bulk(projects)
+
+        configs = {}
+        organization_values = OrganizationConfigValues(organization)
+        for project in projects:
+            project.set_cached_field_value("organization", organization)
+            keys = cached_keys_by_project[project.id]
+            for key in keys:
+                key.set_cached_field_value("project", project)
+            configs.update(get_project_key_configs(project, keys, organization_values))
+
+    key_count = sum(len(keys) for keys in keys_by_project.values())
+    metrics.incr(
+        "relay.projectconfig_cache.invalidation.recompute",
+        tags={"action": "recompute", "scope": "organization"},
+        amount=len(configs),
+    )
+    metrics.incr(
+        "relay.projectconfig_cache.invalidation.recompute",
+        tags={"action": "not-cached", "scope": "organization"},
+        amount=key_count - len(configs),
+    )
+    metrics.timing("relay.projectconfig_cache.invalidation.organization.keys", key_count)
+
+    return configs
+
+
 def compute_projectkey_config(key):
     """Computes a single config for the given :class:`ProjectKey`.
 
@@ -33,6 +33,20 @@ requires_snuba = pytest.mark.skipif(
 )
 
 
+def pytest_benchmark_is_available() -> bool:
+    try:
+        __import__("pytest_benchmark")
+    except ModuleNotFoundError:
+        return False
+    else:
+        return True
+
+
+requires_pytest_benchmark = pytest.mark.skipif(
+    not pytest_benchmark_is_available(), reason="requires pytest-benchmark"
+)
+
+
 def is_arm64() -> bool:
     return os.uname().machine == "arm64"
 
@@ -1,3 +1,4 @@
+from array import array
 from collections.abc import Callable
 from datetime import timedelta
 from enum import Enum
@@ -101,13 +102,106 @@ class TSDBModel(Enum):
     sentry_app_component_interacted = 801
 
 
+class TimeSeriesArrays:
+    """
+    Dense counter series for many keys over the same rollup buckets.
+
+    ``timestamps`` holds the start of every bucket, ``values`` the counts in
+    row-major order: one row of ``len(timestamps)`` counts per key, in the
+    order of ``keys``. Rows are exposed as zero-copy ``memoryview`` slices so
+    they can be summed or compared without materializing ``(timestamp,
+    count)`` tuples.
+
+    >>> arrays = tsdb.get_range_arrays(TSDBModel.group, [1, 2], start, end)
+    >>> arrays.sums()
+    {1: 10, 2: 4}
+    >>> sum(arrays.row(1)[-24:])
+    3
+    """
+
+    def __init__(self, keys, timestamps, values=None):
+        self.keys = list(keys)
+        self.timestamps = array("q", timestamps)
+        self.width = len(self.timestamps)
+        self._index = {key: i for i, key in enumerate(self.keys)}
+        if values is None:
+            values = array("q", bytes(8 * self.width * len(self.keys)))
+        self.values = values
+
+    def index(self, key):
+        return self._index[key]
+
+    def row(self, key):
+        offset = self._index[key] * self.width
+        return memoryview(self.values)[offset : offset + self.width]
+
+    def sums(self):
+        return {key: sum(self.row(key)) for key in self.keys}
+
+    def downsample(self, rollup):
+        """
+        Merge buckets into ``rollup`` sized buckets, like `BaseTSDB.rollup`
+        does for ``get_range`` results.
+        """
+        boundaries = []
+        timestamps = array("q")
+        for i, ts in enumerate(self.timestamps):
+            ts = ts - ts % rollup
+            if not timestamps or timestamps[-1] != ts:
+                timestamps.append(ts)
+                boundaries.append(i)
+        boundaries.append(self.width)
+
+        rv = TimeSeriesArrays(self.keys, timestamps)
+        target = 0
+        for key in self.keys:
+            row = self.row(key)
+            for start, end in zip(boundaries, boundaries[1:]):
+                rv.values[target] = sum(row[start:end])
+                target += 1
+        return rv
+
+    def to_series(self):
+        """
+        Returns the ``get_range`` representation of the arrays.
+        """
+        timestamps = [float(ts) for ts in self.timestamps]
+        return {key: list(zip(timestamps, self.row(key).tolist())) for key in self.keys}
+
+
+def cluster_windows(windows):
+    """
+    Groups ``(start, end)`` windows that overlap or touch. Returns the indexes
+    of the windows of every group, so a single query can cover each group
+    without scanning the gaps between disjoint windows (e.g. the last minute
+    and the same minute 30 days ago).
+
+    >>> cluster_windows([(0, 10), (100, 110), (5, 20)])
+    [[0, 2], [1]]
+    """
+    clusters = []
+    cluster_end = None
+    for index in sorted(range(len(windows)), key=lambda i: windows[i][0]):
+        start, end = windows[index]
+        if clusters and start <= cluster_end:
+            clusters[-1].append(index)
+            cluster_end = max(cluster_end, end)
+        else:
+            clusters.append([index])
+            cluster_end = end
+    return clusters
+
+
 class BaseTSDB(Service):
     __read_methods__ = frozenset(
         [
             "get_range",
+            "get_range_arrays",
             "get_sums",
+            "get_sums_multi_window",
             "get_distinct_counts_series",
             "get_distinct_counts_totals",
+            "get_distinct_counts_totals_multi_window",
             "get_distinct_counts_union",
             "get_most_frequent",
             "get_most_frequent_series",
@@ -372,6 +466,35 @@ class BaseTSDB(Service):
         """
         raise NotImplementedError
 
+    def get_range_arrays(self, model, keys, start, end, rollup=None, environment_id=None):
+        """
+        Like ``get_range``, but returns the counts as a `TimeSeriesArrays`
+        with one row per key and aligned bucket timestamps.
+
+        >>> now = timezone.now()
+        >>> get_range_arrays(TSDBModel.group, [1, 2, 3],
+        >>>                  start=now - timedelta(days=1),
+        >>>                  end=now)
+        """
+        rollup, series = self.get_optimal_rollup_series(start, end, rollup)
+        arrays = TimeSeriesArrays(keys, series)
+        range_set = self.get_range(
+            model,
+            keys,
+            start,
+            end,
+            rollup,
+            environment_ids=[environment_id] if environment_id is not None else None,
+        )
+        buckets = {ts: i for i, ts in enumerate(series)}
+        for key, points in range_set.items():
+            offset = arrays.index(key) * arrays.width
+            for ts, count in points:
+                bucket = buckets.get(int(ts))
+                if bucket is not None:
+                    arrays.values[offset + bucket] = count
+        return arrays
+
     def get_sums(
         self,
         model,
@@ -400,6 +523,42 @@ class BaseTSDB(Service):
         sum_set = {key: sum(p for _, p in points) for (key, points) in range_set.items()}
         return sum_set
 
+    def get_sums_multi_window(
+        self,
+        model,
+        keys,
+        windows,
+        environment_id=None,
+        use_cache=False,
+        jitter_value=None,
+        tenant_ids=None,
+        referrer_suffix=None,
+        environment_ids=None,
+    ):
+        """
+        Like ``get_sums``, for several ``(start, end)`` windows at once.
+        Returns one ``{key: sum}`` mapping per window, in the order of
+        ``windows``. ``environment_ids`` optionally has a different
+        environment (or ``None``) for every window. Backends that can answer
+        all windows with a single query override this.
+        """
+        if environment_ids is None:
+            environment_ids = [environment_id] * len(windows)
+        return [
+            self.get_sums(
+                model,
+                keys,
+                start,
+                end,
+                environment_id=window_environment_id,
+                use_cache=use_cache,
+                jitter_value=jitter_value,
+                tenant_ids=tenant_ids,
+                referrer_suffix=referrer_suffix,
+            )
+            for (start, end), window_environment_id in zip(windows, environment_ids)
+        ]
+
     def _add_jitter_to_series(self, series, start, rollup, jitter_value):
         if jitter_value and series:
             jitter = jitter_value % rollup
@@ -473,6 +632,40 @@ class BaseTSDB(Service):
         """
         raise NotImplementedError
 
+    def get_distinct_counts_totals_multi_window(
+        self,
+        model,
+        keys,
+        windows,
+        environment_id=None,
+        use_cache=False,
+        jitter_value=None,
+        tenant_ids=None,
+        referrer_suffix=None,
+        environment_ids=None,
+    ):
+        """
+        Like ``get_distinct_counts_totals``, for several ``(start, end)``
+        windows at once. Returns one ``{key: count}`` mapping per window, in
+        the order of ``windows``.
+        """
+        if environment_ids is None:
+            environment_ids = [environment_id] * len(windows)
+        return [
+            self.get_distinct_counts_totals(
+                model,
+                keys,
+                start,
+                end,
+                environment_id=window_environment_id,
+                use_cache=use_cache,
+                jitter_value=jitter_value,
+                tenant_ids=tenant_ids,
+                referrer_suffix=referrer_suffix,
+            )
+            for (start, end), window_environment_id in zip(windows, environment_ids)
+        ]
+
     def get_distinct_counts_union(
         self,
         model,
@@ -0,0 +1,231 @@
+"""
+Decoding, merging and counting of Redis HyperLogLog values.
+
+This allows the registers of many HyperLogLogs to be fetched with ``GET`` and
+merged in-process, instead of merging them with ``PFMERGE`` into temporary
+keys. The estimate produced by `count` is the one returned by ``PFCOUNT``
+(the estimator used by Redis since 4.0.)
+
+The representation is described in detail in Redis' ``hyperloglog.c``. In
+short, every value starts with a 16 byte header::
+
+    +------+---+-----+----------+
+    | HYLL | E | N/U | Cardin.  |
+    +------+---+-----+----------+
+
+``E`` is the encoding of the 16384 6-bit registers that follow it, which is
+either dense (registers packed back to back, least significant bit first) or
+sparse (a run length encoding of the registers).
+"""
+
+from __future__ import annotations
+
+import math
+import struct
+from typing import Iterable, Optional
+
+__all__ = ["HLL_REGISTERS", "decode", "encode", "merge", "count"]
+
+HLL_P = 14
+HLL_Q = 64 - HLL_P
+HLL_REGISTERS = 1 << HLL_P
+HLL_REGISTER_MAX = (1 << 6) - 1
+HLL_ALPHA_INF = 0.721347520444481703680
+
+HLL_DENSE = 0
+HLL_SPARSE = 1
+HLL_HEADER = struct.Struct("<4sB3s8s")
+HLL_HEADER_SIZE = HLL_HEADER.size
+HLL_DENSE_SIZE = HLL_HEADER_SIZE + (HLL_REGISTERS * 6 + 7) // 8
+
+# Sparse opcodes
+HLL_SPARSE_XZERO_BIT = 0x40
+HLL_SPARSE_VAL_BIT = 0x80
+HLL_SPARSE_ZERO_MAX_LEN = 64
+HLL_SPARSE_XZERO_MAX_LEN = 16384
+HLL_SPARSE_VAL_MAX_VALUE = 32
+HLL_SPARSE_VAL_MAX_LEN = 4
+# Mirrors the ``hll-sparse-max-bytes`` default of Redis.
+HLL_SPARSE_MAX_BYTES = 3000
+
+# The cached cardinality is flagged as invalid so that Redis recomputes it.
+_INVALID_CARDINALITY = b"\x00" * 7 + b"\x80"
+
+
+def decode(value: bytes, registers: Optional[bytearray] = None) -> bytearray:
+    """
+    Decode a HyperLogLog value as returned by ``GET`` into a bytearray with
+    one element per register. If ``registers`` is provided, the value is
+    merged into it (keeping the maximum of every register) instead.
+    """
+    magic, encoding, _, _ = HLL_HEADER.unpack_from(value)
+    if magic != b"HYLL":
+        raise ValueError("Value is not a HyperLogLog")
+
+    if registers is None:
+        registers = bytearray(HLL_REGISTERS)
+
+    if encoding == HLL_DENSE:
+        _decode_dense(value, registers)
+    elif encoding == HLL_SPARSE:
+        _decode_sparse(value, registers)
+    else:
+        raise ValueError(f"Unsupported HyperLogLog encoding: {encoding}")
+
+    return registers
+
+
+def _decode_dense(value: bytes, registers: bytearray) -> None:
+    if len(value) != HLL_DENSE_SIZE:
+        raise ValueError("Invalid dense HyperLogLog size")
+
+    # Every 3 bytes hold exactly 4 registers.
+    index = 0
+    for offset in range(HLL_HEADER_SIZE, HLL_DENSE_SIZE, 3):
+        bits = value[offset] | (value[offset + 1] << 8) | (value[offset + 2] << 16)
+        for shift in (0, 6, 12, 18):
+            register = (bits >> shift) & HLL_REGISTER_MAX
+            if register > registers[index]:
+                registers[index] = register
+            index += 1
+
+
+def _decode_sparse(value: bytes, registers: bytearray) -> None:
+    index = 0
+    offset = HLL_HEADER_SIZE
+    end = len(value)
+    while offset < end:
+        opcode = value[offset]
+        if opcode & HLL_SPARSE_VAL_BIT:
+            register = ((opcode >> 2) & 0x1F) + 1
+            length = (opcode & 0x3) + 1
+            for i in range(index, index + length):
+                if register > registers[i]:
+                    registers[i] = register
+            index += length
+            offset += 1
+        elif opcode & HLL_SPARSE_XZERO_BIT:
+            index += (((opcode & 0x3F) << 8) | value[offset + 1]) + 1
+            offset += 2
+        else:
+            index += (opcode & 0x3F) + 1
+            offset += 1
+
+    if index != HLL_REGISTERS:
+        raise ValueError("Invalid sparse HyperLogLog")
+
+
+def merge(values: Iterable[Optional[bytes]]) -> bytearray:
+    """
+    Merge HyperLogLog values (missing values are skipped) into registers, as
+    ``PFMERGE`` would.
+    """
+    registers = bytearray(HLL_REGISTERS)
+    for value in values:
+        if value is not None:
+            decode(value, registers)
+    return registers
+
+
+def encode(registers: bytearray) -> bytes:
+    """
+    Encode registers into a value that can be written with ``SET`` and used
+    with any of the HyperLogLog commands. The sparse encoding is used while it
+    is smaller than ``hll-sparse-max-bytes``, like Redis does.
+    """
+    sparse = _encode_sparse(registers)
+    if sparse is not None:
+        return sparse
+    return _encode_dense(registers)
+
+
+def _encode_dense(registers: bytearray) -> bytes:
+    rv = bytearray(HLL_HEADER.pack(b"HYLL", HLL_DENSE, b"\x00" * 3, _INVALID_CARDINALITY))
+    for index in range(0, HLL_REGISTERS, 4):
+        bits = (
+            registers[index]
+            | (registers[index + 1] << 6)
+            | (registers[index + 2] << 12)
+            | (registers[index + 3] << 18)
+        )
+        rv += bytes((bits & 0xFF, (bits >> 8) & 0xFF, bits >> 16))
+    return bytes(rv)
+
+
+def _encode_sparse(registers: bytearray) -> Optional[bytes]:
+    rv = bytearray(HLL_HEADER.pack(b"HYLL", HLL_SPARSE, b"\x00" * 3, _INVALID_CARDINALITY))
+    index = 0
+    while index < HLL_REGISTERS:
+        register = registers[index]
+        run = 1
+        while index + run < HLL_REGISTERS and registers[index + run] == register:
+            run += 1
+        index += run
+
+        if register == 0:
+            while run > 0:
+                length = min(run, HLL_SPARSE_XZERO_MAX_LEN)
+                if length > HLL_SPARSE_ZERO_MAX_LEN:
+                    rv.append(HLL_SPARSE_XZERO_BIT | ((length - 1) >> 8))
+                    rv.append((length - 1) & 0xFF)
+                else:
+                    rv.append(length - 1)
+                run -= length
+        elif register > HLL_SPARSE_VAL_MAX_VALUE:
+            return None
+        else:
+            while run > 0:
+                length = min(run, HLL_SPARSE_VAL_MAX_LEN)
+                rv.append(HLL_SPARSE_VAL_BIT | ((register - 1) << 2) | (length - 1))
+                run -= length
+
+        if len(rv) - HLL_HEADER_SIZE > HLL_SPARSE_MAX_BYTES:
+            return None
+
+    return bytes(rv)
+
+
+def _sigma(x: float) -> float:
+    if x == 1.0:
+        return math.inf
+    y = 1.0
+    z = x
+    while True:
+        x *= x
+        z_prime = z
+        z += x * y
+        y += y
+        if z_prime == z:
+            return z
+
+
+def _tau(x: float) -> float:
+    if x == 0.0 or x == 1.0:
+        return 0.0
+    y = 1.0
+    z = 1 - x
+    while True:
+        x = math.sqrt(x)
+        z_prime = z
+        y *= 0.5
+        z -= (1 - x) ** 2 * y
+        if z_prime == z:
+            return z / 3
+
+
+def count(registers: bytearray) -> int:
+    """
+    Estimate the cardinality of the registers, using the same estimator (by
+    Otmar Ertl) as ``PFCOUNT``.
+    """
+    histogram = [registers.count(i) for i in range(HLL_Q + 2)]
+
+    m = float(HLL_REGISTERS)
+    z = m * _tau((m - histogram[HLL_Q + 1]) / m)
+    for j in range(HLL_Q, 0, -1):
+        z += histogram[j]
+        z *= 0.5
+    z += m * _sigma(histogram[0] / m)
+
+    # llroundl: round half away from zero.
+    return int(math.floor(HLL_ALPHA_INF * m * m / z + 0.5))
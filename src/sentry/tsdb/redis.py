@@ -1,9 +1,6 @@
-import itertools
 import logging
-import random
 import uuid
 from collections import defaultdict, namedtuple
-from functools import reduce
 from hashlib import md5
 from typing import Callable, ContextManager, TypeVar
 
@@ -11,7 +8,8 @@ from django.utils import timezone
 from django.utils.encoding import force_bytes
 from pkg_resources import resource_string
 
-from sentry.tsdb.base import BaseTSDB
+from sentry.tsdb import hyperloglog
+from sentry.tsdb.base import BaseTSDB, TimeSeriesArrays
 from sentry.utils.compat import crc32
 from sentry.utils.dates import to_datetime, to_timestamp
 from sentry.utils.redis import SentryScript, check_cluster_versions, get_cluster_from_options
@@ -166,6 +164,14 @@ class RedisTSDB(BaseTSDB):
 
         Returns a 2-tuple that contains the hash key and the hash field.
         """
+        vnode, hash_field = self.make_counter_shard(key, environment_id)
+        return (self.make_counter_hash_key(model, rollup, timestamp, vnode), hash_field)
+
+    def make_counter_shard(self, key, environment_id):
+        """
+        Returns a 2-tuple of the vnode holding the counters for ``key`` and the
+        hash field they are stored under. Neither depends on the timestamp.
+        """
         model_key = self.get_model_key(key)
 
         if isinstance(model_key, int):
@@ -173,14 +179,14 @@ class RedisTSDB(BaseTSDB):
         else:
             vnode = crc32(force_bytes(model_key)) % self.vnodes
 
-        return (
-            "{prefix}{model}:{epoch}:{vnode}".format(
-                prefix=self.prefix,
-                model=model.value,
-                epoch=self.normalize_to_rollup(timestamp, rollup),
-                vnode=vnode,
-            ),
-            self.add_environment_parameter(model_key, environment_id),
+        return vnode, self.add_environment_parameter(model_key, environment_id)
+
+    def make_counter_hash_key(self, model, rollup, timestamp, vnode):
+        return "{prefix}{model}:{epoch}:{vnode}".format(
+            prefix=self.prefix,
+            model=model.value,
+            epoch=self.normalize_to_rollup(timestamp, rollup),
+            vnode=vnode,
         )
 
     def get_model_key(self, key):
@@ -291,27 +297,65 @@ class RedisTSDB(BaseTSDB):
         self.validate_arguments([model], [environment_id])
 
         rollup, series = self.get_optimal_rollup_series(start, end, rollup)
-        series = [to_datetime(item) for item in series]
+        return self._get_counter_arrays(model, keys, series, rollup, environment_id).to_series()
+
+    def get_range_arrays(self, model, keys, start, end, rollup=None, environment_id=None):
+        self.validate_arguments([model], [environment_id])
+
+        rollup, series = self.get_optimal_rollup_series(start, end, rollup)
+        return self._get_counter_arrays(model, keys, series, rollup, environment_id)
+
+    def get_sums(
+        self,
+        model,
+        keys,
+        start,
+        end,
+        rollup=None,
+        environment_id=None,
+        use_cache=False,
+        jitter_value=None,
+        tenant_ids=None,
+        referrer_suffix=None,
+    ):
+        return self.get_range_arrays(
+            model, keys, start, end, rollup, environment_id=environment_id
+        ).sums()
+
+    def _get_counter_arrays(self, model, keys, series, rollup, environment_id):
+        """
+        Fetch the counters of ``keys`` for every bucket of ``series``.
+
+        Counters of keys sharing a vnode live in the same hash, so this issues
+        one pipelined HMGET per (bucket, vnode) instead of one HGET per
+        (bucket, key).
+        """
+        arrays = TimeSeriesArrays(dict.fromkeys(keys), series)
+
+        # vnode -> ([row, ...], [hash field, ...])
+        shards = defaultdict(lambda: ([], []))
+        for row, key in enumerate(arrays.keys):
+            vnode, hash_field = self.make_counter_shard(key, environment_id)
+            rows, fields = shards[vnode]
+            rows.append(row)
+            fields.append(hash_field)
 
         results = []
         cluster, _ = self.get_cluster(environment_id)
         with cluster.map() as client:
-            for key in keys:
-                for timestamp in series:
-                    hash_key, hash_field = self.make_counter_key(
-                        model, rollup, timestamp, key, environment_id
-                    )
-                    results.append(
-                        (to_timestamp(timestamp), key, client.hget(hash_key, hash_field))
-                    )
-
-        results_by_key = defaultdict(dict)
-        for epoch, key, count in results:
-            results_by_key[key][epoch] = int(count.value or 0)
-
-        for key, points in results_by_key.items():
-            results_by_key[key] = sorted(points.items())
-        return dict(results_by_key)
+            for bucket, timestamp in enumerate(series):
+                timestamp = to_datetime(timestamp)
+                for vnode, (rows, fields) in shards.items():
+                    hash_key = self.make_counter_hash_key(model, rollup, timestamp, vnode)
+                    results.append((bucket, rows, client.hmget(hash_key, fields)))
+
+        width = arrays.width
+        values = arrays.values
+        for bucket, rows, promise in results:
+            for row, count in zip(rows, promise.value):
+                if count is not None:
+                    values[row * width + bucket] = int(count)
+        return arrays
 
     def merge(self, model, destination, sources, timestamp=None, environment_ids=None):
         environment_ids = (set(environment_ids) if environment_ids is not None else set()).union(
@@ -494,78 +538,20 @@ class RedisTSDB(BaseTSDB):
 
         rollup, series = self.get_optimal_rollup_series(start, end, rollup)
 
-        temporary_id = uuid.uuid1().hex
-
-        def make_temporary_key(key):
-            return f"{self.prefix}{temporary_id}:{key}"
-
-        def expand_key(key):
-            """
-            Return a list containing all keys for each interval in the series for a key.
-            """
-            return [
-                self.make_key(model, rollup, timestamp, key, environment_id) for timestamp in series
-            ]
-
+        # The HyperLogLogs are fetched as raw values and merged in-process,
+        # which keeps this read-only on Redis (as opposed to ``PFMERGE``-ing
+        # into temporary keys on every host.)
+        values = []
         cluster, _ = self.get_cluster(environment_id)
-        router = cluster.get_router()
-
-        def map_key_to_host(hosts, key):
-            """
-            Identify the host where a key is located and add it to the host map.
-            """
-            hosts[router.get_host_for_key(key)].add(key)
-            return hosts
-
-        def get_partition_aggregate(value):
-            """
-            Fetch the HyperLogLog value (in its raw byte representation) that
-            results from merging all HyperLogLogs at the provided keys.
-            """
-            (host, keys) = value
-            destination = make_temporary_key(f"p:{host}")
-            client = cluster.get_local_client(host)
-            with client.pipeline(transaction=False) as pipeline:
-                pipeline.execute_command(
-                    "PFMERGE",
-                    destination,
-                    *itertools.chain.from_iterable(expand_key(key) for key in keys),
-                )
-                pipeline.get(destination)
-                pipeline.delete(destination)
-                return (host, pipeline.execute()[1])
-
-        def merge_aggregates(values):
-            """
-            Calculate the cardinality of the provided HyperLogLog values.
-            """
-            destination = make_temporary_key("a")  # all values will be merged into this key
-            aggregates = {make_temporary_key(f"a:{host}"): value for host, value in values}
-
-            # Choose a random host to execute the reduction on. (We use a host
-            # here that we've already accessed as part of this process -- this
-            # way, we constrain the choices to only hosts that we know are
-            # running.)
-            client = cluster.get_local_client(random.choice(values)[0])
-            with client.pipeline(transaction=False) as pipeline:
-                pipeline.mset(aggregates)
-                pipeline.execute_command("PFMERGE", destination, *aggregates.keys())
-                pipeline.execute_command("PFCOUNT", destination)
-                pipeline.delete(destination, *aggregates.keys())
-                return pipeline.execute()[2]
-
-        # TODO: This could be optimized to skip the intermediate step for the
-        # host that has the largest number of keys if the final merge and count
-        # is performed on that host. If that host contains *all* keys, the
-        # final reduction could be performed as a single PFCOUNT, skipping the
-        # MSET and PFMERGE operations entirely.
-
-        return merge_aggregates(
-            [
-                get_partition_aggregate(x)
-                for x in reduce(map_key_to_host, keys, defaultdict(set)).items()
-            ]
-        )
+        with cluster.fanout() as client:
+            for key in keys:
+                c = client.target_key(key)
+                for timestamp in series:
+                    values.append(
+                        c.get(self.make_key(model, rollup, timestamp, key, environment_id))
+                    )
+
+        return hyperloglog.count(hyperloglog.merge(promise.value for promise in values))
 
     def merge_distinct_counts(
         self, model, destination, sources, timestamp=None, environment_ids=None
@@ -609,33 +595,33 @@ class RedisTSDB(BaseTSDB):
             with wrapper(cluster.fanout()) as client:
                 c = client.target_key(destination)
 
-                temporary_key_sequence = itertools.count()
+                temporary_key = make_temporary_key("m")
 
                 for rollup, series in data.items():
                     for timestamp, results in series.items():
                         for environment_id, promises in results.items():
-                            values = {}
-                            for promise in promises:
-                                if promise.value is None:
-                                    continue
-                                k = make_temporary_key(next(temporary_key_sequence))
-                                values[k] = promise.value
-
-                            if values:
-                                key = self.make_key(
-                                    model,
-                                    rollup,
-                                    to_timestamp(timestamp),
-                                    destination,
-                                    environment_id,
-                                )
-                                c.mset(values)
-                                c.pfmerge(key, key, *values.keys())
-                                c.delete(*values.keys())
-                                c.expireat(
-                                    key,
-                                    self.calculate_expiry(rollup, self.rollups[rollup], timestamp),
-                                )
+                            values = [promise.value for promise in promises]
+                            if not any(value is not None for value in values):
+                                continue
+
+                            # Sources are merged in-process so that only a
+                            # single temporary key has to be written, while
+                            # ``PFMERGE`` keeps the update of the destination
+                            # atomic.
+                            key = self.make_key(
+                                model,
+                                rollup,
+                                to_timestamp(timestamp),
+                                destination,
+                                environment_id,
+                            )
+                            c.set(temporary_key, hyperloglog.encode(hyperloglog.merge(values)))
+                            c.pfmerge(key, key, temporary_key)
+                            c.delete(temporary_key)
+                            c.expireat(
+                                key,
+                                self.calculate_expiry(rollup, self.rollups[rollup], timestamp),
+                            )
 
     def delete_distinct_counts(
         self, models, keys, start=None, end=None, timestamp=None, environment_ids=None
@@ -25,9 +25,12 @@ def dont_do_this(callargs):
 method_specifications = {
     # method: (type, function(callargs) -> set[model])
     "get_range": (READ, single_model_argument),
+    "get_range_arrays": (READ, single_model_argument),
     "get_sums": (READ, single_model_argument),
+    "get_sums_multi_window": (READ, single_model_argument),
     "get_distinct_counts_series": (READ, single_model_argument),
     "get_distinct_counts_totals": (READ, single_model_argument),
+    "get_distinct_counts_totals_multi_window": (READ, single_model_argument),
     "get_distinct_counts_union": (READ, single_model_argument),
     "get_most_frequent": (READ, single_model_argument),
     "get_most_frequent_series": (READ, single_model_argument),
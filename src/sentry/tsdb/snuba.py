@@ -24,14 +24,16 @@ from snuba_sdk.entity import get_required_time_column
 from snuba_sdk.legacy import is_condition, parse_condition
 from snuba_sdk.query import SelectableExpression
 
+from sentry import options
 from sentry.constants import DataCategory
 from sentry.ingest.inbound_filters import FILTER_STAT_KEYS_TO_VALUES
 from sentry.issues.query import manual_group_on_time_aggregation
 from sentry.snuba.dataset import Dataset
-from sentry.tsdb.base import BaseTSDB, TSDBModel
+from sentry.tsdb.base import BaseTSDB, TSDBModel, cluster_windows
 from sentry.utils import outcomes, snuba
 from sentry.utils.dates import to_datetime
 from sentry.utils.snuba import (
+    bulk_timeseries_snql_query,
     get_snuba_translators,
     infer_project_ids_from_related_models,
     nest_groups,
@@ -452,7 +454,10 @@ class SnubaTSDB(BaseTSDB):
             if referrer_suffix:
                 referrer += f".{referrer_suffix}"
 
-            query_result = raw_snql_query(snql_request, referrer, use_cache=use_cache)
+            if group_on_time and not use_cache and options.get("snuba.timeseries-cache.enabled"):
+                query_result = bulk_timeseries_snql_query([snql_request], rollup, referrer)[0]
+            else:
+                query_result = raw_snql_query(snql_request, referrer, use_cache=use_cache)
             if manual_group_on_time:
                 translated_results = {"data": query_result["data"]}
             else:
@@ -476,6 +481,159 @@ class SnubaTSDB(BaseTSDB):
         else:
             return result
 
+    def __get_multi_window_data_snql(
+        self,
+        model: TSDBModel,
+        keys: Sequence[Any],
+        windows: Sequence[tuple[datetime, datetime]],
+        environment_ids: Sequence[Optional[int]],
+        aggregation: str = "count",
+        use_cache: bool = False,
+        jitter_value: Optional[int] = None,
+        tenant_ids: Optional[dict[str, str | int]] = None,
+        referrer_suffix: Optional[str] = None,
+    ) -> List[dict[Any, int]]:
+        """
+        Aggregates ``keys`` over several time windows, by selecting one
+        conditional aggregate (``countIf``/``uniqIf``) per window. Every window
+        is rounded to the buckets of its optimal rollup exactly like
+        ``__get_data_snql`` rounds a single range, so the results match the
+        ones of separate queries.
+
+        Windows that overlap or touch share a single query scanning their
+        combined range, disjoint windows are queried separately so that the
+        gap between them isn't scanned.
+
+        ``environment_ids`` has the environment (or ``None``) of every window.
+        When windows have different environments, the environment filter is
+        part of the aggregate of every window instead of the query.
+        """
+        bounds = []
+        for start, end in windows:
+            rollup, series = self.get_optimal_rollup_series(start, end)
+            series = self._add_jitter_to_series(series, start, rollup, jitter_value)
+            bounds.append((to_datetime(series[0]), to_datetime(series[-1] + rollup)))
+
+        results: List[dict[Any, int]] = [{key: 0 for key in keys} for _ in windows]
+        if not keys or not windows:
+            return results
+
+        for cluster in cluster_windows(bounds):
+            cluster_results = self.__get_window_cluster_data_snql(
+                model,
+                keys,
+                [bounds[index] for index in cluster],
+                [environment_ids[index] for index in cluster],
+                aggregation=aggregation,
+                use_cache=use_cache,
+                tenant_ids=tenant_ids,
+                referrer_suffix=referrer_suffix,
+            )
+            for index, result in zip(cluster, cluster_results):
+                results[index] = result
+        return results
+
+    def __get_window_cluster_data_snql(
+        self,
+        model: TSDBModel,
+        keys: Sequence[Any],
+        bounds: Sequence[tuple[datetime, datetime]],
+        environment_ids: Sequence[Optional[int]],
+        aggregation: str,
+        use_cache: bool,
+        tenant_ids: Optional[dict[str, str | int]],
+        referrer_suffix: Optional[str],
+    ) -> List[dict[Any, int]]:
+        """
+        Runs the query of ``__get_multi_window_data_snql`` for already rounded
+        windows that overlap or touch.
+        """
+        model_query_settings = self.model_query_settings[model]
+        model_group = model_query_settings.groupby
+        model_aggregate = model_query_settings.aggregate
+        model_dataset = model_query_settings.dataset
+
+        results: List[dict[Any, int]] = [{key: 0 for key in keys} for _ in bounds]
+        keys_map: dict[str, Any] = {model_group: keys}
+        window_environments: List[Optional[Function]] = [None] * len(bounds)
+        environments = set(environment_ids)
+        if len(environments) == 1:
+            (environment_id,) = environments
+            if environment_id is not None:
+                keys_map["environment"] = [environment_id]
+        else:
+            filtered = [environment_id for environment_id in environments if environment_id]
+            if None not in environments:
+                keys_map["environment"] = filtered
+            environment_forward, _ = get_snuba_translators({"environment": filtered})
+            names = dict(
+                zip(filtered, environment_forward({"environment": filtered})["environment"])
+            )
+            for index, environment_id in enumerate(environment_ids):
+                if environment_id is None:
+                    continue
+                name = names[environment_id]
+                window_environments[index] = (
+                    Function("isNull", [Column("environment")])
+                    if name is None
+                    else Function("equals", [Column("environment"), name])
+                )
+
+        time_column = get_required_time_column(model_dataset.value) or "timestamp"
+        aggregations: List[SelectableExpression] = []
+        for index, (start, end) in enumerate(bounds):
+            window_conditions = [
+                Function("greaterOrEquals", [Column(time_column), start]),
+                Function("less", [Column(time_column), end]),
+            ]
+            if window_environments[index] is not None:
+                window_conditions.append(window_environments[index])
+            in_window = Function("and", window_conditions)
+            arguments = (
+                [Column(model_aggregate), in_window] if aggregation == "uniq" else [in_window]
+            )
+            aggregations.append(Function(f"{aggregation}If", arguments, f"aggregate_{index}"))
+
+        keys_map["project_id"] = infer_project_ids_from_related_models(keys_map)
+        forward, reverse = get_snuba_translators(keys_map)
+
+        where_conds = list(model_query_settings.conditions or [])
+        for col, f_keys in forward(deepcopy(keys_map)).items():
+            if f_keys:
+                if len(f_keys) == 1 and None in f_keys:
+                    where_conds.append(Condition(Column(col), Op.IS_NULL))
+                else:
+                    where_conds.append(Condition(Column(col), Op.IN, f_keys))
+        where_conds += [
+            Condition(Column(time_column), Op.GTE, min(start for start, _ in bounds)),
+            Condition(Column(time_column), Op.LT, max(end for _, end in bounds)),
+        ]
+
+        snql_request = Request(
+            dataset=model_dataset.value,
+            app_id="tsdb.get_data",
+            query=Query(
+                match=Entity(model_dataset.value),
+                select=[Column(model_group)] + aggregations,
+                where=where_conds,
+                groupby=[Column(model_group)],
+                limit=Limit(len(keys)),
+            ),
+            tenant_ids=tenant_ids or dict(),
+        )
+        referrer = f"tsdb-modelid:{model.value}"
+        if referrer_suffix:
+            referrer += f".{referrer_suffix}"
+
+        query_result = raw_snql_query(snql_request, referrer, use_cache=use_cache)
+        for row in query_result["data"]:
+            row = reverse(row)
+            key = row[model_group]
+            for index, result in enumerate(results):
+                if key in result:
+                    result[key] = row[f"aggregate_{index}"]
+        return results
+
     def __get_data_legacy(
         self,
         model,
@@ -746,6 +904,45 @@ class SnubaTSDB(BaseTSDB):
         #    {group: [(timestamp, count), ...]}
         return {k: sorted(result[k].items()) for k in result}
 
+    def get_sums_multi_window(
+        self,
+        model,
+        keys,
+        windows,
+        environment_id=None,
+        use_cache=False,
+        jitter_value=None,
+        tenant_ids=None,
+        referrer_suffix=None,
+        environment_ids=None,
+    ):
+        model_query_settings = self.non_outcomes_snql_query_settings.get(model)
+        # Counting a model with an aggregate column groups by that column
+        # instead, which can't be expressed with one conditional aggregate.
+        if model_query_settings is None or model_query_settings.aggregate is not None:
+            return super().get_sums_multi_window(
+                model,
+                keys,
+                windows,
+                environment_id=environment_id,
+                use_cache=use_cache,
+                jitter_value=jitter_value,
+                tenant_ids=tenant_ids,
+                referrer_suffix=referrer_suffix,
+                environment_ids=environment_ids,
+            )
+        return self.__get_multi_window_data_snql(
+            model,
+            keys,
+            windows,
+            environment_ids if environment_ids is not None else [environment_id] * len(windows),
+            aggregation="count",
+            use_cache=use_cache,
+            jitter_value=jitter_value,
+            tenant_ids=tenant_ids,
+            referrer_suffix=referrer_suffix,
+        )
+
     def get_distinct_counts_series(
         self, model, keys, start, end=None, rollup=None, environment_id=None, tenant_ids=None
     ):
@@ -793,6 +990,43 @@ class SnubaTSDB(BaseTSDB):
             referrer_suffix=referrer_suffix,
         )
 
+    def get_distinct_counts_totals_multi_window(
+        self,
+        model,
+        keys,
+        windows,
+        environment_id=None,
+        use_cache=False,
+        jitter_value=None,
+        tenant_ids=None,
+        referrer_suffix=None,
+        environment_ids=None,
+    ):
+        model_query_settings = self.non_outcomes_snql_query_settings.get(model)
+        if model_query_settings is None or model_query_settings.aggregate is None:
+            return super().get_distinct_counts_totals_multi_window(
+                model,
+                keys,
+                windows,
+                environment_id=environment_id,
+                use_cache=use_cache,
+                jitter_value=jitter_value,
+                tenant_ids=tenant_ids,
+                referrer_suffix=referrer_suffix,
+                environment_ids=environment_ids,
+            )
+        return self.__get_multi_window_data_snql(
+            model,
+            keys,
+            windows,
+            environment_ids if environment_ids is not None else [environment_id] * len(windows),
+            aggregation="uniq",
+            use_cache=use_cache,
+            jitter_value=jitter_value,
+            tenant_ids=tenant_ids,
+            referrer_suffix=referrer_suffix,
+        )
+
     def get_distinct_counts_union(
         self, model, keys, start, end=None, rollup=None, environment_id=None, tenant_ids=None
     ):
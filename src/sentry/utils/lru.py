@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from time import monotonic
+from typing import Callable, Generic, Hashable, MutableMapping, Optional, Tuple, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+__all__ = ["LRUCache"]
+
+
+class LRUCache(Generic[K, V]):
+    """
+    A thread-safe, process-local LRU cache bounded by the total weight of its
+    entries.
+
+    By default every entry weighs 1, which bounds the number of entries. Pass
+    a `weigher` (for example returning the size of a value in bytes) to bound
+    memory instead. Entries expire `ttl` seconds after they were stored,
+    unless a different ttl is passed to `set`.
+
+    Hit, miss and eviction counts are kept so that callers can report them.
+
+    >>> cache = LRUCache(max_weight=1024 * 1024, weigher=len, ttl=60)
+    >>> cache.set("key", b"value")
+    >>> cache.get("key")
+    b"value"
+    """
+
+    def __init__(
+        self,
+        max_weight: int,
+        weigher: Optional[Callable[[V], int]] = None,
+        ttl: Optional[float] = None,
+    ) -> None:
+        self.max_weight = max_weight
+        self.weigher = weigher
+        self.ttl = ttl
+        self.weight = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: MutableMapping[K, Tuple[V, int, Optional[float]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, weight, expires = entry
+                if expires is None or expires > monotonic():
+                    self._entries.move_to_end(key)  # type: ignore[attr-defined]
+                    self.hits += 1
+                    return value
+                self._remove(key)
+            self.misses += 1
+            return default
+
+    def set(
+        self, key: K, value: V, ttl: Optional[float] = None, weight: Optional[int] = None
+    ) -> int:
+        """
+        Store `value`, evicting the least recently used entries as needed.
+        `weight` overrides the `weigher` when the caller already knows it.
+        Returns the number of evicted entries.
+        """
+        if weight is None:
+            weight = self.weigher(value) if self.weigher is not None else 1
+        evicted = 0
+        with self._lock:
+            self._remove(key)
+            # Values that could never fit would just flush the whole cache.
+            if weight > self.max_weight:
+                return evicted
+
+            ttl = self.ttl if ttl is None else ttl
+            expires = monotonic() + ttl if ttl is not None else None
+            self._entries[key] = (value, weight, expires)
+            self.weight += weight
+
+            while self.weight > self.max_weight:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                evicted += 1
+
+            self.evictions += evicted
+        return evicted
+
+    def delete(self, key: K) -> None:
+        with self._lock:
+            self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.weight = 0
+
+    def _remove(self, key: K) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.weight -= entry[1]
@@ -315,6 +315,11 @@ def pytest_runtest_teardown(item):
     for model in (OrganizationOption, ProjectOption, UserOption):
         model.objects.clear_local_cache()
 
+    # Compiled rules refer to the rule registry, which tests replace.
+    from sentry.rules.processor import _compiled_rules
+
+    _compiled_rules.clear()
+
     Hub.main.bind_client(None)
 
 
@@ -59,6 +59,9 @@ _make_rb_cluster = functools.partial(rb.Cluster, pool_cls=_shared_pool)
 
 
 class _RBCluster:
+    # rb clients always return raw bytes
+    decodes_responses = False
+
     def supports(self, config):
         return not config.get("is_redis_cluster", False)
 
@@ -102,6 +105,8 @@ class RetryingRedisCluster(RedisCluster):
 
 
 class _RedisCluster:
+    decodes_responses = True
+
     def supports(self, config):
         # _RedisCluster supports two configurations:
         #  * Explicitly configured with is_redis_cluster. This mode is for real redis-cluster.
@@ -109,7 +114,7 @@ class _RedisCluster:
         #    in non-cluster mode.
         return config.get("is_redis_cluster", False) or len(config.get("hosts")) == 1
 
-    def factory(self, **config):
+    def factory(self, decode_responses: bool = True, **config):
         # StrictRedisCluster expects a list of { host, port } dicts. Coerce the
         # configuration into the correct format if necessary.
         hosts = config.get("hosts")
@@ -135,7 +140,7 @@ class _RedisCluster:
                     #
                     # https://github.com/Grokzen/redis-py-cluster/blob/73f27edf7ceb4a408b3008ef7d82dac570ab9c6a/rediscluster/nodemanager.py#L385
                     startup_nodes=deepcopy(hosts),
-                    decode_responses=True,
+                    decode_responses=decode_responses,
                     skip_full_coverage_check=True,
                     max_connections=16,
                     max_connections_per_node=True,
@@ -144,7 +149,7 @@ class _RedisCluster:
                 )
             else:
                 host = hosts[0].copy()
-                host["decode_responses"] = True
+                host["decode_responses"] = decode_responses
                 return (
                     import_string(config["client_class"])
                     if "client_class" in config
@@ -166,8 +171,15 @@ class ClusterManager(Generic[T]):
         self.__options_manager = options_manager
         self.__cluster_type = cluster_type()
 
-    def get(self, key) -> T:
-        cluster = self.__clusters.get(key)
+    def get(self, key, decode_responses: bool = True) -> T:
+        """
+        Returns the cluster called `key`. Clients of `redis_clusters` decode responses to
+        strings unless `decode_responses` is False, rb clusters never decode them.
+        """
+        # Clusters that never decode responses are shared between both kinds of callers
+        decodes_responses = getattr(self.__cluster_type, "decodes_responses", False)
+        decode_responses = decode_responses and decodes_responses
+        cluster = self.__clusters.get((key, decode_responses))
 
         # Do not access attributes of the `cluster` object to prevent
         # setup/init of lazy objects. The _RedisCluster type will try to
@@ -182,7 +194,11 @@ class ClusterManager(Generic[T]):
             if not self.__cluster_type.supports(configuration):
                 raise KeyError(f"Invalid cluster type, expected: {self.__cluster_type}")
 
-            cluster = self.__clusters[key] = self.__cluster_type.factory(**configuration)
+            if decodes_responses:
+                configuration = {**configuration, "decode_responses": decode_responses}
+            cluster = self.__clusters[key, decode_responses] = self.__cluster_type.factory(
+                **configuration
+            )
 
         return cluster
 
@@ -1,12 +1,15 @@
 from __future__ import annotations
 
+import dataclasses
 import functools
+import itertools
 import logging
 import os
 import re
+import threading
 import time
 from collections import namedtuple
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from contextlib import contextmanager
 from copy import deepcopy
 from datetime import datetime, timedelta, timezone
@@ -31,9 +34,11 @@ from dateutil.parser import parse as parse_datetime
 from django.conf import settings
 from django.core.cache import cache
 from sentry_sdk import Hub
-from snuba_sdk import Request
+from snuba_sdk import Column, Condition, Direction, Op, Request
 from snuba_sdk.legacy import json_to_snql
 
+from sentry import options
+from sentry.locks import locks
 from sentry.models import (
     Environment,
     Group,
@@ -50,6 +55,8 @@ from sentry.snuba.events import Columns
 from sentry.snuba.referrer import validate_referrer
 from sentry.utils import json, metrics
 from sentry.utils.dates import outside_retention_with_modified_start, to_timestamp
+from sentry.utils.locking import UnableToAcquireLock
+from sentry.utils.locking.lock import Lock
 
 logger = logging.getLogger(__name__)
 
@@ -76,6 +83,13 @@ OVERRIDE_OPTIONS = {
     "consistent": os.environ.get("SENTRY_SNUBA_CONSISTENT", "false").lower() in ("true", "1")
 }
 
+# How long a request may run a query before others stop waiting for its result, see
+# `_apply_cache_and_build_results`
+QUERY_CACHE_LOCK_DURATION = 30
+# Requests waiting for a result poll the cache with an exponential backoff
+QUERY_CACHE_POLL_INTERVAL = 0.05
+QUERY_CACHE_MAX_POLL_INTERVAL = 1.0
+
 # Show the snuba query params and the corresponding sql or errors in the server logs
 SNUBA_INFO = os.environ.get("SENTRY_SNUBA_INFO", "false").lower() in ("true", "1")
 if SNUBA_INFO:
@@ -406,7 +420,45 @@ _snuba_pool = connection_from_url(
     timeout=settings.SENTRY_SNUBA_TIMEOUT,
     maxsize=10,
 )
-_query_thread_pool = ThreadPoolExecutor(max_workers=10)
+QUERY_THREAD_POOL_SIZE = 10
+_query_thread_pool = ThreadPoolExecutor(max_workers=QUERY_THREAD_POOL_SIZE)
+
+
+class QueryConcurrencyLimiter:
+    """
+    Limits how many queries of a bulk query run at once, by referrer.
+
+    The limit grows by about one query for every round of queries that finish within
+    `snuba.bulk-query.target-latency` seconds. It is halved when a query is rate limited or
+    slower than that, at most once per target latency so that the queries of one slow round
+    only count once.
+    """
+
+    def __init__(self, max_limit: int) -> None:
+        self.max_limit = max_limit
+        self.limits: Dict[str, float] = {}
+        self.decreased_at: Dict[str, float] = {}
+        self.lock = threading.Lock()
+
+    def get(self, referrer: str) -> int:
+        with self.lock:
+            return int(self.limits.get(referrer, self.max_limit))
+
+    def record(self, referrer: str, duration: float, rate_limited: bool = False) -> None:
+        target_latency = options.get("snuba.bulk-query.target-latency")
+        now = time.monotonic()
+        with self.lock:
+            limit = self.limits.get(referrer, self.max_limit)
+            if rate_limited or duration > target_latency:
+                if now - self.decreased_at.get(referrer, 0) > target_latency:
+                    limit = max(1.0, limit / 2)
+                    self.decreased_at[referrer] = now
+            else:
+                limit = min(float(self.max_limit), limit + 1 / limit)
+            self.limits[referrer] = limit
+
+
+_query_concurrency = QueryConcurrencyLimiter(QUERY_THREAD_POOL_SIZE)
 
 
 epoch_naive = datetime(1970, 1, 1, tzinfo=None)
@@ -830,6 +882,177 @@ def bulk_snql_query(
     return _apply_cache_and_build_results(params, referrer=referrer, use_cache=use_cache)
 
 
+def _get_time_range_conditions(request: Request) -> Optional[Tuple[int, int]]:
+    """
+    Returns the positions of the `>=` start and `<` end conditions of the query, if it has
+    exactly one of each on a time column.
+    """
+    start_pos = end_pos = None
+    for pos, condition in enumerate(request.query.where or []):
+        if not (
+            isinstance(condition, Condition)
+            and isinstance(condition.lhs, Column)
+            and isinstance(condition.rhs, datetime)
+        ):
+            continue
+        if condition.op == Op.GTE and start_pos is None:
+            start_pos = pos
+        elif condition.op == Op.LT and end_pos is None:
+            end_pos = pos
+        else:
+            return None
+    if start_pos is None or end_pos is None:
+        return None
+    return start_pos, end_pos
+
+
+def _set_time_range(
+    request: Request, conditions: Tuple[int, int], start: float, end: float
+) -> Request:
+    """
+    Returns a copy of the request for the time range between the start and end timestamps.
+    """
+    where = list(request.query.where)
+    for pos, timestamp in zip(conditions, (start, end)):
+        condition = where[pos]
+        value = datetime.fromtimestamp(timestamp, timezone.utc)
+        if condition.rhs.tzinfo is None:
+            value = value.replace(tzinfo=None)
+        where[pos] = dataclasses.replace(condition, rhs=value)
+    return dataclasses.replace(request, query=request.query.set_where(where))
+
+
+def _get_timestamp(value: Union[datetime, str, int]) -> float:
+    if isinstance(value, str):
+        # See `sentry.snuba.discover.zerofill`
+        value = datetime.fromisoformat(value)
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return to_timestamp(value)
+    return value
+
+
+def bulk_timeseries_snql_query(
+    requests: List[Request],
+    rollup: int,
+    referrer: Optional[str] = None,
+) -> ResultSet:
+    """
+    Runs queries of time series grouped by `time` in buckets of `rollup` seconds.
+
+    The range of every query is split into chunks of whole buckets. The chunks that lie
+    `snuba.timeseries-cache.settle-seconds` in the past are cached on their own, so that when
+    the range moves forward only the chunks that weren't queried before and the most recent
+    buckets are sent to snuba. Results stitched together from several ranges only have `data`
+    and `meta`.
+    """
+    # Buckets of other sizes don't line up with the chunks
+    if 86400 % rollup:
+        return bulk_snql_query(requests, referrer)
+
+    for request in requests:
+        if referrer:
+            request.tenant_ids = request.tenant_ids or dict()
+            request.tenant_ids["referrer"] = referrer
+
+    chunk_size = rollup * options.get("snuba.timeseries-cache.buckets-per-chunk")
+    settled_at = time.time() - options.get("snuba.timeseries-cache.settle-seconds")
+    metric_tags = {"referrer": referrer} if referrer else None
+
+    # The requests for the ranges to query with the cache keys of the chunks in them, and the
+    # results of each query by the start of their range
+    to_query: List[Tuple[int, float, Request, Dict[float, str]]] = []
+    segments: List[Dict[float, Any]] = []
+    for request_pos, request in enumerate(requests):
+        segments.append({})
+        conditions = _get_time_range_conditions(request)
+        if conditions is None or Column("time") not in (request.query.groupby or []):
+            to_query.append((request_pos, 0, request, {}))
+            continue
+
+        start = _get_timestamp(request.query.where[conditions[0]].rhs)
+        end = _get_timestamp(request.query.where[conditions[1]].rhs)
+        chunks_start = -(-start // chunk_size) * chunk_size
+        chunks_end = max(chunks_start, min(end, settled_at) // chunk_size * chunk_size)
+        cache_keys = {
+            chunk: get_cache_key(_set_time_range(request, conditions, chunk, chunk + chunk_size))
+            for chunk in range(int(chunks_start), int(chunks_end), chunk_size)
+        }
+        cache_data = cache.get_many(list(cache_keys.values()))
+        metrics.incr("snuba.timeseries_cache.hit", amount=len(cache_data), tags=metric_tags)
+        metrics.incr(
+            "snuba.timeseries_cache.miss",
+            amount=len(cache_keys) - len(cache_data),
+            tags=metric_tags,
+        )
+
+        # Query everything between the cached chunks, usually the buckets before the first
+        # chunk, and the chunks that weren't queried before together with the latest buckets
+        range_start = start
+        range_keys: Dict[float, str] = {}
+        for chunk, cache_key in cache_keys.items():
+            if cache_key not in cache_data:
+                range_keys[chunk] = cache_key
+                continue
+            if range_start < chunk:
+                range_request = _set_time_range(request, conditions, range_start, chunk)
+                to_query.append((request_pos, range_start, range_request, range_keys))
+            segments[request_pos][chunk] = json.loads(cache_data[cache_key])
+            range_start, range_keys = chunk + chunk_size, {}
+        if range_start < end:
+            range_request = _set_time_range(request, conditions, range_start, end)
+            to_query.append((request_pos, range_start, range_request, range_keys))
+
+    query_results = bulk_snql_query([item[2] for item in to_query], referrer)
+
+    ttl = options.get("snuba.timeseries-cache.ttl")
+    for result, (request_pos, start, range_request, cache_keys) in zip(query_results, to_query):
+        segments[request_pos][start] = result
+        if not cache_keys:
+            continue
+        # A result cut off by the limit of the query may miss rows of any of the chunks
+        limit = range_request.query.limit
+        if limit is not None and len(result["data"]) >= limit.limit:
+            metrics.incr("snuba.timeseries_cache.limit_reached", tags=metric_tags)
+            continue
+
+        # Split the results by chunk to cache them one by one
+        chunk_data: Dict[float, List[Any]] = {chunk: [] for chunk in cache_keys}
+        for row in result["data"]:
+            chunk = _get_timestamp(row["time"]) // chunk_size * chunk_size
+            if chunk in chunk_data:
+                chunk_data[chunk].append(row)
+        cache.set_many(
+            {
+                cache_key: json.dumps({"data": chunk_data[chunk], "meta": result["meta"]})
+                for chunk, cache_key in cache_keys.items()
+            },
+            ttl,
+        )
+
+    results = []
+    for request, request_segments in zip(requests, segments):
+        if len(request_segments) == 1:
+            results.extend(request_segments.values())
+            continue
+
+        # Results are stitched in the order of time, unless the query orders by time descending
+        orderby = request.query.orderby or []
+        descending = (
+            bool(orderby)
+            and orderby[0].exp == Column("time")
+            and orderby[0].direction == Direction.DESC
+        )
+        data = []
+        meta = []
+        for start in sorted(request_segments, reverse=descending):
+            data.extend(request_segments[start]["data"])
+            meta = meta or request_segments[start].get("meta", [])
+        results.append({"data": data, "meta": meta})
+    return results
+
+
 def get_cache_key(query: SnubaQuery) -> str:
     if isinstance(query, Request):
         hashable = str(query)
@@ -849,6 +1072,78 @@ def bulk_raw_query(
     return _apply_cache_and_build_results(params, referrer=referrer, use_cache=use_cache)
 
 
+def _get_query_cache_policy(referrer: Optional[str]) -> Tuple[int, int]:
+    """
+    Returns how long query results of the referrer are cached, and how long they are
+    served stale after that.
+    """
+    ttl = settings.SENTRY_SNUBA_CACHE_TTL_SECONDS
+    stale_ttl = options.get("snuba.query-cache.stale-ttl")
+    policy = options.get("snuba.query-cache.referrer-policies").get(referrer or "")
+    if policy:
+        ttl = policy.get("ttl", ttl)
+        stale_ttl = policy.get("stale_ttl", stale_ttl)
+    return ttl, stale_ttl
+
+
+def _acquire_query_cache_lock(cache_key: str) -> Optional[Lock]:
+    """
+    Returns the lock for running the query of the cache key, or None if another request
+    holds it.
+    """
+    lock = _get_query_cache_lock(cache_key)
+    try:
+        lock.acquire()
+    except UnableToAcquireLock:
+        return None
+    return lock
+
+
+def _get_query_cache_lock(cache_key: str) -> Lock:
+    return locks.get(
+        f"{cache_key}:lock", duration=QUERY_CACHE_LOCK_DURATION, name="snuba_query_cache"
+    )
+
+
+def _wait_for_cached_results(cache_keys: Sequence[str]) -> Mapping[str, Any]:
+    """
+    Polls the cache for the results other requests are querying, until all of them are
+    there or `snuba.query-cache.single-flight.wait` seconds have passed. Stops waiting for
+    a result once the request running its query released the lock without caching it.
+    """
+    deadline = time.monotonic() + options.get("snuba.query-cache.single-flight.wait")
+    delay = QUERY_CACHE_POLL_INTERVAL
+    cache_data: Dict[str, Any] = {}
+    pending = list(cache_keys)
+    while True:
+        cache_data.update(cache.get_many(pending))
+        pending = [key for key in pending if key not in cache_data]
+        if pending:
+            # The results may have been cached right before the locks were released
+            released = [key for key in pending if not _get_query_cache_lock(key).locked()]
+            cache_data.update(cache.get_many(released))
+            pending = [key for key in pending if key not in released]
+        if not pending or time.monotonic() >= deadline:
+            return cache_data
+        time.sleep(min(delay, max(deadline - time.monotonic(), 0)))
+        delay = min(delay * 1.6, QUERY_CACHE_MAX_POLL_INTERVAL)
+
+
+def _query_and_cache_results(
+    to_query: Sequence[Tuple[int, SnubaQueryBody, Optional[str]]],
+    headers: Mapping[str, str],
+    ttl: int,
+    stale_ttl: int,
+) -> List[Tuple[int, Any]]:
+    query_results = _bulk_snuba_query([item[1] for item in to_query], headers)
+    for result, (_, _, cache_key) in zip(query_results, to_query):
+        if cache_key:
+            cache.set(cache_key, json.dumps(result), ttl + stale_ttl)
+            if stale_ttl:
+                cache.set(f"{cache_key}:fresh", 1, ttl)
+    return [(query_pos, result) for result, (query_pos, _, _) in zip(query_results, to_query)]
+
+
 def _apply_cache_and_build_results(
     snuba_param_list: Sequence[SnubaQueryBody],
     referrer: Optional[str] = None,
@@ -862,29 +1157,71 @@ def _apply_cache_and_build_results(
     query_param_list = list(enumerate(snuba_param_list))
 
     results = []
+    ttl = stale_ttl = 0
+    # Queries that other requests are running, see below
+    to_wait_for: List[Tuple[int, SnubaQueryBody, str]] = []
+    locks_held: List[Lock] = []
 
     if use_cache:
+        ttl, stale_ttl = _get_query_cache_policy(referrer)
+        single_flight = options.get("snuba.query-cache.single-flight.enabled")
         cache_keys = [get_cache_key(query_params[0]) for _, query_params in query_param_list]
-        cache_data = cache.get_many(cache_keys)
+        # Results are kept `stale_ttl` seconds longer than they are fresh, which is tracked
+        # in a separate key
+        fresh_keys = [f"{cache_key}:fresh" for cache_key in cache_keys] if stale_ttl else []
+        cache_data = cache.get_many(cache_keys + fresh_keys)
         to_query: List[Tuple[int, SnubaQueryBody, Optional[str]]] = []
+        metric_tags = {"referrer": referrer} if referrer else None
         for (query_pos, query_params), cache_key in zip(query_param_list, cache_keys):
             cached_result = cache_data.get(cache_key)
-            metric_tags = {"referrer": referrer} if referrer else None
             if cached_result is None:
                 metrics.incr("snuba.query_cache.miss", tags=metric_tags)
+                if single_flight:
+                    lock = _acquire_query_cache_lock(cache_key)
+                    if lock is None:
+                        to_wait_for.append((query_pos, query_params, cache_key))
+                        continue
+                    locks_held.append(lock)
                 to_query.append((query_pos, query_params, cache_key))
+            elif stale_ttl and f"{cache_key}:fresh" not in cache_data:
+                # Only one request refreshes a stale result, the others keep serving it
+                lock = _acquire_query_cache_lock(cache_key)
+                if lock is None:
+                    metrics.incr("snuba.query_cache.stale", tags=metric_tags)
+                    results.append((query_pos, json.loads(cached_result)))
+                else:
+                    metrics.incr("snuba.query_cache.revalidate", tags=metric_tags)
+                    locks_held.append(lock)
+                    to_query.append((query_pos, query_params, cache_key))
             else:
                 metrics.incr("snuba.query_cache.hit", tags=metric_tags)
                 results.append((query_pos, json.loads(cached_result)))
     else:
         to_query = [(query_pos, query_params, None) for query_pos, query_params in query_param_list]
 
-    if to_query:
-        query_results = _bulk_snuba_query([item[1] for item in to_query], headers)
-        for result, (query_pos, _, cache_key) in zip(query_results, to_query):
-            if cache_key:
-                cache.set(cache_key, json.dumps(result), settings.SENTRY_SNUBA_CACHE_TTL_SECONDS)
-            results.append((query_pos, result))
+    try:
+        if to_query:
+            results.extend(_query_and_cache_results(to_query, headers, ttl, stale_ttl))
+    finally:
+        for lock in locks_held:
+            lock.release()
+
+    if to_wait_for:
+        # Another request is running these queries, wait for it to cache their results
+        # rather than sending the same queries to snuba
+        cache_data = _wait_for_cached_results([cache_key for _, _, cache_key in to_wait_for])
+        to_query = []
+        for query_pos, query_params, cache_key in to_wait_for:
+            cached_result = cache_data.get(cache_key)
+            if cached_result is None:
+                metrics.incr("snuba.query_cache.coalesce_timeout", tags=metric_tags)
+                to_query.append((query_pos, query_params, cache_key))
+            else:
+                metrics.incr("snuba.query_cache.coalesced", tags=metric_tags)
+                results.append((query_pos, json.loads(cached_result)))
+
+        if to_query:
+            results.extend(_query_and_cache_results(to_query, headers, ttl, stale_ttl))
 
     # Sort so that we get the results back in the original param list order
     results.sort()
@@ -920,64 +1257,183 @@ def _bulk_snuba_query(
                 parent_api = scope.transaction.name
 
         if len(snuba_param_list) > 1:
-            query_results = list(
-                _query_thread_pool.map(
-                    query_fn,
-                    [
-                        (params, Hub(Hub.current), headers, parent_api)
-                        for params in snuba_param_list
-                    ],
-                )
-            )
+            with metrics.timer("snuba.bulk_query.duration", tags={"referrer": query_referrer}):
+                results = _run_bulk_query(query_fn, snuba_param_list, headers, parent_api)
         else:
             # No need to submit to the thread pool if we're just performing a single query
-            query_results = [query_fn((snuba_param_list[0], Hub(Hub.current), headers, parent_api))]
+            results = [
+                _run_query(query_fn, (snuba_param_list[0], Hub(Hub.current), headers, parent_api))
+            ]
 
-    results = []
-    for response, _, reverse in query_results:
-        try:
-            body = json.loads(response.data)
-            if SNUBA_INFO:
-                if "sql" in body:
-                    print(  # NOQA: only prints when an env variable is set
-                        "{}.sql:\n {}".format(
-                            headers.get("referer", "<unknown>"),
-                            sqlparse.format(body["sql"], reindent_aligned=True),
-                        )
-                    )
-                if "error" in body:
-                    print(  # NOQA: only prints when an env variable is set
-                        "{}.err: {}".format(headers.get("referer", "<unknown>"), body["error"])
-                    )
-        except ValueError:
-            if response.status != 200:
-                logger.exception("snuba.query.invalid-json", extra={"response.data": response.data})
-                raise SnubaError("Failed to parse snuba error response")
-            raise UnexpectedResponseError(f"Could not decode JSON response: {response.data!r}")
+    return results
 
-        if response.status != 200:
-            if body.get("error"):
-                error = body["error"]
-                if response.status == 429:
-                    raise RateLimitExceeded(error["message"])
-                elif error["type"] == "schema":
-                    raise SchemaValidationError(error["message"])
-                elif error["type"] == "clickhouse":
-                    raise clickhouse_error_codes_map.get(error["code"], QueryExecutionError)(
-                        error["message"]
+
+class ResponseBytes:
+    """
+    Tracks the size of the raw response bodies of a bulk query, in total and the most that
+    were held at once while being decoded. Raw bodies are freed as soon as they are decoded,
+    so the peak stays around the concurrency limit times the size of the largest body.
+    """
+
+    def __init__(self) -> None:
+        self.total = 0
+        self.held = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def hold(self, size: int) -> None:
+        with self._lock:
+            self.total += size
+            self.held += size
+            self.peak = max(self.peak, self.held)
+
+    def release(self, size: int) -> None:
+        with self._lock:
+            self.held -= size
+
+
+def _run_bulk_query(
+    query_fn: Callable[[Any], RawResult],
+    snuba_param_list: Sequence[SnubaQueryBody],
+    headers: Mapping[str, str],
+    parent_api: str,
+) -> ResultSet:
+    """
+    Runs the queries in the thread pool, no more at once than the concurrency limit of the
+    referrer, and decodes every response as soon as it arrives.
+    """
+    referrer = headers.get("referer", "<unknown>")
+    adaptive = options.get("snuba.bulk-query.adaptive-concurrency")
+    limit = _query_concurrency.get(referrer) if adaptive else QUERY_THREAD_POOL_SIZE
+    metrics.timing("snuba.bulk_query.concurrency", limit, tags={"referrer": referrer})
+
+    response_bytes = ResponseBytes()
+    results: List[Any] = [None] * len(snuba_param_list)
+    queued = iter(enumerate(snuba_param_list))
+    running: Dict[Future, int] = {}
+    try:
+        while True:
+            for query_pos, params in itertools.islice(queued, limit - len(running)):
+                query_params = (params, Hub(Hub.current), headers, parent_api)
+                if adaptive:
+                    future = _query_thread_pool.submit(
+                        _run_limited_query, query_fn, query_params, referrer, response_bytes
                     )
                 else:
-                    raise SnubaError(error["message"])
-            else:
-                raise SnubaError(f"HTTP {response.status}")
-
-        # Forward and reverse translation maps from model ids to snuba keys, per column
-        body["data"] = [reverse(d) for d in body["data"]]
-        results.append(body)
+                    future = _query_thread_pool.submit(
+                        _run_query, query_fn, query_params, response_bytes
+                    )
+                running[future] = query_pos
+            if not running:
+                break
 
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[running.pop(future)] = future.result()
+    finally:
+        # The results of the other queries won't be used when one of them failed
+        for future in running:
+            future.cancel()
+
+    # The decoded results are kept until the bulk query returns, the total size of the raw
+    # bodies approximates their memory use. Raw bodies only add their peak on top.
+    metrics.timing(
+        "snuba.bulk_query.response_bytes", response_bytes.total, tags={"referrer": referrer}
+    )
+    metrics.timing(
+        "snuba.bulk_query.peak_response_bytes", response_bytes.peak, tags={"referrer": referrer}
+    )
     return results
 
 
+def _run_limited_query(
+    query_fn: Callable[[Any], RawResult],
+    params: Tuple[SnubaQueryBody, Hub, Mapping[str, str], str],
+    referrer: str,
+    response_bytes: Optional[ResponseBytes] = None,
+) -> Mapping[str, Any]:
+    """
+    Runs the query and records its duration with the concurrency limiter of the referrer.
+    The duration is measured from when the query starts running, the time it waited for a
+    thread of the shared pool doesn't count.
+    """
+    started_at = time.monotonic()
+    try:
+        result = _run_query(query_fn, params, response_bytes)
+    except RateLimitExceeded:
+        _query_concurrency.record(referrer, time.monotonic() - started_at, rate_limited=True)
+        raise
+    _query_concurrency.record(referrer, time.monotonic() - started_at)
+    return result
+
+
+def _run_query(
+    query_fn: Callable[[Any], RawResult],
+    params: Tuple[SnubaQueryBody, Hub, Mapping[str, str], str],
+    response_bytes: Optional[ResponseBytes] = None,
+) -> Mapping[str, Any]:
+    response, _, reverse = query_fn(params)
+    # Only the decoded body is kept, the response with the raw body is freed when this returns
+    if response_bytes is None:
+        return _decode_response(response, reverse, params[2])
+
+    size = len(response.data)
+    response_bytes.hold(size)
+    try:
+        return _decode_response(response, reverse, params[2])
+    finally:
+        response_bytes.release(size)
+
+
+def _decode_response(
+    response: urllib3.response.HTTPResponse,
+    reverse: Callable[[Any], Any],
+    headers: Mapping[str, str],
+) -> Mapping[str, Any]:
+    try:
+        body = json.loads(response.data)
+        if SNUBA_INFO:
+            if "sql" in body:
+                print(  # NOQA: only prints when an env variable is set
+                    "{}.sql:\n {}".format(
+                        headers.get("referer", "<unknown>"),
+                        sqlparse.format(body["sql"], reindent_aligned=True),
+                    )
+                )
+            if "error" in body:
+                print(  # NOQA: only prints when an env variable is set
+                    "{}.err: {}".format(headers.get("referer", "<unknown>"), body["error"])
+                )
+    except ValueError:
+        if response.status != 200:
+            logger.exception("snuba.query.invalid-json", extra={"response.data": response.data})
+            raise SnubaError("Failed to parse snuba error response")
+        raise UnexpectedResponseError(f"Could not decode JSON response: {response.data!r}")
+
+    if response.status != 200:
+        if body.get("error"):
+            error = body["error"]
+            if response.status == 429:
+                raise RateLimitExceeded(error["message"])
+            elif error["type"] == "schema":
+                raise SchemaValidationError(error["message"])
+            elif error["type"] == "clickhouse":
+                raise clickhouse_error_codes_map.get(error["code"], QueryExecutionError)(
+                    error["message"]
+                )
+            else:
+                raise SnubaError(error["message"])
+        else:
+            raise SnubaError(f"HTTP {response.status}")
+
+    # Forward and reverse translation maps from model ids to snuba keys, per column. Rows are
+    # translated in place rather than into a copy of the data.
+    data = body["data"]
+    for i, row in enumerate(data):
+        data[i] = reverse(row)
+    return body
+
+
 RawResult = Tuple[urllib3.response.HTTPResponse, Callable[[Any], Any], Callable[[Any], Any]]
 
 
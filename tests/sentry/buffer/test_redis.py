@@ -256,6 +256,92 @@ class TestRedisBuffer:
         self.buf.process("foo")
         process.assert_called_once_with(mock.Mock, {"times_seen": 1}, {"pk": 1}, {}, True)
 
+    @mock.patch("sentry.buffer.base.Buffer.process_batch")
+    def test_process_bulk_flush_decodes_batch(self, process_batch):
+        self.buf.bulk_flush = True
+        client = self.buf.get_routing_client()
+        for key, pk in (("foo", "1"), ("bar", "2")):
+            client.hmset(
+                key,
+                {
+                    "f": '{"pk": ["i","%s"]}' % pk,
+                    "i+times_seen": "2",
+                    "e+foo": '["s","bar"]',
+                    "m": "sentry.models.Group",
+                },
+            )
+        self.buf.process(batch_keys=["foo", "bar", "baz"])
+        process_batch.assert_called_once_with(
+            [
+                (Group, {"times_seen": 2}, {"pk": 1}, {"foo": "bar"}, None),
+                (Group, {"times_seen": 2}, {"pk": 2}, {"foo": "bar"}, None),
+            ]
+        )
+        assert client.hgetall("foo") == {}
+        assert client.get("l:foo") is None
+
+    @mock.patch("sentry.buffer.base.Buffer.process_batch")
+    def test_process_bulk_flush_skips_locked_keys(self, process_batch):
+        self.buf.bulk_flush = True
+        client = self.buf.get_routing_client()
+        for key in ("foo", "bar"):
+            client.hmset(
+                key, {"f": '{"pk": ["i","1"]}', "i+times_seen": "1", "m": "sentry.models.Group"}
+            )
+        client.set("l:foo", "1")
+        self.buf.process(batch_keys=["foo", "bar"])
+        process_batch.assert_called_once_with([(Group, {"times_seen": 1}, {"pk": 1}, {}, None)])
+        assert client.hgetall("foo") != {}
+        assert client.get("l:foo") is not None
+
+    @pytest.mark.django_db
+    @freeze_time()
+    def test_bulk_flush_updates_groups(self, default_project, task_runner):
+        self.buf.bulk_flush = True
+        self.buf.incr_batch_size = 10
+        groups = [Group.objects.create(project=default_project) for _ in range(3)]
+        orig_times_seen = {
+            group.id: Group.objects.get_from_cache(id=group.id).times_seen for group in groups
+        }
+        now = timezone.now()
+        for i, group in enumerate(groups, 1):
+            self.buf.incr(Group, {"times_seen": i}, {"id": group.id}, {"last_seen": now})
+
+        with task_runner(), mock.patch("sentry.buffer", self.buf), mock.patch(
+            "sentry.buffer.base.Buffer.process"
+        ) as process:
+            self.buf.process_pending()
+
+        assert not process.called
+        for i, group in enumerate(groups, 1):
+            cached = Group.objects.get_from_cache(id=group.id)
+            assert cached.times_seen == orig_times_seen[group.id] + i
+            assert cached.last_seen == now
+
+    @pytest.mark.django_db
+    def test_bulk_flush_creates_missing_rows(self, default_project, task_runner):
+        from sentry.models import Release, ReleaseProject
+
+        self.buf.bulk_flush = True
+        self.buf.incr_batch_size = 10
+        releases = [
+            Release.objects.create(organization_id=default_project.organization_id, version=v)
+            for v in ("1.0", "2.0")
+        ]
+        ReleaseProject.objects.create(project=default_project, release=releases[0], new_groups=1)
+        for release in releases:
+            self.buf.incr(
+                ReleaseProject,
+                {"new_groups": 2},
+                {"release_id": release.id, "project_id": default_project.id},
+            )
+
+        with task_runner(), mock.patch("sentry.buffer", self.buf):
+            self.buf.process_pending()
+
+        assert ReleaseProject.objects.get(release=releases[0]).new_groups == 3
+        assert ReleaseProject.objects.get(release=releases[1]).new_groups == 2
+
 
 #    @mock.patch("sentry.buffer.redis.RedisBuffer._make_key", mock.Mock(return_value="foo"))
 #    def test_incr_uses_signal_only(self):
@@ -1,13 +1,18 @@
 from __future__ import annotations
 
+import copy
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any
 
 import pytest
 
 from sentry.grouping.component import GroupingComponent
-from sentry.grouping.enhancer import Enhancements
+from sentry.grouping.enhancer import ENHANCEMENT_BASES, Enhancements
+from sentry.grouping.enhancer.compiler import FrameMatcherTable
 from sentry.grouping.enhancer.exceptions import InvalidEnhancerConfig
 from sentry.grouping.enhancer.matchers import create_match_frame
+from sentry.utils.lru import LRUCache
+from tests.sentry.grouping import grouping_input as grouping_inputs
 
 
 def dump_obj(obj):
@@ -448,3 +453,109 @@ def test_app_no_matches(frame):
     enhancements = Enhancements.from_config_string("app:no +app")
     enhancements.apply_modifications_to_frame([frame], "native", None)
     assert frame.get("in_app")
+
+
+def _iter_stacktraces(data):
+    for interface in ("exception", "threads"):
+        for value in (data.get(interface) or {}).get("values") or ():
+            if value and value.get("stacktrace"):
+                yield value["stacktrace"].get("frames") or [], value
+    if data.get("stacktrace"):
+        yield data["stacktrace"].get("frames") or [], None
+
+
+def _dump_components(components):
+    return [(c.as_dict(), c.is_prefix_frame, c.is_sentinel_frame) for c in components]
+
+
+def _apply_rules_reference(enhancements, frames, platform, exception_data):
+    """The uncompiled engine: every rule is matched against every frame."""
+    cache: dict[Any, Any] = {}
+    match_frames = [create_match_frame(frame, platform) for frame in frames]
+    for rule in enhancements._modifier_rules:
+        for idx, action in rule.get_matching_frame_actions(
+            match_frames, platform, exception_data, cache
+        ):
+            action.apply_modifications_to_frame(frames, match_frames, idx, rule=rule)
+
+    components = [GroupingComponent(id="frame") for _ in frames]
+    match_frames = [create_match_frame(frame, platform) for frame in frames]
+    for rule in enhancements._updater_rules:
+        for idx, action in rule.get_matching_frame_actions(
+            match_frames, platform, exception_data, cache
+        ):
+            action.update_frame_components_contributions(components, frames, idx, rule=rule)
+    return components
+
+
+def _apply_rules_compiled(enhancements, frames, platform, exception_data):
+    enhancements.apply_modifications_to_frame(frames, platform, exception_data)
+    components = [GroupingComponent(id="frame") for _ in frames]
+    enhancements.update_frame_components_contributions(components, frames, platform, exception_data)
+    return components
+
+
+@pytest.mark.parametrize("base", sorted(ENHANCEMENT_BASES))
+def test_compiled_rules_match_reference(base):
+    enhancements = Enhancements.from_config_string(
+        """
+        family:native function:std::* -app
+        !function:main module:foo.* +app
+        [ function:foo* ] | function:* | [ !app:yes ] category=glue
+        category:glue -group
+        family:javascript path:**/node_modules/** -app ^-group
+        error.type:*Error function:* v+group
+        """,
+        bases=[base],
+    )
+
+    checked = 0
+    for grouping_input in grouping_inputs:
+        data = grouping_input.data
+        platform = data.get("platform") or "python"
+        for frames, exception_data in _iter_stacktraces(data):
+            if not all(isinstance(frame, dict) for frame in frames):
+                continue
+            reference_frames = copy.deepcopy(frames)
+            compiled_frames = copy.deepcopy(frames)
+
+            reference = _apply_rules_reference(
+                enhancements, reference_frames, platform, exception_data
+            )
+            # Twice, so that the second run is served from the frame cache.
+            for _ in range(2):
+                compiled_frames = copy.deepcopy(frames)
+                compiled = _apply_rules_compiled(
+                    enhancements, compiled_frames, platform, exception_data
+                )
+                assert compiled_frames == reference_frames
+                assert _dump_components(compiled) == _dump_components(reference)
+            checked += len(frames)
+
+    assert checked > 0
+
+
+def test_matcher_table_ids_unique_across_threads():
+    def build(i):
+        return Enhancements.from_config_string(f"function:unique_{i} +app")._matcher_table
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        tables = list(pool.map(build, range(50)))
+
+    assert len({table.id for table in tables}) == len(tables)
+    assert build(0) is tables[0]
+
+
+def test_matcher_table_registry_bounded(monkeypatch):
+    monkeypatch.setattr(FrameMatcherTable, "instances", LRUCache(max_weight=2))
+
+    tables = [
+        Enhancements.from_config_string(f"function:bounded_{i} +app")._matcher_table
+        for i in range(3)
+    ]
+
+    assert len(FrameMatcherTable.instances) == 2
+    # An evicted table is rebuilt with a fresh id
+    rebuilt = Enhancements.from_config_string("function:bounded_0 +app")._matcher_table
+    assert rebuilt is not tables[0]
+    assert rebuilt.id not in {table.id for table in tables}
@@ -82,6 +82,38 @@ class IncidentGetForSubscriptionTest(TestCase):
         assert AlertRule.objects.get_for_subscription(subscription) == alert_rule
 
 
+class IncidentGetForSubscriptionsTest(TestCase):
+    def test(self):
+        alert_rule = self.create_alert_rule()
+        subscription = alert_rule.snuba_query.subscriptions.get()
+        other_alert_rule = self.create_alert_rule()
+        other_subscription = other_alert_rule.snuba_query.subscriptions.get()
+        AlertRule.objects.get_for_subscription(subscription)
+        delete_alert_rule(other_alert_rule)
+
+        assert AlertRule.objects.get_for_subscriptions([subscription, other_subscription]) == {
+            subscription.id: alert_rule
+        }
+        assert cache.get(AlertRule.objects.CACHE_SUBSCRIPTION_KEY % subscription.id) == alert_rule
+        assert AlertRule.objects.get_for_subscriptions([]) == {}
+
+
+class AlertRuleTriggerGetForAlertRulesTest(TestCase):
+    def test(self):
+        alert_rule = self.create_alert_rule()
+        trigger = self.create_alert_rule_trigger(alert_rule)
+        other_alert_rule = self.create_alert_rule()
+        AlertRuleTrigger.objects.get_for_alert_rule(alert_rule)
+
+        assert AlertRuleTrigger.objects.get_for_alert_rules([alert_rule, other_alert_rule]) == {
+            alert_rule.id: [trigger],
+            other_alert_rule.id: [],
+        }
+        assert (
+            cache.get(AlertRuleTrigger.objects._build_trigger_cache_key(other_alert_rule.id)) == []
+        )
+
+
 class IncidentClearSubscriptionCacheTest(TestCase):
     def setUp(self):
         self.alert_rule = self.create_alert_rule()
@@ -237,6 +269,26 @@ class ActiveIncidentClearCacheTest(TestCase):
         )
 
 
+class GetActiveIncidentsTest(TestCase):
+    def test(self):
+        alert_rule = self.create_alert_rule()
+        other_project = self.create_project()
+        self.create_incident(alert_rule=alert_rule, projects=[self.project])
+        active_incident = self.create_incident(alert_rule=alert_rule, projects=[self.project])
+        self.create_incident(
+            alert_rule=alert_rule, projects=[other_project], status=IncidentStatus.CLOSED.value
+        )
+        pairs = [(alert_rule.id, self.project.id), (alert_rule.id, other_project.id)]
+
+        expected = {pairs[0]: active_incident, pairs[1]: None}
+        assert Incident.objects.get_active_incidents(pairs) == expected
+        assert cache.get(Incident.objects._build_active_incident_cache_key(*pairs[1])) is False
+        # The second time around, both come from the cache
+        with self.assertNumQueries(0):
+            assert Incident.objects.get_active_incidents(pairs) == expected
+        assert Incident.objects.get_active_incident(alert_rule, self.project) == active_incident
+
+
 class IncidentTriggerClearCacheTest(TestCase):
     def setUp(self):
         self.alert_rule = self.create_alert_rule()
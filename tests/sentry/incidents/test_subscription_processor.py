@@ -35,9 +35,12 @@ from sentry.incidents.subscription_processor import (
     build_alert_rule_trigger_stat_key,
     build_trigger_stat_keys,
     get_alert_rule_stats,
+    get_alert_rule_stats_multi,
     get_redis_client,
     partition,
+    process_update_batch,
     update_alert_rule_stats,
+    update_alert_rule_stats_multi,
 )
 from sentry.models import Integration
 from sentry.sentry_metrics.configuration import UseCaseKey
@@ -715,6 +718,116 @@ class ProcessUpdateTest(ProcessUpdateBaseClass):
             incident, [self.action], [(rule.resolve_threshold + 1, IncidentStatus.CLOSED)]
         )
 
+    def test_process_update_batch(self):
+        # Verify that the updates of a batch are processed like they are one at a time,
+        # with the state of each subscription carried from one of its updates to the next
+        rule = self.rule
+        rule.update(threshold_period=2)
+        trigger = self.trigger
+        updates = [
+            (
+                self.build_subscription_update(
+                    self.sub, value=trigger.alert_threshold + 1, time_delta=timedelta(minutes=-2)
+                ),
+                self.sub,
+            ),
+            (
+                self.build_subscription_update(
+                    self.other_sub,
+                    value=trigger.alert_threshold + 1,
+                    time_delta=timedelta(minutes=-2),
+                ),
+                self.other_sub,
+            ),
+            (
+                self.build_subscription_update(
+                    self.sub, value=trigger.alert_threshold + 1, time_delta=timedelta(minutes=-1)
+                ),
+                self.sub,
+            ),
+        ]
+        with self.feature(
+            ["organizations:incidents", "organizations:performance-view"]
+        ), self.capture_on_commit_callbacks(execute=True):
+            process_update_batch(updates)
+
+        incident = self.assert_active_incident(rule, self.sub)
+        self.assert_trigger_exists_with_status(incident, trigger, TriggerStatus.ACTIVE)
+        self.assert_actions_fired_for_incident(
+            incident, [self.action], [(trigger.alert_threshold + 1, IncidentStatus.CRITICAL)]
+        )
+        self.assert_no_active_incident(rule, self.other_sub)
+
+        self.assert_trigger_counts(SubscriptionProcessor(self.sub), trigger, 0, 0)
+        self.assert_trigger_counts(SubscriptionProcessor(self.other_sub), trigger, 1, 0)
+
+        # Already processed updates are skipped in batches too
+        self.metrics.incr.reset_mock()
+        with self.feature(["organizations:incidents", "organizations:performance-view"]):
+            process_update_batch(updates[2:])
+        self.metrics.incr.assert_called_once_with(
+            "incidents.alert_rules.skipping_already_processed_update"
+        )
+
+    def test_process_update_batch_prefetch_failure(self):
+        # Updates are processed one at a time when fetching the state of the batch fails
+        rule = self.rule
+        trigger = self.trigger
+        updates = [
+            (
+                self.build_subscription_update(
+                    self.sub, value=trigger.alert_threshold + 1, time_delta=timedelta(minutes=-1)
+                ),
+                self.sub,
+            ),
+        ]
+        with self.feature(
+            ["organizations:incidents", "organizations:performance-view"]
+        ), self.capture_on_commit_callbacks(execute=True), patch(
+            "sentry.incidents.subscription_processor.SubscriptionProcessorBatch",
+            side_effect=Exception("redis is down"),
+        ):
+            process_update_batch(updates)
+
+        incident = self.assert_active_incident(rule, self.sub)
+        self.assert_trigger_exists_with_status(incident, trigger, TriggerStatus.ACTIVE)
+
+    def test_process_update_batch_writes_stats_per_update(self):
+        # The stats of an update are written before the next update is processed
+        rule = self.rule
+        rule.update(threshold_period=3)
+        trigger = self.trigger
+        updates = [
+            (
+                self.build_subscription_update(
+                    self.sub, value=trigger.alert_threshold + 1, time_delta=timedelta(minutes=-2)
+                ),
+                self.sub,
+            ),
+            (
+                self.build_subscription_update(
+                    self.sub, value=trigger.alert_threshold + 1, time_delta=timedelta(minutes=-1)
+                ),
+                self.sub,
+            ),
+        ]
+        stored_counts = []
+        process_update = SubscriptionProcessor.process_update
+
+        def record_stored_counts(processor, subscription_update):
+            stored_counts.append(
+                get_alert_rule_stats(processor.alert_rule, self.sub, [trigger])[1][trigger.id]
+            )
+            return process_update(processor, subscription_update)
+
+        with self.feature(
+            ["organizations:incidents", "organizations:performance-view"]
+        ), patch.object(SubscriptionProcessor, "process_update", record_stored_counts):
+            process_update_batch(updates)
+
+        assert stored_counts == [0, 1]
+        self.assert_trigger_counts(SubscriptionProcessor(self.sub), trigger, 2, 0)
+
     def test_multiple_subscriptions_do_not_conflict(self):
         # Verify that multiple subscriptions associated with a rule don't conflict with
         # each other
@@ -2769,3 +2882,35 @@ class TestUpdateAlertRuleStats(TestCase):
         )
 
         assert results == [int(to_timestamp(date)), 20, 10, 3, 15]
+
+
+class TestGetAlertRuleStatsMulti(TestCase):
+    def test(self):
+        alert_rule = AlertRule(id=1)
+        subs = [QuerySubscription(project_id=2), QuerySubscription(project_id=3)]
+        triggers = [AlertRuleTrigger(id=3), AlertRuleTrigger(id=4)]
+        timestamp = datetime.now().replace(tzinfo=pytz.utc, microsecond=0)
+        update_alert_rule_stats(alert_rule, subs[0], timestamp, {3: 1, 4: 3}, {3: 2, 4: 4})
+
+        assert get_alert_rule_stats_multi([(alert_rule, sub, triggers) for sub in subs]) == [
+            (timestamp, {3: 1, 4: 3}, {3: 2, 4: 4}),
+            (datetime.fromtimestamp(0, pytz.utc), {3: 0, 4: 0}, {3: 0, 4: 0}),
+        ]
+        assert get_alert_rule_stats_multi([]) == []
+
+
+class TestUpdateAlertRuleStatsMulti(TestCase):
+    def test(self):
+        alert_rule = AlertRule(id=1)
+        subs = [QuerySubscription(project_id=2), QuerySubscription(project_id=3)]
+        triggers = [AlertRuleTrigger(id=3)]
+        date = datetime.utcnow().replace(tzinfo=pytz.utc, microsecond=0)
+        update_alert_rule_stats_multi(
+            [
+                (alert_rule, subs[0], date, {3: 20}, {3: 10}),
+                (alert_rule, subs[1], date, {}, {3: 5}),
+            ]
+        )
+
+        assert get_alert_rule_stats(alert_rule, subs[0], triggers) == (date, {3: 20}, {3: 10})
+        assert get_alert_rule_stats(alert_rule, subs[1], triggers) == (date, {3: 0}, {3: 5})
@@ -4,6 +4,7 @@ import uuid
 from copy import deepcopy
 from datetime import timezone
 from typing import Any, Dict, Optional, Sequence, Type
+from unittest import mock
 
 import pytest
 from jsonschema import ValidationError
@@ -11,14 +12,16 @@ from jsonschema import ValidationError
 from sentry import eventstore
 from sentry.eventstore.snuba.backend import SnubaEventStorage
 from sentry.issues.grouptype import PerformanceSlowDBQueryGroupType, ProfileFileIOGroupType
+from sentry.issues.ingest import hash_fingerprint
 from sentry.issues.issue_occurrence import IssueOccurrence
 from sentry.issues.occurrence_consumer import (
     EventLookupError,
     InvalidEventPayloadError,
     _get_kwargs,
     _process_message,
+    process_occurrence_batch,
 )
-from sentry.models import Group
+from sentry.models import Group, GroupHash
 from sentry.receivers import create_default_projects
 from sentry.testutils import SnubaTestCase, TestCase
 from sentry.testutils.helpers.datetime import before_now, iso_format
@@ -181,6 +184,67 @@ class IssueOccurrenceLookupEventIdTest(IssueOccurrenceTestBase):
         assert fetched_event.get_event_type() == "transaction"
 
 
+class IssueOccurrenceProcessBatchTest(IssueOccurrenceTestBase):
+    @django_db_all
+    def test_process_batch(self) -> None:
+        from sentry.event_manager import EventManager
+
+        event_data = load_data("transaction")
+        event_data["timestamp"] = iso_format(before_now(minutes=1))
+        event_data["start_timestamp"] = iso_format(before_now(minutes=1, seconds=1))
+        event_data["event_id"] = "d" * 32
+        manager = EventManager(data=event_data)
+        manager.normalize()
+        transaction = manager.save(self.project.id)
+
+        messages = [
+            get_test_message(self.project.id),
+            get_test_message(self.project.id, type=300),
+            get_test_message(self.project.id),
+            get_test_message(self.project.id, fingerprint=["another-touch-id"]),
+            get_test_message(
+                self.project.id,
+                include_event=False,
+                event_id=transaction.event_id,
+                fingerprint=["looked-up-touch-id"],
+            ),
+            get_test_message(self.project.id, include_event=False),
+        ]
+        with self.feature("organizations:profile-file-io-main-thread-ingest"):
+            # Invalid messages and events that can't be found don't fail the batch.
+            process_occurrence_batch(messages)
+
+        grouphashes = GroupHash.objects.filter(project=self.project)
+        assert len(grouphashes) == 3
+        assert len({grouphash.group_id for grouphash in grouphashes}) == 3
+        # Both occurrences with the same fingerprint were saved to the same group.
+        group = Group.objects.get(
+            grouphash__hash=hash_fingerprint(["touch-id"])[0], project=self.project
+        )
+        assert group.times_seen == 2
+
+    @django_db_all
+    def test_process_batch_prefetch_failure(self) -> None:
+        messages = [
+            get_test_message(self.project.id),
+            get_test_message(self.project.id),
+        ]
+        with self.feature("organizations:profile-file-io-main-thread-ingest"), mock.patch(
+            "sentry.issues.occurrence_consumer.Project.objects.get_many_from_cache",
+            side_effect=Exception("cache is down"),
+        ), mock.patch(
+            "sentry.issues.occurrence_consumer.get_groups_by_hash",
+            side_effect=Exception("db is down"),
+        ):
+            # Every occurrence does its own lookups instead
+            process_occurrence_batch(messages)
+
+        group = Group.objects.get(
+            grouphash__hash=hash_fingerprint(["touch-id"])[0], project=self.project
+        )
+        assert group.times_seen == 2
+
+
 class ParseEventPayloadTest(IssueOccurrenceTestBase):
     def run_test(self, message: Dict[str, Any]) -> None:
         _get_kwargs(message)
@@ -1,6 +1,11 @@
 from unittest import TestCase
 
-from sentry.lang.javascript.cache import SourceCache
+from sentry.lang.javascript.cache import (
+    ParsedArtifactCache,
+    SourceCache,
+    get_parsed_artifact_cache,
+)
+from sentry.testutils.helpers.options import override_options
 
 
 class BasicCacheTest(TestCase):
@@ -34,3 +39,51 @@ class BasicCacheTest(TestCase):
         # fall back to utf-8
         cache.add(url, "foobar".encode("utf-32"), encoding="utf-32")
         assert cache.get(url)[0] == "foobar"
+
+
+class ParsedArtifactCacheTest(TestCase):
+    def test_sourceview(self):
+        cache = ParsedArtifactCache(max_bytes=1024)
+
+        sourceview = cache.get_sourceview(b"foo\nbar", ident="a")
+        assert sourceview[1] == "bar"
+        assert cache.get_sourceview(b"foo\nbar") is sourceview
+        assert cache.get_by_ident("sourceview", "a") == (sourceview, None)
+        assert cache.get_by_ident("sourceview", "b") is None
+        assert cache.get_by_ident("sourcemapcache", "a") is None
+
+    def test_replaced_contents(self):
+        cache = ParsedArtifactCache(max_bytes=1024)
+
+        old = cache.get_sourceview(b"foo", ident="a", url="http://example.com/foo.js")
+        new = cache.get_sourceview(b"bar", ident="a", url="http://example.com/foo.js")
+        assert old is not new
+        assert cache.get_by_ident("sourceview", "a") == (new, "http://example.com/foo.js")
+
+    def test_eviction(self):
+        cache = ParsedArtifactCache(max_bytes=1024)
+
+        cache.get_sourceview(b"a" * 600, ident="a")
+        cache.get_sourceview(b"b" * 600, ident="b")
+        assert cache.get_by_ident("sourceview", "a") is None
+        assert cache.get_by_ident("sourceview", "b") is not None
+
+    def test_sourcemap_cache(self):
+        cache = ParsedArtifactCache(max_bytes=1024)
+        sourcemap = b'{"version":3,"sources":["foo.js"],"names":[],"mappings":"AAAA"}'
+
+        sourcemap_cache = cache.get_sourcemap_cache(b"foo();", sourcemap, ident="a")
+        assert sourcemap_cache.lookup(1, 1, 0).src == "foo.js"
+        assert cache.get_sourcemap_cache(b"foo();", sourcemap) is sourcemap_cache
+        assert cache.get_sourcemap_cache(b"bar();", sourcemap) is not sourcemap_cache
+        assert cache.get_by_ident("sourcemapcache", "a") == (sourcemap_cache, None)
+
+    def test_get_parsed_artifact_cache(self):
+        with override_options({"sourcemaps.parsed-cache.max-bytes": 0}):
+            assert get_parsed_artifact_cache() is None
+
+        with override_options({"sourcemaps.parsed-cache.max-bytes": 1024}):
+            cache = get_parsed_artifact_cache()
+            assert cache is not None
+            assert cache.max_bytes == 1024
+            assert get_parsed_artifact_cache() is cache
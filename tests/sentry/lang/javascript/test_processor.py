@@ -1691,6 +1691,102 @@ class FetchByDebugIdTest(FetchTest):
         assert result is None
         fetcher.close()
 
+    def test_get_debug_id_ident(self):
+        debug_id = "c941d872-af1f-4f0c-a7ff-ad3d295fe153"
+        files = {
+            "index.js.map": {
+                "url": "~/index.js.map",
+                "type": "source_map",
+                "content": b"foo",
+                "headers": {"content-type": "application/json", "debug-id": debug_id},
+            },
+        }
+        file = self.get_compressed_zip_file("bundle.zip", deepcopy(files))
+        artifact_bundle = ArtifactBundle.objects.create(
+            organization_id=self.organization.id, bundle_id=uuid4(), file=file, artifact_count=1
+        )
+        DebugIdArtifactBundle.objects.create(
+            organization_id=self.organization.id,
+            debug_id=debug_id,
+            artifact_bundle=artifact_bundle,
+            source_file_type=SourceFileType.SOURCE_MAP.value,
+        )
+        ProjectArtifactBundle.objects.create(
+            organization_id=self.organization.id,
+            project_id=self.project.id,
+            artifact_bundle=artifact_bundle,
+        )
+
+        fetcher = Fetcher(self.organization, self.project)
+        ident = fetcher.get_debug_id_ident(debug_id, SourceFileType.SOURCE_MAP)
+        assert ident is not None
+        assert fetcher.get_debug_id_ident(debug_id, SourceFileType.SOURCE_MAP) == ident
+        assert fetcher.get_debug_id_ident(debug_id, SourceFileType.MINIFIED_SOURCE) is None
+
+        # Re-uploading the bundle replaces its file.
+        artifact_bundle.update(file=self.get_compressed_zip_file("bundle.zip", deepcopy(files)))
+        fetcher = Fetcher(self.organization, self.project)
+        assert fetcher.get_debug_id_ident(debug_id, SourceFileType.SOURCE_MAP) != ident
+
+    @patch(
+        "sentry.lang.javascript.processor.ArtifactBundle.objects.filter",
+        side_effect=ArtifactBundle.objects.filter,
+    )
+    def test_prefetch_artifact_bundles(self, filter):
+        debug_ids = ["c941d872-af1f-4f0c-a7ff-ad3d295fe153", "4ca1d872-af1f-4f0c-a7ff-ad3d295fe153"]
+        missing_debug_id = "abcdd872-af1f-4f0c-a7ff-ad3d295fe153"
+        for idx, debug_id in enumerate(debug_ids):
+            file = self.get_compressed_zip_file(
+                "bundle.zip",
+                {
+                    "index.js.map": {
+                        "url": f"~/index{idx}.js.map",
+                        "type": "source_map",
+                        "content": f"foo{idx}".encode(),
+                        "headers": {"content-type": "application/json", "debug-id": debug_id},
+                    },
+                },
+            )
+            artifact_bundle = ArtifactBundle.objects.create(
+                organization_id=self.organization.id,
+                bundle_id=uuid4(),
+                file=file,
+                artifact_count=1,
+            )
+            DebugIdArtifactBundle.objects.create(
+                organization_id=self.organization.id,
+                debug_id=debug_id,
+                artifact_bundle=artifact_bundle,
+                source_file_type=SourceFileType.SOURCE_MAP.value,
+            )
+            ProjectArtifactBundle.objects.create(
+                organization_id=self.organization.id,
+                project_id=self.project.id,
+                artifact_bundle=artifact_bundle,
+            )
+
+        for concurrency in (4, 1):
+            fetcher = Fetcher(self.organization, self.project)
+            with override_options({"sourcemaps.prefetch.concurrency": concurrency}):
+                fetcher.prefetch_artifact_bundles(
+                    [
+                        (debug_id, SourceFileType.SOURCE_MAP)
+                        for debug_id in debug_ids + [missing_debug_id]
+                    ]
+                )
+            assert len(fetcher.open_archives) == 2
+            assert fetcher.empty_result_for_debug_ids == {
+                (missing_debug_id, SourceFileType.SOURCE_MAP)
+            }
+
+            # The bundles were resolved and opened up front, so the lookups don't run any query.
+            for idx, debug_id in enumerate(debug_ids):
+                result = fetcher.fetch_by_debug_id(debug_id, SourceFileType.SOURCE_MAP)
+                assert result.body == f"foo{idx}".encode()
+            assert fetcher.fetch_by_debug_id(missing_debug_id, SourceFileType.SOURCE_MAP) is None
+            assert filter.call_count == 0
+            fetcher.close()
+
     def test_fetch_by_debug_id_with_invalid_params(self):
         file = self.get_compressed_zip_file(
             "bundle.zip",
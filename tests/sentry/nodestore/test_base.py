@@ -0,0 +1,169 @@
+import time
+
+import pytest
+
+from sentry.db.models.fields.node import NodeData
+from sentry.nodestore.base import NodeStorage, get_local_cache, is_indexed
+from sentry.testutils.helpers.options import override_options
+from sentry.utils import json
+from sentry.utils.samples import load_data
+
+
+class InMemoryNodeStorage(NodeStorage):
+    """
+    A backend without a native bulk read, so `get_multi` goes through the
+    concurrent fallback of the base class.
+
+    Nodestores are thread-locals that get re-initialized with the same
+    arguments in every thread, so the storage dict is passed in to share it
+    with the fetching threads.
+    """
+
+    def __init__(self, nodes, delays=None, failing=()):
+        self.nodes = nodes
+        self.delays = delays or {}
+        self.failing = set(failing)
+
+    def _get_bytes(self, id):
+        time.sleep(self.delays.get(id, 0))
+        if id in self.failing:
+            raise OSError(id)
+        return self.nodes.get(id)
+
+    def _set_bytes(self, id, data, ttl=None):
+        self.nodes[id] = data
+
+    def delete(self, id):
+        self.nodes.pop(id, None)
+        self._delete_cache_item(id)
+
+    @property
+    def cache(self):
+        return None
+
+
+@pytest.mark.parametrize("concurrency", [1, 2, 8])
+def test_get_multi_concurrent(concurrency):
+    ns = InMemoryNodeStorage({})
+    for i in range(10):
+        ns.set(f"node_{i}", {"foo": i})
+
+    with override_options({"nodestore.get-multi.concurrency": concurrency}):
+        result = ns.get_multi([f"node_{i}" for i in range(12)])
+
+    assert result == {
+        **{f"node_{i}": {"foo": i} for i in range(10)},
+        "node_10": None,
+        "node_11": None,
+    }
+
+
+def test_get_multi_concurrent_partial_failure():
+    ns = InMemoryNodeStorage({}, failing=["node_1"])
+    ns.set("node_0", {"foo": "a"})
+    ns.set("node_1", {"foo": "b"})
+
+    with override_options({"nodestore.get-multi.concurrency": 4}):
+        assert ns.get_multi(["node_0", "node_1"]) == {"node_0": {"foo": "a"}, "node_1": None}
+
+
+def test_get_multi_concurrent_all_failed():
+    ns = InMemoryNodeStorage({}, failing=["node_0", "node_1"])
+
+    with override_options({"nodestore.get-multi.concurrency": 4}), pytest.raises(OSError):
+        ns.get_multi(["node_0", "node_1"])
+
+
+def test_get_multi_concurrent_deadline():
+    ns = InMemoryNodeStorage({}, delays={"node_1": 1})
+    ns.set("node_0", {"foo": "a"})
+    ns.set("node_1", {"foo": "b"})
+
+    with override_options(
+        {"nodestore.get-multi.concurrency": 4, "nodestore.get-multi.timeout": 0.1}
+    ):
+        assert ns.get_multi(["node_0", "node_1"]) == {"node_0": {"foo": "a"}, "node_1": None}
+
+
+@pytest.fixture
+def local_cache():
+    with override_options({"nodestore.local-cache.max-bytes": 1024}):
+        cache = get_local_cache()
+        yield cache
+        cache.clear()
+
+
+def test_local_cache(local_cache):
+    nodes = {}
+    ns = InMemoryNodeStorage(nodes)
+    ns.set("node_1", {"foo": "a"})
+    # Writes don't populate the in-process tier.
+    assert local_cache.get("node_1") is None
+
+    assert ns.get("node_1") == {"foo": "a"}
+    assert local_cache.get("node_1") == {"foo": "a"}
+
+    del nodes["node_1"]
+    assert ns.get("node_1") == {"foo": "a"}
+    assert ns.get_multi(["node_1"]) == {"node_1": {"foo": "a"}}
+
+    ns.delete_multi(["node_1"])
+    assert local_cache.get("node_1") is None
+    assert ns.get("node_1") is None
+
+
+def test_local_cache_invalidated_on_set(local_cache):
+    ns = InMemoryNodeStorage({})
+    ns.set("node_1", {"foo": "a"})
+    assert ns.get_multi(["node_1"]) == {"node_1": {"foo": "a"}}
+    assert local_cache.get("node_1") == {"foo": "a"}
+
+    ns.set("node_1", {"foo": "b"})
+    assert ns.get("node_1") == {"foo": "b"}
+
+
+@pytest.mark.parametrize("get_multi", [False, True], ids=["get", "get_multi"])
+def test_local_cache_returns_copies(local_cache, get_multi):
+    data = {"foo": "a", "tags": [["level", "error"]], "_ref": 1, "_ref_version": 2}
+    ns = InMemoryNodeStorage({})
+    ns.set("node_1", data)
+
+    def get():
+        return ns.get_multi(["node_1"])["node_1"] if get_multi else ns.get("node_1")
+
+    # Populate the in-process tier and mutate what it hands out the way
+    # events do, both on the read that populated it and on a hit.
+    for _ in range(2):
+        node = NodeData("node_1", ref_version=2)
+        node.bind_data(get(), ref=1)
+        node.data["fingerprint"] = ["{{ default }}"]
+        node.data["tags"][0][1] = "fatal"
+        assert "_ref" not in node.data
+
+    assert get() == data
+
+
+def test_local_cache_evicts_by_size(local_cache):
+    ns = InMemoryNodeStorage({})
+    for i in range(4):
+        ns.set(f"node_{i}", {"foo": "x" * 400})
+        ns.get(f"node_{i}")
+
+    assert local_cache.get("node_0") is None
+    assert local_cache.get("node_3") is not None
+    assert local_cache.weight <= 1024
+
+
+@pytest.mark.parametrize("platform", ["python", "javascript", "cocoa", "java"])
+def test_indexed_encoding_real_payloads(platform):
+    data = load_data(platform)
+    nodes = {}
+    ns = InMemoryNodeStorage(nodes)
+
+    for indexed in (False, True):
+        with override_options({"nodestore.indexed-encoding": indexed}):
+            ns.set_subkeys(platform, {None: data, "unprocessed": {**data, "unprocessed": True}})
+
+        assert bool(is_indexed(nodes[platform])) is indexed
+        assert ns.get(platform) == json.loads(json.dumps(data))
+        assert ns.get(platform, subkey="unprocessed")["unprocessed"] is True
@@ -7,6 +7,7 @@ from contextlib import nullcontext
 import pytest
 
 from sentry.nodestore.django.backend import DjangoNodeStorage
+from sentry.testutils.helpers.options import override_options
 from sentry.testutils.silo import region_silo_test
 from tests.sentry.nodestore.bigtable.test_backend import (
     MockedBigtableNodeStorage,
@@ -97,3 +98,27 @@ def test_set_subkeys(ns):
     ns.delete("node_1")
     assert ns.get("node_1") is None
     assert ns.get("node_1", subkey="other") is None
+
+
+@region_silo_test(stable=True)
+def test_set_subkeys_indexed_encoding(ns):
+    with override_options({"nodestore.indexed-encoding": True}):
+        ns.set_subkeys("node_1", {None: {"foo": "a"}, "other": {"foo": "b"}})
+        ns.set_subkeys("node_2", {None: {"foo": "c"}})
+
+    # Reading does not depend on the option, old and new nodes are mixed
+    ns.set("node_3", {"foo": "d"})
+
+    assert ns.get("node_1") == {"foo": "a"}
+    assert ns.get("node_1", subkey="other") == {"foo": "b"}
+    assert ns.get("node_1", subkey="missing") is None
+    assert ns.get("node_2", subkey="other") is None
+    assert ns.get_multi(["node_1", "node_2", "node_3"]) == {
+        "node_1": {"foo": "a"},
+        "node_2": {"foo": "c"},
+        "node_3": {"foo": "d"},
+    }
+    assert ns.get_multi(["node_1", "node_3"], subkey="other") == {
+        "node_1": {"foo": "b"},
+        "node_3": None,
+    }
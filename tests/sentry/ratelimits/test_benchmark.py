@@ -0,0 +1,56 @@
+import pytest
+
+from sentry.ratelimits.sliding_windows import (
+    Quota,
+    QuotaLease,
+    RedisSlidingWindowRateLimiter,
+    RequestedQuota,
+)
+from sentry.testutils.skips import requires_pytest_benchmark
+
+# A consumer batch of the metrics indexer: one request per message, spread
+# over a few organizations, each checked against a global and a per-org quota
+# like the writes limiter does.
+BATCH_SIZE = 1000
+ORGANIZATIONS = 50
+
+QUOTAS = [
+    Quota(window_seconds=3600, granularity_seconds=60, limit=10**9, prefix_override="global"),
+    Quota(window_seconds=3600, granularity_seconds=60, limit=10**7),
+    Quota(window_seconds=10, granularity_seconds=1, limit=10**6),
+]
+
+
+def check_and_use(limiter, requests):
+    timestamp, grants = limiter.check_within_quotas(requests)
+    limiter.use_quotas(requests, grants, timestamp)
+    return grants
+
+
+def bulk_check_and_use(limiter, requests):
+    return limiter.bulk_check_and_use_quotas(requests)
+
+
+def make_lease(limiter):
+    lease = QuotaLease(limiter, size=1000, ttl_seconds=10)
+    return lambda limiter, requests: lease.check_and_use_quotas(requests)
+
+
+@requires_pytest_benchmark
+@pytest.mark.parametrize("method", ["check_and_use", "bulk", "lease"])
+def test_benchmark_sliding_windows_batch(method, benchmark):
+    limiter = RedisSlidingWindowRateLimiter()
+    requests = [
+        RequestedQuota(prefix=f"benchmark-org:{i % ORGANIZATIONS}", requested=1, quotas=QUOTAS)
+        for i in range(BATCH_SIZE)
+    ]
+    check = {
+        "check_and_use": check_and_use,
+        "bulk": bulk_check_and_use,
+        "lease": make_lease(limiter),
+    }[method]
+
+    grants = benchmark(check, limiter, requests)
+
+    assert [grant.granted for grant in grants] == [1] * BATCH_SIZE
+    benchmark.extra_info["messages_per_second"] = BATCH_SIZE / benchmark.stats.stats.mean
@@ -1,8 +1,11 @@
+from unittest import mock
+
 import pytest
 
 from sentry.ratelimits.sliding_windows import (
     GrantedQuota,
     Quota,
+    QuotaLease,
     RedisSlidingWindowRateLimiter,
     RequestedQuota,
 )
@@ -71,3 +74,64 @@ def test_basic(limiter):
         )
 
         assert resp == [GrantedQuota(prefix="foo", granted=0, reached_quotas=quotas)]
+
+
+@pytest.mark.parametrize("shards", [1, 32])
+def test_bulk_matches_check_and_use(shards):
+    limiter = RedisSlidingWindowRateLimiter(shards=shards)
+    quotas = [
+        Quota(window_seconds=10, granularity_seconds=1, limit=25, prefix_override="global"),
+        Quota(window_seconds=10, granularity_seconds=5, limit=10),
+    ]
+
+    for timestamp in range(0, 30, 3):
+        requests = [
+            RequestedQuota(prefix=f"bulk-org:{org_id}", requested=org_id, quotas=quotas)
+            for org_id in range(6)
+        ]
+        expected = limiter.check_and_use_quotas(requests, timestamp=TIMESTAMP_OFFSET + timestamp)
+        resp = limiter.bulk_check_and_use_quotas(requests, timestamp=TIMESTAMP_OFFSET + timestamp)
+        assert resp == expected
+
+
+def test_bulk_same_prefix(limiter):
+    quotas = [Quota(window_seconds=10, granularity_seconds=1, limit=10)]
+    requests = [RequestedQuota(prefix="foo", requested=4, quotas=quotas)] * 3
+
+    resp = limiter.bulk_check_and_use_quotas(requests, timestamp=TIMESTAMP_OFFSET)
+    assert resp == [
+        GrantedQuota(prefix="foo", granted=4, reached_quotas=[]),
+        GrantedQuota(prefix="foo", granted=4, reached_quotas=[]),
+        GrantedQuota(prefix="foo", granted=2, reached_quotas=quotas),
+    ]
+
+    resp = limiter.bulk_check_and_use_quotas(requests[:1], timestamp=TIMESTAMP_OFFSET + 9)
+    assert resp == [GrantedQuota(prefix="foo", granted=0, reached_quotas=quotas)]
+
+    resp = limiter.bulk_check_and_use_quotas(requests[:1], timestamp=TIMESTAMP_OFFSET + 10)
+    assert resp == [GrantedQuota(prefix="foo", granted=4, reached_quotas=[])]
+
+
+def test_lease(limiter):
+    quotas = [Quota(window_seconds=10, granularity_seconds=1, limit=25)]
+    request = RequestedQuota(prefix="foo", requested=1, quotas=quotas)
+    lease = QuotaLease(limiter, size=10, ttl_seconds=5)
+
+    with mock.patch.object(
+        limiter, "bulk_check_and_use_quotas", wraps=limiter.bulk_check_and_use_quotas
+    ) as bulk_check_and_use_quotas:
+        for _ in range(11):
+            resp = lease.check_and_use_quotas([request], timestamp=TIMESTAMP_OFFSET)
+            assert resp == [GrantedQuota(prefix="foo", granted=1, reached_quotas=[])]
+        assert bulk_check_and_use_quotas.call_count == 1
+
+        # The budget of all processes is limited by the quota.
+        other_lease = QuotaLease(limiter, size=10, ttl_seconds=5)
+        resp = other_lease.check_and_use_quotas(
+            [RequestedQuota(prefix="foo", requested=20, quotas=quotas)], timestamp=TIMESTAMP_OFFSET
+        )
+        assert resp == [GrantedQuota(prefix="foo", granted=14, reached_quotas=quotas)]
+
+        resp = lease.check_and_use_quotas([request], timestamp=TIMESTAMP_OFFSET)
+        assert resp == [GrantedQuota(prefix="foo", granted=0, reached_quotas=quotas)]
+        assert bulk_check_and_use_quotas.call_count == 3
@@ -20,7 +20,12 @@ from sentry.dynamic_sampling.rules.base import NEW_MODEL_THRESHOLD_IN_MINUTES
 from sentry.models import ProjectKey
 from sentry.models.projectteam import ProjectTeam
 from sentry.models.transaction_threshold import TransactionMetric
-from sentry.relay.config import ProjectConfig, get_project_config
+from sentry.relay.config import (
+    OrganizationConfigValues,
+    ProjectConfig,
+    get_dynamic_sampling_config,
+    get_project_config,
+)
 from sentry.snuba.dataset import Dataset
 from sentry.testutils.factories import Factories
 from sentry.testutils.helpers import Feature
@@ -718,3 +723,33 @@ def test_alert_metric_extraction_rules(default_project, factories):
                 }
             ],
         }
+
+
+@django_db_all
+def test_organization_values_without_blended_sample_rate(default_project):
+    with Feature({"organizations:dynamic-sampling": True}), patch(
+        "sentry.relay.config.quotas.get_blended_sample_rate", return_value=None
+    ) as get_blended_sample_rate:
+        organization_values = OrganizationConfigValues(default_project.organization)
+        for _ in range(2):
+            config = get_dynamic_sampling_config(default_project, organization_values)
+            assert config == {"rules": [], "rulesV2": []}
+
+    assert get_blended_sample_rate.call_count == 1
+
+
+@django_db_all
+def test_organization_values_failure(default_project):
+    with Feature({"organizations:dynamic-sampling": True}):
+        with patch(
+            "sentry.relay.config.quotas.get_blended_sample_rate", side_effect=Exception
+        ), patch("sentry.relay.config.logger") as logger:
+            organization_values = OrganizationConfigValues(default_project.organization)
+        assert organization_values.dynamic_sampling_failed
+        assert logger.error.call_args.kwargs["exc_info"]
+
+        # The rules are generated for the project on its own
+        with patch("sentry.relay.config.quotas.get_blended_sample_rate", return_value=0.1):
+            config = get_dynamic_sampling_config(default_project, organization_values)
+        assert config is not None
+        assert config["rulesV2"]
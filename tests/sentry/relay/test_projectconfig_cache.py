@@ -23,3 +23,14 @@ def test_read_write():
     my_key = "fake-dsn-1"
     cache.set_many({my_key: "my-value"})
     assert cache.get(my_key) == "my-value"
+
+
+@django_db_all
+def test_exists_many():
+    cache = redis.RedisProjectConfigCache()
+    cache.set_many({"fake-dsn-1": "my-value", "fake-dsn-2": "my-value"})
+    assert cache.exists_many(["fake-dsn-1", "fake-dsn-3", "fake-dsn-2"]) == {
+        "fake-dsn-1",
+        "fake-dsn-2",
+    }
+    assert cache.exists_many([]) == set()
@@ -0,0 +1,88 @@
+from unittest import mock
+
+import pytest
+
+from sentry.models import Rule
+from sentry.rules.processor import RuleProcessor
+from sentry.testutils.skips import requires_pytest_benchmark
+from sentry.utils.pytest.fixtures import django_db_all
+
+# The alert rules of a large project: most of them check a frequency of the
+# issue, some of them behind a filter that rarely passes. None of them fire,
+# so every event evaluates every rule.
+FREQUENCY_ID = "sentry.rules.conditions.event_frequency.EventFrequencyCondition"
+UNIQUE_USER_FREQUENCY_ID = (
+    "sentry.rules.conditions.event_frequency.EventUniqueUserFrequencyCondition"
+)
+FIRST_SEEN_ID = "sentry.rules.conditions.first_seen_event.FirstSeenEventCondition"
+TAGGED_EVENT_ID = "sentry.rules.filters.tagged_event.TaggedEventFilter"
+INTERVALS = ["1m", "5m", "15m", "1h", "1d"]
+
+EMAIL_ACTION_DATA = {
+    "id": "sentry.mail.actions.NotifyEmailAction",
+    "targetType": "IssueOwners",
+    "targetIdentifier": None,
+}
+
+
+def make_rule_data(index):
+    interval = INTERVALS[index % len(INTERVALS)]
+    if index % 3 == 0:
+        return {
+            "conditions": [
+                {"id": FIRST_SEEN_ID},
+                {"id": FREQUENCY_ID, "interval": interval, "value": 10**6},
+            ],
+            "action_match": "any",
+            "actions": [EMAIL_ACTION_DATA],
+        }
+    elif index % 3 == 1:
+        return {
+            "conditions": [
+                {"id": TAGGED_EVENT_ID, "key": "level", "match": "eq", "value": "fatal"},
+                {"id": FREQUENCY_ID, "interval": interval, "value": 10**6},
+            ],
+            "actions": [EMAIL_ACTION_DATA],
+        }
+    return {
+        "conditions": [{"id": UNIQUE_USER_FREQUENCY_ID, "interval": interval, "value": 10**6}],
+        "actions": [EMAIL_ACTION_DATA],
+    }
+
+
+def zero_windows(model, keys, windows, **kwargs):
+    return [{key: 0 for key in keys} for _ in windows]
+
+
+@django_db_all
+@requires_pytest_benchmark
+@pytest.mark.parametrize("rule_count", [50, 200])
+def test_benchmark_rule_processor(default_project, factories, benchmark, rule_count):
+    for index in range(rule_count):
+        Rule.objects.create(project=default_project, data=make_rule_data(index))
+
+    event = factories.store_event(data={"level": "error"}, project_id=default_project.id)
+    group_event = next(event.build_group_events())
+
+    def apply():
+        rp = RuleProcessor(
+            group_event,
+            is_new=False,
+            is_regression=False,
+            is_new_group_environment=False,
+            has_reappeared=False,
+        )
+        return list(rp.apply())
+
+    with mock.patch(
+        "sentry.tsdb.get_sums_multi_window", side_effect=zero_windows
+    ) as get_sums, mock.patch(
+        "sentry.tsdb.get_distinct_counts_totals_multi_window", side_effect=zero_windows
+    ) as get_distinct_counts:
+        results = benchmark(apply)
+
+    assert results == []
+    rounds = benchmark.stats.stats.rounds
+    benchmark.extra_info["tsdb_calls_per_event"] = (
+        get_sums.call_count + get_distinct_counts.call_count
+    ) / rounds
@@ -14,10 +14,11 @@ from sentry.notifications.types import ActionTargetType
 from sentry.rules import init_registry
 from sentry.rules.conditions import EventCondition
 from sentry.rules.filters.base import EventFilter
-from sentry.rules.processor import RuleProcessor
+from sentry.rules.processor import RuleProcessor, _compiled_rules, get_compiled_rules
 from sentry.testutils import TestCase
 from sentry.testutils.helpers import install_slack
 from sentry.testutils.silo import region_silo_test
+from sentry.utils.snuba import OVERRIDE_OPTIONS, options_override
 
 EMAIL_ACTION_DATA = {
     "id": "sentry.mail.actions.NotifyEmailAction",
@@ -39,6 +40,8 @@ class MockConditionTrue(EventCondition):
 @region_silo_test(stable=True)
 class RuleProcessorTest(TestCase):
     def setUp(self):
+        # Compiled rules refer to the rule registry, which these tests replace.
+        _compiled_rules.clear()
         self.group_event = self.store_event(data={}, project_id=self.project.id)
         self.group_event = next(self.group_event.build_group_events())
 
@@ -338,6 +341,225 @@ class RuleProcessorTest(TestCase):
         # mock condition first.
         assert passes.call_count == 0
 
+    @patch(
+        "sentry.constants._SENTRY_RULES",
+        [
+            "sentry.mail.actions.NotifyEmailAction",
+            "sentry.rules.conditions.event_frequency.EventFrequencyCondition",
+            "sentry.rules.conditions.event_frequency.EventUniqueUserFrequencyCondition",
+        ],
+    )
+    def test_frequency_conditions_planned(self):
+        frequency_id = "sentry.rules.conditions.event_frequency.EventFrequencyCondition"
+        user_frequency_id = (
+            "sentry.rules.conditions.event_frequency.EventUniqueUserFrequencyCondition"
+        )
+        environment = self.group_event.get_environment()
+        self.rule.update(
+            data={
+                "conditions": [{"id": frequency_id, "interval": "1m", "value": 5}],
+                "actions": [EMAIL_ACTION_DATA],
+            }
+        )
+        Rule.objects.create(
+            project=self.group_event.project,
+            data={
+                "conditions": [{"id": frequency_id, "interval": "1h", "value": 50}],
+                "actions": [EMAIL_ACTION_DATA],
+            },
+        )
+        comparison_rule = Rule.objects.create(
+            project=self.group_event.project,
+            data={
+                "conditions": [
+                    {
+                        "id": frequency_id,
+                        "interval": "1h",
+                        "value": 100,
+                        "comparisonType": "percent",
+                        "comparisonInterval": "1d",
+                    }
+                ],
+                "actions": [EMAIL_ACTION_DATA],
+            },
+        )
+        Rule.objects.create(
+            project=self.group_event.project,
+            environment_id=environment.id,
+            data={
+                "conditions": [{"id": frequency_id, "interval": "1h", "value": 50}],
+                "actions": [EMAIL_ACTION_DATA],
+            },
+        )
+        user_rule = Rule.objects.create(
+            project=self.group_event.project,
+            data={
+                "conditions": [
+                    {"id": user_frequency_id, "interval": "1h", "value": 2},
+                    {"id": frequency_id, "interval": "1h", "value": 10},
+                ],
+                "actions": [EMAIL_ACTION_DATA],
+            },
+        )
+
+        consistent = []
+
+        def get_sums_multi_window(model, keys, windows, environment_ids, **kwargs):
+            consistent.append(OVERRIDE_OPTIONS["consistent"])
+            # 10 events in the last minute, 20 in the last hour and 5 in the same hour a day ago.
+            results = []
+            for start, end in windows:
+                if end - start == timedelta(minutes=1):
+                    results.append({keys[0]: 10})
+                else:
+                    results.append(
+                        {keys[0]: 20 if timezone.now() - end < timedelta(hours=1) else 5}
+                    )
+            return results
+
+        def get_distinct_counts_totals_multi_window(model, keys, windows, **kwargs):
+            return [{keys[0]: 3} for _ in windows]
+
+        with patch("sentry.rules.processor.rules", init_registry()), patch(
+            "sentry.tsdb.get_sums_multi_window", side_effect=get_sums_multi_window
+        ) as get_sums, patch(
+            "sentry.tsdb.get_distinct_counts_totals_multi_window",
+            side_effect=get_distinct_counts_totals_multi_window,
+        ) as get_distinct_counts, options_override(
+            {"consistent": True}
+        ):
+            rp = RuleProcessor(
+                self.group_event,
+                is_new=True,
+                is_regression=True,
+                is_new_group_environment=True,
+                has_reappeared=True,
+            )
+            results = list(rp.apply())
+
+        # All frequency conditions were answered by a single query per model and group of
+        # overlapping windows, for the distinct windows and environments. The comparison window
+        # a day ago is queried on its own.
+        assert get_sums.call_count == 2
+        assert get_distinct_counts.call_count == 1
+        needs = [
+            need
+            for call in get_sums.call_args_list
+            for need in zip(call[1]["environment_ids"], call[1]["windows"])
+        ]
+        end = max(window_end for _, (_, window_end) in needs)
+        assert [len(call[1]["windows"]) for call in get_sums.call_args_list] == [1, 3]
+        # Only the group with the minute window keeps consistent reads.
+        assert consistent == [False, True]
+        assert sorted(needs, key=lambda need: (need[0] or 0, need[1])) == [
+            (None, (end - timedelta(days=1, hours=1), end - timedelta(days=1))),
+            (None, (end - timedelta(hours=1), end)),
+            (None, (end - timedelta(minutes=1), end)),
+            (environment.id, (end - timedelta(hours=1), end)),
+        ]
+        assert {futures[0].rule for _, futures in results} == {
+            self.rule,
+            comparison_rule,
+            user_rule,
+        }
+
+    @patch(
+        "sentry.constants._SENTRY_RULES",
+        [
+            "sentry.mail.actions.NotifyEmailAction",
+            "sentry.rules.conditions.event_frequency.EventFrequencyCondition",
+            "sentry.rules.conditions.event_frequency.EventUniqueUserFrequencyCondition",
+        ],
+    )
+    def test_frequency_query_failure_isolated(self):
+        frequency_id = "sentry.rules.conditions.event_frequency.EventFrequencyCondition"
+        user_frequency_id = (
+            "sentry.rules.conditions.event_frequency.EventUniqueUserFrequencyCondition"
+        )
+        self.rule.update(
+            data={
+                "conditions": [{"id": frequency_id, "interval": "1m", "value": 5}],
+                "actions": [EMAIL_ACTION_DATA],
+            },
+        )
+        user_rule = Rule.objects.create(
+            project=self.group_event.project,
+            data={
+                "conditions": [{"id": user_frequency_id, "interval": "1h", "value": 2}],
+                "actions": [EMAIL_ACTION_DATA],
+            },
+        )
+
+        with patch("sentry.rules.processor.rules", init_registry()), patch(
+            "sentry.tsdb.get_sums_multi_window", side_effect=Exception("snuba is down")
+        ), patch(
+            "sentry.tsdb.get_distinct_counts_totals_multi_window",
+            side_effect=lambda model, keys, windows, **kwargs: [{keys[0]: 3} for _ in windows],
+        ):
+            results = list(
+                RuleProcessor(
+                    self.group_event,
+                    is_new=True,
+                    is_regression=True,
+                    is_new_group_environment=True,
+                    has_reappeared=True,
+                ).apply()
+            )
+
+        # Only the condition of the failed query fails
+        assert {futures[0].rule for _, futures in results} == {user_rule}
+
+    @patch(
+        "sentry.constants._SENTRY_RULES",
+        [
+            "sentry.mail.actions.NotifyEmailAction",
+            "sentry.rules.conditions.event_frequency.EventFrequencyCondition",
+        ],
+    )
+    def test_unplanned_frequency_conditions(self):
+        frequency_id = "sentry.rules.conditions.event_frequency.EventFrequencyCondition"
+        self.rule.update(
+            data={
+                "conditions": [{"id": frequency_id, "interval": "1m", "value": 5}],
+                "actions": [EMAIL_ACTION_DATA],
+            },
+        )
+
+        with patch("sentry.rules.processor.rules", init_registry()), patch(
+            "sentry.rules.conditions.event_frequency.EventFrequencyCondition.get_tsdb_query",
+            return_value=None,
+        ), patch(
+            "sentry.rules.conditions.event_frequency.EventFrequencyCondition.passes",
+            return_value=True,
+        ) as passes, patch(
+            "sentry.tsdb.get_sums_multi_window"
+        ) as get_sums:
+            results = list(
+                RuleProcessor(
+                    self.group_event,
+                    is_new=True,
+                    is_regression=True,
+                    is_new_group_environment=True,
+                    has_reappeared=True,
+                ).apply()
+            )
+
+        # Conditions that don't describe their query are evaluated on their own
+        assert passes.call_count == 1
+        assert get_sums.call_count == 0
+        assert {futures[0].rule for _, futures in results} == {self.rule}
+
+    def test_compiled_rules_cached(self):
+        rules = Rule.get_for_project(self.project.id)
+        compiled = get_compiled_rules(self.project, rules)
+        assert get_compiled_rules(self.project, Rule.get_for_project(self.project.id)) is compiled
+
+        self.rule.data = {"conditions": [EVERY_EVENT_COND_DATA], "actions": [], "frequency": 5}
+        self.rule.save()
+        recompiled = get_compiled_rules(self.project, Rule.get_for_project(self.project.id))
+        assert recompiled is not compiled
+        assert recompiled.rules[self.rule.id].frequency == 5
+
 
 class MockFilterTrue(EventFilter):
     id = "tests.sentry.rules.test_processor.MockFilterTrue"
@@ -365,6 +587,8 @@ class RuleProcessorTestFilters(TestCase):
     )
 
     def setUp(self):
+        # Compiled rules refer to the rule registry, which these tests replace.
+        _compiled_rules.clear()
         self.group_event = self.store_event(data={}, project_id=self.project.id)
         self.group_event = next(self.group_event.build_group_events())
 
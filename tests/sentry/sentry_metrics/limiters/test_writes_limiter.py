@@ -1,6 +1,8 @@
 from enum import Enum
 from unittest.mock import patch
 
+import pytest
+
 from sentry.sentry_metrics.configuration import (
     PERFORMANCE_PG_NAMESPACE,
     RELEASE_HEALTH_PG_NAMESPACE,
@@ -341,3 +343,39 @@ def test_writes_limiter_respects_use_case_id():
 
         with writes_limiter_rh.check_write_limits(use_case_keys) as state:
             assert len(state.dropped_strings) == 24
+
+
+@pytest.mark.parametrize("lease_size", [0, 100])
+@patch("sentry.sentry_metrics.indexer.limiters.writes.UseCaseID", MockUseCaseID)
+@patch(
+    "sentry.sentry_metrics.indexer.limiters.writes.USE_CASE_ID_WRITES_LIMIT_QUOTA_OPTIONS",
+    MOCK_USE_CASE_ID_WRITES_LIMIT_QUOTA_OPTIONS,
+)
+def test_writes_limiter_bulk(lease_size):
+    with override_options(
+        {
+            "sentry-metrics.writes-limiter.bulk": True,
+            "sentry-metrics.writes-limiter.lease-size": lease_size,
+            "sentry-metrics.writes-limiter.limits.uc1.global": [],
+            "sentry-metrics.writes-limiter.limits.uc1.per-org": [
+                {"window_seconds": 10, "granularity_seconds": 10, "limit": 2}
+            ],
+        },
+    ):
+        writes_limiter = UcaWritesLimiter(PERFORMANCE_PG_NAMESPACE)
+
+        with patch.object(writes_limiter.rate_limiter, "use_quotas") as use_quotas:
+            with writes_limiter.check_write_limits(
+                UseCaseKeyCollection({MockUseCaseID.USE_CASE_1: {1: {"a", "b", "c"}}})
+            ) as state:
+                assert len(state.dropped_strings) == 1
+                assert len(state.accepted_keys.as_tuples()) == 2
+
+            # The quota was consumed right away, by the first batch.
+            with writes_limiter.check_write_limits(
+                UseCaseKeyCollection({MockUseCaseID.USE_CASE_1: {1: {"d"}, 2: {"e"}}})
+            ) as state:
+                assert [ds.use_case_key_result.org_id for ds in state.dropped_strings] == [1]
+                assert state.accepted_keys.as_tuples() == [(MockUseCaseID.USE_CASE_1, 2, "e")]
+
+        assert use_quotas.call_count == 0
@@ -7,10 +7,15 @@ from unittest.mock import patch
 
 import pytest
 import sentry_kafka_schemas
+from sentry_kafka_schemas.codecs import ValidationError
 from arroyo.backends.kafka import KafkaPayload
 from arroyo.types import BrokerValue, Message, Partition, Topic, Value
 
-from sentry.sentry_metrics.consumers.indexer.batch import IndexerBatch, PartitionIdxOffset
+from sentry.sentry_metrics.consumers.indexer.batch import (
+    IndexerBatch,
+    PartitionIdxOffset,
+    split_raw_value,
+)
 from sentry.sentry_metrics.indexer.base import FetchType, FetchTypeExt, Metadata
 from sentry.snuba.metrics.naming_layer.mri import SessionMRI, TransactionMRI
 from sentry.testutils.helpers.options import override_options
@@ -1823,3 +1828,117 @@ def test_cardinality_limiter(caplog, settings):
             ],
         )
     ]
+
+
+def test_split_raw_value():
+    payload = (
+        b'{"name":"d:sessions/duration@second","tags":{"value":"[1]","\\"value\\":[2]":"x"},'
+        b'"type":"d","value" : [4.5, 5, -6e-07],"org_id":1}'
+    )
+    stripped, raw_value = split_raw_value(payload)
+
+    assert bytes(raw_value) == b"[4.5, 5, -6e-07]"
+    assert stripped == payload.replace(b"[4.5, 5, -6e-07]", b"[]")
+    assert json.loads(stripped)["tags"] == {"value": "[1]", '"value":[2]': "x"}
+
+    assert split_raw_value(json.dumps(counter_payload).encode("utf-8")) is None
+    assert split_raw_value(b'{"type":"s","value":["a"]}') is None
+
+
+@patch("sentry.sentry_metrics.consumers.indexer.batch.UseCaseID", MockUseCaseID)
+@pytest.mark.parametrize("should_index_tag_values", [True, False])
+def test_raw_value_passthrough(should_index_tag_values):
+    """
+    Copying the values of sets and distributions as raw bytes produces the
+    same output messages as decoding and encoding them.
+    """
+    payloads = [
+        (counter_payload, counter_headers),
+        (distribution_payload, distribution_headers),
+        (set_payload, set_headers),
+        ({**distribution_payload, "value": [0.25, 1.5, 1000.125, 3]}, distribution_headers),
+    ]
+
+    def reconstruct(raw_value_passthrough):
+        with override_options(
+            {"sentry-metrics.indexer.raw-value-passthrough": raw_value_passthrough}
+        ):
+            batch = IndexerBatch(
+                _construct_outer_message(payloads),
+                should_index_tag_values,
+                False,
+                input_codec=_INGEST_CODEC,
+            )
+        strings = batch.extract_strings()
+        mapping = {
+            use_case_id: {
+                org_id: {string: id for id, string in enumerate(sorted(org_strings), 1)}
+                for org_id, org_strings in org_mapping.items()
+            }
+            for use_case_id, org_mapping in strings.items()
+        }
+        meta = {
+            use_case_id: {
+                org_id: {
+                    string: Metadata(id=id, fetch_type=FetchType.CACHE_HIT)
+                    for string, id in org_mapping.items()
+                }
+                for org_id, org_mapping in use_case_mapping.items()
+            }
+            for use_case_id, use_case_mapping in mapping.items()
+        }
+        raw_value_count = len(batch.raw_values_by_offset)
+        return raw_value_count, batch.reconstruct_messages(mapping, meta)
+
+    raw_value_count, messages = reconstruct(False)
+    assert raw_value_count == 0
+
+    raw_value_count, passthrough_messages = reconstruct(True)
+    assert raw_value_count == 3
+    assert [msg.payload.value for msg in passthrough_messages] == [
+        msg.payload.value for msg in messages
+    ]
+    assert [msg.payload.headers for msg in passthrough_messages] == [
+        msg.payload.headers for msg in messages
+    ]
+
+
+@patch("sentry.sentry_metrics.consumers.indexer.batch.UseCaseID", MockUseCaseID)
+@pytest.mark.parametrize(
+    "payload",
+    [
+        {**set_payload, "value": [3, -1]},
+        {**set_payload, "value": [3, 2.5]},
+        {**counter_payload, "value": [1, 2]},
+    ],
+    ids=["negative_set", "float_set", "counter"],
+)
+def test_raw_value_passthrough_validated(payload, settings):
+    """
+    Values that aren't valid for the type of the metric are decoded, so that
+    the schema validation sees them.
+    """
+    settings.SENTRY_METRICS_INDEXER_RAISE_VALIDATION_ERRORS = True
+
+    with override_options({"sentry-metrics.indexer.raw-value-passthrough": True}), pytest.raises(
+        ValidationError
+    ):
+        IndexerBatch(
+            _construct_outer_message([(payload, set_headers)]),
+            True,
+            False,
+            input_codec=_INGEST_CODEC,
+        )
+
+    settings.SENTRY_METRICS_INDEXER_RAISE_VALIDATION_ERRORS = False
+    with override_options({"sentry-metrics.indexer.raw-value-passthrough": True}):
+        batch = IndexerBatch(
+            _construct_outer_message([(payload, set_headers)]),
+            True,
+            False,
+            input_codec=_INGEST_CODEC,
+        )
+    assert batch.raw_values_by_offset == {}
+    assert [parsed["value"] for parsed in batch.parsed_payloads_by_offset.values()] == [
+        payload["value"]
+    ]
@@ -0,0 +1,143 @@
+import itertools
+import random
+from datetime import datetime, timezone
+
+import pytest
+from arroyo.backends.kafka import KafkaPayload
+from arroyo.types import BrokerValue, Message, Partition, Topic, Value
+
+from sentry.sentry_metrics.consumers.indexer.batch import IndexerBatch
+from sentry.sentry_metrics.indexer.base import FetchType, Metadata
+from sentry.sentry_metrics.indexer.postgres.postgres_v2 import PGStringIndexerV2
+from sentry.sentry_metrics.use_case_id_registry import UseCaseID
+from sentry.testutils.helpers.options import override_options
+from sentry.testutils.skips import requires_pytest_benchmark
+from sentry.utils import json
+from sentry.utils.pytest.fixtures import django_db_all
+
+# A cardinality spike: a batch of the indexer consumer where most strings are
+# new, e.g. after a release started sending a unique tag value per event.
+BATCH_SIZE = 5000
+ORGANIZATIONS = 5
+
+# A batch of the generic metrics indexer consumer as relay sends it: mostly
+# distributions of transaction durations and measurements, some counters and
+# sets of user ids, with the usual transaction tags.
+MESSAGE_BATCH_SIZE = 1000
+TRANSACTION_TAGS = {
+    "environment": "production",
+    "release": "backend@23.7.1",
+    "transaction": "/api/0/organizations/{organization_slug}/events/",
+    "transaction.method": "GET",
+    "transaction.op": "http.server",
+    "transaction.status": "ok",
+    "http.status_code": "200",
+    "browser.name": "Chrome",
+}
+
+
+@django_db_all
+@requires_pytest_benchmark
+@pytest.mark.parametrize("copy_insert", [False, True], ids=["bulk_create", "copy"])
+@pytest.mark.parametrize("use_case_id", [UseCaseID.SESSIONS, UseCaseID.TRANSACTIONS])
+def test_benchmark_pg_indexer_new_strings(benchmark, copy_insert, use_case_id):
+    indexer = PGStringIndexerV2()
+    batches = itertools.count()
+
+    def setup():
+        # Every round records strings that don't exist yet
+        batch = next(batches)
+        strings = {
+            org_id: {f"release-{batch}-{i}" for i in range(org_id, BATCH_SIZE, ORGANIZATIONS)}
+            for org_id in range(1, ORGANIZATIONS + 1)
+        }
+        return ({use_case_id: strings},), {}
+
+    with override_options({"sentry-metrics.indexer.pg-copy-insert": copy_insert}):
+        results = benchmark.pedantic(indexer.bulk_record, setup=setup, rounds=5)
+
+    assert all(id is not None for id in results.get_mapped_strings_to_ints().values())
+    benchmark.extra_info["strings_per_second"] = BATCH_SIZE / benchmark.stats.stats.mean
+
+
+def make_metric_payload(rand, index):
+    kind = index % 10
+    if kind < 6:
+        name = "d:transactions/duration@millisecond"
+        metric_type = "d"
+        value = [round(rand.lognormvariate(5, 1), 3) for _ in range(rand.randint(1, 200))]
+    elif kind < 9:
+        name = "c:transactions/count_per_root_project@none"
+        metric_type = "c"
+        value = float(rand.randint(1, 100))
+    else:
+        name = "s:transactions/user@none"
+        metric_type = "s"
+        value = [rand.getrandbits(31) for _ in range(rand.randint(1, 50))]
+
+    return {
+        "name": name,
+        "tags": TRANSACTION_TAGS,
+        "timestamp": 1689000000 + index,
+        "type": metric_type,
+        "value": value,
+        "org_id": 1 + index % ORGANIZATIONS,
+        "retention_days": 90,
+        "project_id": 3,
+    }
+
+
+def make_outer_message():
+    rand = random.Random(0)
+    timestamp = datetime.now(tz=timezone.utc)
+    messages = [
+        Message(
+            BrokerValue(
+                KafkaPayload(
+                    None,
+                    json.dumps(make_metric_payload(rand, index)).encode("utf-8"),
+                    [("namespace", b"transactions")],
+                ),
+                Partition(Topic("ingest-performance-metrics"), 0),
+                index,
+                timestamp,
+            )
+        )
+        for index in range(MESSAGE_BATCH_SIZE)
+    ]
+    return Message(Value(messages, messages[-1].committable))
+
+
+def process_batch(outer_message):
+    batch = IndexerBatch(outer_message, False, False, input_codec=None)
+    strings = batch.extract_strings()
+    mapping = {
+        use_case_id: {
+            org_id: {string: id for id, string in enumerate(sorted(org_strings), 1)}
+            for org_id, org_strings in org_mapping.items()
+        }
+        for use_case_id, org_mapping in strings.items()
+    }
+    meta = {
+        use_case_id: {
+            org_id: {
+                string: Metadata(id=id, fetch_type=FetchType.CACHE_HIT)
+                for string, id in org_mapping.items()
+            }
+            for org_id, org_mapping in use_case_mapping.items()
+        }
+        for use_case_id, use_case_mapping in mapping.items()
+    }
+    return batch.reconstruct_messages(mapping, meta)
+
+
+@requires_pytest_benchmark
+@pytest.mark.parametrize("raw_value_passthrough", [False, True], ids=["decode", "passthrough"])
+def test_benchmark_indexer_batch(benchmark, raw_value_passthrough):
+    outer_message = make_outer_message()
+
+    with override_options({"sentry-metrics.indexer.raw-value-passthrough": raw_value_passthrough}):
+        messages = benchmark(process_batch, outer_message)
+
+    assert len(messages) == MESSAGE_BATCH_SIZE
+    benchmark.extra_info["messages_per_second"] = MESSAGE_BATCH_SIZE / benchmark.stats.stats.mean
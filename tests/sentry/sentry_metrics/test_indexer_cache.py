@@ -1,10 +1,23 @@
+import uuid
+from unittest import mock
+
 import pytest
 from django.conf import settings
 
-from sentry.sentry_metrics.indexer.cache import StringIndexerCache
+from sentry import options
+from sentry.sentry_metrics.indexer.base import FetchType
+from sentry.sentry_metrics.indexer.cache import (
+    CachingIndexer,
+    StringIndexerCache,
+    StringIndexerLocalCache,
+)
+from sentry.sentry_metrics.indexer.mock import RawSimpleIndexer
+from sentry.sentry_metrics.indexer.shared_cache import SharedIdTable, StringIndexerSharedCache
 from sentry.sentry_metrics.use_case_id_registry import UseCaseID
+from sentry.testutils.helpers.options import override_options
 from sentry.utils.cache import cache
 from sentry.utils.hashlib import md5_text
+from sentry.utils.pytest.fixtures import django_db_all
 
 pytestmark = pytest.mark.sentry_metrics
 
@@ -81,3 +94,126 @@ def test_separate_namespacing() -> None:
     indexer_cache.set("transactions:3:what", 2)
     assert indexer_cache.get("sessions:3:what") == 1
     assert indexer_cache.get("transactions:3:what") == 2
+
+
+@django_db_all
+def test_local_cache_bulk_record() -> None:
+    cache.clear()
+    indexer = RawSimpleIndexer()
+    caching_indexer = CachingIndexer(indexer_cache, indexer, StringIndexerLocalCache())
+    strings = {UseCaseID.TRANSACTIONS: {1: {"a", "b"}}, UseCaseID.SESSIONS: {1: {"c"}}}
+
+    with override_options(
+        {
+            "sentry-metrics.indexer.local-cache.max-bytes": 10000,
+            "sentry-metrics.indexer.local-cache.max-bytes-per-use-case": {"sessions": 0},
+        }
+    ):
+        results = caching_indexer.bulk_record(strings)
+        ids = results.get_mapped_strings_to_ints()
+
+        # Only the transactions strings are cached in the local tier. The sessions string
+        # comes from the shared cache.
+        with mock.patch.object(indexer_cache, "get_many", wraps=indexer_cache.get_many) as get_many:
+            results = caching_indexer.bulk_record(strings)
+        get_many.assert_called_once_with(["sessions:1:c"])
+
+    assert results.get_mapped_strings_to_ints() == ids
+    assert {
+        meta.fetch_type
+        for use_case_meta in results.get_fetch_metadata().values()
+        for org_meta in use_case_meta.values()
+        for meta in org_meta.values()
+    } == {FetchType.CACHE_HIT}
+
+
+@django_db_all
+def test_local_cache_resolve() -> None:
+    cache.clear()
+    indexer = RawSimpleIndexer()
+    caching_indexer = CachingIndexer(indexer_cache, indexer, StringIndexerLocalCache())
+
+    with override_options(
+        {
+            "sentry-metrics.indexer.local-cache.max-bytes": 10000,
+            "sentry-metrics.indexer.local-cache.negative-ttl": 60,
+        }
+    ):
+        assert caching_indexer.resolve(UseCaseID.TRANSACTIONS, 1, "a") is None
+        id = indexer.record(UseCaseID.TRANSACTIONS, 1, "a")
+        # The missing id is cached, until the string is recorded through the caching indexer
+        assert caching_indexer.resolve(UseCaseID.TRANSACTIONS, 1, "a") is None
+        assert caching_indexer.record(UseCaseID.TRANSACTIONS, 1, "a") == id
+
+        with mock.patch.object(indexer, "resolve") as resolve, mock.patch.object(
+            indexer_cache, "get"
+        ) as get:
+            assert caching_indexer.resolve(UseCaseID.TRANSACTIONS, 1, "a") == id
+        assert resolve.call_count == 0
+        assert get.call_count == 0
+
+
+@django_db_all
+def test_local_cache_budget() -> None:
+    local_cache = StringIndexerLocalCache()
+    with override_options({"sentry-metrics.indexer.local-cache.max-bytes": 1000}):
+        local_cache.set_many({f"transactions:1:{i}": i for i in range(1, 10)})
+        local_cache.set("sessions:1:a", 1)
+        ids, missing = local_cache.get_many(["transactions:1:9", "transactions:1:1"])
+        assert ids == {"transactions:1:9": 9}
+        assert missing == ["transactions:1:1"]
+        # The budget is per use case, so the sessions entry survives
+        assert local_cache.get("sessions:1:a") == (True, 1)
+        # Negative caching is disabled by default
+        local_cache.set_no_id("sessions:1:b")
+        assert local_cache.get("sessions:1:b") == (False, None)
+
+    with override_options({"sentry-metrics.indexer.local-cache.max-bytes": 0}):
+        assert local_cache.get("sessions:1:a") == (False, None)
+        assert not local_cache.is_enabled()
+
+
+@django_db_all
+def test_local_cache_reads_options_once() -> None:
+    local_cache = StringIndexerLocalCache()
+    keys = [f"{use_case_id}:1:a" for use_case_id in ("transactions", "sessions", "spans")]
+    with override_options({"sentry-metrics.indexer.local-cache.max-bytes": 1000}), mock.patch(
+        "sentry.sentry_metrics.indexer.cache.options.get",
+        wraps=options.get,
+    ) as options_get:
+        local_cache.set_many(dict.fromkeys(keys, 1))
+        assert local_cache.get_many(keys) == (dict.fromkeys(keys, 1), [])
+
+    names = [call.args[0] for call in options_get.call_args_list]
+    assert names.count("sentry-metrics.indexer.local-cache.max-bytes") == 2
+    assert names.count("sentry-metrics.indexer.local-cache.max-bytes-per-use-case") == 2
+
+
+@django_db_all
+def test_shared_cache_bulk_record() -> None:
+    cache.clear()
+    indexer = RawSimpleIndexer()
+    name = f"sentry-test-{uuid.uuid4().hex}"
+    strings = {UseCaseID.TRANSACTIONS: {1: {"a", "b"}}}
+
+    with override_options(
+        {
+            "sentry-metrics.indexer.shared-cache.max-bytes": 10000,
+            "sentry-metrics.indexer.shared-cache.name": name,
+        }
+    ):
+        caching_indexer = CachingIndexer(indexer_cache, indexer, None, StringIndexerSharedCache())
+        ids = caching_indexer.bulk_record(strings).get_mapped_strings_to_ints()
+
+        # Another process of the host finds the ids in shared memory
+        other_indexer = CachingIndexer(indexer_cache, indexer, None, StringIndexerSharedCache())
+        with mock.patch.object(indexer_cache, "get_many") as get_many:
+            results = other_indexer.bulk_record(strings)
+            assert other_indexer.resolve(UseCaseID.TRANSACTIONS, 1, "a") == ids["transactions:1:a"]
+        assert get_many.call_count == 0
+
+    table = SharedIdTable.open(name, 10000)
+    table.close()
+    table.unlink()
+
+    assert results.get_mapped_strings_to_ints() == ids
@@ -0,0 +1,102 @@
+import uuid
+from unittest import mock
+
+import pytest
+
+from sentry.sentry_metrics.indexer.shared_cache import SharedIdTable, StringIndexerSharedCache
+from sentry.testutils.helpers.options import override_options
+
+pytestmark = pytest.mark.sentry_metrics
+
+# Room for two buckets of eight slots
+TABLE_SIZE = 64 + 2 * 8 * 32
+
+
+@pytest.fixture
+def table_name():
+    name = f"sentry-test-{uuid.uuid4().hex}"
+    yield name
+    table = SharedIdTable.open(name, TABLE_SIZE)
+    table.close()
+    table.unlink()
+
+
+def test_shared_id_table(table_name) -> None:
+    table = SharedIdTable.open(table_name, TABLE_SIZE)
+    other = SharedIdTable.open(table_name, TABLE_SIZE)
+    try:
+        assert table.set_many({"transactions:1:a": 1, "sessions:1:a": 2}) == 0
+        assert other.get_many(["transactions:1:a", "sessions:1:a", "sessions:1:b"], 60) == {
+            "transactions:1:a": 1,
+            "sessions:1:a": 2,
+        }
+        assert other.entries == 2
+        # Expired entries are not returned
+        assert other.get_many(["transactions:1:a"], -1) == {}
+
+        # Full buckets evict older entries
+        evicted = other.set_many({f"transactions:1:{i}": i for i in range(100)})
+        assert evicted == 100 + 2 - 16
+        assert table.entries == 16
+        keys = [f"transactions:1:{i}" for i in range(100)] + ["transactions:1:a", "sessions:1:a"]
+        assert len(table.get_many(keys, 60)) == 16
+    finally:
+        table.close()
+        other.close()
+
+
+def test_shared_id_table_single_writer(table_name) -> None:
+    table = SharedIdTable.open(table_name, TABLE_SIZE)
+    other = SharedIdTable.open(table_name, TABLE_SIZE)
+    try:
+        with mock.patch("fcntl.flock", side_effect=BlockingIOError):
+            assert table.set_many({"transactions:1:a": 1}) is None
+        assert other.get_many(["transactions:1:a"], 60) == {}
+    finally:
+        table.close()
+        other.close()
+
+
+def test_shared_id_table_resize(table_name) -> None:
+    table = SharedIdTable.open(table_name, TABLE_SIZE)
+    resized = SharedIdTable.open(table_name, TABLE_SIZE * 2)
+    other = SharedIdTable.open(table_name, TABLE_SIZE * 2)
+    try:
+        # The old segment is retired and unlinked, the resized one is shared under its name
+        assert table.retired
+        assert table.set_many({"transactions:1:a": 1}) is None
+        assert not resized.retired
+        assert resized.buckets == 4
+        assert other.set_many({"transactions:1:a": 1}) == 0
+        assert resized.get_many(["transactions:1:a"], 60) == {"transactions:1:a": 1}
+    finally:
+        table.close()
+        resized.close()
+        other.close()
+
+
+def test_string_indexer_shared_cache(table_name) -> None:
+    shared_cache = StringIndexerSharedCache()
+    options = {
+        "sentry-metrics.indexer.shared-cache.max-bytes": TABLE_SIZE,
+        "sentry-metrics.indexer.shared-cache.name": table_name,
+    }
+    with override_options(options):
+        assert shared_cache.is_enabled()
+        shared_cache.set_many({"transactions:1:a": 1, "transactions:1:b": None})
+        assert shared_cache.get_many(["transactions:1:a", "transactions:1:b"]) == (
+            {"transactions:1:a": 1},
+            ["transactions:1:b"],
+        )
+        assert shared_cache.get("transactions:1:a") == 1
+
+    with override_options(
+        {**options, "sentry-metrics.indexer.shared-cache.max-bytes": TABLE_SIZE * 2}
+    ):
+        assert shared_cache.get("transactions:1:a") is None
+        assert shared_cache.table is not None
+        assert shared_cache.table.buckets == 4
+
+    with override_options({"sentry-metrics.indexer.shared-cache.max-bytes": 0}):
+        assert not shared_cache.is_enabled()
+        assert shared_cache.get("transactions:1:a") is None
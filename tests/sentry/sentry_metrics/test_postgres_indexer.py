@@ -3,9 +3,11 @@ from typing import Mapping, Set
 from sentry.sentry_metrics.configuration import UseCaseKey
 from sentry.sentry_metrics.indexer.base import FetchType, Metadata, UseCaseKeyCollection
 from sentry.sentry_metrics.indexer.cache import CachingIndexer
+from sentry.sentry_metrics.indexer.postgres.models import PerfStringIndexer, StringIndexer
 from sentry.sentry_metrics.indexer.postgres.postgres_v2 import PGStringIndexerV2, indexer_cache
 from sentry.sentry_metrics.use_case_id_registry import UseCaseID
 from sentry.testutils.cases import TestCase
+from sentry.testutils.helpers.options import override_options
 from sentry.utils.cache import cache
 
 
@@ -40,3 +42,54 @@ class PostgresIndexerV2Test(TestCase):
         )
 
         assert indexer_cache.get(key) is None
+
+    def test_copy_insert(self) -> None:
+        indexer = PGStringIndexerV2()
+        org_id = self.organization.id
+        existing_id = indexer.record(self.use_case_id, org_id, "hello")
+        perf_existing_id = indexer.record(UseCaseID.TRANSACTIONS, org_id, "hello")
+
+        assert indexer._copy_insert(
+            StringIndexer, [(None, org_id, "hello"), (None, org_id, "new")]
+        ) == {
+            (None, org_id, "hello"): existing_id,
+            (None, org_id, "new"): indexer.resolve(self.use_case_id, org_id, "new"),
+        }
+        assert indexer._copy_insert(
+            PerfStringIndexer, [("transactions", org_id, "hello"), ("spans", org_id, "hello")]
+        ) == {
+            ("transactions", org_id, "hello"): perf_existing_id,
+            ("spans", org_id, "hello"): indexer.resolve(UseCaseID.SPANS, org_id, "hello"),
+        }
+
+    def test_copy_insert_bulk_record(self) -> None:
+        org_id = self.organization.id
+        new_strings = {"hey", "", 'with,comma "quoted"\nnewline'} | {f"s{i}" for i in range(10)}
+
+        for uca_limiting in (False, True):
+            indexer = PGStringIndexerV2()
+            for use_case_id in (UseCaseID.SESSIONS, UseCaseID.TRANSACTIONS):
+                existing_id = indexer.record(use_case_id, org_id, f"hello-{uca_limiting}")
+                strings = {f"hello-{uca_limiting}"} | {f"{s}-{uca_limiting}" for s in new_strings}
+
+                with override_options(
+                    {
+                        "sentry-metrics.indexer.pg-copy-insert": True,
+                        # Write the strings in several batches
+                        "sentry-metrics.indexer.pg-copy-insert.batch-size": 4,
+                        "sentry-metrics.writes-limiter.apply-uca-limiting": uca_limiting,
+                    }
+                ):
+                    results = indexer.bulk_record({use_case_id: {org_id: strings}})
+
+                assert results[use_case_id][org_id] == {
+                    string: indexer.resolve(use_case_id, org_id, string) for string in strings
+                }
+                assert results[use_case_id][org_id][f"hello-{uca_limiting}"] == existing_id
+                meta = results.get_fetch_metadata()[use_case_id][org_id]
+                assert_fetch_type_for_tag_string_set(
+                    meta, FetchType.DB_READ, {f"hello-{uca_limiting}"}
+                )
+                assert_fetch_type_for_tag_string_set(
+                    meta, FetchType.FIRST_SEEN, strings - {f"hello-{uca_limiting}"}
+                )
@@ -17,6 +17,7 @@ from sentry.snuba.models import SnubaQuery
 from sentry.snuba.query_subscriptions.consumer import (
     InvalidSchemaError,
     parse_message_value,
+    register_batch_subscriber,
     register_subscriber,
     subscriber_registry,
 )
@@ -125,6 +126,63 @@ class HandleMessageTest(BaseQuerySubscriptionTest, TestCase):
         )
         mock_callback.assert_called_once_with(data["payload"], sub)
 
+    def test_arroyo_consumer_batched(self):
+        registration_key = "registered_test_batched"
+        mock_callback = mock.Mock()
+        mock_batch_callback = mock.Mock()
+        register_subscriber(registration_key)(mock_callback)
+        register_batch_subscriber(registration_key)(mock_batch_callback)
+        with self.tasks():
+            snuba_query = create_snuba_query(
+                SnubaQuery.Type.ERROR,
+                Dataset.Events,
+                "hello",
+                "count()",
+                timedelta(minutes=10),
+                timedelta(minutes=1),
+                None,
+            )
+            sub = create_snuba_subscription(self.project, registration_key, snuba_query)
+        sub.refresh_from_db()
+
+        data = deepcopy(self.valid_wrapper)
+        data["payload"]["subscription_id"] = sub.subscription_id
+        commit = mock.Mock()
+        partition = Partition(Topic("test"), 0)
+        strategy = QuerySubscriptionStrategyFactory(
+            self.topic,
+            10,
+            1,
+            1,
+            DEFAULT_BLOCK_SIZE,
+            DEFAULT_BLOCK_SIZE,
+            multi_proc=False,
+            mode="batched",
+        ).create_with_partitions(commit, {partition: 0})
+        message = self.build_mock_message(data, topic=self.topic)
+        invalid_message = self.build_mock_message({"version": 3, "payload": {}})
+
+        for offset, mock_message in enumerate([message, invalid_message, message]):
+            strategy.submit(
+                Message(
+                    BrokerValue(
+                        KafkaPayload(b"key", mock_message.value().encode("utf-8"), []),
+                        partition,
+                        offset,
+                        datetime.now(),
+                    )
+                )
+            )
+        strategy.join()
+
+        payload = deepcopy(data["payload"])
+        payload["values"] = payload.pop("result")
+        payload.pop("request")
+        payload["timestamp"] = parse_date(payload["timestamp"]).replace(tzinfo=timezone.utc)
+        # The invalid message is skipped, and the others are handled together
+        mock_batch_callback.assert_called_once_with([(payload, sub), (payload, sub)])
+        assert mock_callback.call_count == 0
+
 
 class ParseMessageValueTest(BaseQuerySubscriptionTest, unittest.TestCase):
     def run_test(self, message):
@@ -12,6 +12,7 @@ from sentry.relay.projectconfig_debounce_cache.redis import RedisProjectConfigDe
 from sentry.tasks.relay import (
     _schedule_invalidate_project_config,
     build_project_config,
+    compute_projectkey_config,
     invalidate_project_config,
     schedule_build_project_config,
     schedule_invalidate_project_config,
@@ -91,6 +92,7 @@ def redis_cache(monkeypatch):
     monkeypatch.setattr("sentry.relay.projectconfig_cache.set_many", cache.set_many)
     monkeypatch.setattr("sentry.relay.projectconfig_cache.delete_many", cache.delete_many)
     monkeypatch.setattr("sentry.relay.projectconfig_cache.get", cache.get)
+    monkeypatch.setattr("sentry.relay.projectconfig_cache.exists_many", cache.exists_many)
 
     return cache
 
@@ -461,6 +463,40 @@ class TestInvalidationTask:
             assert new_cfg is not None
             assert new_cfg != cfg
 
+    def test_invalidate_org_computes_cached_keys(
+        self,
+        factories,
+        default_project,
+        default_organization,
+        default_projectkey,
+        redis_cache,
+        task_runner,
+        django_cache,
+    ):
+        other_project = factories.create_project(organization=default_organization)
+        other_key = factories.create_project_key(other_project)
+        disabled_key = ProjectKey.objects.create(
+            project=other_project, status=ProjectKeyStatus.INACTIVE
+        )
+        uncached_key = ProjectKey.objects.create(project=default_project)
+        cached_keys = [default_projectkey, other_key, disabled_key]
+        redis_cache.set_many({key.public_key: "dummy" for key in cached_keys})
+
+        with task_runner():
+            schedule_invalidate_project_config(
+                organization_id=default_organization.id, trigger="test"
+            )
+
+        assert redis_cache.get(uncached_key.public_key) is None
+        assert redis_cache.get(disabled_key.public_key) == {"disabled": True}
+        for key in [default_projectkey, other_key]:
+            cfg = redis_cache.get(key.public_key)
+            expected = compute_projectkey_config(ProjectKey.objects.get(id=key.id))
+            for cfg_ in (cfg, expected):
+                for field in ("lastFetch", "lastChange", "rev"):
+                    cfg_.pop(field)
+            assert cfg == expected
+
     @mock.patch(
         "sentry.tasks.relay._schedule_invalidate_project_config",
         wraps=_schedule_invalidate_project_config,
@@ -5,7 +5,14 @@ from unittest import TestCase
 import pytz
 from freezegun import freeze_time
 
-from sentry.tsdb.base import ONE_DAY, ONE_HOUR, ONE_MINUTE, BaseTSDB
+from sentry.tsdb.base import (
+    ONE_DAY,
+    ONE_HOUR,
+    ONE_MINUTE,
+    BaseTSDB,
+    TimeSeriesArrays,
+    cluster_windows,
+)
 from sentry.utils.dates import to_timestamp
 
 
@@ -128,3 +135,41 @@ class BaseTSDBTest(TestCase):
         assert self.tsdb.make_series(0, start) == [
             (to_timestamp(start + timedelta(hours=24) * i), 0) for i in range(8)
         ]
+
+
+def test_cluster_windows():
+    assert cluster_windows([]) == []
+    # Overlapping and touching windows share a group, disjoint ones don't.
+    assert cluster_windows([(50, 60), (0, 10), (10, 20), (15, 16), (30, 40)]) == [
+        [1, 2, 3],
+        [4],
+        [0],
+    ]
+    assert cluster_windows([(0, 100), (10, 20), (90, 110)]) == [[0, 1, 2]]
+
+
+class TimeSeriesArraysTest(TestCase):
+    def test_rows(self):
+        arrays = TimeSeriesArrays(["a", "b"], [60, 120, 180])
+        arrays.values[arrays.index("b") * arrays.width + 1] = 5
+        arrays.values[0] = 2
+
+        assert arrays.row("a").tolist() == [2, 0, 0]
+        assert arrays.row("b").tolist() == [0, 5, 0]
+        assert arrays.sums() == {"a": 2, "b": 5}
+        assert arrays.to_series() == {
+            "a": [(60, 2), (120, 0), (180, 0)],
+            "b": [(60, 0), (120, 5), (180, 0)],
+        }
+
+    def test_downsample(self):
+        pre_results = {1: [(1368889980, 5), (1368890040, 10), (1368893640, 7)]}
+        arrays = TimeSeriesArrays(pre_results.keys(), [ts for ts, _ in pre_results[1]])
+        for i, (_, count) in enumerate(pre_results[1]):
+            arrays.values[i] = count
+
+        downsampled = arrays.downsample(3600)
+        assert downsampled.to_series() == {
+            key: [tuple(point) for point in points]
+            for key, points in BaseTSDB().rollup(pre_results, 3600).items()
+        }
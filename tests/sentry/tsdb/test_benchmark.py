@@ -0,0 +1,83 @@
+import uuid
+from datetime import timedelta
+
+import pytest
+from django.test import override_settings
+from django.utils import timezone
+
+from sentry.testutils.skips import requires_pytest_benchmark
+from sentry.tsdb.base import ONE_HOUR, TSDBModel
+from sentry.tsdb.redis import RedisTSDB
+
+MODEL = TSDBModel.users_affected_by_group
+
+
+@pytest.fixture
+def tsdb():
+    with override_settings(
+        SENTRY_OPTIONS={
+            "redis.clusters": {"tsdb": {"hosts": {i - 6: {"db": i} for i in range(6, 9)}}}
+        }
+    ):
+        db = RedisTSDB(rollups=((ONE_HOUR, 24),), vnodes=64, cluster="tsdb")
+    yield db
+    with db.cluster.all() as client:
+        client.flushdb()
+
+
+def pfmerge_union(db, model, keys, start, end, rollup):
+    """
+    The previous implementation of `get_distinct_counts_union`: merge on every
+    host into a temporary key, then merge the partial results on one host.
+    """
+    _, series = db.get_optimal_rollup_series(start, end, rollup)
+    temporary_id = uuid.uuid1().hex
+    router = db.cluster.get_router()
+
+    hosts = {}
+    for key in keys:
+        hosts.setdefault(router.get_host_for_key(key), []).append(key)
+
+    aggregates = {}
+    for host, host_keys in hosts.items():
+        destination = f"{db.prefix}{temporary_id}:p:{host}"
+        with db.cluster.get_local_client(host).pipeline(transaction=False) as pipeline:
+            pipeline.execute_command(
+                "PFMERGE",
+                destination,
+                *(
+                    db.make_key(model, rollup, timestamp, key, None)
+                    for key in host_keys
+                    for timestamp in series
+                ),
+            )
+            pipeline.get(destination)
+            pipeline.delete(destination)
+            aggregates[f"{db.prefix}{temporary_id}:a:{host}"] = pipeline.execute()[1]
+
+    destination = f"{db.prefix}{temporary_id}:a"
+    with db.cluster.get_local_client(next(iter(hosts))).pipeline(transaction=False) as pipeline:
+        pipeline.mset(aggregates)
+        pipeline.execute_command("PFMERGE", destination, *aggregates.keys())
+        pipeline.execute_command("PFCOUNT", destination)
+        pipeline.delete(destination, *aggregates.keys())
+        return pipeline.execute()[2]
+
+
+@requires_pytest_benchmark
+@pytest.mark.parametrize("users", [10, 1000, 10000])
+@pytest.mark.parametrize("method", ["pfmerge", "local"])
+def test_benchmark_distinct_counts_union(tsdb, method, users, benchmark):
+    now = timezone.now()
+    start = now - timedelta(hours=12)
+    keys = list(range(20))
+    tsdb.record_multi(
+        [(MODEL, key, [f"user:{key}:{i}" for i in range(users)]) for key in keys], timestamp=now
+    )
+
+    if method == "local":
+        result = benchmark(tsdb.get_distinct_counts_union, MODEL, keys, start, now, ONE_HOUR)
+    else:
+        result = benchmark(pfmerge_union, tsdb, MODEL, keys, start, now, ONE_HOUR)
+
+    assert result == pfmerge_union(tsdb, MODEL, keys, start, now, ONE_HOUR)
@@ -5,6 +5,7 @@ import pytest
 from django.test import override_settings
 
 from sentry.testutils import TestCase
+from sentry.tsdb import hyperloglog
 from sentry.tsdb.base import ONE_DAY, ONE_HOUR, ONE_MINUTE, TSDBModel
 from sentry.tsdb.redis import CountMinScript, RedisTSDB, SuppressionWrapper
 from sentry.utils.dates import to_datetime, to_timestamp
@@ -187,6 +188,55 @@ class RedisTSDBTest(TestCase):
         results = self.db.get_sums(TSDBModel.project, [1, 2], dts[0], dts[-1], environment_id=1)
         assert results == {1: 0, 2: 0}
 
+    def test_get_range_arrays(self):
+        now = datetime.utcnow().replace(tzinfo=timezone.utc) - timedelta(hours=4)
+        dts = [now + timedelta(hours=i) for i in range(4)]
+
+        def timestamp(d):
+            t = int(to_timestamp(d))
+            return t - (t % 3600)
+
+        self.db.incr(TSDBModel.group, 1, dts[0])
+        self.db.incr(TSDBModel.group, 1, dts[1], count=2)
+        self.db.incr(TSDBModel.group, 65, dts[1], count=5)
+        self.db.incr(TSDBModel.group, 2, dts[3], count=3, environment_id=1)
+
+        arrays = self.db.get_range_arrays(TSDBModel.group, [1, 2, 65], dts[0], dts[-1])
+        assert list(arrays.timestamps) == [timestamp(dt) for dt in dts]
+        assert arrays.keys == [1, 2, 65]
+        assert arrays.row(1).tolist() == [1, 2, 0, 0]
+        assert arrays.row(2).tolist() == [0, 0, 0, 0]
+        assert arrays.row(65).tolist() == [0, 5, 0, 0]
+        assert arrays.sums() == {1: 3, 2: 0, 65: 5}
+        assert arrays.to_series() == self.db.get_range(TSDBModel.group, [1, 2, 65], dts[0], dts[-1])
+
+        arrays = self.db.get_range_arrays(
+            TSDBModel.group, [1, 2], dts[0], dts[-1], environment_id=1
+        )
+        assert arrays.sums() == {1: 0, 2: 3}
+
+    def test_hyperloglog_matches_pfcount(self):
+        client = self.db.cluster.get_local_client(0)
+        # Small sets stay sparsely encoded, large ones are promoted to dense.
+        for i, size in enumerate([0, 1, 100, 2000, 20000]):
+            client.pfadd(f"hll:{i}", *(f"{size}:{j}" for j in range(size)))
+
+        keys = [f"hll:{i}" for i in range(5)]
+        values = [client.get(key) for key in keys]
+        for key, value in zip(keys, values):
+            assert hyperloglog.count(hyperloglog.decode(value)) == client.pfcount(key)
+
+        registers = hyperloglog.merge(values)
+        assert hyperloglog.count(registers) == client.pfcount(*keys)
+
+        # Values produced by `encode` are valid HyperLogLogs for Redis.
+        for i in range(1, len(keys) + 1):
+            registers = hyperloglog.merge(values[:i])
+            client.set("hll:merged", hyperloglog.encode(registers))
+            assert client.pfcount("hll:merged") == hyperloglog.count(registers)
+            client.pfadd("hll:merged", "one more")
+            assert client.pfcount("hll:merged") == client.pfcount("hll:merged", *keys[:i])
+
     def test_count_distinct(self):
         now = datetime.utcnow().replace(tzinfo=timezone.utc) - timedelta(hours=4)
         dts = [now + timedelta(hours=i) for i in range(4)]
@@ -0,0 +1,62 @@
+import time
+import tracemalloc
+
+import pytest
+
+from sentry.testutils.skips import requires_pytest_benchmark
+from sentry.utils import json
+from sentry.utils.pytest.fixtures import django_db_all
+from sentry.utils.snuba import _bulk_snuba_query
+
+# A bulk call as the issue stream or a dashboard sends them: 50 queries, some of
+# which return large result sets.
+QUERIES = 50
+ROWS = 2000
+LATENCY = 0.02
+
+
+class FakeResponse:
+    status = 200
+
+    def __init__(self, data):
+        self.data = data
+
+
+def make_body(i):
+    rows = [
+        {"group_id": i * ROWS + row, "times_seen": row, "last_seen": "2023-07-01T00:00:00+00:00"}
+        for row in range(ROWS if i % 5 == 0 else ROWS // 20)
+    ]
+    return json.dumps({"data": rows, "meta": []}).encode()
+
+
+def run_bulk_query(bodies):
+    def legacy_snql_query(params):
+        (i, forward, reverse), _, _, _ = params
+        time.sleep(LATENCY)
+        # A fresh copy, like a response read from the network
+        return FakeResponse(bytes(bodies[i])), forward, reverse
+
+    params = [(i, lambda x: x, lambda row: row) for i in range(QUERIES)]
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr("sentry.utils.snuba._legacy_snql_query", legacy_snql_query)
+        return _bulk_snuba_query(params, {"referer": "search"})
+
+
+@requires_pytest_benchmark
+@django_db_all
+def test_benchmark_bulk_snuba_query(benchmark):
+    bodies = [make_body(i) for i in range(QUERIES)]
+
+    tracemalloc.start()
+    try:
+        run_bulk_query(bodies)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    benchmark.extra_info["queries"] = QUERIES
+    benchmark.extra_info["response_bytes"] = sum(len(body) for body in bodies)
+    benchmark.extra_info["peak_memory_bytes"] = peak
+
+    results = benchmark(run_bulk_query, bodies)
+    assert len(results) == QUERIES
@@ -0,0 +1,48 @@
+from unittest import mock
+
+from sentry.utils.lru import LRUCache
+
+
+def test_evicts_least_recently_used():
+    cache = LRUCache(max_weight=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    assert cache.set("c", 3) == 1
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert (cache.hits, cache.misses, cache.evictions) == (3, 1, 1)
+
+
+def test_weigher():
+    cache = LRUCache(max_weight=10, weigher=len)
+    cache.set("a", b"12345")
+    cache.set("b", b"123456")
+    assert cache.get("a") is None
+    assert cache.weight == 6
+
+    # Too large to ever fit
+    cache.set("c", b"12345678901")
+    assert cache.get("c") is None
+    assert cache.get("b") == b"123456"
+
+    cache.set("b", b"1", weight=3)
+    assert cache.weight == 3
+    cache.delete("b")
+    assert cache.weight == 0
+    assert len(cache) == 0
+
+
+@mock.patch("sentry.utils.lru.monotonic")
+def test_ttl(monotonic):
+    monotonic.return_value = 100
+    cache = LRUCache(max_weight=10, ttl=10)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=30)
+
+    monotonic.return_value = 115
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+    assert cache.weight == 1
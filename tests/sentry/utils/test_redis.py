@@ -61,6 +61,23 @@ class ClusterManagerTestCase(TestCase):
         with pytest.raises(KeyError):
             manager.get("bar")
 
+    @mock.patch("sentry.utils.redis.RetryingRedisCluster")
+    def test_decode_responses(self, RetryingRedisCluster):
+        manager = make_manager(cluster_type=_RedisCluster)
+        assert manager.get("foo") is manager.get("foo", decode_responses=True)
+        assert manager.get("foo") is not manager.get("foo", decode_responses=False)
+        client = manager.get("foo")._setupfunc()  # type: ignore[attr-defined]
+        assert client.connection_pool.connection_kwargs["decode_responses"] is True
+        client = manager.get("foo", decode_responses=False)._setupfunc()  # type: ignore[attr-defined]
+        assert client.connection_pool.connection_kwargs["decode_responses"] is False
+
+        manager.get("baz", decode_responses=False)._setupfunc()  # type: ignore[attr-defined]
+        assert RetryingRedisCluster.call_args.kwargs["decode_responses"] is False
+
+        # rb clients never decode responses, so there is only one of them
+        manager = make_manager()
+        assert manager.get("foo") is manager.get("foo", decode_responses=False)
+
     def test_multiple_retrieval_do_not_setup_lazy_object(self):
         class TestClusterType:
             def supports(self, config):
@@ -1,18 +1,44 @@
+import threading
+import time
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from unittest import mock
 
 import pytest
 import pytz
+from django.core.cache import cache
 from django.utils import timezone
+from snuba_sdk import (
+    Column,
+    Condition,
+    Direction,
+    Entity,
+    Function,
+    Granularity,
+    Limit,
+    Op,
+    OrderBy,
+    Query,
+    Request,
+)
 
 from sentry.models import GroupRelease, Project, Release
 from sentry.snuba.dataset import Dataset
+from sentry.locks import locks
 from sentry.testutils import TestCase
+from sentry.testutils.helpers.options import override_options
+from sentry.utils import json
 from sentry.utils.snuba import (
+    QueryConcurrencyLimiter,
+    RateLimitExceeded,
     SnubaQueryParams,
     UnqualifiedQueryError,
+    _apply_cache_and_build_results,
+    _bulk_snuba_query,
     _prepare_query_params,
+    bulk_timeseries_snql_query,
+    get_cache_key,
     get_json_type,
     get_query_params_to_update_for_projects,
     get_snuba_column_name,
@@ -374,3 +400,360 @@ class QuantizeTimeTest(unittest.TestCase):
                 break
 
         assert i != j
+
+
+@mock.patch("sentry.utils.snuba._bulk_snuba_query")
+class QueryCacheTest(TestCase):
+    query = {"dataset": "events", "selected_columns": ["count()"]}
+
+    def setUp(self):
+        super().setUp()
+        self.cache_key = get_cache_key(self.query)
+        self.params = [(self.query, lambda x: x, lambda x: x)]
+
+    def hold_lock(self):
+        lock = locks.get(f"{self.cache_key}:lock", duration=10)
+        lock.acquire()
+        self.addCleanup(lock.release)
+        return lock
+
+    def test_miss(self, bulk_query):
+        bulk_query.return_value = [{"data": [{"count": 1}]}]
+
+        assert _apply_cache_and_build_results(self.params, use_cache=True) == [
+            {"data": [{"count": 1}]}
+        ]
+        assert bulk_query.call_count == 1
+        assert json.loads(cache.get(self.cache_key)) == {"data": [{"count": 1}]}
+        assert _apply_cache_and_build_results(self.params, use_cache=True) == [
+            {"data": [{"count": 1}]}
+        ]
+        assert bulk_query.call_count == 1
+
+    @override_options({"snuba.query-cache.stale-ttl": 60})
+    def test_stale_result_is_revalidated_once(self, bulk_query):
+        bulk_query.return_value = [{"data": [{"count": 2}]}]
+        cache.set(self.cache_key, json.dumps({"data": [{"count": 1}]}), 60)
+
+        # Another request refreshes the result
+        lock = self.hold_lock()
+        with mock.patch("sentry.utils.snuba.metrics.incr") as incr:
+            assert _apply_cache_and_build_results(self.params, use_cache=True) == [
+                {"data": [{"count": 1}]}
+            ]
+        assert bulk_query.call_count == 0
+        assert incr.call_args == mock.call("snuba.query_cache.stale", tags=None)
+
+        lock.release()
+        assert _apply_cache_and_build_results(self.params, use_cache=True) == [
+            {"data": [{"count": 2}]}
+        ]
+        assert bulk_query.call_count == 1
+        assert cache.get(f"{self.cache_key}:fresh")
+
+        assert _apply_cache_and_build_results(self.params, use_cache=True) == [
+            {"data": [{"count": 2}]}
+        ]
+        assert bulk_query.call_count == 1
+
+    @override_options(
+        {
+            "snuba.query-cache.stale-ttl": 60,
+            "snuba.query-cache.referrer-policies": {"search": {"ttl": 300, "stale_ttl": 0}},
+        }
+    )
+    def test_referrer_policy(self, bulk_query):
+        bulk_query.return_value = [{"data": []}]
+
+        with mock.patch("sentry.utils.snuba.cache.set") as cache_set:
+            _apply_cache_and_build_results(self.params, referrer="search", use_cache=True)
+        assert cache_set.call_args_list == [mock.call(self.cache_key, '{"data":[]}', 300)]
+
+    @override_options({"snuba.query-cache.single-flight.enabled": True})
+    def test_single_flight_waits_for_leader(self, bulk_query):
+        self.hold_lock()
+
+        def sleep(seconds):
+            # The request holding the lock caches its result in the meantime
+            cache.set(self.cache_key, json.dumps({"data": [{"count": 1}]}), 60)
+
+        with mock.patch("sentry.utils.snuba.time.sleep", side_effect=sleep) as mock_sleep:
+            assert _apply_cache_and_build_results(self.params, use_cache=True) == [
+                {"data": [{"count": 1}]}
+            ]
+        assert mock_sleep.call_count == 1
+        assert bulk_query.call_count == 0
+
+    @override_options({"snuba.query-cache.single-flight.enabled": True})
+    def test_single_flight_backoff(self, bulk_query):
+        self.hold_lock()
+        delays = []
+
+        def sleep(seconds):
+            delays.append(seconds)
+            if len(delays) == 10:
+                cache.set(self.cache_key, json.dumps({"data": [{"count": 1}]}), 60)
+
+        with mock.patch("sentry.utils.snuba.time.sleep", side_effect=sleep):
+            assert _apply_cache_and_build_results(self.params, use_cache=True) == [
+                {"data": [{"count": 1}]}
+            ]
+        assert delays == sorted(delays)
+        assert delays[0] < delays[-1] <= 1.0
+        assert bulk_query.call_count == 0
+
+    @override_options({"snuba.query-cache.single-flight.enabled": True})
+    def test_single_flight_leader_failed(self, bulk_query):
+        bulk_query.return_value = [{"data": [{"count": 1}]}]
+
+        def sleep(seconds):
+            # The request holding the lock fails without caching a result
+            lock.release()
+
+        lock = self.hold_lock()
+        with mock.patch("sentry.utils.snuba.time.sleep", side_effect=sleep) as mock_sleep:
+            assert _apply_cache_and_build_results(self.params, use_cache=True) == [
+                {"data": [{"count": 1}]}
+            ]
+        assert mock_sleep.call_count == 1
+        assert bulk_query.call_count == 1
+
+    @override_options(
+        {
+            "snuba.query-cache.single-flight.enabled": True,
+            "snuba.query-cache.single-flight.wait": 0.1,
+        }
+    )
+    def test_single_flight_timeout(self, bulk_query):
+        bulk_query.return_value = [{"data": [{"count": 1}]}]
+        self.hold_lock()
+
+        assert _apply_cache_and_build_results(self.params, use_cache=True) == [
+            {"data": [{"count": 1}]}
+        ]
+        assert bulk_query.call_count == 1
+        assert cache.get(self.cache_key)
+
+
+@override_options({"snuba.timeseries-cache.buckets-per-chunk": 4})
+class TimeseriesCacheTest(TestCase):
+    def setUp(self):
+        super().setUp()
+        now = timezone.now().replace(second=0, microsecond=0)
+        self.events = [now - timedelta(minutes=17 * i) for i in range(300)]
+        self.queried = []
+
+    def bulk_snql_query(self, requests, referrer=None):
+        results = []
+        for request in requests:
+            _, start, end = request.query.where
+            rollup = request.query.granularity.granularity
+            self.queried.append((start.rhs, end.rhs))
+            counts = {}
+            for event in self.events:
+                if start.rhs <= event < end.rhs:
+                    bucket = int(event.timestamp()) // rollup * rollup
+                    counts[bucket] = counts.get(bucket, 0) + 1
+            data = [{"time": time, "count": count} for time, count in sorted(counts.items())]
+            if request.query.limit is not None:
+                data = data[: request.query.limit.limit]
+            results.append({"data": data, "meta": [{"name": "count", "type": "UInt64"}]})
+        return results
+
+    def request(self, start, end, rollup, limit=None):
+        return Request(
+            dataset="events",
+            app_id="default",
+            query=Query(
+                match=Entity("events"),
+                select=[Function("count", [], "count")],
+                where=[
+                    Condition(Column("project_id"), Op.IN, [self.project.id]),
+                    Condition(Column("timestamp"), Op.GTE, start),
+                    Condition(Column("timestamp"), Op.LT, end),
+                ],
+                groupby=[Column("time")],
+                orderby=[OrderBy(Column("time"), Direction.ASC)],
+                granularity=Granularity(rollup),
+                limit=Limit(limit) if limit is not None else None,
+            ),
+        )
+
+    def test_only_recent_buckets_are_requeried(self):
+        rollup = 3600
+        end = timezone.now().replace(microsecond=0) - timedelta(minutes=5)
+        start = end - timedelta(days=2)
+
+        with mock.patch("sentry.utils.snuba.bulk_snql_query", side_effect=self.bulk_snql_query):
+            for shift in range(3):
+                request_start = start + timedelta(minutes=7 * shift)
+                request_end = end + timedelta(minutes=7 * shift)
+                expected = self.bulk_snql_query([self.request(request_start, request_end, rollup)])
+                self.queried.clear()
+
+                result = bulk_timeseries_snql_query(
+                    [self.request(request_start, request_end, rollup)], rollup
+                )
+
+                assert result == expected
+                if shift == 0:
+                    assert self.queried == [(request_start, request_end)]
+                else:
+                    # The buckets before the first cached chunk and the ones after the last
+                    assert len(self.queried) == 2
+                    assert self.queried[0][0] == request_start
+                    assert self.queried[1][1] == request_end
+                    assert self.queried[1][0] > request_end - timedelta(seconds=rollup * 5)
+
+    def test_limited_results_not_cached(self):
+        rollup = 3600
+        end = timezone.now().replace(microsecond=0) - timedelta(minutes=5)
+        start = end - timedelta(days=2)
+
+        with mock.patch("sentry.utils.snuba.bulk_snql_query", side_effect=self.bulk_snql_query):
+            for _ in range(2):
+                self.queried.clear()
+                result = bulk_timeseries_snql_query(
+                    [self.request(start, end, rollup, limit=10)], rollup
+                )
+
+                assert len(result[0]["data"]) == 10
+                # Chunks of a result cut off by the limit are never cached
+                assert self.queried == [(start, end)]
+
+    def test_unaligned_rollup(self):
+        end = timezone.now().replace(microsecond=0)
+        request = self.request(end - timedelta(days=2), end, 7 * 3600)
+
+        with mock.patch("sentry.utils.snuba.bulk_snql_query", side_effect=self.bulk_snql_query):
+            result = bulk_timeseries_snql_query([request], 7 * 3600)
+
+        assert result == self.bulk_snql_query([request])
+        assert len(self.queried) == 2
+
+
+class QueryConcurrencyLimiterTest(TestCase):
+    def test_increase(self):
+        limiter = QueryConcurrencyLimiter(10)
+        limiter.limits["search"] = 2.0
+
+        # About one more query per round of queries
+        for _ in range(6):
+            limiter.record("search", 0.1)
+
+        assert limiter.get("search") == 4
+        assert limiter.get("api.dashboards") == 10
+
+        for _ in range(100):
+            limiter.record("search", 0.1)
+        assert limiter.get("search") == 10
+
+    def test_decrease_once_per_round(self):
+        limiter = QueryConcurrencyLimiter(10)
+
+        limiter.record("search", 0.1, rate_limited=True)
+        limiter.record("search", 10.0)
+        assert limiter.get("search") == 5
+
+        with mock.patch("sentry.utils.snuba.time.monotonic", return_value=time.monotonic() + 5):
+            limiter.record("search", 10.0)
+        assert limiter.get("search") == 2
+
+
+class FakeResponse:
+    def __init__(self, status, body):
+        self.status = status
+        self.data = json.dumps(body).encode()
+
+
+class BulkSnubaQueryTest(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.running = 0
+        self.max_running = 0
+        self.lock = threading.Lock()
+
+    def snql_query(self, params):
+        (request, forward, reverse), _, _, _ = params
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(0.01)
+        with self.lock:
+            self.running -= 1
+        if request == "rate-limited":
+            body = {"error": {"type": "rate-limiting", "message": "slow down"}}
+            return FakeResponse(429, body), forward, reverse
+        return FakeResponse(200, {"data": [{"id": request}, {"id": request + 1}]}), forward, reverse
+
+    def params(self, requests):
+        return [(request, lambda x: x, lambda row: {"id": row["id"] * 10}) for request in requests]
+
+    @override_options({"snuba.bulk-query.adaptive-concurrency": True})
+    def test_results_in_order_with_limited_concurrency(self):
+        limiter = QueryConcurrencyLimiter(10)
+        limiter.limits["search"] = 2.0
+
+        with mock.patch("sentry.utils.snuba._query_concurrency", limiter), mock.patch(
+            "sentry.utils.snuba._legacy_snql_query", side_effect=self.snql_query
+        ):
+            results = _bulk_snuba_query(self.params(range(0, 100, 10)), {"referer": "search"})
+
+        assert [result["data"] for result in results] == [
+            [{"id": i * 10}, {"id": (i + 1) * 10}] for i in range(0, 100, 10)
+        ]
+        assert self.max_running == 2
+        assert limiter.get("search") > 2
+
+    @override_options({"snuba.bulk-query.adaptive-concurrency": True})
+    def test_rate_limited(self):
+        limiter = QueryConcurrencyLimiter(10)
+
+        with mock.patch("sentry.utils.snuba._query_concurrency", limiter), mock.patch(
+            "sentry.utils.snuba._legacy_snql_query", side_effect=self.snql_query
+        ):
+            with pytest.raises(RateLimitExceeded):
+                _bulk_snuba_query(self.params([1, "rate-limited", 2]), {"referer": "search"})
+
+        assert limiter.get("search") == 5
+
+    @override_options(
+        {
+            "snuba.bulk-query.adaptive-concurrency": True,
+            "snuba.bulk-query.target-latency": 0.05,
+        }
+    )
+    def test_queue_time_not_counted(self):
+        limiter = QueryConcurrencyLimiter(10)
+
+        # The queries run one after another, the last ones wait for a thread longer than the
+        # target latency
+        with ThreadPoolExecutor(max_workers=1) as pool, mock.patch(
+            "sentry.utils.snuba._query_thread_pool", pool
+        ), mock.patch("sentry.utils.snuba._query_concurrency", limiter), mock.patch(
+            "sentry.utils.snuba._legacy_snql_query", side_effect=self.snql_query
+        ):
+            _bulk_snuba_query(self.params(range(10)), {"referer": "search"})
+
+        assert self.max_running == 1
+        assert limiter.get("search") == 10
+
+    def test_response_bytes(self):
+        params = self.params(range(10))
+        sizes = [
+            len(FakeResponse(200, {"data": [{"id": i}, {"id": i + 1}]}).data) for i in range(10)
+        ]
+
+        # The queries run one after another, so one raw body is held at a time
+        with ThreadPoolExecutor(max_workers=1) as pool, mock.patch(
+            "sentry.utils.snuba._query_thread_pool", pool
+        ), mock.patch(
+            "sentry.utils.snuba._legacy_snql_query", side_effect=self.snql_query
+        ), mock.patch(
+            "sentry.utils.snuba.metrics.timing"
+        ) as timing:
+            _bulk_snuba_query(params, {"referer": "search"})
+
+        timings = {call.args[0]: call.args[1] for call in timing.call_args_list}
+        assert timings["snuba.bulk_query.response_bytes"] == sum(sizes)
+        assert timings["snuba.bulk_query.peak_response_bytes"] == max(sizes)
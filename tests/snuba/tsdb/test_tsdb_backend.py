@@ -12,6 +12,7 @@ from sentry.testutils.silo import region_silo_test
 from sentry.tsdb.base import TSDBModel
 from sentry.tsdb.snuba import SnubaTSDB
 from sentry.utils.dates import to_datetime, to_timestamp
+from sentry.utils.snuba import raw_snql_query
 from tests.sentry.issues.test_utils import SearchIssueTestMixin
 
 
@@ -349,6 +350,89 @@ class SnubaTSDBTest(TestCase, SnubaTestCase):
             tenant_ids={"referrer": "r", "organization_id": 1234},
         ) == {self.proj1.id: expected}
 
+    def test_multi_window(self):
+        windows = [
+            (self.now, self.now + timedelta(hours=4)),
+            (self.now + timedelta(minutes=30), self.now + timedelta(hours=1)),
+            (self.now + timedelta(hours=3), self.now + timedelta(hours=3, minutes=5)),
+        ]
+        keys = [self.proj1group1.id, self.proj1group2.id]
+        tenant_ids = {"referrer": "r", "organization_id": 1234}
+
+        for environment_id in (None, self.env1.id):
+            assert self.db.get_sums_multi_window(
+                TSDBModel.group,
+                keys,
+                windows,
+                environment_id=environment_id,
+                jitter_value=self.proj1group1.id,
+                tenant_ids=tenant_ids,
+            ) == [
+                self.db.get_sums(
+                    TSDBModel.group,
+                    keys,
+                    start,
+                    end,
+                    environment_id=environment_id,
+                    jitter_value=self.proj1group1.id,
+                    tenant_ids=tenant_ids,
+                )
+                for start, end in windows
+            ]
+
+            assert self.db.get_distinct_counts_totals_multi_window(
+                TSDBModel.users_affected_by_group,
+                keys,
+                windows,
+                environment_id=environment_id,
+                tenant_ids=tenant_ids,
+            ) == [
+                self.db.get_distinct_counts_totals(
+                    TSDBModel.users_affected_by_group,
+                    keys,
+                    start,
+                    end,
+                    environment_id=environment_id,
+                    tenant_ids=tenant_ids,
+                )
+                for start, end in windows
+            ]
+
+        # Disjoint windows are queried separately.
+        disjoint = windows + [(self.now - timedelta(days=30), self.now - timedelta(days=29))]
+        expected = [
+            self.db.get_sums(TSDBModel.group, keys, start, end, tenant_ids=tenant_ids)
+            for start, end in disjoint
+        ]
+        with patch("sentry.tsdb.snuba.raw_snql_query", wraps=raw_snql_query) as snuba:
+            assert (
+                self.db.get_sums_multi_window(
+                    TSDBModel.group, keys, disjoint, tenant_ids=tenant_ids
+                )
+                == expected
+            )
+        assert snuba.call_count == 2
+
+        # Windows can have different environments.
+        environment_ids = [None, self.env1.id, self.env1.id]
+        assert self.db.get_sums_multi_window(
+            TSDBModel.group,
+            keys,
+            windows,
+            environment_ids=environment_ids,
+            tenant_ids=tenant_ids,
+        ) == [
+            self.db.get_sums(
+                TSDBModel.group,
+                keys,
+                start,
+                end,
+                environment_id=environment_id,
+                tenant_ids=tenant_ids,
+            )
+            for (start, end), environment_id in zip(windows, environment_ids)
+        ]
+
     def test_distinct_counts_series_users(self):
         dts = [self.now + timedelta(hours=i) for i in range(4)]
         assert self.db.get_distinct_counts_series(